@@ -163,6 +163,8 @@ dist = setup(name=name,
         'simplejson': ['simplejson'],
         'cdecimal': ['cdecimal'],
         'calendar': ['GooCalendar'],
+        'msgpack': ['msgpack >= 0.5.2'],
+        'zstd': ['zstandard'],
         },
     zip_safe=False,
     **args
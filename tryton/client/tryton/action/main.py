@@ -3,7 +3,7 @@
 import tryton.rpc as rpc
 from tryton.common import message, selection, file_open, mailto
 from tryton.gui.window import Window
-from tryton.pyson import PYSONDecoder
+from tryton.pyson import compile_pyson
 import gettext
 import tempfile
 import os
@@ -114,18 +114,19 @@ class Action(object):
             }
             ctx.update(rpc.CONTEXT)
             ctx['_user'] = rpc._USER
-            decoder = PYSONDecoder(ctx)
-            action_ctx = decoder.decode(action.get('pyson_context') or '{}')
+            action_ctx = compile_pyson(
+                action.get('pyson_context') or '{}')(ctx)
             ctx.update(action_ctx)
             ctx.update(context)
             action_ctx.update(context)
 
             ctx['context'] = ctx
-            decoder = PYSONDecoder(ctx)
-            domain = decoder.decode(action['pyson_domain'])
-            order = decoder.decode(action['pyson_order'])
-            search_value = decoder.decode(action['pyson_search_value'] or '[]')
-            tab_domain = [(n, decoder.decode(d)) for n, d in action['domains']]
+            domain = compile_pyson(action['pyson_domain'])(ctx)
+            order = compile_pyson(action['pyson_order'])(ctx)
+            search_value = compile_pyson(
+                action['pyson_search_value'] or '[]')(ctx)
+            tab_domain = [(n, compile_pyson(d)(ctx))
+                for n, d in action['domains']]
 
             name = False
             if action.get('window_name', True):
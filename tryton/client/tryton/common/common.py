@@ -1276,7 +1276,7 @@ class RPCProgress(object):
         if self.exception:
             if self.process_exception_p:
                 def rpc_execute(*args):
-                    return RPCProgress('execute',
+                    return RPCProgress(self.method,
                         args).run(self.process_exception_p)
                 result = process_exception(self.exception, *self.args,
                     rpc_execute=rpc_execute, session=self.session)
@@ -1308,6 +1308,19 @@ def RPCExecute(*args, **kwargs):
     return RPCProgress('execute', args).run(process_exception, callback)
 
 
+def RPCExecuteBatch(*calls, **kwargs):
+    """Execute the calls, tuples of arguments like for RPCExecute, in a
+    single request and return the list of results."""
+    rpc_context = rpc.CONTEXT.copy()
+    if kwargs.get('context'):
+        rpc_context.update(kwargs['context'])
+    calls = tuple(tuple(c) + (rpc_context,) for c in calls)
+    process_exception = kwargs.get('process_exception', True)
+    callback = kwargs.get('callback')
+    return RPCProgress('execute_batch', calls).run(process_exception,
+        callback)
+
+
 def RPCContextReload(callback=None):
     def update(context):
         rpc.CONTEXT.clear()
@@ -381,11 +381,10 @@ class Form(SignalEvent, TabContent):
             if self.screen.current_record else None)
         if self.screen.current_view.view_type != 'form':
             self.screen.search_filter(self.screen.screen_container.get_text())
-            for record in self.screen.group:
-                if record.id == record_id:
-                    self.screen.current_record = record
-                    set_cursor = True
-                    break
+            record = self.screen.group.get(record_id)
+            if record:
+                self.screen.current_record = record
+                set_cursor = True
         self.screen.display(set_cursor=set_cursor)
         self.message_info()
         self.activate_save()
@@ -14,6 +14,7 @@ import decimal
 from decimal import Decimal
 import math
 from tryton.common import RPCExecute, RPCException
+from tryton.exceptions import TrytonServerError, TrytonServerUnavailable
 import tryton.rpc as rpc
 
 
@@ -893,15 +894,29 @@ class BinaryField(Field):
         result = record.value.get(self.name) or 0
         if isinstance(result, _FileCache):
             result = os.stat(result.path).st_size
+        elif isinstance(result, dict):
+            result = result['size']
         elif isinstance(result, (basestring, bytes, bytearray)):
             result = len(result)
         return result
 
     def get_data(self, record):
-        if not isinstance(record.value.get(self.name),
-                (basestring, bytes, bytearray)):
+        value = record.value.get(self.name)
+        if isinstance(value, _FileCache) and os.path.isfile(value.path):
+            return self.get(record)
+        if not isinstance(value, (basestring, bytes, bytearray)):
             if record.id < 0:
                 return ''
+            if isinstance(value, dict):
+                # The reference is downloaded and cached by its digest
+                try:
+                    path = rpc.download(record.model_name, self.name,
+                        record.id, value['digest'])
+                except (TrytonServerError, TrytonServerUnavailable):
+                    pass
+                else:
+                    self.set(record, _FileCache(path))
+                    return self.get(record)
             context = record.context_get()
             try:
                 values, = RPCExecute('model', record.model_name, 'read',
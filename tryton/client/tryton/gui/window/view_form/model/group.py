@@ -1,13 +1,17 @@
 # This file is part of Tryton.  The COPYRIGHT file at the top level of
 # this repository contains the full copyright notices and license terms.
+import tryton.rpc as rpc
 from record import Record
 from field import Field, M2OField, ReferenceField
 from tryton.signal_event import SignalEvent
 from tryton.common.domain_inversion import is_leaf
-from tryton.common import RPCExecute, RPCException, MODELACCESS
+from tryton.common import RPCExecute, RPCException, RPCProgress, MODELACCESS
 
 
 class Group(SignalEvent, list):
+    """List of records.
+    The records of a group without parent are created only when they are
+    accessed, until then the group holds their id."""
 
     def __init__(self, model_name, fields, ids=None, parent=None,
             parent_name='', child_name='', context=None, domain=None,
@@ -28,11 +32,18 @@ class Group(SignalEvent, list):
         self.fields = {}
         self.load_fields(fields)
         self.current_idx = None
-        self.load(ids)
+        self.__id2record = {}
+        # The values read of the ids not yet created
+        self.__id2value = {}
+        # The positions by id, computed again after a change of the list
+        self.__id2position = None
+        # The ids replaced by their record may still be used as tree iters
+        self.__created_ids = []
         self.record_deleted, self.record_removed = [], []
+        self.load(ids)
         self.on_write = set()
         self.__readonly = readonly
-        self.__id2record = {}
+        self.__prefetching = set()
         self.__field_childs = None
         self.exclude_field = None
         self.skip_model_access = False
@@ -87,49 +98,158 @@ class Group(SignalEvent, list):
 
     domain4inversion = property(__get_domain4inversion)
 
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.__getitem__(j)
+                for j in xrange(*i.indices(self.__len__()))]
+        entry = super(Group, self).__getitem__(i)
+        if not isinstance(entry, Record):
+            if i < 0:
+                i += self.__len__()
+            entry = self.__create(i, entry)
+        return entry
+
+    def __getslice__(self, i, j):
+        return self.__getitem__(slice(i, j))
+
+    def __iter__(self):
+        i = 0
+        while i < self.__len__():
+            yield self.__getitem__(i)
+            i += 1
+
+    def __create(self, pos, id_):
+        "Create the record of id at position pos"
+        record = Record(self.model_name, id_, group=self)
+        record.signal_connect(self, 'record-changed', self._record_changed)
+        record.signal_connect(self, 'record-modified', self._record_modified)
+        super(Group, self).__setitem__(pos, record)
+        self.__id2record[id_] = record
+        self.__created_ids.append(id_)
+        if pos >= 1:
+            previous = self.entry(pos - 1)
+            if isinstance(previous, Record):
+                previous.next[id(self)] = record
+        record.next[id(self)] = self.entry(pos + 1)
+        if id_ in self.__id2value:
+            record.set(self.__id2value.pop(id_), signal=False)
+        return record
+
+    def entry(self, pos):
+        """Return the record at position pos or its id if not created
+        or None if pos is out of the list"""
+        if 0 <= pos < self.__len__():
+            return super(Group, self).__getitem__(pos)
+
+    def __positions(self):
+        if self.__id2position is None:
+            self.__id2position = dict((id_, i)
+                for i, id_ in enumerate(self.ids()))
+        return self.__id2position
+
+    def position(self, entry):
+        "Return the position of the record or of the id"
+        if isinstance(entry, Record):
+            entry = entry.id
+        return self.__positions()[entry]
+
+    def ids(self):
+        "Return the ids of the records without creating them"
+        return [e.id if isinstance(e, Record) else e
+            for e in super(Group, self).__iter__()]
+
+    def created_records(self):
+        "Return the records created, the others have not been accessed"
+        return [e for e in super(Group, self).__iter__()
+            if isinstance(e, Record)]
+
+    def next_record(self, record):
+        "Return the record after record or None"
+        entry = record.next.get(id(self))
+        if entry is None or isinstance(entry, Record):
+            return entry
+        return self.get(entry)
+
     def insert(self, pos, record):
         assert record.group is self
         if pos >= 1:
-            self.__getitem__(pos - 1).next[id(self)] = record
-        if pos < self.__len__():
-            record.next[id(self)] = self.__getitem__(pos)
-        else:
-            record.next[id(self)] = None
+            previous = self.entry(pos - 1)
+            if isinstance(previous, Record):
+                previous.next[id(self)] = record
+        record.next[id(self)] = self.entry(pos)
         super(Group, self).insert(pos, record)
         self.__id2record[record.id] = record
+        self.__id2position = None
         if not self.lock_signal:
             self.signal('group-list-changed', ('record-added', record))
 
     def append(self, record):
         assert record.group is self
-        if self.__len__() >= 1:
-            self.__getitem__(self.__len__() - 1).next[id(self)] = record
+        previous = self.entry(self.__len__() - 1)
+        if isinstance(previous, Record):
+            previous.next[id(self)] = record
         record.next[id(self)] = None
         super(Group, self).append(record)
         self.__id2record[record.id] = record
+        if self.__id2position is not None:
+            self.__id2position[record.id] = self.__len__() - 1
         if not self.lock_signal:
             self.signal('group-list-changed', ('record-added', record))
 
+    def __append_id(self, id_):
+        "Append the id of a record to create when accessed"
+        previous = self.entry(self.__len__() - 1)
+        if isinstance(previous, Record):
+            previous.next[id(self)] = id_
+        super(Group, self).append(id_)
+        if self.__id2position is not None:
+            self.__id2position[id_] = self.__len__() - 1
+        if not self.lock_signal:
+            self.signal('group-list-changed', ('record-added', id_))
+
     def _remove(self, record):
         idx = self.index(record)
         if idx >= 1:
-            if idx + 1 < self.__len__():
-                self.__getitem__(idx - 1).next[id(self)] = \
-                    self.__getitem__(idx + 1)
-            else:
-                self.__getitem__(idx - 1).next[id(self)] = None
+            previous = self.entry(idx - 1)
+            if isinstance(previous, Record):
+                previous.next[id(self)] = self.entry(idx + 1)
         self.signal('group-list-changed', ('record-removed', record))
         super(Group, self).remove(record)
         del self.__id2record[record.id]
+        self.__id2position = None
 
     def clear(self):
-        for record in self[:]:
-            self.signal('group-list-changed', ('record-removed', record))
-            record.destroy()
-            self.pop(0)
+        if len(self.created_records()) != self.__len__():
+            # The views reload the whole list instead of removing each id
+            lock_signal, self.lock_signal = self.lock_signal, True
+            for record in self.created_records():
+                record.destroy()
+            del self[:]
+            self.lock_signal = lock_signal
+            if not lock_signal:
+                self.signal('group-cleared')
+        else:
+            for record in self[:]:
+                self.signal('group-list-changed', ('record-removed', record))
+                record.destroy()
+                self.pop(0)
         self.__id2record = {}
+        self.__id2value = {}
+        self.__id2position = None
+        self.__created_ids = []
         self.record_removed, self.record_deleted = [], []
 
+    def sort(self, *args, **kwargs):
+        super(Group, self).sort(*args, **kwargs)
+        self.__id2position = None
+        previous = None
+        for entry in super(Group, self).__iter__():
+            if isinstance(previous, Record):
+                previous.next[id(self)] = entry
+            previous = entry
+        if isinstance(previous, Record):
+            previous.next[id(self)] = None
+
     def move(self, record, pos):
         if self.__len__() > pos >= 0:
             idx = self.index(record)
@@ -143,6 +263,7 @@ class Group(SignalEvent, list):
 
     def __setitem__(self, i, value):
         super(Group, self).__setitem__(i, value)
+        self.__id2position = None
         if not self.lock_signal:
             self.signal('group-list-changed', ('record-changed', i))
 
@@ -157,7 +278,7 @@ class Group(SignalEvent, list):
 
     def save(self):
         saved = []
-        for record in self:
+        for record in self.created_records():
             saved.append(record.save(force_reload=False))
         if self.record_deleted:
             self.delete(self.record_deleted)
@@ -188,9 +309,10 @@ class Group(SignalEvent, list):
         for child in self.children:
             child.reload(ids)
         for id_ in ids:
-            record = self.get(id_)
+            record = self.__id2record.get(id_)
             if record and not record.modified:
                 record.cancel()
+            self.__id2value.pop(id_, None)
 
     def on_write_ids(self, ids):
         if not self.on_write:
@@ -204,16 +326,102 @@ class Group(SignalEvent, list):
                 return []
         return list({}.fromkeys(res))
 
-    def load(self, ids, modified=False):
+    def eager_fields_names(self):
+        "Return the names of the fields to read with the records"
+        fnames = [fname for fname, field in self.fields.iteritems()
+            if field.attrs.get('loading', 'eager') == 'eager']
+        fnames.extend(['%s.rec_name' % fname for fname in fnames
+                if self.fields[fname].attrs['type']
+                in ('many2one', 'one2one', 'reference')])
+        if 'rec_name' not in fnames:
+            fnames.append('rec_name')
+        fnames.append('_timestamp')
+        return fnames
+
+    def prefetch(self, records, callback=None):
+        '''
+        Read in the background the eager fields of the records not loaded.
+        callback is called with the list of records loaded.
+        '''
+        fnames = [fname for fname, field in self.fields.iteritems()
+            if field.attrs.get('loading', 'eager') == 'eager']
+        id2record = {}
+        for record in records:
+            if (record.id < 0
+                    or record.id in self.__prefetching
+                    or record.modified
+                    or record.destroyed
+                    or record.get_loaded(fnames)):
+                continue
+            id2record[record.id] = record
+        if not id2record:
+            return
+        ids = id2record.keys()
+        self.__prefetching.update(ids)
+        fnames = self.eager_fields_names()
+
+        ctx = rpc.CONTEXT.copy()
+        ctx.update(self.context)
+        ctx.update(('%s.%s' % (self.model_name, fname), 'reference')
+            for fname, field in self.fields.iteritems()
+            if field.attrs['type'] == 'binary' and fname in fnames)
+
+        def loaded(get_result):
+            self.__prefetching.difference_update(ids)
+            try:
+                values = get_result()
+            except RPCException:
+                values = []
+            id2value = dict((value['id'], value) for value in values)
+            records = []
+            for id_, record in id2record.iteritems():
+                # The record may have been changed or removed meanwhile
+                if (record.destroyed or record.modified
+                        or record.group is not self):
+                    continue
+                value = id2value.get(id_)
+                if value is None:
+                    # Set empty values for failed or missing records
+                    # to not read them again on each display
+                    record.exception = True
+                    value = dict((f, None) for f in fnames)
+                    value['id'] = id_
+                record.set(value, signal=False)
+                records.append(record)
+            if callback:
+                callback(records)
+        RPCProgress('execute_nonblocking', ('model', self.model_name, 'read',
+                ids, fnames, ctx)).run(True, loaded)
+
+    def prefetching(self, record):
+        'Return True if the record is being read in the background'
+        return record.id in self.__prefetching
+
+    def load(self, ids, modified=False, values=None, lock_signal=None):
+        '''Load the records of ids with the values read if any.
+        The signals are locked and the group is cleared at the end when
+        lock_signal is True, by default when loading more than one record.
+        Otherwise each new record is signaled as added.'''
         if not ids:
             return True
 
-        if len(ids) > 1:
+        if lock_signal is None:
+            lock_signal = len(ids) > 1
+        if lock_signal:
             self.lock_signal = True
 
+        id2values = dict((v['id'], v) for v in values or [])
         new_records = []
         for id in ids:
-            new_record = self.get(id)
+            new_record = self.__id2record.get(id)
+            if not new_record and self.parent is None:
+                if id not in self.__positions():
+                    self.__append_id(id)
+                if id in id2values:
+                    self.__id2value[id] = id2values[id]
+                if modified and not new_records:
+                    new_records.append(self.get(id))
+                continue
             if not new_record:
                 new_record = Record(self.model_name, id, group=self)
                 self.append(new_record)
@@ -223,6 +431,11 @@ class Group(SignalEvent, list):
                     self._record_modified)
             new_records.append(new_record)
 
+        # Set the values read with the ids
+        for record in new_records:
+            if record.id in id2values and not record.modified:
+                record.set(id2values[record.id], signal=False)
+
         # Remove previously removed or deleted records
         for record in self.record_removed[:]:
             if record.id in ids:
@@ -393,7 +606,7 @@ class Group(SignalEvent, list):
             return True
 
         new = []
-        for record in self:
+        for record in self.created_records():
             if record.id < 0:
                 new.append(record)
 
@@ -408,13 +621,17 @@ class Group(SignalEvent, list):
 
     def get(self, id):
         'Return record with the id'
-        return self.__id2record.get(id)
+        record = self.__id2record.get(id)
+        if record is None and id in self.__positions():
+            record = self[self.__positions()[id]]
+        return record
 
     def id_changed(self, old_id):
         'Update index for old id'
         record = self.__id2record[old_id]
         self.__id2record[record.id] = record
         del self.__id2record[old_id]
+        self.__id2position = None
 
     def destroy(self):
         if self.parent:
@@ -3,7 +3,7 @@
 import tryton.rpc as rpc
 from tryton.signal_event import SignalEvent
 import tryton.common as common
-from tryton.pyson import PYSONDecoder
+from tryton.pyson import compile_pyson
 import field as fields
 from functools import reduce
 from tryton.common import RPCExecute, RPCException
@@ -107,7 +107,7 @@ class Record(SignalEvent):
                         n += 1
 
             ctx = record_context.copy()
-            ctx.update(dict(('%s.%s' % (self.model_name, fname), 'size')
+            ctx.update(dict(('%s.%s' % (self.model_name, fname), 'reference')
                     for fname, field in self.group.fields.iteritems()
                     if field.attrs['type'] == 'binary' and fname in fnames))
             exception = None
@@ -272,6 +272,22 @@ class Record(SignalEvent):
         self.modified_fields.clear()
         self._timestamp = None
 
+    def evict(self):
+        '''
+        Drop the values of the record to free the memory.
+        Only the unmodified records without loaded children are evicted.
+        Return True if the record is evicted.
+        '''
+        if self.id < 0 or self.modified or not self._loaded:
+            return False
+        if any(hasattr(v, 'destroy') for v in self.value.itervalues()):
+            return False
+        self.value.clear()
+        self._loaded.clear()
+        self.state_attrs.clear()
+        self._timestamp = None
+        return True
+
     def get_timestamp(self):
         result = {self.model_name + ',' + str(self.id): self._timestamp}
         for name, field in self.group.fields.iteritems():
@@ -498,7 +514,7 @@ class Record(SignalEvent):
         if self.parent and self.parent_name:
             ctx['_parent_' + self.parent_name] = \
                 common.EvalEnvironment(self.parent)
-        val = PYSONDecoder(ctx).decode(expr)
+        val = compile_pyson(expr)(ctx)
         return val
 
     def _get_on_change_args(self, args):
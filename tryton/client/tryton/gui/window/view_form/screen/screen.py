@@ -24,8 +24,8 @@ from tryton.config import CONFIG
 from tryton.exceptions import TrytonServerError, TrytonServerUnavailable
 from tryton.jsonrpc import JSONEncoder
 from tryton.common.domain_parser import DomainParser
-from tryton.common import RPCExecute, RPCException, MODELACCESS, \
-    node_attributes, sur, RPCContextReload, warning
+from tryton.common import RPCExecute, RPCExecuteBatch, RPCException, \
+    MODELACCESS, node_attributes, sur, RPCContextReload, warning
 from tryton.action import Action
 import tryton.rpc as rpc
 
@@ -54,6 +54,12 @@ class Screen(SignalEvent):
 
         self.limit = limit or CONFIG['client.limit']
         self.offset = 0
+        self.__page_domain = None
+        self.__page_tokens = {
+            'next': None,
+            'previous': None,
+            }
+        self.__page_size = 0
         super(Screen, self).__init__()
 
         self.readonly = readonly
@@ -92,6 +98,7 @@ class Screen(SignalEvent):
         self._domain_parser = {}
         self.pre_validate = False
         self.view_to_load = mode[:]
+        self.preload_views()
         if view_ids or mode:
             self.switch_view()
 
@@ -180,17 +187,59 @@ class Screen(SignalEvent):
         return selection
 
     def search_prev(self, search_string):
-        self.offset -= self.limit
-        self.search_filter(search_string=search_string)
+        self.offset = max(self.offset - self.limit, 0)
+        self.search_filter(search_string=search_string,
+            token=self.__page_tokens['previous'])
 
     def search_next(self, search_string):
-        self.offset += self.limit
-        self.search_filter(search_string=search_string)
+        self.offset += self.__page_size
+        self.search_filter(search_string=search_string,
+            token=self.__page_tokens['next'])
+
+    def search_more(self):
+        "Append the next page of records to the group"
+        token = self.__page_tokens['next']
+        if not token or self.__page_domain is None:
+            return False
+        page = self.search_page(self.__page_domain, token)
+        self.__page_tokens['next'] = page['next']
+        self.__page_size += len(page['ids'])
+        self.screen_container.but_next.set_sensitive(bool(page['next']))
+        # Signal each record to insert them in the views
+        self.group.load(page['ids'], values=page['records'],
+            lock_signal=False)
+        self.display()
+        return bool(page['ids'])
+
+    def search_page(self, domain, token=None, count=False):
+        "Return the page of records of the domain after or before token"
+        fields_names = None
+        context = self.context.copy()
+        view = self.current_view
+        # The flat list reads only the rows displayed
+        if self.group.fields and (view.view_type != 'tree'
+                or view.children_field):
+            fields_names = self.group.eager_fields_names()
+            context.update(('%s.%s' % (self.model_name, fname), 'reference')
+                for fname, field in self.group.fields.iteritems()
+                if field.attrs['type'] == 'binary' and fname in fields_names)
+        try:
+            return RPCExecute('model', self.model_name, 'search_page',
+                domain, self.offset, self.limit, self.order, token,
+                fields_names, count, context=context)
+        except RPCException:
+            return {
+                'ids': [],
+                'records': [],
+                'count': 0 if count else None,
+                'next': None,
+                'previous': None,
+                }
 
     def search_complete(self, search_string):
         return list(self.domain_parser.completion(search_string))
 
-    def search_filter(self, search_string=None, only_ids=False):
+    def search_filter(self, search_string=None, only_ids=False, token=None):
         domain = []
 
         if self.domain_parser and not self.parent:
@@ -200,7 +249,7 @@ class Screen(SignalEvent):
                 domain = self.search_value
             self.screen_container.set_text(self.domain_parser.string(domain))
         else:
-            domain = [('id', 'in', [x.id for x in self.group])]
+            domain = [('id', 'in', self.group.ids())]
 
         if domain:
             if self.domain:
@@ -218,30 +267,28 @@ class Screen(SignalEvent):
         if tab_domain:
             domain = ['AND', domain, tab_domain]
 
-        try:
-            ids = RPCExecute('model', self.model_name, 'search', domain,
-                self.offset, self.limit, self.order, context=self.context)
-        except RPCException:
-            ids = []
-        if not only_ids:
-            if len(ids) == self.limit:
-                try:
-                    self.search_count = RPCExecute('model', self.model_name,
-                        'search_count', domain, context=self.context)
-                except RPCException:
-                    self.search_count = 0
-            else:
-                self.search_count = len(ids)
-        self.screen_container.but_prev.set_sensitive(bool(self.offset))
-        if (len(ids) == self.limit
-                and self.search_count > self.limit + self.offset):
-            self.screen_container.but_next.set_sensitive(True)
-        else:
-            self.screen_container.but_next.set_sensitive(False)
         if only_ids:
-            return ids
+            try:
+                return RPCExecute('model', self.model_name, 'search', domain,
+                    self.offset, self.limit, self.order, context=self.context)
+            except RPCException:
+                return []
+
+        # Search, count and read the page in a single request
+        page = self.search_page(domain, token=token, count=token is None)
+        ids = page['ids']
+        if page['count'] is not None:
+            self.search_count = page['count']
+        self.__page_domain = domain
+        self.__page_tokens = {
+            'next': page['next'],
+            'previous': page['previous'],
+            }
+        self.__page_size = len(ids)
+        self.screen_container.but_prev.set_sensitive(bool(page['previous']))
+        self.screen_container.but_next.set_sensitive(bool(page['next']))
         self.clear()
-        self.load(ids)
+        self.load(ids, values=page['records'])
         return bool(ids)
 
     @property
@@ -392,6 +439,26 @@ class Screen(SignalEvent):
         # Postpone set of the cursor to ensure widgets are allocated
         gobject.idle_add(self.set_cursor)
 
+    def preload_views(self):
+        "Fetch the views to load in a single request"
+        calls, keys = [], []
+        for i, view_type in enumerate(self.view_to_load):
+            view_id = self.view_ids[i] if i < len(self.view_ids) else None
+            key = str(view_id) if view_id else view_type
+            if key in self.views_preload:
+                continue
+            calls.append(('model', self.model_name, 'fields_view_get',
+                    view_id, view_type))
+            keys.append(key)
+        if len(calls) < 2:
+            return
+        try:
+            views = RPCExecuteBatch(*calls, context=self.context)
+        except RPCException:
+            return
+        self.views_preload = self.views_preload.copy()
+        self.views_preload.update(zip(keys, views))
+
     def load_view_to_load(self):
         if len(self.view_to_load):
             if self.view_ids:
@@ -542,7 +609,7 @@ class Screen(SignalEvent):
                 if self.current_record.modified or self.current_record.id < 0:
                     return True
         else:
-            for record in self.group:
+            for record in self.group.created_records():
                 if record.modified or record.id < 0:
                     return True
         if self.current_view.modified:
@@ -717,10 +784,10 @@ class Screen(SignalEvent):
         json_domain = json.dumps(domain, cls=JSONEncoder)
         return json_domain
 
-    def load(self, ids, set_cursor=True, modified=False):
+    def load(self, ids, set_cursor=True, modified=False, values=None):
         self.tree_states.clear()
         self.tree_states_done.clear()
-        self.group.load(ids, modified=modified)
+        self.group.load(ids, modified=modified, values=values)
         self.current_view.reset()
         if ids and self.current_view.view_type != 'calendar':
             self.display(ids[0])
@@ -786,12 +853,12 @@ class Screen(SignalEvent):
                 parent = record.parent
                 if not parent or record.model_name != parent.model_name:
                     break
-                next = parent.next.get(id(parent.group))
+                next = parent.group.next_record(parent)
                 while not next:
                     parent = parent.parent
                     if not parent:
                         break
-                    next = parent.next.get(id(parent.group))
+                    next = parent.group.next_record(parent)
                 if not next:
                     break
                 record = next
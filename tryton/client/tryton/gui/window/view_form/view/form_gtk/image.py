@@ -95,8 +95,8 @@ class Image(BinaryMixin, Widget):
         value = None
         if self.field:
             value = self.field.get_client(self.record)
-        if isinstance(value, (int, long)):
-            if value > BIG_IMAGE_SIZE:
+        if isinstance(value, (int, long, dict)):
+            if self.field.get_size(self.record) > BIG_IMAGE_SIZE:
                 value = False
             else:
                 value = self.field.get_data(self.record)
@@ -6,7 +6,7 @@ import gtk
 from functools import reduce
 from tryton.common import hex2rgb, generateColorscheme, \
         COLOR_SCHEMES, datetime_strftime
-from tryton.pyson import PYSONDecoder
+from tryton.pyson import compile_pyson
 import locale
 import math
 import datetime
@@ -380,7 +380,7 @@ class Graph(gtk.DrawingArea):
                     context['_user'] = rpc._USER
                     for field in model.group.fields:
                         context[field] = model[field].get(model)
-                    if not PYSONDecoder(context).decode(yfield['domain']):
+                    if not compile_pyson(yfield['domain'])(context):
                         continue
                 if yfield['name'] == '#':
                     self.datas[x][key] += 1
@@ -11,7 +11,7 @@ except ImportError:
 import locale
 import gettext
 from functools import wraps
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from tryton.config import CONFIG
 from tryton.common.cellrendererbutton import CellRendererButton
@@ -21,6 +21,7 @@ from tryton.common.popup_menu import populate
 from tryton.common import RPCExecute, RPCException, node_attributes, Tooltips
 from tryton.common import domain_inversion, simplify, unique_value
 import tryton.common as common
+from tryton.gui.window.view_form.model.record import Record
 from . import View
 from .list_gtk.editabletree import EditableTreeView, TreeView
 from .list_gtk.widget import (Affix, Char, Text, Int, Boolean, URL, Date,
@@ -60,6 +61,9 @@ def path_convert_id2pos(model, id_path):
 
 
 class AdaptModelGroup(gtk.GenericTreeModel):
+    """Tree model of a group.
+    The rows of the records not yet created have their id as iter, the
+    record is created when the value of the row is requested."""
 
     def __init__(self, group, children_field=None):
         super(AdaptModelGroup, self).__init__()
@@ -67,8 +71,16 @@ class AdaptModelGroup(gtk.GenericTreeModel):
         self.set_property('leak_references', False)
         self.children_field = children_field
         self.__removed = None  # XXX dirty hack to allow update of has_child
+        self.__to_load = []
+        # The records displayed ordered from the least recently used
+        self.__displayed = OrderedDict()
 
     def added(self, group, record):
+        if not isinstance(record, Record):
+            if group is self.group:
+                path = self.on_get_path(record)
+                self.row_inserted(path, self.get_iter(path))
+            return
         if (group is self.group
                 and (record.group is self.group
                     or record.group.child_name == self.children_field)):
@@ -146,8 +158,8 @@ class AdaptModelGroup(gtk.GenericTreeModel):
         ids2pos = {}
         pos = 0
         new_order = []
-        for record in self.group:
-            ids2pos[record.id] = pos
+        for record_id in self.group.ids():
+            ids2pos[record_id] = pos
             new_order.append(pos)
             pos += 1
         pos = 0
@@ -159,20 +171,78 @@ class AdaptModelGroup(gtk.GenericTreeModel):
                 pos += 1
             except KeyError:
                 continue
-        self.group.sort(lambda x, y:
-            cmp(new_order[ids2pos[x.id]], new_order[ids2pos[y.id]]))
-        prev = None
-        for record in self.group:
-            if prev:
-                prev.next[id(self.group)] = record
-            prev = record
-        if prev:
-            prev.next[id(self.group)] = None
+        self.group.sort(key=lambda x: new_order[ids2pos[
+                    x.id if isinstance(x, Record) else x]])
         self.rows_reordered(None, None, new_order)
 
     def __len__(self):
         return len(self.group)
 
+    def lazy_load(self, record):
+        '''
+        Return True if the record is not loaded and is read in the background.
+        Only the records of a flat list are loaded lazily.
+        '''
+        if self.children_field or record.group is not self.group:
+            return False
+        if record.id >= 0:
+            self.__displayed.pop(record.id, None)
+            self.__displayed[record.id] = record
+        if self.group.prefetching(record):
+            return True
+        fnames = [fname for fname, field in self.group.fields.iteritems()
+            if field.attrs.get('loading', 'eager') == 'eager']
+        if record.id < 0 or record.modified or record.get_loaded(fnames):
+            return False
+        if not self.__to_load:
+            # Wait for all the visible rows to be requested
+            gobject.idle_add(self.__prefetch)
+        self.__to_load.append(record)
+        return True
+
+    def __prefetch(self):
+        records, self.__to_load = self.__to_load, []
+        group = self.group
+        records = [r for r in records if r.group is group]
+        if not records:
+            return False
+        try:
+            first, last = sorted((group.index(records[0]),
+                    group.index(records[-1])))
+        except ValueError:
+            # The records have been removed meanwhile
+            return False
+        # Prefetch a window of the size of the visible rows on each side
+        size = last - first + 1
+        first = max(first - size, 0)
+        last = min(last + size, len(group) - 1)
+        window = group[first:last + 1]
+        positions = dict((id(r), i) for i, r in enumerate(window, first))
+
+        def loaded(records):
+            for record in records:
+                position = positions.get(id(record))
+                if position is None or group.entry(position) is not record:
+                    if record not in group:
+                        continue
+                    position = group.index(record)
+                path = (position,)
+                self.row_changed(path, self.get_iter(path))
+        group.prefetch(records + window, callback=loaded)
+        self.__evict(set(positions), max(CONFIG['client.limit'], 3 * size))
+        return False
+
+    def __evict(self, keep, size):
+        'Evict the least recently displayed records beyond size'
+        displayed = self.__displayed
+        for id_ in displayed.keys()[:max(len(displayed) - size, 0)]:
+            record = displayed[id_]
+            if id(record) in keep:
+                continue
+            del displayed[id_]
+            if record.group is self.group:
+                record.evict()
+
     def on_get_flags(self):
         if not self.children_field:
             return gtk.TREE_MODEL_LIST_ONLY
@@ -189,6 +259,8 @@ class AdaptModelGroup(gtk.GenericTreeModel):
     def on_get_path(self, iter_):
         if isinstance(iter_, tuple):
             return tuple(x[0] for x in iter_)
+        elif not isinstance(iter_, Record) or iter_.group is self.group:
+            return (self.group.position(iter_),)
         else:
             path = []
             i = iter_
@@ -216,16 +288,21 @@ class AdaptModelGroup(gtk.GenericTreeModel):
         return record
 
     def on_get_value(self, record, column):
+        if not isinstance(record, Record):
+            record = self.group.get(record)
         return record
 
     def on_iter_next(self, record):
         if record is None:
             return None
-        return record.next.get(id(record.group))
+        if isinstance(record, Record) and record.group is not self.group:
+            return record.next.get(id(record.group))
+        return self.group.entry(self.group.position(record) + 1)
 
     def on_iter_has_child(self, record):
         if record is None or not self.children_field:
             return False
+        record = self.on_get_value(record, 0)
         children = record.children_group(self.children_field)
         if children is None:
             return False
@@ -236,11 +313,9 @@ class AdaptModelGroup(gtk.GenericTreeModel):
 
     def on_iter_children(self, record):
         if record is None:
-            if self.group:
-                return self.group[0]
-            else:
-                return None
+            return self.group.entry(0)
         if self.children_field:
+            record = self.on_get_value(record, 0)
             children = record.children_group(self.children_field)
             if children:
                 return children[0]
@@ -251,21 +326,21 @@ class AdaptModelGroup(gtk.GenericTreeModel):
             return len(self.group)
         if not self.children_field:
             return 0
+        record = self.on_get_value(record, 0)
         return len(record.children_group(self.children_field))
 
     def on_iter_nth_child(self, record, nth):
         if record is None:
-            if nth < len(self.group):
-                return self.group[nth]
-            return None
+            return self.group.entry(nth)
         if not self.children_field:
             return None
+        record = self.on_get_value(record, 0)
         if nth < len(record.children_group(self.children_field)):
             return record.children_group(self.children_field)[nth]
         return None
 
     def on_iter_parent(self, record):
-        if record is None:
+        if record is None or not isinstance(record, Record):
             return None
         return record.parent
 
@@ -309,6 +384,8 @@ class ViewTree(View):
         scroll.add(self.treeview)
         scroll.set_policy(gtk.POLICY_AUTOMATIC, gtk.POLICY_AUTOMATIC)
         scroll.set_placement(gtk.CORNER_TOP_LEFT)
+        scroll.get_vadjustment().connect('value-changed',
+            self.__scroll_changed)
         viewport = gtk.Viewport()
         viewport.set_shadow_type(gtk.SHADOW_ETCHED_IN)
         viewport.add(scroll)
@@ -319,6 +396,15 @@ class ViewTree(View):
 
         self.display()
 
+    def __scroll_changed(self, adjustment):
+        # Load the next page when the bottom is reached
+        if (adjustment.value + adjustment.page_size >= adjustment.upper
+                and adjustment.value > 0
+                and not self.children_field
+                and not self.screen.parent
+                and self.screen.current_view is self):
+            self.screen.search_more()
+
     def parse(self, xml):
         for node in xml.childNodes:
             if node.nodeType != node.ELEMENT_NODE:
@@ -1091,7 +1177,11 @@ class ViewTree(View):
             loaded = True
             digit = 0
             field = self.screen.group.fields[name]
-            for record in self.screen.group:
+            records = self.screen.group.created_records()
+            if len(records) != len(self.screen.group):
+                # The records not created are not loaded
+                loaded, records = False, []
+            for record in records:
                 if not record.get_loaded([name]) and record.id >= 0:
                     loaded = False
                     break
@@ -93,6 +93,10 @@ class CellCache(list):
             record = store.get_value(iter, 0)
             counter = self.view.treeview.display_counter
             if (self.display_counters.get(record.id) != counter):
+                if store.lazy_load(record):
+                    # Rendered when the values are read
+                    cell.set_property('visible', False)
+                    return
                 if getattr(cell, 'decorated', None):
                     func(self, column, cell, store, iter)
                 else:
@@ -521,8 +525,8 @@ class Image(GenericText):
         record = store.get_value(iter_, 0)
         field = record[self.field_name]
         value = field.get_client(record)
-        if isinstance(value, (int, long)):
-            if value > common.BIG_IMAGE_SIZE:
+        if isinstance(value, (int, long, dict)):
+            if field.get_size(record) > common.BIG_IMAGE_SIZE:
                 value = None
             else:
                 value = field.get_data(record)
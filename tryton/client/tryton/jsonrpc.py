@@ -16,8 +16,17 @@ import hashlib
 import base64
 import threading
 import errno
+import struct
 from functools import partial
 from contextlib import contextmanager
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 __all__ = ["ResponseError", "Fault", "ProtocolError", "Transport",
     "ServerProxy", "ServerPool"]
@@ -112,26 +121,30 @@ class JSONEncoder(json.JSONEncoder):
         return super(JSONEncoder, self).default(obj)
 
 
-class JSONParser(object):
-
-    def __init__(self, target):
-        self.__targer = target
-
-    def feed(self, data):
-        self.__targer.feed(data)
-
-    def close(self):
-        pass
-
-
-class JSONUnmarshaller(object):
-    data = ''
-
-    def feed(self, data):
-        self.data += data
-
-    def close(self):
-        return json.loads(self.data, object_hook=object_hook)
+MSGPACK_CONTENT_TYPE = 'application/x-msgpack'
+# msgpack extension type codes
+_DATETIME, _DATE, _TIME, _TIMEDELTA, _DECIMAL, _BYTES = range(1, 7)
+_datetime = struct.Struct('>HBBBBBI')
+_date = struct.Struct('>HBB')
+_time = struct.Struct('>BBBI')
+_timedelta = struct.Struct('>d')
+
+
+def ext_hook(code, data):
+    if code == _DATETIME:
+        return datetime.datetime(*_datetime.unpack(data))
+    elif code == _DATE:
+        return datetime.date(*_date.unpack(data))
+    elif code == _TIME:
+        return datetime.time(*_time.unpack(data))
+    elif code == _TIMEDELTA:
+        return datetime.timedelta(seconds=_timedelta.unpack(data)[0])
+    elif code == _DECIMAL:
+        return Decimal(data)
+    elif code == _BYTES:
+        cast = bytearray if bytes == str else bytes
+        return cast(data)
+    return msgpack.ExtType(code, data)
 
 
 class Transport(xmlrpclib.Transport, xmlrpclib.SafeTransport):
@@ -145,10 +158,27 @@ class Transport(xmlrpclib.Transport, xmlrpclib.SafeTransport):
         self.__fingerprints = fingerprints
         self.__ca_certs = ca_certs
 
-    def getparser(self):
-        target = JSONUnmarshaller()
-        parser = JSONParser(target)
-        return parser, target
+    def send_request(self, connection, handler, request_body):
+        connection.putrequest('POST', handler, skip_accept_encoding=True)
+        encodings = ['gzip']
+        if zstandard:
+            encodings.insert(0, 'zstd')
+        connection.putheader('Accept-Encoding', ', '.join(encodings))
+        if msgpack:
+            connection.putheader('Accept',
+                '%s, application/json-rpc' % MSGPACK_CONTENT_TYPE)
+
+    def parse_response(self, response):
+        data = response.read()
+        encoding = response.getheader('Content-Encoding', '')
+        if encoding == 'gzip':
+            data = xmlrpclib.gzip_decode(data, max_decode=-1)
+        elif encoding == 'zstd':
+            data = zstandard.ZstdDecompressor().decompress(data)
+        content_type = response.getheader('Content-Type', '')
+        if content_type.split(';')[0] == MSGPACK_CONTENT_TYPE:
+            return msgpack.unpackb(data, raw=False, ext_hook=ext_hook)
+        return json.loads(data, object_hook=object_hook)
 
     def get_host_info(self, host):
         host, extra_headers, x509 = xmlrpclib.Transport.get_host_info(
@@ -263,8 +293,48 @@ class ServerProxy(xmlrpclib.ServerProxy):
                 'params': params,
                 }, cls=JSONEncoder)
 
+        response = self.__send(request)
+        if response['id'] != id_:
+            raise ResponseError('Invalid response id (%s) excpected %s' %
+                (response['id'], id_))
+        if response.get('error'):
+            raise Fault(*response['error'])
+        return response['result']
+
+    def batch(self, requests):
+        """Send the list of requests (methodname, params) in a single call.
+        Return the list of results in the same order with a Fault instance
+        for the failed requests."""
+        ids = []
+        batch = []
+        for methodname, params in requests:
+            self.__id += 1
+            ids.append(self.__id)
+            batch.append({
+                    'id': self.__id,
+                    'method': methodname,
+                    'params': params,
+                    })
+        request = json.dumps(batch, cls=JSONEncoder)
+
+        responses = self.__send(request)
+        if not isinstance(responses, list) or len(responses) != len(ids):
+            raise ResponseError('Invalid batch response')
+        responses = dict((r['id'], r) for r in responses)
+        results = []
+        for id_ in ids:
+            if id_ not in responses:
+                raise ResponseError('Missing response id (%s)' % id_)
+            response = responses[id_]
+            if response.get('error'):
+                results.append(Fault(*response['error']))
+            else:
+                results.append(response['result'])
+        return results
+
+    def __send(self, request):
         try:
-            response = self.__transport.request(
+            return self.__transport.request(
                 self.__host,
                 self.__handler,
                 request,
@@ -276,7 +346,7 @@ class ServerProxy(xmlrpclib.ServerProxy):
                 raise
             # try one more time
             self.__transport.close()
-            response = self.__transport.request(
+            return self.__transport.request(
                 self.__host,
                 self.__handler,
                 request,
@@ -286,12 +356,29 @@ class ServerProxy(xmlrpclib.ServerProxy):
             self.__transport.close()
             raise
 
-        if response['id'] != id_:
-            raise ResponseError('Invalid response id (%s) excpected %s' %
-                (response['id'], id_))
-        if response.get('error'):
-            raise Fault(*response['error'])
-        return response['result']
+    def download(self, path, fileobj, headers=None, chunk_size=64 * 1024):
+        """GET the path under the database and write the content by chunks
+        into fileobj if the response is OK.
+        Return the response status and headers."""
+        try:
+            connection = self.__transport.make_connection(self.__host)
+            connection.putrequest('GET', self.__handler + path)
+            for keyword, value in (headers or {}).iteritems():
+                connection.putheader(keyword, value)
+            connection.endheaders()
+            response = connection.getresponse()
+            if response.status == 200:
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        break
+                    fileobj.write(chunk)
+            else:
+                response.read()
+            return response.status, dict(response.getheaders())
+        except:
+            self.__transport.close()
+            raise
 
     def close(self):
         self.__transport.close()
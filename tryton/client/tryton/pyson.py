@@ -143,6 +143,74 @@ class PYSONDecoder(json.JSONDecoder):
         return dct
 
 
+class PYSONCompiler(object):
+    """Compile encoded PYSON into functions which evaluate it for a context.
+
+    The JSON is parsed only once per string and the resulting function gives
+    the same result as PYSONDecoder(context).decode(string).
+    """
+    size_limit = 1024
+
+    def __init__(self):
+        self._cache = {}
+
+    def __call__(self, string):
+        try:
+            return self._cache[string]
+        except KeyError:
+            pass
+        func = self._compile(json.loads(string))
+
+        def evaluate(context=None):
+            return func(context or {})
+        if len(self._cache) >= self.size_limit:
+            self._cache.clear()
+        self._cache[string] = evaluate
+        return evaluate
+
+    def _compile(self, value):
+        # Lists and dictionaries are rebuilt at each call because the callers
+        # may modify the result
+        if isinstance(value, dict):
+            constants, items = {}, []
+            for k, v in value.iteritems():
+                if isinstance(v, (dict, list)):
+                    items.append((k, self._compile(v)))
+                else:
+                    constants[k] = v
+            klass = None
+            if '__class__' in value:
+                klass = CONTEXT.get(value['__class__'])
+
+            def build(context):
+                dct = constants.copy()
+                for k, f in items:
+                    dct[k] = f(context)
+                return dct
+            if klass:
+                eval_ = klass.eval
+
+                def func(context):
+                    return eval_(build(context), context)
+            else:
+                func = build
+        elif isinstance(value, list):
+            if any(isinstance(v, (dict, list)) for v in value):
+                funcs = [self._compile(v) for v in value]
+
+                def func(context):
+                    return [f(context) for f in funcs]
+            else:
+                def func(context):
+                    return list(value)
+        else:
+            def func(context):
+                return value
+        return func
+
+compile_pyson = PYSONCompiler()
+
+
 class Eval(PYSON):
 
     def __init__(self, v, d=''):
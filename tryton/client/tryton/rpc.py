@@ -4,6 +4,10 @@ import httplib
 import logging
 import socket
 import os
+import time
+import base64
+import urllib
+import tempfile
 from functools import partial
 from tryton.jsonrpc import ServerProxy, ServerPool, Fault
 from tryton.fingerprints import Fingerprints
@@ -24,6 +28,8 @@ _VIEW_CACHE = {}
 _TOOLBAR_CACHE = {}
 _KEYWORD_CACHE = {}
 _CA_CERTS = os.path.join(get_config_dir(), 'ca_certs')
+_BINARY_CACHE = os.path.join(get_config_dir(), 'binary')
+_BINARY_CACHE_AGE = 30 * 24 * 60 * 60
 if not os.path.isfile(_CA_CERTS):
     _CA_CERTS = None
 _FINGERPRINTS = Fingerprints()
@@ -101,6 +107,7 @@ def login(username, password, host, port, database):
     _PORT = port
     _DATABASE = database
     IPCServer(host, port, database).run()
+    clean_binary_cache()
     return 1
 
 
@@ -130,26 +137,28 @@ def logout():
     _KEYWORD_CACHE = {}
 
 
+def _get_cache(args):
+    "Return the cache and the key of the call or None"
+    if CONFIG['dev']:
+        return None, None
+    model = args[1]
+    method = args[2]
+    if method == 'fields_view_get':
+        return _VIEW_CACHE, str(args)
+    elif method == 'view_toolbar_get':
+        return _TOOLBAR_CACHE, str(args)
+    elif model == 'ir.action.keyword' and method == 'get_keyword':
+        return _KEYWORD_CACHE, str(args)
+    return None, None
+
+
 def _execute(blocking, *args):
     global CONNECTION, _USER, _SESSION
     if CONNECTION is None:
         raise TrytonServerError('NotLogged')
-    key = False
-    model = args[1]
-    method = args[2]
-    if not CONFIG['dev']:
-        if method == 'fields_view_get':
-            key = str(args)
-            if key in _VIEW_CACHE:
-                return _VIEW_CACHE[key]
-        elif method == 'view_toolbar_get':
-            key = str(args)
-            if key in _TOOLBAR_CACHE:
-                return _TOOLBAR_CACHE[key]
-        elif model == 'ir.action.keyword' and method == 'get_keyword':
-            key = str(args)
-            if key in _KEYWORD_CACHE:
-                return _KEYWORD_CACHE[key]
+    cache, key = _get_cache(args)
+    if cache is not None and key in cache:
+        return cache[key]
     try:
         name = '.'.join(args[:3])
         args = (_USER, _SESSION) + args[3:]
@@ -158,20 +167,105 @@ def _execute(blocking, *args):
             result = getattr(conn, name)(*args)
     except (httplib.CannotSendRequest, socket.error), exception:
         raise TrytonServerUnavailable(*exception.args)
-    if not CONFIG['dev']:
-        if key and method == 'fields_view_get':
-            _VIEW_CACHE[key] = result
-        elif key and method == 'view_toolbar_get':
-            _TOOLBAR_CACHE[key] = result
-        elif key and model == 'ir.action.keyword' and method == 'get_keyword':
-            _KEYWORD_CACHE[key] = result
+    if cache is not None:
+        cache[key] = result
     logging.getLogger(__name__).debug(repr(result))
     return result
 
 
+def execute_batch(*calls):
+    """Execute the calls, tuples of arguments like for execute, in a single
+    request and return the list of results.
+    The first failure is raised.
+    The calls are not coalesced automatically: execute stays one request per
+    call, so the callers batch only the calls that do not depend on each
+    other like Screen.preload_views."""
+    global CONNECTION, _USER, _SESSION
+    if CONNECTION is None:
+        raise TrytonServerError('NotLogged')
+    results = [None] * len(calls)
+    requests, positions, keys = [], [], []
+    for i, args in enumerate(calls):
+        cache, key = _get_cache(args)
+        if cache is not None and key in cache:
+            results[i] = cache[key]
+            continue
+        name = '.'.join(args[:3])
+        params = (_USER, _SESSION) + args[3:]
+        logging.getLogger(__name__).info('%s%s' % (name, params))
+        requests.append((name, params))
+        positions.append(i)
+        keys.append((cache, key))
+    if requests:
+        try:
+            with CONNECTION() as conn:
+                responses = conn.batch(requests)
+        except (httplib.CannotSendRequest, socket.error), exception:
+            raise TrytonServerUnavailable(*exception.args)
+        for i, (cache, key), result in zip(positions, keys, responses):
+            if isinstance(result, Fault):
+                raise result
+            if cache is not None:
+                cache[key] = result
+            logging.getLogger(__name__).debug(repr(result))
+            results[i] = result
+    return results
+
+
 def execute(*args):
     return _execute(True, *args)
 
 
 def execute_nonblocking(*args):
     return _execute(False, *args)
+
+
+def download(model, field, id_, digest):
+    """Return the path of the content of the binary field of the record.
+    The content is addressed by its digest so it is downloaded only if it is
+    not already in the cache."""
+    global CONNECTION, _USER, _SESSION
+    if CONNECTION is None:
+        raise TrytonServerError('NotLogged')
+    path = os.path.join(_BINARY_CACHE, digest[0:2], digest)
+    if os.path.isfile(path):
+        os.utime(path, None)
+        return path
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0700)
+    url = '/binary/' + '/'.join(urllib.quote(str(x), safe='')
+        for x in (model, field, id_, digest))
+    headers = {
+        'Authorization': 'Session ' + base64.b64encode(
+            '%s:%s' % (_USER, _SESSION)),
+        }
+    logging.getLogger(__name__).info('GET %s' % url)
+    fd, filename = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            with CONNECTION() as conn:
+                status, _ = conn.download(url, fp, headers=headers)
+        if status != 200:
+            raise TrytonServerError('HTTP %s' % status)
+        os.rename(filename, path)
+    except (httplib.HTTPException, socket.error), exception:
+        os.remove(filename)
+        raise TrytonServerUnavailable(*exception.args)
+    except:
+        os.remove(filename)
+        raise
+    return path
+
+
+def clean_binary_cache():
+    "Remove the cached binaries not used for a while"
+    limit = time.time() - _BINARY_CACHE_AGE
+    for root, _, files in os.walk(_BINARY_CACHE):
+        for name in files:
+            filename = os.path.join(root, name)
+            try:
+                if os.stat(filename).st_mtime < limit:
+                    os.remove(filename)
+            except OSError:
+                pass
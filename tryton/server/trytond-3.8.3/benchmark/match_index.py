@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+"""
+Compare the linear scan of MatchMixin.match with the lookup of MatchIndex
+on rows shaped like tax rule lines: a group and an origin tax which are
+None for a part of them.
+
+Usage: python benchmark/match_index.py [rows] [patterns]
+"""
+import sys
+import random
+import timeit
+
+from trytond.model.match import MatchMixin, MatchIndex
+
+NAMES = ['group', 'origin_tax']
+RANDOM = random.Random(1)
+
+
+class Field(object):
+    _type = 'integer'
+
+
+class Line(MatchMixin):
+    'Line with the values as attributes like a browse record'
+    _fields = dict((n, Field()) for n in NAMES)
+
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+
+def match_values(values, pattern):
+    return MatchMixin.match_values.__func__(MatchMixin, values, pattern)
+
+
+def best(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main(size=5000, count=1000):
+    rows = [{
+            'id': i,
+            'group': RANDOM.choice([None, 1, 2, 3]),
+            'origin_tax': RANDOM.choice([None] + range(1, size // 2)),
+            } for i in xrange(size)]
+    patterns = [{
+            'group': RANDOM.choice([1, 2, 3]),
+            'origin_tax': RANDOM.randint(1, size // 2 + size // 4),
+            } for _ in xrange(count)]
+    lines = [Line(r) for r in rows]
+
+    def scan():
+        for pattern in patterns:
+            for line in lines:
+                if line.match(pattern):
+                    break
+
+    def lookup():
+        index = MatchIndex(rows, NAMES)
+        for pattern in patterns:
+            index.find(pattern, match_values)
+
+    index = MatchIndex(rows, NAMES)
+    for pattern in patterns:
+        found = index.find(pattern, match_values)
+        line = next((l for l in lines if l.match(pattern)), None)
+        assert (found and found['id']) == (line and line.id)
+
+    print '%s rows, %s patterns' % (size, count)
+    print '  MatchMixin.match scan: %.4fs' % best(scan)
+    print '  MatchIndex (with build): %.4fs' % best(lookup)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+"""
+Time the model and field access checks of the admin user, and the read of
+up to 1000 existing records with their stored fields.
+
+The database DB_NAME must exist with the modules of the models installed.
+
+Usage: DB_NAME=health TRYTOND_CONFIG=trytond.conf \\
+    python benchmark/model_access.py [model ...]
+"""
+import sys
+import timeit
+
+from trytond.config import config
+config.update_etc()
+
+from trytond.tests.test_tryton import DB_NAME, USER, CONTEXT
+from trytond.transaction import Transaction
+from trytond.pool import Pool
+
+NUMBER = 10000
+
+
+def best(func, number=NUMBER, repeat=5):
+    'Return the best time of number calls in micro-seconds'
+    return min(timeit.repeat(func, number=number, repeat=repeat)
+        ) * 10 ** 6 / number
+
+
+def main(models=('party.party', 'gnuhealth.patient')):
+    pool = Pool(DB_NAME)
+    pool.init()
+    ModelAccess = pool.get('ir.model.access')
+    ModelFieldAccess = pool.get('ir.model.field.access')
+    with Transaction().start(DB_NAME, USER, context=CONTEXT) as transaction:
+        with transaction.set_context(_check_access=True):
+            for model in models:
+                Model = pool.get(model)
+                fields = Model._fields.keys()
+                stored = [n for n, f in Model._fields.iteritems()
+                    if not hasattr(f, 'get') and not hasattr(f, 'set')]
+                print '%s: %s fields, %s stored' % (
+                    model, len(fields), len(stored))
+                print '  ModelAccess.check: %.2fus' % best(
+                    lambda: ModelAccess.check(model, 'read'))
+                print '  ModelFieldAccess.check: %.2fus' % best(
+                    lambda: ModelFieldAccess.check(model, fields))
+                ids = [r.id for r in Model.search([], limit=1000)]
+                if ids:
+                    print '  read of %s records: %.2fms' % (len(ids),
+                        best(lambda: Model.read(ids, stored), number=1)
+                        / 1000)
+
+
+if __name__ == '__main__':
+    main(*[sys.argv[1:]] if len(sys.argv) > 1 else [])
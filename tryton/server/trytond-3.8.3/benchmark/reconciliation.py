@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+"""
+Time find_zero_sum_groups on synthetic ledgers and compare the number of
+lines matched with the combinations of chunks used before.
+
+A ledger has invoices paid 3 days later, each payment covering 1 to 4
+invoices, and one unpaid invoice for 10 payments.
+
+Usage: python benchmark/reconciliation.py [payments ...]
+"""
+import sys
+import time
+import random
+import datetime
+from itertools import combinations
+
+from trytond.modules.account.reconciliation import find_zero_sum_groups
+
+DATE = datetime.date(2015, 1, 1)
+DAY = datetime.timedelta(days=1)
+
+
+def ledger(payments, seed=42, lag=3):
+    'Return the (key, amount, date) lines of a ledger'
+    rng = random.Random(seed)
+    lines, key = [], 0
+    for i in xrange(payments):
+        invoices = [rng.randint(100, 100000)
+            for _ in xrange(rng.randint(1, 4))]
+        for amount in invoices:
+            key += 1
+            lines.append((key, amount, DATE + i * DAY))
+        key += 1
+        lines.append((key, -sum(invoices), DATE + (i + lag) * DAY))
+    for i in xrange(payments // 10):
+        key += 1
+        lines.append((key, rng.randint(100, 100000), DATE + i * DAY))
+    return lines
+
+
+def combinations_chunks(lines, chunk=10):
+    '''
+    Return the number of lines matched by the largest zero-sum combination
+    of each chunk, as the wizard did before
+    '''
+    matched = 0
+    for start in xrange(0, len(lines), chunk):
+        chunk_lines = lines[start:start + chunk]
+        for size in xrange(len(chunk_lines), 1, -1):
+            if any(not sum(l[1] for l in c)
+                    for c in combinations(chunk_lines, size)):
+                matched += size
+                break
+    return matched
+
+
+def main(*sizes):
+    for payments in sizes or (500, 5000):
+        lines = ledger(payments)
+        start = time.time()
+        groups = find_zero_sum_groups(lines, window=20)
+        print '%s payments, %s lines: %s lines matched in %.2fs' % (
+            payments, len(lines), sum(len(g) for g in groups),
+            time.time() - start)
+        if len(lines) <= 2000:
+            start = time.time()
+            matched = combinations_chunks(lines)
+            print '  combinations of chunks of 10: %s lines matched ' \
+                'in %.2fs' % (matched, time.time() - start)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
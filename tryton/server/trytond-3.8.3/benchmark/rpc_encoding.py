@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+"""
+Compare the size and the speed of the JSON and msgpack encodings of RPC
+responses, with their gzip and zstd compressions.
+
+Usage: python benchmark/rpc_encoding.py [runs]
+"""
+import sys
+import os
+import time
+import random
+import datetime
+import xmlrpclib
+from decimal import Decimal
+
+from trytond.protocols.jsonrpc import json_dumps, json_loads
+from trytond.protocols import msgpackrpc
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+RANDOM = random.Random(1)
+
+
+def rows(size, photo=False):
+    'Return a read response of size rows'
+    result = []
+    for i in xrange(size):
+        value = {
+            'id': i,
+            'name': u'Patient %s \xe9' % i,
+            'code': 'PAC%06d' % i,
+            'state': 'confirmed',
+            'party': RANDOM.randint(1, 5000),
+            'party.rec_name': u'Party %s' % i,
+            'appointment_date': (datetime.datetime(2016, 1, 1)
+                + datetime.timedelta(minutes=i)),
+            'dob': datetime.date(1970, 1, 1) + datetime.timedelta(days=i),
+            'amount': Decimal('%s.%02d' % (
+                    RANDOM.randint(0, 10000), RANDOM.randint(0, 99))),
+            'tax': Decimal('%s.%02d' % (
+                    RANDOM.randint(0, 100), RANDOM.randint(0, 99))),
+            'total': Decimal('%s.%02d' % (
+                    RANDOM.randint(0, 10000), RANDOM.randint(0, 99))),
+            'active': True,
+            'notes': None,
+            '_timestamp': 'x' * 20,
+            'lines': range(i % 7),
+            }
+        if photo:
+            value['photo'] = bytearray(os.urandom(20000))
+        result.append(value)
+    return {'id': 1, 'result': result}
+
+
+def mean(func, runs):
+    start = time.time()
+    for _ in xrange(runs):
+        result = func()
+    return result, (time.time() - start) / runs
+
+
+def bench(name, payload, runs):
+    codecs = [('json', json_dumps, json_loads)]
+    if msgpackrpc.msgpack is not None:
+        codecs.append(('msgpack', msgpackrpc.dumps, msgpackrpc.loads))
+    for codec, dumps, loads in codecs:
+        data, encode = mean(lambda: dumps(payload), runs)
+        _, decode = mean(lambda: loads(data), runs)
+        line = '%-22s %-8s %9d bytes, gzip %8d' % (
+            name, codec, len(data), len(xmlrpclib.gzip_encode(data)))
+        if zstandard is not None:
+            line += ', zstd %8d' % len(
+                zstandard.ZstdCompressor().compress(data))
+        print '%s, encode %.3fs, decode %.3fs' % (line, encode, decode)
+
+
+def main(runs=20):
+    bench('read of 2000 rows', rows(2000), runs)
+    bench('read of 50 photos', rows(50, photo=True), runs)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
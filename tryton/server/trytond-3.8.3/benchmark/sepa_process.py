@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+"""
+Time the processing of a SEPA payment group and the memory it uses.
+
+The database DB_NAME is created with account_payment_sepa and filled with
+the payments on the first run. There are ten payments per mandate.
+
+Usage: DB_NAME=bench_sepa TRYTOND_CONFIG=trytond.conf \\
+    python benchmark/sepa_process.py [payments]
+"""
+import sys
+import time
+import resource
+from decimal import Decimal
+
+from trytond.config import config
+config.update_etc()
+
+from trytond.tests.test_tryton import (install_module, create_db, DB_NAME,
+    USER, CONTEXT)
+from trytond.transaction import Transaction
+from trytond.pool import Pool
+from trytond.modules.account_payment_sepa.tests.test_account_payment_sepa \
+    import setup_environment, setup_journal
+
+PER_MANDATE = 10
+
+
+def rss():
+    'Return the peak resident memory in MB'
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def setup(size):
+    pool = Pool()
+    Party = pool.get('party.party')
+    Account = pool.get('bank.account')
+    Mandate = pool.get('account.payment.sepa.mandate')
+    Payment = pool.get('account.payment')
+    Date = pool.get('ir.date')
+    Currency = pool.get('currency.currency')
+    Company = pool.get('company.company')
+    User = pool.get('res.user')
+
+    currency, = Currency.create([{
+                'name': 'cu1',
+                'symbol': 'cu1',
+                'code': 'cu1',
+                }])
+    party, = Party.create([{
+                'name': 'Dunder Mifflin',
+                }])
+    Company.create([{
+                'party': party.id,
+                'currency': currency.id,
+                }])
+    environment = setup_environment()
+    company, bank = environment['company'], environment['bank']
+    parties = Party.create([{
+                'name': 'Customer %s' % i,
+                'addresses': [('create', [{
+                                'street': 'street',
+                                'zip': '1234',
+                                'city': 'City',
+                                }])],
+                } for i in xrange(size // PER_MANDATE)])
+    User.write([User(USER)], {
+            'main_company': company.id,
+            'company': company.id,
+            })
+    company_account, customer_account = Account.create([{
+                'bank': bank,
+                'owners': [('add', [company.party])],
+                'currency': company.currency.id,
+                'numbers': [('create', [{
+                                'type': 'iban',
+                                'number': 'ES8200000000000000000000',
+                                }])]}, {
+                'bank': bank,
+                'owners': [('add', [p.id for p in parties])],
+                'currency': company.currency.id,
+                'numbers': [('create', [{
+                                'type': 'iban',
+                                'number': 'ES3600000000050000000001',
+                                }])]}])
+    Mandate.create([{
+                'company': company,
+                'party': p,
+                'account_number': customer_account.numbers[0],
+                'identification': 'MANDATE-%s' % p.id,
+                'type': 'recurrent',
+                'signature_date': Date.today(),
+                'state': 'validated',
+                } for p in parties])
+    journal = setup_journal('pain.008.001.02', 'receivable', company,
+        company_account)
+    Payment.create([{
+                'company': company.id,
+                'party': p.id,
+                'journal': journal.id,
+                'kind': 'receivable',
+                'amount': Decimal('10.0'),
+                'state': 'approved',
+                'description': 'Instalment',
+                'date': Date.today(),
+                } for p in parties for _ in xrange(PER_MANDATE)])
+
+
+def main(size=1000):
+    create_db()
+    install_module('account_payment_sepa')
+    with Transaction().start(DB_NAME, USER, context=CONTEXT) as transaction:
+        pool = Pool()
+        Payment = pool.get('account.payment')
+        Group = pool.get('account.payment.group')
+        Journal = pool.get('account.payment.journal')
+        cursor = transaction.cursor
+
+        if not Payment.search([], limit=1):
+            start = time.time()
+            setup(size)
+            cursor.commit()
+            print 'setup %.1fs' % (time.time() - start)
+        journal, = Journal.search([])
+        payments = Payment.search([])
+        cursor.cache.clear()
+
+        before = rss()
+        start = time.time()
+        group = Group(journal=journal, kind='receivable',
+            company=journal.company)
+        group.save()
+        Payment.process(payments, lambda: group)
+        print '%s payments: process %.1fs, peak RSS %d MB -> %d MB' % (
+            len(payments), time.time() - start, before, rss())
+        cursor.rollback()
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -103,9 +103,11 @@ setup(name=name,
         'cdecimal': ['cdecimal'],
         'Levenshtein': ['python-Levenshtein'],
         'BCrypt': ['bcrypt'],
+        'msgpack': ['msgpack >= 0.5.2'],
+        'zstd': ['zstandard'],
         },
     zip_safe=False,
     test_suite='trytond.tests',
     test_loader='trytond.test_loader:Loader',
-    tests_require=['mock'],
+    tests_require=['mock', 'msgpack >= 0.5.2'],
     )
@@ -195,6 +195,18 @@ class CursorInterface(object):
         '''
         raise NotImplementedError
 
+    def has_advisory_lock(self):
+        'Return True if database supports advisory locks'
+        return False
+
+    def advisory_lock(self, key1, key2):
+        '''
+        Lock the pair of integer keys until the end of the transaction.
+        Like lock, it does not wait and raises DatabaseOperationalError if
+        the keys are already locked, so the transaction can be retried.
+        '''
+        raise NotImplementedError
+
     def has_constraint(self):
         '''
         Return True if database handle constraint.
@@ -224,6 +236,10 @@ class CursorInterface(object):
         'Return True if database supports multirow insert'
         return False
 
+    def has_window_functions(self):
+        'Return True if database supports window functions'
+        return False
+
     def __build_dict(self, row):
         return dict((desc[0], row[i])
                 for i, desc in enumerate(self.description))
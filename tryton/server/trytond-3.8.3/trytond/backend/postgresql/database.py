@@ -331,6 +331,17 @@ class Cursor(CursorInterface):
     def lock(self, table):
         self.cursor.execute('LOCK "%s" IN EXCLUSIVE MODE NOWAIT' % table)
 
+    def has_advisory_lock(self):
+        return True
+
+    def advisory_lock(self, key1, key2):
+        self.cursor.execute('SELECT pg_try_advisory_xact_lock(%s, %s)',
+            (key1, key2))
+        locked, = self.cursor.fetchone()
+        if not locked:
+            raise DatabaseOperationalError(
+                'could not obtain advisory lock (%s, %s)' % (key1, key2))
+
     def has_constraint(self):
         return True
 
@@ -348,6 +359,9 @@ class Cursor(CursorInterface):
     def has_multirow_insert(self):
         return True
 
+    def has_window_functions(self):
+        return True
+
     @property
     def current_user(self):
         if self._current_user is None:
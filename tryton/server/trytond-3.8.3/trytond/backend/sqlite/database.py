@@ -395,6 +395,9 @@ class Cursor(CursorInterface):
     def has_multirow_insert(self):
         return True
 
+    def has_window_functions(self):
+        return sqlite.sqlite_version_info >= (3, 25, 0)
+
 sqlite.register_converter('NUMERIC', lambda val: Decimal(val.decode('utf-8')))
 if sys.version_info[0] == 2:
     sqlite.register_adapter(Decimal, lambda val: buffer(str(val)))
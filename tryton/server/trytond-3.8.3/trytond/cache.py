@@ -42,12 +42,18 @@ class Cache(object):
             return (key, Transaction().user, freeze(Transaction().context))
         return key
 
+    def _get_cache(self, dbname):
+        # Do not instantiate a new LRUDict at each call
+        cache = self._cache.get(dbname)
+        if cache is None:
+            cache = self._cache[dbname] = LRUDict(self.size_limit)
+        return cache
+
     def get(self, key, default=None):
         cursor = Transaction().cursor
         key = self._key(key)
         with self._lock:
-            cache = self._cache.setdefault(cursor.dbname,
-                LRUDict(self.size_limit))
+            cache = self._get_cache(cursor.dbname)
             try:
                 result = cache[key] = cache.pop(key)
                 return result
@@ -58,8 +64,7 @@ class Cache(object):
         cursor = Transaction().cursor
         key = self._key(key)
         with self._lock:
-            cache = self._cache.setdefault(cursor.dbname,
-                LRUDict(self.size_limit))
+            cache = self._get_cache(cursor.dbname)
             try:
                 cache[key] = value
             except TypeError:
@@ -0,0 +1,220 @@
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+import os
+import errno
+import time
+import hashlib
+import tempfile
+
+from trytond.config import config
+
+__all__ = ['filestore', 'FileStore']
+
+CHUNK_SIZE = 64 * 1024
+TEMPORARY_PREFIX = '.tmp-'
+
+
+class FileStore(object):
+    '''
+    Store the files under the path of the database section.
+    The files are addressed by the SHA-256 of their content so the same
+    content is stored only once and there is no collision to handle.
+    '''
+
+    def __init__(self, path=None, fsync=None):
+        self._path = path
+        self._fsync = fsync
+
+    @property
+    def path(self):
+        return self._path or config.get('database', 'path')
+
+    @property
+    def fsync(self):
+        if self._fsync is not None:
+            return self._fsync
+        return config.getboolean('database', 'fsync', default=True)
+
+    def directory(self, prefix=''):
+        return os.path.join(self.path, prefix)
+
+    def filename(self, id, prefix=''):
+        return os.path.join(self.directory(prefix), id[0:2], id[2:4], id)
+
+    def get(self, id, prefix=''):
+        with self.open(id, prefix=prefix) as file_p:
+            return file_p.read()
+
+    def open(self, id, prefix=''):
+        'Return a file object opened for reading on the content of id'
+        return open(self.filename(id, prefix=prefix), 'rb')
+
+    def stream(self, id, prefix='', offset=0, length=None,
+            chunk_size=CHUNK_SIZE):
+        'Yield the content of id by chunks from offset for length bytes'
+        with self.open(id, prefix=prefix) as file_p:
+            if offset:
+                file_p.seek(offset)
+            while length is None or length > 0:
+                size = chunk_size
+                if length is not None:
+                    size = min(size, length)
+                    length -= size
+                chunk = file_p.read(size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def size(self, id, prefix=''):
+        return os.stat(self.filename(id, prefix=prefix)).st_size
+
+    def exists(self, id, prefix=''):
+        return os.path.isfile(self.filename(id, prefix=prefix))
+
+    def set(self, data, prefix=''):
+        '''
+        Store data which is a string, a file object read by chunks or an
+        iterable of strings like a serializer output.
+        The content is written to a temporary file which is renamed
+        atomically to its address.
+        Return the id and the size of the content.
+        '''
+        directory = self.directory(prefix)
+        _makedirs(directory)
+        fd, tmp = tempfile.mkstemp(prefix=TEMPORARY_PREFIX, dir=directory)
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as file_p:
+                for chunk in _chunks(data):
+                    digest.update(chunk)
+                    file_p.write(chunk)
+                    size += len(chunk)
+                if self.fsync:
+                    file_p.flush()
+                    os.fsync(file_p.fileno())
+            id = digest.hexdigest()
+            filename = self.filename(id, prefix=prefix)
+            if os.path.isfile(filename):
+                os.remove(tmp)
+                # Refresh the time to protect it from a running collect
+                os.utime(filename, None)
+            else:
+                _makedirs(os.path.dirname(filename))
+                os.chmod(tmp, 0660)
+                os.rename(tmp, filename)
+                if self.fsync:
+                    _fsync_directory(os.path.dirname(filename))
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return id, size
+
+    def delete(self, id, prefix=''):
+        try:
+            os.remove(self.filename(id, prefix=prefix))
+        except OSError, exception:
+            if exception.errno != errno.ENOENT:
+                raise
+
+    def ids(self, prefix=''):
+        'Yield the ids stored under prefix'
+        directory = self.directory(prefix)
+        for first in _listdir(directory):
+            if len(first) != 2:
+                continue
+            for second in _listdir(os.path.join(directory, first)):
+                if len(second) != 2:
+                    continue
+                path = os.path.join(directory, first, second)
+                for name in _listdir(path):
+                    if os.path.isfile(os.path.join(path, name)):
+                        yield name
+
+    def collect(self, used, prefix='', grace=3600):
+        '''
+        Remove the files under prefix whose id is not in used and the
+        temporary files if they are older than grace seconds, the younger
+        may belong to a transaction not yet committed.
+        Return the number of files removed.
+        '''
+        removed = 0
+        limit = time.time() - grace
+        for id in list(self.ids(prefix=prefix)):
+            if id in used:
+                continue
+            try:
+                if os.stat(self.filename(id, prefix=prefix)).st_mtime < limit:
+                    self.delete(id, prefix=prefix)
+                    removed += 1
+            except OSError:
+                pass
+        directory = self.directory(prefix)
+        for name in _listdir(directory):
+            if not name.startswith(TEMPORARY_PREFIX):
+                continue
+            filename = os.path.join(directory, name)
+            try:
+                if os.stat(filename).st_mtime < limit:
+                    os.remove(filename)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+def _chunks(data, chunk_size=CHUNK_SIZE):
+    if hasattr(data, 'read'):
+        while True:
+            chunk = data.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    elif isinstance(data, (basestring, buffer, bytearray)):
+        for offset in xrange(0, len(data), chunk_size):
+            yield buffer(data, offset, chunk_size)
+    else:
+        # Gather the strings of the iterable into chunks
+        strings, size = [], 0
+        for string in data:
+            strings.append(string)
+            size += len(string)
+            if size >= chunk_size:
+                yield ''.join(strings)
+                strings, size = [], 0
+        if strings:
+            yield ''.join(strings)
+
+
+def _makedirs(directory):
+    try:
+        os.makedirs(directory, 0770)
+    except OSError, exception:
+        if exception.errno != errno.EEXIST:
+            raise
+
+
+def _listdir(directory):
+    try:
+        return os.listdir(directory)
+    except OSError, exception:
+        if exception.errno != errno.ENOENT:
+            raise
+        return []
+
+
+def _fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        # Some platforms can not open directories
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+filestore = FileStore()
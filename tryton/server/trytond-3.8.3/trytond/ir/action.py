@@ -595,6 +595,8 @@ class ActionReport(ActionMixin, ModelSQL, ModelView):
         if format_ == 'size':
             converter = len
             default = 0
+        elif format_ == 'reference':
+            converter = fields.Binary.reference
         for report in reports:
             data = getattr(report, name + '_custom')
             if not data and getattr(report, name[:-8]):
@@ -1,12 +1,13 @@
 # This file is part of Tryton.  The COPYRIGHT file at the top level of
 # this repository contains the full copyright notices and license terms.
 import os
-import hashlib
+from sql import Null
 from sql.operators import Concat
 from sql.conditionals import Coalesce
 
 from ..model import ModelView, ModelSQL, fields, Unique
 from ..config import config
+from ..filestore import filestore
 from .. import backend
 from ..transaction import Transaction
 from ..pyson import Eval
@@ -32,7 +33,8 @@ class Attachment(ModelSQL, ModelView):
         ('data', 'Data'),
         ('link', 'Link'),
         ], 'Type', required=True)
-    data = fields.Function(fields.Binary('Data', filename='name', states={
+    data = fields.Function(fields.Binary('Data', filename='name',
+            file_id='file_id', states={
                 'invisible': Eval('type') != 'data',
                 }, depends=['type']), 'get_data', setter='set_data')
     description = fields.Text('Description')
@@ -42,11 +44,10 @@ class Attachment(ModelSQL, ModelView):
     link = fields.Char('Link', states={
             'invisible': Eval('type') != 'link',
             }, depends=['type'])
-    digest = fields.Char('Digest', size=32)
-    collision = fields.Integer('Collision')
-    data_size = fields.Function(fields.Integer('Data size', states={
-                'invisible': Eval('type') != 'data',
-                }, depends=['type']), 'get_data')
+    file_id = fields.Char('File ID', readonly=True)
+    data_size = fields.Integer('Data size', readonly=True, states={
+            'invisible': Eval('type') != 'data',
+            }, depends=['type'])
     last_modification = fields.Function(fields.DateTime('Last Modification'),
         'get_last_modification')
     last_user = fields.Function(fields.Char('Last User'),
@@ -86,6 +87,31 @@ class Attachment(ModelSQL, ModelView):
             table.drop_column('res_model')
             table.drop_column('res_id')
 
+        # Migration from 3.8: digest and collision replaced by file_id
+        if table.column_exist('digest'):
+            directory = os.path.join(config.get('database', 'path'),
+                cursor.dbname)
+            # Skip the migrated attachments as SQLite does not drop columns
+            cursor.execute(*attachment.select(attachment.id,
+                    attachment.digest, attachment.collision,
+                    where=(attachment.digest != Null)
+                    & (attachment.file_id == Null)))
+            for id_, digest, collision in cursor.fetchall():
+                file_id = digest
+                if collision:
+                    file_id = '%s-%s' % (digest, collision)
+                try:
+                    size = os.stat(os.path.join(directory,
+                            file_id[0:2], file_id[2:4], file_id)).st_size
+                except OSError:
+                    size = None
+                cursor.execute(*attachment.update(
+                        [attachment.file_id, attachment.data_size],
+                        [file_id, size],
+                        where=attachment.id == id_))
+            table.drop_column('digest')
+            table.drop_column('collision')
+
     @staticmethod
     def default_type():
         return 'data'
@@ -94,10 +120,6 @@ class Attachment(ModelSQL, ModelView):
     def default_resource():
         return Transaction().context.get('resource')
 
-    @staticmethod
-    def default_collision():
-        return 0
-
     @staticmethod
     def models_get():
         pool = Pool()
@@ -113,81 +135,48 @@ class Attachment(ModelSQL, ModelView):
 
     def get_data(self, name):
         db_name = Transaction().cursor.dbname
-        format_ = Transaction().context.pop('%s.%s'
+        format_ = Transaction().context.get('%s.%s'
             % (self.__name__, name), '')
+        if format_ == 'size':
+            return self.data_size or 0
+        elif format_ == 'reference':
+            if not self.file_id:
+                return None
+            return {
+                'size': self.data_size or 0,
+                'digest': self.file_id,
+                }
         value = None
-        if name == 'data_size' or format_ == 'size':
-            value = 0
-        if self.digest:
-            filename = self.digest
-            if self.collision:
-                filename = filename + '-' + str(self.collision)
-            filename = os.path.join(config.get('database', 'path'), db_name,
-                    filename[0:2], filename[2:4], filename)
-            if name == 'data_size' or format_ == 'size':
-                try:
-                    statinfo = os.stat(filename)
-                    value = statinfo.st_size
-                except OSError:
-                    pass
-            else:
-                try:
-                    with open(filename, 'rb') as file_p:
-                        value = fields.Binary.cast(file_p.read())
-                except IOError:
-                    pass
+        if self.file_id:
+            try:
+                value = fields.Binary.cast(
+                    filestore.get(self.file_id, prefix=db_name))
+            except IOError:
+                pass
         return value
 
     @classmethod
     def set_data(cls, attachments, name, value):
         if value is None:
             return
-        cursor = Transaction().cursor
-        table = cls.__table__()
-        db_name = cursor.dbname
-        directory = os.path.join(config.get('database', 'path'), db_name)
-        if not os.path.isdir(directory):
-            os.makedirs(directory, 0770)
-        digest = hashlib.md5(value).hexdigest()
-        directory = os.path.join(directory, digest[0:2], digest[2:4])
-        if not os.path.isdir(directory):
-            os.makedirs(directory, 0770)
-        filename = os.path.join(directory, digest)
-        collision = 0
-        if os.path.isfile(filename):
-            with open(filename, 'rb') as file_p:
-                data = file_p.read()
-            if value != data:
-                cursor.execute(*table.select(table.collision,
-                        where=(table.digest == digest)
-                        & (table.collision != 0),
-                        group_by=table.collision,
-                        order_by=table.collision))
-                collision2 = 0
-                for row in cursor.fetchall():
-                    collision2 = row[0]
-                    filename = os.path.join(directory,
-                            digest + '-' + str(collision2))
-                    if os.path.isfile(filename):
-                        with open(filename, 'rb') as file_p:
-                            data = file_p.read()
-                        if value == data:
-                            collision = collision2
-                            break
-                if collision == 0:
-                    collision = collision2 + 1
-                    filename = os.path.join(directory,
-                            digest + '-' + str(collision))
-                    with open(filename, 'wb') as file_p:
-                        file_p.write(value)
-        else:
-            with open(filename, 'wb') as file_p:
-                file_p.write(value)
+        db_name = Transaction().cursor.dbname
+        file_id, size = filestore.set(value, prefix=db_name)
         cls.write(attachments, {
-            'digest': digest,
-            'collision': collision,
+            'file_id': file_id,
+            'data_size': size,
             })
 
+    @classmethod
+    def collect_files(cls):
+        'Remove the stored files which are not used by any attachment'
+        cursor = Transaction().cursor
+        table = cls.__table__()
+        cursor.execute(*table.select(table.file_id,
+                where=table.file_id != Null,
+                group_by=table.file_id))
+        used = set(file_id for file_id, in cursor.fetchall())
+        return filestore.collect(used, prefix=cursor.dbname)
+
     @fields.depends('description')
     def on_change_with_summary(self, name=None):
         return firstline(self.description or '')
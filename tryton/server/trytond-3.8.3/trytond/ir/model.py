@@ -2,8 +2,10 @@
 # this repository contains the full copyright notices and license terms.
 import re
 import heapq
+import operator
+from functools import reduce
 
-from sql import Null
+from sql import Null, Column
 from sql.aggregate import Max
 from sql.conditionals import Case
 from collections import defaultdict
@@ -35,6 +37,25 @@ __all__ = [
 
 IDENTIFIER = re.compile(r'^[a-zA-z_][a-zA-Z0-9_]*$')
 
+# Bits of the access masks
+ACCESS_READ = 1
+ACCESS_WRITE = 2
+ACCESS_CREATE = 4
+ACCESS_DELETE = 8
+ACCESS_ALL = ACCESS_READ | ACCESS_WRITE | ACCESS_CREATE | ACCESS_DELETE
+ACCESS_MODES = {
+    'read': ACCESS_READ,
+    'write': ACCESS_WRITE,
+    'create': ACCESS_CREATE,
+    'delete': ACCESS_DELETE,
+    }
+
+
+def _access_mask_columns(table):
+    "Return the columns aggregating the permissions of table into a mask"
+    return [Max(Case((Column(table, 'perm_%s' % mode) == True, bit),
+                else_=0)) for mode, bit in ACCESS_MODES.iteritems()]
+
 
 class Model(ModelSQL, ModelView):
     "Model"
@@ -485,45 +506,65 @@ class ModelAccess(ModelSQL, ModelView):
         if Transaction().user == 0:
             return defaultdict(lambda: defaultdict(lambda: True))
 
+        masks = cls.get_access_masks()
+        access = {}
+        for model in models:
+            mask = masks.get(model, ACCESS_ALL)
+            access[model] = dict((mode, bool(mask & bit))
+                for mode, bit in ACCESS_MODES.iteritems())
+        return access
+
+    @staticmethod
+    def _get_groups():
+        'Return the set of groups of the user'
         pool = Pool()
-        Model = pool.get('ir.model')
         UserGroup = pool.get('res.user-res.group')
-        cursor = Transaction().cursor
+        transaction = Transaction()
+        cursor = transaction.cursor
+        user_group = UserGroup.__table__()
+        cursor.execute(*user_group.select(user_group.group,
+                where=user_group.user == transaction.user))
+        return frozenset(g for g, in cursor.fetchall())
+
+    @classmethod
+    def get_access_masks(cls):
+        """
+        Return the access bitmask of the models for the groups of the user.
+        The models without access are missing and must use ACCESS_ALL.
+        The result is shared by the users with the same groups.
+        """
         user = Transaction().user
+        if user == 0:
+            return {}
+        masks = cls._get_access_cache.get(('user', user))
+        if masks is not None:
+            return masks
+        groups = cls._get_groups()
+        key = ('masks', groups)
+        masks = cls._get_access_cache.get(key)
+        if masks is not None:
+            return cls._get_access_cache.set(('user', user), masks)
+
+        pool = Pool()
+        Model = pool.get('ir.model')
+        cursor = Transaction().cursor
         model_access = cls.__table__()
         ir_model = Model.__table__()
-        user_group = UserGroup.__table__()
 
-        access = {}
-        for model in models:
-            maccess = cls._get_access_cache.get((user, model), default=-1)
-            if maccess == -1:
-                break
-            access[model] = maccess
-        else:
-            return access
-
-        default = {'read': True, 'write': True, 'create': True, 'delete': True}
-        access = dict((m, default) for m in models)
-        cursor.execute(*model_access.join(ir_model, 'LEFT',
+        where = model_access.group == Null
+        if groups:
+            where |= model_access.group.in_(list(groups))
+        cursor.execute(*model_access.join(ir_model,
                 condition=model_access.model == ir_model.id
-                ).join(user_group, 'LEFT',
-                condition=user_group.group == model_access.group
-                ).select(
-                ir_model.model,
-                Max(Case((model_access.perm_read == True, 1), else_=0)),
-                Max(Case((model_access.perm_write == True, 1), else_=0)),
-                Max(Case((model_access.perm_create == True, 1), else_=0)),
-                Max(Case((model_access.perm_delete == True, 1), else_=0)),
-                where=ir_model.model.in_(models)
-                & ((user_group.user == user) | (model_access.group == Null)),
+                ).select(ir_model.model,
+                *_access_mask_columns(model_access),
+                where=where,
                 group_by=ir_model.model))
-        access.update(dict(
-                (m, {'read': r, 'write': w, 'create': c, 'delete': d})
-                for m, r, w, c, d in cursor.fetchall()))
-        for model, maccess in access.iteritems():
-            cls._get_access_cache.set((user, model), maccess)
-        return access
+        masks = {}
+        for row in cursor.fetchall():
+            masks[row[0]] = reduce(operator.or_, row[1:])
+        cls._get_access_cache.set(key, masks)
+        return cls._get_access_cache.set(('user', user), masks)
 
     @classmethod
     def check(cls, model_name, mode='read', raise_exception=True):
@@ -535,8 +576,8 @@ class ModelAccess(ModelSQL, ModelView):
                     and not Transaction().context.get('_check_access'))):
             return True
 
-        access = cls.get_access([model_name])[model_name][mode]
-        if not access and access is not None:
+        mask = cls.get_access_masks().get(model_name, ACCESS_ALL)
+        if not mask & ACCESS_MODES[mode]:
             if raise_exception:
                 cls.raise_user_error(mode, model_name)
             else:
@@ -665,49 +706,62 @@ class ModelFieldAccess(ModelSQL, ModelView):
             return defaultdict(lambda: defaultdict(
                     lambda: defaultdict(lambda: True)))
 
+        accesses = {}
+        for model in models:
+            accesses[model] = maccesses = {}
+            for field, mask in cls.get_access_masks(model).iteritems():
+                maccesses[field] = dict((mode, bool(mask & bit))
+                    for mode, bit in ACCESS_MODES.iteritems())
+        return accesses
+
+    @classmethod
+    def get_access_masks(cls, model_name):
+        """
+        Return the access bitmask of the fields of model_name for the groups
+        of the user.
+        The fields without access are missing and must use ACCESS_ALL.
+        The result is shared by the users with the same groups.
+        """
+        user = Transaction().user
+        if user == 0:
+            return {}
+        masks = cls._get_access_cache.get(('user', user))
+        if masks is not None:
+            return masks.get(model_name, {})
+        ModelAccess = Pool().get('ir.model.access')
+        groups = ModelAccess._get_groups()
+        key = ('masks', groups)
+        masks = cls._get_access_cache.get(key)
+        if masks is not None:
+            cls._get_access_cache.set(('user', user), masks)
+            return masks.get(model_name, {})
+
         pool = Pool()
         Model = pool.get('ir.model')
         ModelField = pool.get('ir.model.field')
-        UserGroup = pool.get('res.user-res.group')
         cursor = Transaction().cursor
-        user = Transaction().user
         field_access = cls.__table__()
         ir_model = Model.__table__()
         model_field = ModelField.__table__()
-        user_group = UserGroup.__table__()
 
-        accesses = {}
-        for model in models:
-            maccesses = cls._get_access_cache.get((user, model))
-            if maccesses is None:
-                break
-            accesses[model] = maccesses
-        else:
-            return accesses
-
-        default = {}
-        accesses = dict((m, default) for m in models)
+        where = field_access.group == Null
+        if groups:
+            where |= field_access.group.in_(list(groups))
         cursor.execute(*field_access.join(model_field,
                 condition=field_access.field == model_field.id
                 ).join(ir_model,
                 condition=model_field.model == ir_model.id
-                ).join(user_group, 'LEFT',
-                condition=user_group.group == field_access.group
-                ).select(
-                ir_model.model,
-                model_field.name,
-                Max(Case((field_access.perm_read == True , 1), else_=0)),
-                Max(Case((field_access.perm_write == True, 1), else_=0)),
-                Max(Case((field_access.perm_create == True, 1), else_=0)),
-                Max(Case((field_access.perm_delete == True, 1), else_=0)),
-                where=ir_model.model.in_(models)
-                & ((user_group.user == user) | (field_access.group == Null)),
+                ).select(ir_model.model, model_field.name,
+                *_access_mask_columns(field_access),
+                where=where,
                 group_by=[ir_model.model, model_field.name]))
-        for m, f, r, w, c, d in cursor.fetchall():
-            accesses[m][f] = {'read': r, 'write': w, 'create': c, 'delete': d}
-        for model, maccesses in accesses.iteritems():
-            cls._get_access_cache.set((user, model), maccesses)
-        return accesses
+        masks = {}
+        for row in cursor.fetchall():
+            masks.setdefault(row[0], {})[row[1]] = reduce(
+                operator.or_, row[2:])
+        cls._get_access_cache.set(key, masks)
+        cls._get_access_cache.set(('user', user), masks)
+        return masks.get(model_name, {})
 
     @classmethod
     def check(cls, model_name, fields, mode='read', raise_exception=True,
@@ -724,16 +778,18 @@ class ModelFieldAccess(ModelSQL, ModelView):
                 return dict((x, True) for x in fields)
             return True
 
-        accesses = dict((f, a[mode])
-            for f, a in cls.get_access([model_name])[model_name].iteritems())
+        masks = cls.get_access_masks(model_name)
+        bit = ACCESS_MODES[mode]
         if access:
-            return accesses
-        for field in fields:
-            if not accesses.get(field, True):
-                if raise_exception:
-                    cls.raise_user_error(mode, (model_name, field))
-                else:
-                    return False
+            return dict((f, bool(m & bit)) for f, m in masks.iteritems())
+        # Most of the models have no field access
+        if masks:
+            for field in fields:
+                if not masks.get(field, ACCESS_ALL) & bit:
+                    if raise_exception:
+                        cls.raise_user_error(mode, (model_name, field))
+                    else:
+                        return False
         return True
 
     @classmethod
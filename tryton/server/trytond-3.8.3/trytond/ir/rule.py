@@ -5,7 +5,8 @@ from ..transaction import Transaction
 from ..cache import Cache
 from ..pool import Pool
 from .. import backend
-from ..pyson import PYSONDecoder
+from ..pyson import PYSONDecoder, compile_pyson
+from ..tools import grouped_slice, reduce_ids
 
 __all__ = [
     'RuleGroup', 'Rule',
@@ -173,79 +174,148 @@ class Rule(ModelSQL, ModelView):
         if domain is not False:
             return domain
 
+        pool = Pool()
+        User_Group = pool.get('res.user-res.group')
+        cursor = Transaction().cursor
+        user_group = User_Group.__table__()
+        user_id = Transaction().user
+        cursor.execute(*user_group.select(user_group.group,
+                where=user_group.user == user_id))
+        group_ids = set(g for g, in cursor.fetchall())
+
+        clause = {}
+        clause_global = {}
+        domains = []
+        shared = True
+        for rule_group in cls._get_rule_groups(model_name):
+            if (user_id not in rule_group['users']
+                    and not (group_ids & rule_group['groups'])):
+                if not rule_group['rules']:
+                    continue
+                if not (rule_group['default_p'] or rule_group['global_p']):
+                    continue
+            if not rule_group['rules']:
+                # A rule group without rule grants the access
+                clause[rule_group['id']] = []
+                continue
+            if not rule_group['perm_%s' % mode]:
+                continue
+            for domain in rule_group['rules']:
+                domains.append((rule_group['id'], rule_group['global_p'],
+                        domain))
+                # The evaluation context contains only the user
+                shared &= 'Eval' not in domain
+
+        # Users with the same rule groups share the domain when it does not
+        # depend on the evaluation context
+        if shared:
+            shared_key = (model_name, mode, tuple(sorted(
+                        set(i for i, _, _ in domains) | set(clause))))
+            domain = cls._domain_get_cache.get(shared_key, False)
+            if domain is not False:
+                cls._domain_get_cache.set(key, domain)
+                return domain
+
+        if domains:
+            ctx = {} if shared else cls._get_context()
+            # Use root user without context to prevent recursion
+            with Transaction().set_user(0), \
+                    Transaction().set_context(user=0):
+                for rule_group_id, global_p, domain in domains:
+                    dom = compile_pyson(domain)(ctx)
+                    if global_p:
+                        clause_global.setdefault(rule_group_id, ['OR'])
+                        clause_global[rule_group_id].append(dom)
+                    else:
+                        clause.setdefault(rule_group_id, ['OR'])
+                        clause[rule_group_id].append(dom)
+            clause = cls._domain_get_clause(clause, clause_global)
+        else:
+            clause = None
+
+        if shared:
+            cls._domain_get_cache.set(shared_key, clause)
+        cls._domain_get_cache.set(key, clause)
+        return clause
+
+    @classmethod
+    def _get_rule_groups(cls, model_name):
+        "Return the definition of the rule groups of the model"
+        key = ('rule_groups', model_name)
+        rule_groups = cls._domain_get_cache.get(key)
+        if rule_groups is not None:
+            return rule_groups
+
         pool = Pool()
         RuleGroup = pool.get('ir.rule.group')
         Model = pool.get('ir.model')
         RuleGroup_User = pool.get('ir.rule.group-res.user')
         RuleGroup_Group = pool.get('ir.rule.group-res.group')
-        User_Group = pool.get('res.user-res.group')
 
         cursor = Transaction().cursor
         rule_table = cls.__table__()
         rule_group = RuleGroup.__table__()
         rule_group_user = RuleGroup_User.__table__()
         rule_group_group = RuleGroup_Group.__table__()
-        user_group = User_Group.__table__()
         model = Model.__table__()
-        user_id = Transaction().user
-        cursor.execute(*rule_table.join(rule_group,
-                condition=rule_group.id == rule_table.rule_group
-                ).join(model,
-                condition=rule_group.model == model.id
-                ).select(rule_table.id,
-                where=(model.model == model_name)
-                & (getattr(rule_group, 'perm_%s' % mode) == True)
-                & (rule_group.id.in_(
-                        rule_group_user.select(rule_group_user.rule_group,
-                            where=rule_group_user.user == user_id)
-                        | rule_group_group.join(
-                            user_group,
-                            condition=(rule_group_group.group
-                                == user_group.group)
-                            ).select(rule_group_group.rule_group,
-                            where=user_group.user == user_id)
-                        )
-                    | (rule_group.default_p == True)
-                    | (rule_group.global_p == True)
-                    )))
-        ids = [x[0] for x in cursor.fetchall()]
-        if not ids:
-            cls._domain_get_cache.set(key, None)
-            return
-        clause = {}
-        clause_global = {}
-        ctx = cls._get_context()
-        # Use root user without context to prevent recursion
-        with Transaction().set_user(0), \
-                Transaction().set_context(user=0):
-            for rule in cls.browse(ids):
-                assert rule.domain, ('Rule domain empty,'
-                    'check if migration was done')
-                dom = PYSONDecoder(ctx).decode(rule.domain)
-                if rule.rule_group.global_p:
-                    clause_global.setdefault(rule.rule_group.id, ['OR'])
-                    clause_global[rule.rule_group.id].append(dom)
-                else:
-                    clause.setdefault(rule.rule_group.id, ['OR'])
-                    clause[rule.rule_group.id].append(dom)
-
-        # Test if there is no rule_group that have no rule
+
         cursor.execute(*rule_group.join(model,
                 condition=rule_group.model == model.id
-                ).select(rule_group.id,
-                where=(model.model == model_name)
-                & ~rule_group.id.in_(rule_table.select(rule_table.rule_group))
-                & rule_group.id.in_(rule_group_user.select(
-                        rule_group_user.rule_group,
-                        where=rule_group_user.user == user_id)
-                    | rule_group_group.join(user_group,
-                        condition=rule_group_group.group == user_group.group
-                        ).select(rule_group_group.rule_group,
-                        where=user_group.user == user_id))))
-        fetchone = cursor.fetchone()
-        if fetchone:
-            group_id = fetchone[0]
-            clause[group_id] = []
+                ).select(rule_group.id, rule_group.global_p,
+                rule_group.default_p, rule_group.perm_read,
+                rule_group.perm_write, rule_group.perm_create,
+                rule_group.perm_delete,
+                where=model.model == model_name,
+                order_by=rule_group.id))
+        rule_groups = []
+        id2rule_group = {}
+        for (id_, global_p, default_p, perm_read, perm_write, perm_create,
+                perm_delete) in cursor.fetchall():
+            rule_group_def = {
+                'id': id_,
+                'global_p': bool(global_p),
+                'default_p': bool(default_p),
+                'perm_read': bool(perm_read),
+                'perm_write': bool(perm_write),
+                'perm_create': bool(perm_create),
+                'perm_delete': bool(perm_delete),
+                'users': set(),
+                'groups': set(),
+                'rules': [],
+                }
+            rule_groups.append(rule_group_def)
+            id2rule_group[id_] = rule_group_def
+
+        for sub_ids in grouped_slice(id2rule_group.keys()):
+            sub_ids = list(sub_ids)
+            red_sql = reduce_ids(rule_group_user.rule_group, sub_ids)
+            cursor.execute(*rule_group_user.select(
+                    rule_group_user.rule_group, rule_group_user.user,
+                    where=red_sql))
+            for rule_group_id, user_id in cursor.fetchall():
+                id2rule_group[rule_group_id]['users'].add(user_id)
+
+            red_sql = reduce_ids(rule_group_group.rule_group, sub_ids)
+            cursor.execute(*rule_group_group.select(
+                    rule_group_group.rule_group, rule_group_group.group,
+                    where=red_sql))
+            for rule_group_id, group_id in cursor.fetchall():
+                id2rule_group[rule_group_id]['groups'].add(group_id)
+
+            red_sql = reduce_ids(rule_table.rule_group, sub_ids)
+            cursor.execute(*rule_table.select(
+                    rule_table.rule_group, rule_table.domain,
+                    where=red_sql, order_by=rule_table.id))
+            for rule_group_id, domain in cursor.fetchall():
+                assert domain, ('Rule domain empty,'
+                    'check if migration was done')
+                id2rule_group[rule_group_id]['rules'].append(domain)
+
+        cls._domain_get_cache.set(key, rule_groups)
+        return rule_groups
+
+    @staticmethod
+    def _domain_get_clause(clause, clause_global):
         clause = clause.values()
         if clause:
             clause.insert(0, 'OR')
@@ -259,8 +329,6 @@ class Rule(ModelSQL, ModelView):
             clause = ['AND', clause_global, clause]
         elif clause_global:
             clause = clause_global
-
-        cls._domain_get_cache.set(key, clause)
         return clause
 
     @classmethod
@@ -345,15 +345,54 @@ class Sequence(ModelSQL, ModelView):
                 return hex(timestamp)[2:].upper()
         return ''
 
+    @classmethod
+    def _get_sequences(cls, sequence, count):
+        '''
+        Return count values of the sequence
+        The incremental values are reserved as one block.
+        '''
+        if sequence.type == 'incremental':
+            if sql_sequence and not cls._strict:
+                cursor = Transaction().cursor
+                cursor.execute('SELECT nextval(\'"%s"\') '
+                    'FROM generate_series(1, %%s)'
+                    % sequence._sql_sequence_name, (count,))
+                numbers = [n for n, in cursor.fetchall()]
+            else:
+                # Pre-fetch number_next
+                number_next = sequence.number_next_internal
+                increment = sequence.number_increment
+                cls.write([sequence], {
+                        'number_next_internal': (number_next
+                            + count * increment),
+                        })
+                numbers = xrange(number_next, number_next + count * increment,
+                    increment)
+            return ['%%0%sd' % sequence.padding % n for n in numbers]
+        values = []
+        for _ in xrange(count):
+            # Instantiate again to get the last timestamp written
+            values.append(cls._get_sequence(cls(sequence.id)))
+        return values
+
     @classmethod
     def get_id(cls, domain):
         '''
         Return sequence value for the domain
         '''
+        return cls.get_ids(domain, 1)[0]
+
+    @classmethod
+    def get_ids(cls, domain, count):
+        '''
+        Return count sequence values for the domain
+        '''
         if isinstance(domain, cls):
             domain = domain.id
         if isinstance(domain, (int, long)):
             domain = [('id', '=', domain)]
+        if not count:
+            return []
 
         # bypass rules on sequences
         with Transaction().set_context(user=False, _check_access=False):
@@ -363,11 +402,10 @@ class Sequence(ModelSQL, ModelView):
                 except TypeError:
                     cls.raise_user_error('missing')
                 date = Transaction().context.get('date')
-                return '%s%s%s' % (
-                    cls._process(sequence.prefix, date=date),
-                    cls._get_sequence(sequence),
-                    cls._process(sequence.suffix, date=date),
-                    )
+                prefix = cls._process(sequence.prefix, date=date)
+                suffix = cls._process(sequence.suffix, date=date)
+                return ['%s%s%s' % (prefix, value, suffix)
+                    for value in cls._get_sequences(sequence, count)]
 
     @classmethod
     def get(cls, code):
@@ -381,6 +419,6 @@ class SequenceStrict(Sequence):
     _strict = True
 
     @classmethod
-    def get_id(cls, clause):
+    def get_ids(cls, clause, count):
         Transaction().cursor.lock(cls._table)
-        return super(SequenceStrict, cls).get_id(clause)
+        return super(SequenceStrict, cls).get_ids(clause, count)
@@ -6,7 +6,7 @@ from sql import Literal, Null
 from sql.aggregate import Count, Max
 
 from ..model import ModelView, ModelSQL, fields, EvalEnvironment, Check
-from ..pyson import Eval, PYSONDecoder
+from ..pyson import Eval, PYSONDecoder, compile_pyson
 from ..tools import grouped_slice
 from .. import backend
 from ..tools import reduce_ids
@@ -42,6 +42,10 @@ class Trigger(ModelSQL, ModelView):
     condition = fields.Char('Condition', required=True,
         help='A PYSON statement evaluated with record represented by '
         '"self"\nIt triggers the action if true.')
+    domain = fields.Char('Domain',
+        help='A PYSON domain selecting the records with the condition.\n'
+        'It is evaluated by the database so it is faster than the '
+        'condition.')
     limit_number = fields.Integer('Limit Number', required=True,
         help='Limit the number of call to "Action Function" by records.\n'
         '0 for no limit.')
@@ -68,6 +72,8 @@ class Trigger(ModelSQL, ModelView):
         cls._error_messages.update({
                 'invalid_condition': ('Condition "%(condition)s" is not a '
                     'valid PYSON expression on trigger "%(trigger)s".'),
+                'invalid_domain': ('Domain "%(domain)s" is not a '
+                    'valid PYSON domain on trigger "%(trigger)s".'),
                 })
         cls._order.insert(0, ('name', 'ASC'))
 
@@ -98,6 +104,7 @@ class Trigger(ModelSQL, ModelView):
     def validate(cls, triggers):
         super(Trigger, cls).validate(triggers)
         cls.check_condition(triggers)
+        cls.check_domain(triggers)
 
     @classmethod
     def check_condition(cls, triggers):
@@ -113,6 +120,24 @@ class Trigger(ModelSQL, ModelView):
                         'trigger': trigger.rec_name,
                         })
 
+    @classmethod
+    def check_domain(cls, triggers):
+        '''
+        Check domain
+        '''
+        for trigger in triggers:
+            if not trigger.domain:
+                continue
+            try:
+                domain = PYSONDecoder(noeval=True).decode(trigger.domain)
+            except Exception:
+                domain = None
+            if not isinstance(domain, list):
+                cls.raise_user_error('invalid_domain', {
+                        'domain': trigger.domain,
+                        'trigger': trigger.rec_name,
+                        })
+
     @staticmethod
     def default_active():
         return True
@@ -176,7 +201,50 @@ class Trigger(ModelSQL, ModelView):
         env['time'] = time
         env['context'] = Transaction().context
         env['self'] = EvalEnvironment(record, record.__class__)
-        return bool(PYSONDecoder(env).decode(trigger.condition))
+        return bool(compile_pyson(trigger.condition)(env))
+
+    @staticmethod
+    def eval_domain(trigger):
+        '''
+        Return the domain of trigger
+        '''
+        if not trigger.domain:
+            return []
+        env = {}
+        env['current_date'] = datetime.datetime.today()
+        env['time'] = time
+        env['context'] = Transaction().context
+        return compile_pyson(trigger.domain)(env)
+
+    @classmethod
+    def filter(cls, trigger, records):
+        '''
+        Return the records matching the domain and the condition of trigger
+        The condition is evaluated per record only if it is not always true.
+        '''
+        pool = Pool()
+        Model = pool.get(trigger.model.model)
+
+        domain = cls.eval_domain(trigger)
+        if records and domain:
+            ids = set()
+            # Use root to not filter the records with the rules of the user
+            with Transaction().set_user(0), \
+                    Transaction().set_context(active_test=False, user=0):
+                for sub_records in grouped_slice(records):
+                    ids.update(map(int, Model.search([
+                                    ('id', 'in', map(int, sub_records)),
+                                    domain,
+                                    ], order=[])))
+            records = [r for r in records if r.id in ids]
+        if not cls._condition_true(trigger):
+            records = [r for r in records if cls.eval(trigger, r)]
+        return records
+
+    @staticmethod
+    def _condition_true(trigger):
+        'Test if the condition of trigger is always true'
+        return PYSONDecoder(noeval=True).decode(trigger.condition) is True
 
     @classmethod
     def trigger_action(cls, records, trigger):
@@ -267,12 +335,9 @@ class Trigger(ModelSQL, ModelView):
                 ])
         for trigger in triggers:
             Model = pool.get(trigger.model.model)
-            triggered = []
-            # TODO add a domain
-            records = Model.search([])
-            for record in records:
-                if cls.eval(trigger, record):
-                    triggered.append(record)
+            triggered = Model.search(cls.eval_domain(trigger))
+            if not cls._condition_true(trigger):
+                triggered = [r for r in triggered if cls.eval(trigger, r)]
             if triggered:
                 cls.trigger_action(triggered, trigger)
 
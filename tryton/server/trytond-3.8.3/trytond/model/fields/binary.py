@@ -1,5 +1,7 @@
 # This file is part of Tryton.  The COPYRIGHT file at the top level of
 # this repository contains the full copyright notices and license terms.
+import hashlib
+
 from sql import Query, Expression
 
 from .field import Field, SQLType
@@ -17,7 +19,8 @@ class Binary(Field):
     def __init__(self, string='', help='', required=False, readonly=False,
             domain=None, states=None, select=False, on_change=None,
             on_change_with=None, depends=None, filename=None, context=None,
-            loading='lazy'):
+            loading='lazy', file_id=None):
+        self.file_id = file_id
         if filename is not None:
             self.filename = filename
             if depends is None:
@@ -50,6 +53,8 @@ class Binary(Field):
         if format_ == 'size':
             converter = len
             default = 0
+        elif format_ == 'reference':
+            converter = cls.reference
         for i in values:
             value = i[name]
             if value:
@@ -63,6 +68,17 @@ class Binary(Field):
             res.setdefault(i, default)
         return res
 
+    @staticmethod
+    def reference(value):
+        '''
+        Return the reference of the value: a dictionary with its size and
+        its SHA-256 digest
+        '''
+        return {
+            'size': len(value),
+            'digest': hashlib.sha256(value).hexdigest(),
+            }
+
     @staticmethod
     def sql_format(value):
         if isinstance(value, (Query, Expression)):
@@ -1,8 +1,24 @@
 # This file is part of Tryton.  The COPYRIGHT file at the toplevel of this
 # repository contains the full copyright notices and license terms.
+import heapq
+
+from trytond.cache import Cache, freeze
+from trytond.transaction import Transaction
+
+__all__ = ['MatchMixin', 'MatchIndex']
+
+# The field types which are indexed by the equality of their value
+_INDEX_TYPES = set(['many2one', 'selection', 'boolean', 'char', 'integer'])
 
 
 class MatchMixin(object):
+    '''
+    Mixin to find the first record matching a pattern.
+
+    The models which override match must also override match_values to keep
+    the same semantic for find_match.
+    '''
+    _match_index_cache = Cache('model.match_index', context=False)
 
     def match(self, pattern):
         '''Match on pattern
@@ -17,3 +33,115 @@ class MatchMixin(object):
             if value != pattern_value:
                 return False
         return True
+
+    @classmethod
+    def match_values(cls, values, pattern):
+        '''Match the values read of a record on pattern
+        It is the same as match for the values returned by read'''
+        for field, pattern_value in pattern.iteritems():
+            value = values[field]
+            if value is None:
+                continue
+            if value != pattern_value:
+                return False
+        return True
+
+    @classmethod
+    def match_index_names(cls, names):
+        'Return the names of the pattern on which the records are indexed'
+        return [n for n in names
+            if n in cls._fields and cls._fields[n]._type in _INDEX_TYPES]
+
+    @classmethod
+    def get_match_index(cls, domain, names, fields_names=None):
+        '''
+        Return the MatchIndex of the records of domain for the pattern names.
+        fields_names are the extra fields to read.
+        '''
+        fields_names = sorted(set(names) | set(fields_names or []))
+        key = (cls.__name__, Transaction().user, freeze(domain),
+            tuple(sorted(names)), tuple(fields_names))
+        index = cls._match_index_cache.get(key)
+        if index is None:
+            index = MatchIndex(
+                cls.search_read(domain, fields_names=fields_names),
+                cls.match_index_names(names))
+            cls._match_index_cache.set(key, index)
+        return index
+
+    @classmethod
+    def find_match(cls, domain, pattern, fields_names=None):
+        '''
+        Return the values of the first record of domain matching pattern or
+        None.
+        fields_names are the extra fields to read.
+        '''
+        index = cls.get_match_index(domain, pattern.keys(),
+            fields_names=fields_names)
+        return index.find(pattern, cls.match_values)
+
+    @classmethod
+    def clear_match_index(cls):
+        '''
+        Clear the indexes, must be called when the records change.
+        This includes the deletion of the records they refer to with
+        ondelete SET NULL or CASCADE.
+        '''
+        cls._match_index_cache.clear()
+
+
+class MatchIndex(object):
+    '''
+    Index of rows to find the first one matching a pattern.
+
+    The rows are dictionaries of values kept in their order. They are
+    arranged in a tree keyed on the values of names where None is a wildcard,
+    so only the rows with the values of the pattern or None are tested.
+    '''
+
+    def __init__(self, rows, names):
+        self.rows = rows
+        self.names = list(names)
+        self._tree = []
+        if self.names:
+            self._tree = {}
+        for position, row in enumerate(rows):
+            node = self._tree
+            for i, name in enumerate(self.names, 1):
+                if i < len(self.names):
+                    node = node.setdefault(row[name], {})
+                else:
+                    node = node.setdefault(row[name], [])
+            node.append(position)
+
+    def _leaves(self, node, values):
+        if not values:
+            yield node
+            return
+        value = values[0]
+        keys = [value, None] if value is not None else [None]
+        for key in keys:
+            child = node.get(key)
+            if child is not None:
+                for leaf in self._leaves(child, values[1:]):
+                    yield leaf
+
+    def candidates(self, pattern):
+        'Return the positions of the rows which may match pattern in order'
+        values = [pattern[n] for n in self.names]
+        try:
+            leaves = list(self._leaves(self._tree, values))
+        except TypeError:
+            # Unhashable value
+            return xrange(len(self.rows))
+        return heapq.merge(*leaves)
+
+    def find(self, pattern, match):
+        '''
+        Return the first row matching pattern or None.
+        match is the function testing a row against the pattern.
+        '''
+        for position in self.candidates(pattern):
+            row = self.rows[position]
+            if match(row, pattern):
+                return row
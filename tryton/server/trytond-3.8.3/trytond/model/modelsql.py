@@ -4,8 +4,8 @@ import datetime
 from itertools import islice, izip, chain, ifilter
 from collections import OrderedDict
 
-from sql import Table, Column, Literal, Desc, Asc, Expression, Null
-from sql.functions import CurrentTimestamp, Extract
+from sql import Table, Column, Literal, Desc, Asc, Expression, Null, Window
+from sql.functions import CurrentTimestamp, Extract, RowNumber
 from sql.conditionals import Coalesce
 from sql.operators import Or, And, Operator
 from sql.aggregate import Count, Max
@@ -17,7 +17,7 @@ from trytond.tools import reduce_ids, grouped_slice
 from trytond.const import OPERATORS
 from trytond.transaction import Transaction
 from trytond.pool import Pool
-from trytond.cache import LRUDict
+from trytond.cache import LRUDict, freeze
 from trytond.exceptions import ConcurrencyException
 from trytond.rpc import RPC
 from trytond.config import config
@@ -212,6 +212,11 @@ class ModelSQL(ModelStorage):
 
         if cls._history:
             cls._update_history_table()
+            # Index to find the last revision of the records
+            history_table = TableHandler(Transaction().cursor, cls,
+                module_name, history=True)
+            history_table.index_action(['id', 'write_date', 'create_date'],
+                action='add')
             cursor = Transaction().cursor
             table = cls.__table__()
             history_table = cls.__table_history__()
@@ -366,6 +371,34 @@ class ModelSQL(ModelStorage):
                         cursor.execute(*history.insert(hcolumns,
                                 [[id_, CurrentTimestamp(), user]]))
 
+    @classmethod
+    def _history_last_clause(cls, table, ids, datetime, _before=False):
+        '''
+        Return the clause on the history table selecting for each of the ids
+        the last revision at (or before) the date time.
+        '''
+        cursor = Transaction().cursor
+        history = cls.__table_history__()
+        column_datetime = Coalesce(history.write_date, history.create_date)
+        if not _before:
+            hwhere = (column_datetime <= datetime)
+        else:
+            hwhere = (column_datetime < datetime)
+        horder = [column_datetime.desc, Column(history, '__id').desc]
+        if cursor.has_window_functions():
+            window = Window([history.id], order_by=horder)
+            revisions = history.select(Column(history, '__id').as_('__id'),
+                RowNumber(window=window).as_('rank'),
+                where=hwhere & reduce_ids(history.id, ids))
+            return Column(table, '__id').in_(revisions.select(
+                    Column(revisions, '__id'),
+                    where=Column(revisions, 'rank') == 1))
+        else:
+            return Column(table, '__id') == history.select(
+                Column(history, '__id'),
+                where=hwhere & (history.id == table.id),
+                order_by=horder, limit=1)
+
     @classmethod
     def _restore_history(cls, ids, datetime, _before=False):
         if not cls._history:
@@ -391,19 +424,20 @@ class ModelSQL(ModelStorage):
             return all(not v for n, v in zip(fnames, values)
                 if n not in ['id', 'write_uid', 'write_date'])
 
+        id_index = fnames.index('id')
+        id2values = {}
+        for sub_ids in grouped_slice(ids):
+            sub_ids = list(sub_ids)
+            hwhere = reduce_ids(history.id, sub_ids)
+            hwhere &= cls._history_last_clause(history, sub_ids, datetime,
+                _before=_before)
+            cursor.execute(*history.select(*hcolumns, where=hwhere))
+            id2values.update((v[id_index], v) for v in cursor.fetchall())
+
         to_delete = []
         to_update = []
         for id_ in ids:
-            column_datetime = Coalesce(history.write_date, history.create_date)
-            if not _before:
-                hwhere = (column_datetime <= datetime)
-            else:
-                hwhere = (column_datetime < datetime)
-            hwhere &= (history.id == id_)
-            horder = (column_datetime.desc, Column(history, '__id').desc)
-            cursor.execute(*history.select(*hcolumns,
-                    where=hwhere, order_by=horder, limit=1))
-            values = cursor.fetchone()
+            values = id2values.get(id_)
             if not values or is_deleted(values):
                 to_delete.append(id_)
             else:
@@ -470,7 +504,6 @@ class ModelSQL(ModelStorage):
         cursor = transaction.cursor
         pool = Pool()
         Translation = pool.get('ir.translation')
-        Rule = pool.get('ir.rule')
 
         super(ModelSQL, cls).create(vlist)
 
@@ -534,17 +567,14 @@ class ModelSQL(ModelStorage):
                     cls.__raise_integrity_error(exception, values)
                 raise
 
-        domain = Rule.domain_get(cls.__name__, mode='create')
-        if domain:
-            tables = {None: (table, None)}
-            tables, expression = cls.search_domain(
-                domain, active_test=False, tables=tables)
-            from_ = convert_from(None, tables)
+        rule_query = cls._get_rule_query('create')
+        if rule_query:
+            rule_table, from_, expression = rule_query
             for sub_ids in grouped_slice(new_ids):
                 sub_ids = list(sub_ids)
-                red_sql = reduce_ids(table.id, sub_ids)
+                red_sql = reduce_ids(rule_table.id, sub_ids)
 
-                cursor.execute(*from_.select(table.id,
+                cursor.execute(*from_.select(rule_table.id,
                         where=red_sql & expression))
                 if len(cursor.fetchall()) != len(sub_ids):
                     cls.raise_user_error('access_error', cls.__name__)
@@ -589,7 +619,6 @@ class ModelSQL(ModelStorage):
     @classmethod
     def read(cls, ids, fields_names=None):
         pool = Pool()
-        Rule = pool.get('ir.rule')
         Translation = pool.get('ir.translation')
         ModelAccess = pool.get('ir.model.access')
         if not fields_names:
@@ -604,9 +633,6 @@ class ModelSQL(ModelStorage):
         if not ids:
             return []
 
-        # construct a clause for the rules :
-        domain = Rule.domain_get(cls.__name__, mode='read')
-
         fields_related = {}
         datetime_fields = []
         for field_name in fields_names:
@@ -625,19 +651,17 @@ class ModelSQL(ModelStorage):
         table = cls.__table__()
         table_query = cls.table_query()
 
-        in_max = cursor.IN_MAX
-        history_order = None
-        history_clause = None
-        history_limit = None
+        history = False
         if (cls._history
                 and Transaction().context.get('_datetime')
                 and not table_query):
-            in_max = 1
+            history = True
             table = cls.__table_history__()
-            column = Coalesce(table.write_date, table.create_date)
-            history_clause = (column <= Transaction().context['_datetime'])
-            history_order = (column.desc, Column(table, '__id').desc)
-            history_limit = 1
+
+        # construct a clause for the rules :
+        rule_query = cls._get_rule_query('read', history=history)
+        if rule_query:
+            table, from_, dom_exp = rule_query
 
         columns = []
         for f in fields_names + fields_related.keys() + datetime_fields:
@@ -654,30 +678,23 @@ class ModelSQL(ModelStorage):
             if 'id' not in fields_names:
                 columns.append(table.id.as_('id'))
 
-            tables = {None: (table, None)}
-            if domain:
-                tables, dom_exp = cls.search_domain(
-                    domain, active_test=False, tables=tables)
-            from_ = convert_from(None, tables)
-            for sub_ids in grouped_slice(ids, in_max):
+            if not rule_query:
+                from_ = table
+            for sub_ids in grouped_slice(ids):
                 sub_ids = list(sub_ids)
                 red_sql = reduce_ids(table.id, sub_ids)
+                if history:
+                    red_sql &= cls._history_last_clause(table, sub_ids,
+                        Transaction().context['_datetime'])
                 where = red_sql
-                if history_clause:
-                    where &= history_clause
-                if domain:
+                if rule_query:
                     where &= dom_exp
-                cursor.execute(*from_.select(*columns, where=where,
-                        order_by=history_order, limit=history_limit))
+                cursor.execute(*from_.select(*columns, where=where))
                 dictfetchall = cursor.dictfetchall()
                 if not len(dictfetchall) == len({}.fromkeys(sub_ids)):
-                    if domain:
-                        where = red_sql
-                        if history_clause:
-                            where &= history_clause
-                        where &= dom_exp
-                        cursor.execute(*from_.select(table.id, where=where,
-                                order_by=history_order, limit=history_limit))
+                    if rule_query:
+                        where = red_sql & dom_exp
+                        cursor.execute(*from_.select(table.id, where=where))
                         rowcount = cursor.rowcount
                         if rowcount == -1 or rowcount is None:
                             rowcount = len(cursor.fetchall())
@@ -830,7 +847,6 @@ class ModelSQL(ModelStorage):
         pool = Pool()
         Translation = pool.get('ir.translation')
         Config = pool.get('ir.configuration')
-        Rule = pool.get('ir.rule')
 
         assert not len(args) % 2
         # Remove possible duplicates from all records
@@ -874,24 +890,22 @@ class ModelSQL(ModelStorage):
                         columns.append(Column(table, fname))
                         update_values.append(field.sql_format(value))
 
-            domain = Rule.domain_get(cls.__name__, mode='write')
-            tables = {None: (table, None)}
-            if domain:
-                tables, dom_exp = cls.search_domain(
-                    domain, active_test=False, tables=tables)
-            from_ = convert_from(None, tables)
+            rule_query = cls._get_rule_query('write')
             for sub_ids in grouped_slice(ids):
                 sub_ids = list(sub_ids)
                 red_sql = reduce_ids(table.id, sub_ids)
-                where = red_sql
-                if domain:
-                    where &= dom_exp
-                cursor.execute(*from_.select(table.id, where=where))
+                if rule_query:
+                    rule_table, from_, dom_exp = rule_query
+                    cursor.execute(*from_.select(rule_table.id,
+                            where=reduce_ids(rule_table.id, sub_ids)
+                            & dom_exp))
+                else:
+                    cursor.execute(*table.select(table.id, where=red_sql))
                 rowcount = cursor.rowcount
                 if rowcount == -1 or rowcount is None:
                     rowcount = len(cursor.fetchall())
                 if not rowcount == len({}.fromkeys(sub_ids)):
-                    if domain:
+                    if rule_query:
                         cursor.execute(*table.select(table.id, where=red_sql))
                         rowcount = cursor.rowcount
                         if rowcount == -1 or rowcount is None:
@@ -939,7 +953,6 @@ class ModelSQL(ModelStorage):
         cursor = transaction.cursor
         pool = Pool()
         Translation = pool.get('ir.translation')
-        Rule = pool.get('ir.rule')
         ids = map(int, records)
 
         if not ids:
@@ -991,17 +1004,13 @@ class ModelSQL(ModelStorage):
 
         transaction.delete.setdefault(cls.__name__, set()).update(ids)
 
-        domain = Rule.domain_get(cls.__name__, mode='delete')
-
-        if domain:
-            tables = {None: (table, None)}
-            tables, dom_exp = cls.search_domain(
-                domain, active_test=False, tables=tables)
-            from_ = convert_from(None, tables)
+        rule_query = cls._get_rule_query('delete')
+        if rule_query:
+            rule_table, from_, dom_exp = rule_query
             for sub_ids in grouped_slice(ids):
                 sub_ids = list(sub_ids)
-                red_sql = reduce_ids(table.id, sub_ids)
-                cursor.execute(*from_.select(table.id,
+                red_sql = reduce_ids(rule_table.id, sub_ids)
+                cursor.execute(*from_.select(rule_table.id,
                         where=red_sql & dom_exp))
                 rowcount = cursor.rowcount
                 if rowcount == -1 or rowcount is None:
@@ -1267,6 +1276,42 @@ class ModelSQL(ModelStorage):
                 <= transaction.context['_datetime'])
         return tables, expression
 
+    @classmethod
+    def _get_rule_query(cls, mode, history=False):
+        '''
+        Return the table, the from and the expression of the rule domain for
+        the mode or None if there is no rule.
+        The SQL is memoized in the transaction for the context until a record
+        is modified.
+        '''
+        pool = Pool()
+        Rule = pool.get('ir.rule')
+        transaction = Transaction()
+        domain = Rule.domain_get(cls.__name__, mode=mode)
+        if not domain:
+            return
+        # The context may change the table of table_query and the searchers
+        key = (cls.__name__, mode, history, freeze(transaction.context))
+        try:
+            cached = transaction.rule_queries.get(key)
+        except TypeError:
+            key, cached = None, None
+        # The domain is the same object as long as it is cached
+        if (cached and cached[0] is domain
+                and cached[1] == transaction.counter):
+            return cached[2]
+        if history:
+            table = cls.__table_history__()
+        else:
+            table = cls.__table__()
+        tables, expression = cls.search_domain(
+            domain, active_test=False, tables={None: (table, None)})
+        rule_query = table, convert_from(None, tables), expression
+        if key is not None:
+            transaction.rule_queries[key] = (
+                domain, transaction.counter, rule_query)
+        return rule_query
+
     @classmethod
     def _update_mptt(cls, field_names, list_ids, values=None):
         cursor = Transaction().cursor
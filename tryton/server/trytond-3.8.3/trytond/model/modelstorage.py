@@ -20,7 +20,7 @@ from trytond.model import Model
 from trytond.model import fields
 from trytond.tools import reduce_domain, memoize, is_instance_method, \
     grouped_slice
-from trytond.pyson import PYSONEncoder, PYSONDecoder, PYSON
+from trytond.pyson import PYSONEncoder, PYSON, compile_pyson
 from trytond.const import OPERATORS
 from trytond.config import config
 from trytond.transaction import Transaction
@@ -34,6 +34,11 @@ from .descriptors import dualmethod
 __all__ = ['ModelStorage', 'EvalEnvironment']
 
 
+# The field types which can be used for keyset pagination
+_KEYSET_TYPES = set(['char', 'text', 'integer', 'biginteger', 'numeric',
+        'date', 'datetime', 'timestamp', 'time'])
+
+
 def cache_size():
     return Transaction().context.get('_record_cache_size',
         config.getint('cache', 'record'))
@@ -67,6 +72,7 @@ class ModelStorage(Model):
                     'search': RPC(result=lambda r: map(int, r)),
                     'search_count': RPC(),
                     'search_read': RPC(),
+                    'search_page': RPC(),
                     'export_data': RPC(instantiate=0),
                     'import_data': RPC(readonly=False),
                     })
@@ -109,12 +115,9 @@ class ModelStorage(Model):
         if not triggers:
             return
         for trigger in triggers:
-            triggers = []
-            for record in records:
-                if Trigger.eval(trigger, record):
-                    triggers.append(record)
-            if triggers:
-                Trigger.trigger_action(triggers, trigger)
+            triggered = Trigger.filter(trigger, records)
+            if triggered:
+                Trigger.trigger_action(triggered, trigger)
 
     @classmethod
     def read(cls, ids, fields_names=None):
@@ -188,10 +191,8 @@ class ModelStorage(Model):
             return {}
         eligibles = {}
         for trigger in triggers:
-            eligibles[trigger] = []
-            for record in records:
-                if not Trigger.eval(trigger, record):
-                    eligibles[trigger].append(record)
+            matching = set(map(int, Trigger.filter(trigger, records)))
+            eligibles[trigger] = [r for r in records if r.id not in matching]
         return eligibles
 
     @classmethod
@@ -202,10 +203,7 @@ class ModelStorage(Model):
         '''
         Trigger = Pool().get('ir.trigger')
         for trigger, records in eligibles.iteritems():
-            triggered = []
-            for record in records:
-                if Trigger.eval(trigger, record):
-                    triggered.append(record)
+            triggered = Trigger.filter(trigger, records)
             if triggered:
                 Trigger.trigger_action(triggered, trigger)
 
@@ -242,10 +240,7 @@ class ModelStorage(Model):
         if not triggers:
             return
         for trigger in triggers:
-            triggered = []
-            for record in records:
-                if Trigger.eval(trigger, record):
-                    triggered.append(record)
+            triggered = Trigger.filter(trigger, records)
             if triggered:
                 Trigger.trigger_action(triggered, trigger)
 
@@ -382,6 +377,143 @@ class ModelStorage(Model):
         rows.sort(key=lambda r: index[r['id']])
         return rows
 
+    @classmethod
+    def search_page(cls, domain, offset=0, limit=None, order=None,
+            token=None, fields_names=None, count=False):
+        '''
+        Return a page of the records that match the domain as a dictionary
+        with the keys:
+            - ids: the list of ids of the page
+            - records: the values read of fields_names if any
+            - count: the number of records matching the domain if count
+              (computed without query when the page is the last one)
+            - next, previous: the token to pass to get the next or the
+              previous page or None if there is none
+        The token seeks the records after or before the boundary values of
+        the order which is completed by id. The offset is used instead if
+        the order is not on stored columns or when no token is given.
+        '''
+        if order is None or order is False:
+            order = getattr(cls, '_order', None) or []
+        order = [(o, t.upper()) for o, t in order]
+        if 'id' not in [o for o, _ in order]:
+            order.append(('id', 'ASC'))
+        keyset = all(cls._keyset_field(o) for o, _ in order)
+        limit = limit or None
+
+        direction = 'next'
+        search_domain = domain
+        if token and 'offset' in token:
+            offset = token['offset']
+        elif token:
+            direction = token['direction']
+            values = token['values']
+            if not keyset or len(values) != len(order):
+                cls.raise_user_error('Invalid page token')
+            search_domain = [domain, cls._keyset_domain(order, values,
+                    direction)]
+            offset = 0
+        search_order = order
+        if direction == 'previous':
+            search_order = [(o, 'DESC' if t == 'ASC' else 'ASC')
+                for o, t in order]
+
+        records = cls.search(search_domain, offset=offset,
+            limit=limit + 1 if limit else None, order=search_order)
+        more = bool(limit) and len(records) > limit
+        records = records[:limit]
+        if direction == 'previous':
+            records.reverse()
+        ids = map(int, records)
+
+        if count and direction == 'next' and search_domain is domain and (
+                not more and (ids or not offset)):
+            # The last page gives the count without a query
+            count = offset + len(ids)
+        elif count:
+            count = cls.search_count(domain)
+        else:
+            count = None
+
+        result = {
+            'ids': ids,
+            'records': [],
+            'count': count,
+            'next': None,
+            'previous': None,
+            }
+        if fields_names:
+            rows = cls.read(ids, fields_names)
+            index = {i: p for p, i in enumerate(ids)}
+            rows.sort(key=lambda r: index[r['id']])
+            result['records'] = rows
+
+        if direction == 'next':
+            has_next = more
+            has_previous = bool(offset
+                or (token and 'offset' not in token))
+        else:
+            has_next, has_previous = True, more
+        if not ids:
+            return result
+        if not keyset:
+            if has_next:
+                result['next'] = {'offset': offset + limit}
+            if has_previous:
+                result['previous'] = {
+                    'offset': max(offset - (limit or offset), 0),
+                    }
+            return result
+        names = [o for o, _ in order]
+        rows = dict((r['id'], r)
+            for r in cls.read(list(set([ids[0], ids[-1]])), names))
+        if has_next:
+            result['next'] = {
+                'direction': 'next',
+                'values': [rows[ids[-1]][n] for n in names],
+                }
+        if has_previous:
+            result['previous'] = {
+                'direction': 'previous',
+                'values': [rows[ids[0]][n] for n in names],
+                }
+        return result
+
+    @classmethod
+    def _keyset_field(cls, name):
+        "Test if the records can be seeked on the values of the field name"
+        if name == 'id':
+            return True
+        field = cls._fields.get(name)
+        return (field is not None
+            and field._type in _KEYSET_TYPES
+            and not getattr(field, 'translate', False)
+            and not isinstance(field, fields.Function)
+            and not getattr(cls, 'order_%s' % name, None))
+
+    @staticmethod
+    def _keyset_domain(order, values, direction):
+        "Return the domain of the records after or before the values"
+        # PostgreSQL sorts NULL as the largest value, the others as the
+        # smallest
+        nulls_largest = backend.name() == 'postgresql'
+        domain = ['OR']
+        for i, (name, otype) in enumerate(order):
+            value = values[i]
+            greater = (otype == 'ASC') == (direction == 'next')
+            if value is None:
+                if greater == nulls_largest:
+                    continue
+                clause = [(name, '!=', None)]
+            elif greater == nulls_largest:
+                clause = ['OR', (name, '>' if greater else '<', value),
+                    (name, '=', None)]
+            else:
+                clause = [(name, '>' if greater else '<', value)]
+            domain.append([(n, '=', v) for (n, _), v in zip(order[:i], values)]
+                + [clause])
+        return domain
+
     @classmethod
     def _search_domain_active(cls, domain, active_test=True):
         # reduce_domain return a new instance so we can safety modify domain
@@ -488,7 +620,7 @@ class ModelStorage(Model):
                     env['time'] = time
                     env['context'] = Transaction().context
                     env['active_id'] = value.id
-                    invisible = PYSONDecoder(env).decode(pyson_invisible)
+                    invisible = compile_pyson(pyson_invisible)(env)
                     if invisible:
                         value = ''
                         break
@@ -930,7 +1062,7 @@ class ModelStorage(Model):
                     env['time'] = time
                     env['context'] = Transaction().context
                     env['active_id'] = record.id
-                    domain = freeze(PYSONDecoder(env).decode(pyson_domain))
+                    domain = freeze(compile_pyson(pyson_domain)(env))
                     domains[domain].append(record)
             else:
                 domains[freeze(field.domain)].extend(records)
@@ -997,7 +1129,7 @@ class ModelStorage(Model):
                             env['time'] = time
                             env['context'] = Transaction().context
                             env['active_id'] = record.id
-                            required = PYSONDecoder(env).decode(pyson_required)
+                            required = compile_pyson(pyson_required)(env)
                             if required:
                                 required_test(getattr(record, field_name),
                                     field_name)
@@ -1021,7 +1153,7 @@ class ModelStorage(Model):
                             env['time'] = time
                             env['context'] = Transaction().context
                             env['active_id'] = record.id
-                            field_size = PYSONDecoder(env).decode(pyson_size)
+                            field_size = compile_pyson(pyson_size)(env)
                         else:
                             field_size = field.size
                         size = len(getattr(record, field_name) or '')
@@ -1058,7 +1190,7 @@ class ModelStorage(Model):
                             env['time'] = time
                             env['context'] = Transaction().context
                             env['active_id'] = record.id
-                            digits = PYSONDecoder(env).decode(pyson_digits)
+                            digits = compile_pyson(pyson_digits)(env)
                             digits_test(getattr(record, field_name), digits,
                                 field_name)
                     else:
@@ -1110,7 +1242,7 @@ class ModelStorage(Model):
                 if (field._type in ('datetime', 'time')
                         and field_name not in ('create_date', 'write_date')):
                     if is_pyson(field.format):
-                        pyson_format = PYSONDecoder().encode(field.format)
+                        pyson_format = PYSONEncoder().encode(field.format)
                         for record in records:
                             env = EvalEnvironment(record, cls)
                             env.update(Transaction().context)
@@ -1118,7 +1250,7 @@ class ModelStorage(Model):
                             env['time'] = time
                             env['context'] = Transaction().context
                             env['active_id'] = record.id
-                            format = PYSONDecoder(env).decode(pyson_format)
+                            format = compile_pyson(pyson_format)(env)
                             format_test(getattr(record, field_name), format,
                                 field_name)
                     else:
@@ -1303,7 +1435,7 @@ class ModelStorage(Model):
             ctx = {}
             if field.context:
                 pyson_context = PYSONEncoder().encode(field.context)
-                ctx.update(PYSONDecoder(data).decode(pyson_context))
+                ctx.update(compile_pyson(pyson_context)(data))
             datetime_ = None
             if getattr(field, 'datetime_field', None):
                 datetime_ = data.get(field.datetime_field)
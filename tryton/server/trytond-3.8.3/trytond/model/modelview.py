@@ -7,7 +7,7 @@ import collections
 
 from trytond.model import Model, fields
 from trytond.tools import ClassProperty, is_instance_method
-from trytond.pyson import PYSONDecoder, PYSONEncoder
+from trytond.pyson import PYSONEncoder, compile_pyson
 from trytond.transaction import Transaction
 from trytond.cache import Cache
 from trytond.pool import Pool
@@ -296,8 +296,8 @@ class ModelView(Model):
                     raise_p = True
             for view in views:
                 if view.domain:
-                    if not PYSONDecoder({'context': Transaction().context}
-                            ).decode(view.domain):
+                    if not compile_pyson(view.domain)(
+                            {'context': Transaction().context}):
                         continue
                 if not view.arch or not view.arch.strip():
                     continue
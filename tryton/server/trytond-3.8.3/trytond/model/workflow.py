@@ -32,7 +32,11 @@ class Workflow(object):
 
                 result = func(cls, filtered, *args, **kwargs)
                 if to_update:
-                    for record in to_update.keys():
+                    # Iterate in the order of the records to read them by
+                    # batch
+                    for record in filtered:
+                        if record not in to_update:
+                            continue
                         current_state = getattr(record, cls._transition_state)
                         if current_state != to_update[record]:
                             del to_update[record]
@@ -1901,6 +1901,24 @@ class OpenThirdPartyBalance(Wizard):
         return 'end'
 
 
+def _to_decimal(value):
+    # SQLite uses float for SUM
+    if not isinstance(value, Decimal):
+        return Decimal(str(value))
+    return value
+
+
+def _get_party_names(party_ids):
+    "Return a dictionary of the rec_name of the parties"
+    pool = Pool()
+    Party = pool.get('party.party')
+    names = {}
+    for sub_ids in grouped_slice(party_ids):
+        for party in Party.read(list(sub_ids), ['rec_name']):
+            names[party['id']] = party['rec_name']
+    return names
+
+
 class ThirdPartyBalance(Report):
     __name__ = 'account.third_party_balance'
 
@@ -1910,7 +1928,6 @@ class ThirdPartyBalance(Report):
             data)
 
         pool = Pool()
-        Party = pool.get('party.party')
         MoveLine = pool.get('account.move.line')
         Move = pool.get('account.move')
         Account = pool.get('account.account')
@@ -1946,21 +1963,20 @@ class ThirdPartyBalance(Report):
                 group_by=line.party,
                 having=(Sum(line.debit) != 0) | (Sum(line.credit) != 0)))
 
-        res = cursor.fetchall()
-        id2party = {}
-        for party in Party.browse([x[0] for x in res]):
-            id2party[party.id] = party
-        objects = [{
-            'name': id2party[x[0]].rec_name,
-            'debit': x[1],
-            'credit': x[2],
-            'solde': x[1] - x[2],
-            } for x in res]
-        objects.sort(lambda x, y: cmp(x['name'], y['name']))
-        report_context['total_debit'] = sum((x['debit'] for x in objects))
-        report_context['total_credit'] = sum((x['credit'] for x in objects))
-        report_context['total_solde'] = sum((x['solde'] for x in objects))
-        report_context['records'] = objects
+        res = [(party, _to_decimal(debit), _to_decimal(credit))
+            for party, debit, credit in cursor.fetchall()]
+        names = _get_party_names([x[0] for x in res])
+        res.sort(key=lambda x: names[x[0]])
+        report_context['total_debit'] = sum((x[1] for x in res))
+        report_context['total_credit'] = sum((x[2] for x in res))
+        report_context['total_solde'] = sum((x[1] - x[2] for x in res))
+        # Build the records while rendering
+        report_context['records'] = ({
+                'name': names[x[0]],
+                'debit': x[1],
+                'credit': x[2],
+                'solde': x[1] - x[2],
+                } for x in res)
 
         return report_context
 
@@ -2053,7 +2069,6 @@ class AgedBalance(Report):
         report_context = super(AgedBalance, cls).get_context(records, data)
 
         pool = Pool()
-        Party = pool.get('party.party')
         MoveLine = pool.get('account.move.line')
         Move = pool.get('account.move')
         Account = pool.get('account.account')
@@ -2083,47 +2098,48 @@ class AgedBalance(Report):
             'customer': ('receivable',),
             }[data['balance_type']]
 
-        res = {}
+        today = Date.today()
+        # Sum the balance of each term in one scan
+        columns = []
         for position, term in enumerate(terms):
-            term_query = line.maturity_date <= (Date.today() - term * coef)
+            term_query = line.maturity_date <= (today - term * coef)
             if position != 2:
                 term_query &= line.maturity_date > (
-                    Date.today() - terms[position + 1] * coef)
-
-            cursor.execute(*line.join(move, condition=line.move == move.id
-                    ).join(account, condition=line.account == account.id
-                    ).select(line.party, Sum(line.debit) - Sum(line.credit),
-                    where=(line.party != Null)
-                    & (account.active == True)
-                    & account.kind.in_(kind)
-                    & (line.reconciliation == Null)
-                    & (account.company == data['company'])
-                    & term_query & line_query,
-                    group_by=line.party,
-                    having=(Sum(line.debit) - Sum(line.credit)) != 0))
-            for party, solde in cursor.fetchall():
-                if party in res:
-                    res[party][position] = solde
-                else:
-                    res[party] = [(i[0] == position) and solde
-                        or Decimal("0.0") for i in enumerate(terms)]
-        parties = Party.search([
-            ('id', 'in', [k for k in res.iterkeys()]),
-            ])
+                    today - terms[position + 1] * coef)
+            columns.append(Sum(Case((term_query, line.debit - line.credit),
+                        else_=0)))
+
+        cursor.execute(*line.join(move, condition=line.move == move.id
+                ).join(account, condition=line.account == account.id
+                ).select(line.party, *columns,
+                where=(line.party != Null)
+                & (account.active == True)
+                & account.kind.in_(kind)
+                & (line.reconciliation == Null)
+                & (account.company == data['company'])
+                & (line.maturity_date <= (today - terms[0] * coef))
+                & line_query,
+                group_by=line.party,
+                having=reduce(operator.or_, (c != 0 for c in columns))))
+        res = [(row[0], [_to_decimal(v) for v in row[1:]])
+            for row in cursor.fetchall()]
+        names = _get_party_names([x[0] for x in res])
+        res.sort(key=lambda x: names[x[0]])
 
         report_context['main_title'] = data['balance_type']
         report_context['unit'] = data['unit']
         for i in range(3):
             report_context['total' + str(i)] = sum(
-                (v[i] for v in res.itervalues()))
+                (v[i] for _, v in res), Decimal(0))
             report_context['term' + str(i)] = terms[i]
 
         report_context['company'] = company
-        report_context['parties'] = [{
-                'name': p.rec_name,
-                'amount0': res[p.id][0],
-                'amount1': res[p.id][1],
-                'amount2': res[p.id][2],
-                } for p in parties]
+        # Build the parties while rendering
+        report_context['parties'] = ({
+                'name': names[party],
+                'amount0': amounts[0],
+                'amount1': amounts[1],
+                'amount2': amounts[2],
+                } for party, amounts in res)
 
         return report_context
@@ -2,7 +2,7 @@
 # this repository contains the full copyright notices and license terms.
 from decimal import Decimal
 import datetime
-from itertools import groupby, combinations
+from itertools import groupby
 from operator import itemgetter
 from collections import defaultdict
 
@@ -22,6 +22,8 @@ from trytond.rpc import RPC
 from trytond.tools import reduce_ids, grouped_slice
 from trytond.config import config
 
+from .reconciliation import find_zero_sum_groups
+
 __all__ = ['Move', 'Reconciliation', 'Line', 'OpenJournalAsk',
     'OpenJournal', 'OpenAccount',
     'ReconcileLinesWriteOff', 'ReconcileLines',
@@ -405,35 +407,63 @@ class Move(ModelSQL, ModelView):
         Sequence = pool.get('ir.sequence')
         Date = pool.get('ir.date')
         Line = pool.get('account.move.line')
+        ModelFieldAccess = pool.get('ir.model.field.access')
+        table = cls.__table__()
+        line = Line.__table__()
+        cursor = Transaction().cursor
 
+        amounts = {}
+        for sub_moves in grouped_slice(moves):
+            red_sql = reduce_ids(line.move, [m.id for m in sub_moves])
+            cursor.execute(*line.select(line.move,
+                    Sum(line.debit - line.credit),
+                    where=red_sql,
+                    group_by=line.move))
+            amounts.update(cursor.fetchall())
         for move in moves:
-            amount = Decimal('0.0')
-            if not move.lines:
+            if move.id not in amounts:
                 cls.raise_user_error('post_empty_move', (move.rec_name,))
-            company = None
-            for line in move.lines:
-                amount += line.debit - line.credit
-                if not company:
-                    company = line.account.company
-            if not company.currency.is_zero(amount):
+            amount = amounts[move.id]
+            # SQLite uses float for SUM
+            if not isinstance(amount, Decimal):
+                amount = Decimal(amount)
+            if not move.company.currency.is_zero(amount):
                 cls.raise_user_error('post_unbalanced_move', (move.rec_name,))
+
+        # Reserve the post numbers as one block per sequence
+        numbered, to_number = [], defaultdict(list)
         for move in moves:
-            values = {
-                'state': 'posted',
-                }
-            if not move.post_number:
-                values['post_date'] = Date.today()
-                values['post_number'] = Sequence.get_id(
-                    move.period.post_move_sequence_used.id)
-            cls.write([move], values)
-
-            keyfunc = lambda l: (l.party, l.account)
-            to_reconcile = [l for l in move.lines
-                if ((l.debit == l.credit == Decimal('0'))
-                    and l.account.reconcile)]
-            to_reconcile = sorted(to_reconcile, key=keyfunc)
-            for _, zero_lines in groupby(to_reconcile, keyfunc):
-                Line.reconcile(list(zero_lines))
+            if move.post_number:
+                numbered.append(move)
+            else:
+                to_number[move.period.post_move_sequence_used.id].append(move)
+        if to_number:
+            ModelFieldAccess.check(cls.__name__, ['post_number'], 'write')
+        for sequence_id, sequence_moves in to_number.iteritems():
+            numbers = iter(Sequence.get_ids(sequence_id, len(sequence_moves)))
+            for sub_moves in grouped_slice(sequence_moves):
+                sub_moves = list(sub_moves)
+                post_number = Case(*[(table.id == m.id, next(numbers))
+                        for m in sub_moves])
+                cursor.execute(*table.update([table.post_number],
+                        [post_number],
+                        where=reduce_ids(table.id, [m.id for m in sub_moves])))
+
+        args = []
+        if numbered:
+            args.extend((numbered, {
+                        'state': 'posted',
+                        }))
+        to_number = sum(to_number.itervalues(), [])
+        if to_number:
+            args.extend((to_number, {
+                        'state': 'posted',
+                        'post_date': Date.today(),
+                        }))
+        if args:
+            cls.write(*args)
+
+        Line.reconcile_zero(moves)
 
     @classmethod
     @ModelView.button
@@ -692,6 +722,9 @@ class Line(ModelSQL, ModelView):
         table = TableHandler(cursor, cls, module_name)
         # Index for General Ledger
         table.index_action(['move', 'account'], 'add')
+        # Index for Aged Balance and reconciliation
+        table.index_action(
+            ['account', 'party', 'reconciliation', 'maturity_date'], 'add')
 
         # Migration from 1.2
         table.not_null_action('blocked', action='remove')
@@ -1508,6 +1541,131 @@ class Line(ModelSQL, ModelView):
             result['fields'] = cls.fields_get(fields_names=list(fields))
         return result
 
+    @classmethod
+    def find_reconciliations(cls, lines, chunk=None):
+        '''
+        Return the lists of lines which can be reconciled without write-off.
+        All the lines must have the same account and party.
+        The lines are compared within chunk lines in date order.
+        '''
+        if chunk is None:
+            chunk = config.getint('account', 'reconciliation_chunk',
+                default=20)
+        lines = list(lines)
+        if not lines:
+            return []
+        digits = lines[0].account.company.currency.digits
+        id2line = {}
+        amounts = []
+        for line in lines:
+            id2line[line.id] = line
+            # Compare integer amounts in the minor unit of the currency
+            amount = int((line.debit - line.credit).scaleb(digits))
+            amounts.append((line.id, amount, line.date))
+        return [[id2line[i] for i in group]
+            for group in find_zero_sum_groups(amounts, window=chunk)]
+
+    @classmethod
+    def reconcile_automatic(cls, accounts=None):
+        '''
+        Reconcile the lines of the accounts that can be reconciled without
+        write-off, for each account and party.
+        All the accounts to reconcile are processed if accounts is None.
+        Return the created reconciliations.
+        '''
+        pool = Pool()
+        Account = pool.get('account.account')
+        Reconciliation = pool.get('account.move.reconciliation')
+        line = cls.__table__()
+        account = Account.__table__()
+        cursor = Transaction().cursor
+
+        balance = line.debit - line.credit
+        where = ((line.reconciliation == Null) & (line.state == 'valid')
+            & account.reconcile)
+        if accounts is not None:
+            if not accounts:
+                return []
+            where &= reduce_ids(account.id, [a.id for a in accounts])
+        # Only the accounts and parties with debit and credit lines
+        cursor.execute(*line.join(account,
+                condition=line.account == account.id).select(
+                line.account, line.party,
+                where=where,
+                group_by=[line.account, line.party],
+                having=(
+                    Sum(Case((balance > 0, 1), else_=0)) > 0)
+                & (Sum(Case((balance < 0, 1), else_=0)) > 0),
+                order_by=[line.account, line.party]))
+
+        to_reconcile = []
+        for account_id, parties in groupby(cursor.fetchall(),
+                key=itemgetter(0)):
+            for sub_parties in grouped_slice([p for _, p in parties]):
+                sub_parties = list(sub_parties)
+                party_domain = ['OR',
+                    ('party', 'in', [p for p in sub_parties if p]),
+                    ]
+                if None in sub_parties:
+                    party_domain.append(('party', '=', None))
+                lines = cls.search([
+                        ('account', '=', account_id),
+                        party_domain,
+                        ('reconciliation', '=', None),
+                        ('state', '=', 'valid'),
+                        ], order=[('party.id', 'ASC'), ('id', 'ASC')])
+                for _, party_lines in groupby(lines, key=lambda l: l.party):
+                    to_reconcile.extend(cls.find_reconciliations(party_lines))
+
+        reconciliations = []
+        for sub_lines in grouped_slice(to_reconcile):
+            reconciliations.extend(Reconciliation.create([{
+                            'lines': [('add', [l.id for l in lines])],
+                            } for lines in sub_lines]))
+        return reconciliations
+
+    @classmethod
+    def reconcile_zero(cls, moves):
+        '''
+        Reconcile together the lines of moves without amount per account and
+        party.
+        Return the created reconciliations.
+        '''
+        pool = Pool()
+        Account = pool.get('account.account')
+        Reconciliation = pool.get('account.move.reconciliation')
+        line = cls.__table__()
+        account = Account.__table__()
+        cursor = Transaction().cursor
+
+        debit = cls.debit.sql_column(line)
+        credit = cls.credit.sql_column(line)
+        rows = []
+        for sub_moves in grouped_slice(moves):
+            red_sql = reduce_ids(line.move, [m.id for m in sub_moves])
+            cursor.execute(*line.join(account,
+                    condition=line.account == account.id).select(
+                    line.move, line.account, line.party, line.id,
+                    line.reconciliation,
+                    where=red_sql & account.reconcile
+                    & (debit == 0) & (credit == 0)))
+            rows.extend(cursor.fetchall())
+        for row in rows:
+            if row[4] is not None:
+                line = cls(row[3])
+                cls.raise_user_error('already_reconciled',
+                    error_args=(line.move.number, line.id,))
+        rows.sort(key=lambda r: (r[0], r[1], r[2] or 0, r[3]))
+
+        reconciliations = []
+        groups = [[r[3] for r in group]
+            for _, group in groupby(rows, key=itemgetter(0, 1, 2))]
+        for sub_groups in grouped_slice(groups):
+            reconciliations.extend(Reconciliation.create([{
+                            'lines': [('add', ids)],
+                            } for ids in sub_groups]))
+        return reconciliations
+
     @classmethod
     def reconcile(cls, lines, journal=None, date=None, account=None,
             description=None):
@@ -1903,24 +2061,10 @@ class Reconcile(Wizard):
 
     def _default_lines(self):
         'Return the larger list of lines which can be reconciled'
-        currency = self.show.account.company.currency
-        chunk = config.getint('account', 'reconciliation_chunk', default=10)
-        # Combination is exponential so it must be limited to small number
-        default = []
-        for lines in grouped_slice(self._all_lines(), chunk):
-            lines = list(lines)
-            best = None
-            for n in xrange(len(lines), 1, -1):
-                for comb_lines in combinations(lines, n):
-                    amount = sum((l.debit - l.credit) for l in comb_lines)
-                    if currency.is_zero(amount):
-                        best = [l.id for l in comb_lines]
-                        break
-                if best:
-                    break
-            if best:
-                default.extend(best)
-        return default
+        pool = Pool()
+        Line = pool.get('account.move.line')
+        return [l.id for lines in Line.find_reconciliations(self._all_lines())
+            for l in lines]
 
     def transition_reconcile(self):
         pool = Pool()
@@ -0,0 +1,123 @@
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+import datetime
+from collections import defaultdict
+
+__all__ = ['find_zero_sum_groups', 'largest_zero_sum']
+
+
+def find_zero_sum_groups(lines, window=20):
+    '''
+    Return a list of disjoint groups of keys whose amounts sum to zero.
+
+    lines is an iterable of (key, amount, date) where amount is an integer
+    (the amount in the minor unit of the currency).
+    Lines are matched by:
+
+        - all the lines if they sum to zero,
+        - pairs of opposite amounts, the oldest lines first,
+        - the largest zero-sum subset of window lines taken in date order.
+    '''
+    lines = sorted(lines, key=_line_key)
+    if len(lines) >= 2 and not sum(l[1] for l in lines):
+        return [[l[0] for l in lines]]
+
+    groups = []
+    remaining = _match_pairs(lines, groups)
+    _match_windows(remaining, window, groups)
+    return groups
+
+
+def _line_key(line):
+    key, _, date = line
+    return (date or datetime.date.min, key)
+
+
+def _match_pairs(lines, groups):
+    'Add to groups the pairs of opposite amounts and return the other lines'
+    debits, credits = defaultdict(list), defaultdict(list)
+    for line in lines:
+        if line[1] > 0:
+            debits[line[1]].append(line)
+        elif line[1] < 0:
+            credits[-line[1]].append(line)
+
+    matched = set()
+    for amount, debit_lines in debits.iteritems():
+        # zip stops at the shortest so the newest lines are left
+        for debit, credit in zip(debit_lines, credits.get(amount, [])):
+            groups.append([debit[0], credit[0]])
+            matched.add(debit[0])
+            matched.add(credit[0])
+    return [l for l in lines if l[0] not in matched]
+
+
+def _match_windows(lines, window, groups):
+    'Add to groups the zero-sum subsets found in windows of lines'
+    window = max(window, 2)
+    matched = set()
+    start = 0
+    while True:
+        # Positions of the next window unmatched lines
+        positions = []
+        position = start
+        while position < len(lines) and len(positions) < window:
+            if lines[position][0] not in matched:
+                positions.append(position)
+            position += 1
+        if len(positions) < 2:
+            break
+        indexes = largest_zero_sum([lines[p][1] for p in positions])
+        if indexes:
+            group = [lines[positions[i]][0] for i in indexes]
+            groups.append(group)
+            matched.update(group)
+            start = positions[0]
+        elif position >= len(lines):
+            break
+        else:
+            # The first half of the window has been tried against all its
+            # neighbours
+            start = positions[len(positions) // 2]
+
+
+def largest_zero_sum(amounts):
+    '''
+    Return the indexes of the largest subset of amounts (of at least 2
+    items) which sums to zero or None.
+    The subset sums of both halves are computed and met in the middle.
+    '''
+    half = len(amounts) // 2
+    left = _subset_sums(amounts[:half])
+    right = _subset_sums(amounts[half:])
+    best = None
+    for total, (count, mask) in right.iteritems():
+        match = left.get(-total)
+        if match is None:
+            continue
+        if count + match[0] >= 2 and (
+                best is None or count + match[0] > best[0]):
+            best = (count + match[0], match[1], mask)
+    if best is None:
+        return None
+    _, left_mask, right_mask = best
+    indexes = [i for i in xrange(half) if left_mask & (1 << i)]
+    indexes.extend(half + i for i in xrange(len(amounts) - half)
+        if right_mask & (1 << i))
+    return indexes
+
+
+def _subset_sums(amounts):
+    '''
+    Return a dictionary of the reachable sums of amounts with the largest
+    number of items and the bit mask of these items
+    '''
+    sums = {0: (0, 0)}
+    for i, amount in enumerate(amounts):
+        bit = 1 << i
+        for total, (count, mask) in sums.items():
+            new = total + amount
+            current = sums.get(new)
+            if current is None or current[0] < count + 1:
+                sums[new] = (count + 1, mask | bit)
+    return sums
@@ -1179,6 +1179,14 @@ class TaxRule(ModelSQL, ModelView):
     def default_company():
         return Transaction().context.get('company')
 
+    @classmethod
+    def delete(cls, rules):
+        pool = Pool()
+        RuleLine = pool.get('account.tax.rule.line')
+        super(TaxRule, cls).delete(rules)
+        # The lines are deleted on cascade
+        RuleLine.clear_match_index()
+
     def apply(self, tax, pattern):
         '''
         Apply rule on tax
@@ -1186,13 +1194,18 @@ class TaxRule(ModelSQL, ModelView):
         value.
         Return a list of the tax id to use or None
         '''
+        pool = Pool()
+        RuleLine = pool.get('account.tax.rule.line')
+
         pattern = pattern.copy()
         pattern['group'] = tax.group.id if tax and tax.group else None
         pattern['origin_tax'] = tax.id if tax else None
 
-        for line in self.lines:
-            if line.match(pattern):
-                return line.get_taxes()
+        line = RuleLine.find_match([
+                ('rule', '=', self.id),
+                ], pattern, fields_names=['tax'])
+        if line:
+            return RuleLine(line['id'], tax=line['tax']).get_taxes()
         return tax and [tax.id] or None
 
     def update_rule(self, template2rule=None):
@@ -1393,12 +1406,35 @@ class TaxRuleLine(ModelSQL, ModelView, MatchMixin):
         table, _ = tables[None]
         return [Case((table.sequence == Null, 0), else_=1), table.sequence]
 
+    @classmethod
+    def create(cls, vlist):
+        lines = super(TaxRuleLine, cls).create(vlist)
+        cls.clear_match_index()
+        return lines
+
+    @classmethod
+    def write(cls, *args):
+        super(TaxRuleLine, cls).write(*args)
+        cls.clear_match_index()
+
+    @classmethod
+    def delete(cls, lines):
+        super(TaxRuleLine, cls).delete(lines)
+        cls.clear_match_index()
+
     def match(self, pattern):
         if 'group' in pattern and not self.group:
             if pattern['group']:
                 return False
         return super(TaxRuleLine, self).match(pattern)
 
+    @classmethod
+    def match_values(cls, values, pattern):
+        if 'group' in pattern and not values['group']:
+            if pattern['group']:
+                return False
+        return super(TaxRuleLine, cls).match_values(values, pattern)
+
     def get_taxes(self):
         '''
         Return list of taxes for a line
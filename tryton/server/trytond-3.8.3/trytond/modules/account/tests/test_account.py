@@ -3,6 +3,7 @@
 import unittest
 import doctest
 import datetime
+import random
 from decimal import Decimal
 from dateutil.relativedelta import relativedelta
 from trytond.pool import Pool
@@ -11,6 +12,10 @@ from trytond.tests.test_tryton import ModuleTestCase
 from trytond.tests.test_tryton import doctest_setup, doctest_teardown
 from trytond.tests.test_tryton import POOL, DB_NAME, USER, CONTEXT
 from trytond.transaction import Transaction
+from trytond.exceptions import UserError
+
+from trytond.modules.account.reconciliation import find_zero_sum_groups, \
+    largest_zero_sum
 
 
 class AccountTestCase(ModuleTestCase):
@@ -759,6 +764,291 @@ class AccountTestCase(ModuleTestCase):
             self.assertEqual(party.payable, Decimal('90'))
             self.assertEqual(party.payable_today, Decimal('30'))
 
+    def test0060_reconcile_automatic(self):
+        'Test automatic reconciliation'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            pool = Pool()
+            Party = pool.get('party.party')
+            Line = pool.get('account.move.line')
+            fiscalyear, = self.fiscalyear.search([])
+            period = fiscalyear.periods[0]
+            journal_revenue, = self.journal.search([
+                    ('code', '=', 'REV'),
+                    ])
+            revenue, = self.account.search([
+                    ('kind', '=', 'revenue'),
+                    ])
+            receivable, = self.account.search([
+                    ('kind', '=', 'receivable'),
+                    ])
+            party1, party2, party3, party4 = Party.create([{
+                        'name': 'Reconcile party 1',
+                        }, {
+                        'name': 'Reconcile party 2',
+                        }, {
+                        'name': 'Reconcile party 3',
+                        }, {
+                        'name': 'Reconcile party 3',
+                        }])
+
+            def get_move(amount, party):
+                debit, credit = (amount, 0) if amount > 0 else (0, -amount)
+                return {
+                    'period': period.id,
+                    'journal': journal_revenue.id,
+                    'date': period.start_date,
+                    'lines': [
+                        ('create', [{
+                                    'account': revenue.id,
+                                    'debit': credit,
+                                    'credit': debit,
+                                    }, {
+                                    'account': receivable.id,
+                                    'debit': debit,
+                                    'credit': credit,
+                                    'party': party.id,
+                                    }]),
+                        ],
+                    }
+            self.move.create([get_move(Decimal(a), p) for a, p in [
+                        (100, party1), (-100, party1),
+                        (30, party1), (20, party1), (-50, party1),
+                        (15, party1),
+                        (10, party2), (-20, party2),
+                        # Parties with the same name
+                        (40, party3), (60, party4),
+                        (-40, party3), (-60, party4),
+                        ]])
+            # Draft lines are not reconciled
+            self.move.create([{
+                        'period': period.id,
+                        'journal': journal_revenue.id,
+                        'date': period.start_date,
+                        'lines': [
+                            ('create', [{
+                                        'account': receivable.id,
+                                        'debit': 0,
+                                        'credit': Decimal(15),
+                                        'party': party1.id,
+                                        }]),
+                            ],
+                        }])
+
+            reconciliations = Line.reconcile_automatic([receivable])
+            self.assertEqual(len(reconciliations), 4)
+            self.assertEqual(sorted(len(r.lines) for r in reconciliations),
+                [2, 2, 2, 3])
+            lines = Line.search([
+                    ('account', '=', receivable.id),
+                    ('reconciliation', '=', None),
+                    ])
+            self.assertEqual(
+                sorted((l.party.name, l.debit - l.credit, l.state)
+                    for l in lines),
+                [('Reconcile party 1', Decimal(-15), 'draft'),
+                    ('Reconcile party 1', Decimal(15), 'valid'),
+                    ('Reconcile party 2', Decimal(-20), 'valid'),
+                    ('Reconcile party 2', Decimal(10), 'valid')])
+
+    def test0065_post(self):
+        'Test post moves'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            pool = Pool()
+            Party = pool.get('party.party')
+            Line = pool.get('account.move.line')
+            fiscalyear, = self.fiscalyear.search([])
+            period = fiscalyear.periods[0]
+            journal_revenue, = self.journal.search([
+                    ('code', '=', 'REV'),
+                    ])
+            revenue, = self.account.search([
+                    ('kind', '=', 'revenue'),
+                    ])
+            receivable, = self.account.search([
+                    ('kind', '=', 'receivable'),
+                    ])
+            party, = Party.create([{
+                        'name': 'Post party',
+                        }])
+
+            def get_move(debit, credit):
+                return {
+                    'period': period.id,
+                    'journal': journal_revenue.id,
+                    'date': period.start_date,
+                    'lines': [
+                        ('create', [{
+                                    'account': revenue.id,
+                                    'debit': credit,
+                                    'credit': debit,
+                                    }, {
+                                    'account': receivable.id,
+                                    'debit': debit,
+                                    'credit': credit,
+                                    'party': party.id,
+                                    }]),
+                        ],
+                    }
+            moves = self.move.create([get_move(Decimal(10), Decimal(0)),
+                    get_move(Decimal(0), Decimal(0)),
+                    get_move(Decimal(0), Decimal(5))])
+            unbalanced, = self.move.create([get_move(Decimal(0), Decimal(0))])
+            Line.write(list(unbalanced.lines[:1]), {
+                    'credit': Decimal(1),
+                    })
+            self.assertRaises(UserError, self.move.post, moves + [unbalanced])
+
+            self.move.post(moves)
+            moves = self.move.browse(moves)
+            self.assertEqual([m.state for m in moves], ['posted'] * 3)
+            self.assertEqual(len(set(m.post_number for m in moves)), 3)
+            self.assertTrue(all(m.post_date for m in moves))
+            numbers = [int(m.post_number) for m in moves]
+            self.assertEqual(numbers, range(numbers[0], numbers[0] + 3))
+
+            zero_line, = [l for l in moves[1].lines
+                if l.account == receivable]
+            self.assertTrue(zero_line.reconciliation)
+            for move in (moves[0], moves[2]):
+                for line in move.lines:
+                    self.assertEqual(line.reconciliation, None)
+
+    def test0070_find_zero_sum_groups(self):
+        'Test find_zero_sum_groups'
+        date = datetime.date(2015, 1, 1)
+        day = datetime.timedelta(days=1)
+
+        def check(lines, groups):
+            amounts = dict((k, a) for k, a, _ in lines)
+            keys = [k for g in groups for k in g]
+            self.assertEqual(len(keys), len(set(keys)))
+            for group in groups:
+                self.assertEqual(sum(amounts[k] for k in group), 0)
+
+        self.assertEqual(find_zero_sum_groups([]), [])
+        lines = [(1, 100, date), (2, -40, date), (3, -60, date)]
+        self.assertEqual(find_zero_sum_groups(lines), [[1, 2, 3]])
+
+        # Pairs are matched in date order
+        lines = [(1, 100, date + day), (2, 100, date), (3, -100, date),
+            (4, 7, date)]
+        self.assertEqual(find_zero_sum_groups(lines), [[2, 3]])
+
+        lines = [(1, 30, date), (2, 7, date), (3, -50, date),
+            (4, 20, date + day), (5, 11, date + day)]
+        groups = find_zero_sum_groups(lines)
+        self.assertEqual(map(sorted, groups), [[1, 3, 4]])
+        self.assertEqual(sorted(largest_zero_sum([3, -1, -2, 5, -5])),
+            [0, 1, 2, 3, 4])
+        self.assertEqual(largest_zero_sum([3, 1]), None)
+
+        # Synthetic ledger of invoices paid by payments of many invoices
+        lines, key = [], 0
+        rng = random.Random(42)
+        for i in xrange(500):
+            invoices = [rng.randint(100, 100000)
+                for _ in xrange(rng.randint(1, 4))]
+            for amount in invoices:
+                key += 1
+                lines.append((key, amount, date + i * day))
+            key += 1
+            lines.append((key, -sum(invoices), date + (i + 3) * day))
+        # Unpaid invoices
+        for i in xrange(50):
+            key += 1
+            lines.append((key, rng.randint(100, 100000), date + i * day))
+        groups = find_zero_sum_groups(lines, window=20)
+        check(lines, groups)
+        self.assertGreater(len([k for g in groups for k in g]),
+            0.9 * (len(lines) - 50))
+
+    def test0080_aged_balance(self):
+        'Test aged balance and third party balance'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            pool = Pool()
+            Party = pool.get('party.party')
+            AgedBalance = pool.get('account.aged_balance', type='report')
+            ThirdPartyBalance = pool.get('account.third_party_balance',
+                type='report')
+            company, = self.company.search([
+                    ('rec_name', '=', 'Dunder Mifflin'),
+                    ])
+            fiscalyear, = self.fiscalyear.search([])
+            period = fiscalyear.periods[0]
+            journal_revenue, = self.journal.search([
+                    ('code', '=', 'REV'),
+                    ])
+            revenue, = self.account.search([
+                    ('kind', '=', 'revenue'),
+                    ])
+            receivable, = self.account.search([
+                    ('kind', '=', 'receivable'),
+                    ])
+            party1, party2 = Party.create([{
+                        'name': 'Aged party B',
+                        }, {
+                        'name': 'Aged party A',
+                        }])
+            today = datetime.date.today()
+
+            def get_move(amount, party, days):
+                return {
+                    'period': period.id,
+                    'journal': journal_revenue.id,
+                    'date': period.start_date,
+                    'lines': [
+                        ('create', [{
+                                    'account': revenue.id,
+                                    'credit': amount,
+                                    }, {
+                                    'account': receivable.id,
+                                    'debit': amount,
+                                    'party': party.id,
+                                    'maturity_date': (today
+                                        - datetime.timedelta(days=days)),
+                                    }]),
+                        ],
+                    }
+            self.move.create([get_move(Decimal(a), p, d) for a, p, d in [
+                        (10, party1, 40), (20, party1, 45), (30, party1, 70),
+                        (40, party1, 100), (50, party2, 35), (60, party2, 10),
+                        ]])
+
+            context = AgedBalance.get_context([], {
+                    'company': company.id,
+                    'term1': 30,
+                    'term2': 60,
+                    'term3': 90,
+                    'unit': 'day',
+                    'posted': False,
+                    'balance_type': 'customer',
+                    })
+            parties = [p for p in context['parties']
+                if p['name'].startswith('Aged party')]
+            self.assertEqual(parties, [{
+                        'name': 'Aged party A',
+                        'amount0': Decimal(50),
+                        'amount1': Decimal(0),
+                        'amount2': Decimal(0),
+                        }, {
+                        'name': 'Aged party B',
+                        'amount0': Decimal(30),
+                        'amount1': Decimal(30),
+                        'amount2': Decimal(40),
+                        }])
+
+            context = ThirdPartyBalance.get_context([], {
+                    'company': company.id,
+                    'fiscalyear': fiscalyear.id,
+                    'posted': False,
+                    })
+            records = [r for r in context['records']
+                if r['name'].startswith('Aged party')]
+            self.assertEqual([(r['name'], r['solde']) for r in records], [
+                    ('Aged party A', Decimal(110)),
+                    ('Aged party B', Decimal(100)),
+                    ])
+
 
 def suite():
     suite = trytond.tests.test_tryton.suite()
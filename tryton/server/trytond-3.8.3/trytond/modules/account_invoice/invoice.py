@@ -627,6 +627,8 @@ class Invoice(Workflow, ModelSQL, ModelView, TaxableMixin):
 
         today = Date.today()
         res = dict((x.id, _ZERO) for x in invoices)
+        # Amounts to convert into the currency of the invoices
+        to_compute = []
         for invoice in invoices:
             if invoice.state != 'posted':
                 continue
@@ -655,10 +657,16 @@ class Invoice(Workflow, ModelSQL, ModelView, TaxableMixin):
                 amount = - amount
                 amount_currency = - amount_currency
             if amount != _ZERO:
-                with Transaction().set_context(date=invoice.currency_date):
-                    amount_currency += Currency.compute(
-                        invoice.company.currency, amount, invoice.currency)
+                to_compute.append((invoice, amount))
             res[invoice.id] = amount_currency
+        if to_compute:
+            amounts = Currency.compute_many(
+                [i.company.currency for i, _ in to_compute],
+                [a for _, a in to_compute],
+                [i.currency for i, _ in to_compute],
+                dates=[i.currency_date for i, _ in to_compute])
+            for (invoice, _), amount in zip(to_compute, amounts):
+                res[invoice.id] += amount
         return res
 
     @classmethod
@@ -4,12 +4,16 @@ import datetime
 import os
 import unicodedata
 from itertools import groupby
+from operator import itemgetter
+from collections import defaultdict
 from io import BytesIO
 
 import genshi
 import genshi.template
 from lxml import etree
-from sql import Literal
+from sql import Literal, Null
+from sql.aggregate import Max, Min
+from sql.conditionals import Case
 
 from trytond.pool import PoolMeta, Pool
 from trytond.model import (ModelSQL, ModelView, Workflow, fields, dualmethod,
@@ -18,6 +22,7 @@ from trytond.pyson import Eval, If
 from trytond.transaction import Transaction
 from trytond.tools import reduce_ids, grouped_slice
 from trytond import backend
+from trytond.filestore import filestore
 from trytond.modules.company import CompanyReport
 
 from .sepa_handler import CAMT054
@@ -144,17 +149,35 @@ class Group:
     def process_sepa(self):
         pool = Pool()
         Payment = pool.get('account.payment')
+        Mandate = pool.get('account.payment.sepa.mandate')
         if self.kind == 'receivable':
-            mandates = Payment.get_sepa_mandates(self.payments)
-            for payment, mandate in zip(self.payments, mandates):
+            payments = self.payments
+            mandates = Payment.get_sepa_mandates(payments)
+            for payment, mandate in zip(payments, mandates):
                 if not mandate:
                     self.raise_user_error('no_mandate', payment.rec_name)
-                # Write one by one becasue mandate.sequence_type must be
-                # recomputed each time
-                Payment.write([payment], {
-                        'sepa_mandate': mandate,
-                        'sepa_mandate_sequence_type': mandate.sequence_type,
-                        })
+            sequence_types = Mandate.get_sequence_types(set(mandates))
+            to_mandate = defaultdict(list)
+            to_sequence_type = defaultdict(list)
+            for payment, mandate in zip(payments, mandates):
+                if payment.sepa_mandate != mandate:
+                    to_mandate[mandate.id].append(payment)
+                sequence_type = sequence_types[mandate.id]
+                to_sequence_type[sequence_type].append(payment)
+                # The following payments of the mandate are recurrent
+                if sequence_type == 'FRST':
+                    sequence_types[mandate.id] = 'RCUR'
+            args = []
+            for mandate_id, mandate_payments in to_mandate.iteritems():
+                args.extend((mandate_payments, {
+                            'sepa_mandate': mandate_id,
+                            }))
+            for sequence_type, type_payments in to_sequence_type.iteritems():
+                args.extend((type_payments, {
+                            'sepa_mandate_sequence_type': sequence_type,
+                            }))
+            if args:
+                Payment.write(*args)
         self.generate_message(_save=False)
 
     @dualmethod
@@ -168,11 +191,16 @@ class Group:
                 raise NotImplementedError
             if not group.sepa_messages:
                 group.sepa_messages = ()
-            message = tmpl.generate(group=group,
+            stream = tmpl.generate(group=group,
                 datetime=datetime, normalize=unicodedata.normalize,
-                ).filter(remove_comment).render()
-            message = Message(message=message, type='out', state='waiting',
-                company=group.company)
+                ).filter(remove_comment)
+            # Write the serialized stream by chunks instead of rendering
+            # the whole message in memory
+            file_id, _ = filestore.set(
+                (s.encode('utf-8') for s in stream.serialize()),
+                prefix=Message._get_filestore_prefix())
+            message = Message(message_file_id=file_id, type='out',
+                state='waiting', company=group.company)
             group.sepa_messages += (message,)
         if _save:
             cls.save(groups)
@@ -197,9 +225,11 @@ class Group:
     @property
     def sepa_payments(self):
         keyfunc = self.sepa_group_payment_key
-        payments = sorted(self.payments, key=keyfunc)
-        for key, grouped_payments in groupby(payments, key=keyfunc):
-            yield dict(key), list(grouped_payments)
+        # Compute the key only once per payment
+        payments = sorted(((keyfunc(p), p) for p in self.payments),
+            key=itemgetter(0))
+        for key, grouped_payments in groupby(payments, key=itemgetter(0)):
+            yield dict(key), [p for _, p in grouped_payments]
 
 
 class Payment:
@@ -241,6 +271,17 @@ class Payment:
 
     @classmethod
     def get_sepa_mandates(cls, payments):
+        pool = Pool()
+        Mandate = pool.get('account.payment.sepa.mandate')
+
+        party_ids = set(p.party.id for p in payments if not p.sepa_mandate)
+        party_mandates = defaultdict(list)
+        for sub_ids in grouped_slice(party_ids):
+            for mandate in Mandate.search([
+                        ('party', 'in', list(sub_ids)),
+                        ]):
+                party_mandates[mandate.party.id].append(mandate)
+
         mandates = []
         for payment in payments:
             if payment.sepa_mandate:
@@ -249,7 +290,7 @@ class Payment:
                 else:
                     mandate = None
             else:
-                for mandate in payment.party.sepa_mandates:
+                for mandate in party_mandates[payment.party.id]:
                     if mandate.is_valid:
                         break
                 else:
@@ -489,15 +530,49 @@ class Mandate(Workflow, ModelSQL, ModelView):
 
     @property
     def sequence_type(self):
-        if self.type == 'one-off':
-            return 'OOFF'
-        elif (not self.payments
-                or all(not p.sepa_mandate_sequence_type for p in self.payments)
-                or all(p.rejected for p in self.payments)):
-            return 'FRST'
-        # TODO manage FNAL
-        else:
-            return 'RCUR'
+        return self.get_sequence_types([self])[self.id]
+
+    @classmethod
+    def get_sequence_types(cls, mandates):
+        '''
+        Return the sequence type of the next payment for each mandate.
+        A recurrent mandate is first until it has a payment sent with a
+        sequence type and which is not rejected.
+        '''
+        pool = Pool()
+        Payment = pool.get('account.payment')
+        payment = Payment.__table__()
+        cursor = Transaction().cursor
+
+        sent = ((payment.sepa_mandate_sequence_type != Null)
+            & (payment.sepa_mandate_sequence_type != ''))
+        rejected = ((payment.state == 'failed')
+            & (payment.sepa_return_reason_code != Null)
+            & (payment.sepa_return_reason_code != '')
+            & (payment.sepa_return_reason_information == '/RTYP/RJCT'))
+        recurrent = set()
+        for sub_mandates in grouped_slice(mandates):
+            red_sql = reduce_ids(payment.sepa_mandate,
+                [m.id for m in sub_mandates])
+            cursor.execute(*payment.select(payment.sepa_mandate,
+                    Max(Case((sent, 1), else_=0)),
+                    Min(Case((rejected, 1), else_=0)),
+                    where=red_sql,
+                    group_by=payment.sepa_mandate))
+            for mandate_id, any_sent, all_rejected in cursor.fetchall():
+                if any_sent and not all_rejected:
+                    recurrent.add(mandate_id)
+
+        sequence_types = {}
+        for mandate in mandates:
+            if mandate.type == 'one-off':
+                sequence_types[mandate.id] = 'OOFF'
+            elif mandate.id in recurrent:
+                # TODO manage FNAL
+                sequence_types[mandate.id] = 'RCUR'
+            else:
+                sequence_types[mandate.id] = 'FRST'
+        return sequence_types
 
     @classmethod
     def has_payments(self, mandates, name):
@@ -560,7 +635,10 @@ class Message(Workflow, ModelSQL, ModelView):
         'readonly': Eval('state') != 'draft',
         }
     _depends = ['state']
-    message = fields.Text('Message', states=_states, depends=_depends)
+    message = fields.Function(fields.Text('Message', states=_states,
+            depends=_depends), 'get_message', setter='set_message',
+        searcher='search_message')
+    message_file_id = fields.Char('Message File ID', readonly=True)
     filename = fields.Function(fields.Char('Filename'), 'get_filename')
     type = fields.Selection([
             ('in', 'IN'),
@@ -619,23 +697,46 @@ class Message(Workflow, ModelSQL, ModelView):
 
         super(Message, cls).__register__(module_name)
 
+        table = TableHandler(cursor, cls, module_name)
+        message_table = cls.__table__()
+        prefix = cls._get_filestore_prefix()
+
         # Migration from 3.2
         if TableHandler.table_exist(cursor, Group._table):
             group_table = TableHandler(cursor, Group, module_name)
             if group_table.column_exist('sepa_message'):
                 group = Group.__table__()
-                table = cls.__table__()
                 cursor.execute(*group.select(
                         group.id, group.sepa_message, group.company))
                 for group_id, message, company_id in cursor.fetchall():
-                    cursor.execute(*table.insert(
-                            [table.message, table.type, table.company,
-                                table.origin, table.state],
-                            [[message, 'out', company_id,
+                    file_id = None
+                    if message is not None:
+                        file_id, _ = filestore.set(
+                            message.encode('utf-8'), prefix=prefix)
+                    cursor.execute(*message_table.insert(
+                            [message_table.message_file_id,
+                                message_table.type, message_table.company,
+                                message_table.origin, message_table.state],
+                            [[file_id, 'out', company_id,
                                     'account.payment.group,%s' % group_id,
                                     'done']]))
                 group_table.drop_column('sepa_message')
 
+        # Migration from 3.8: message stored in the filestore
+        if table.column_exist('message'):
+            # Skip the migrated messages as SQLite does not drop columns
+            cursor.execute(*message_table.select(
+                    message_table.id, message_table.message,
+                    where=(message_table.message != Null)
+                    & (message_table.message_file_id == Null)))
+            for message_id, message in cursor.fetchall():
+                file_id, _ = filestore.set(
+                    message.encode('utf-8'), prefix=prefix)
+                cursor.execute(*message_table.update(
+                        [message_table.message_file_id], [file_id],
+                        where=message_table.id == message_id))
+            table.drop_column('message')
+
     @staticmethod
     def default_type():
         return 'in'
@@ -648,6 +749,41 @@ class Message(Workflow, ModelSQL, ModelView):
     def default_state():
         return 'draft'
 
+    @staticmethod
+    def _get_filestore_prefix():
+        'Return the filestore prefix of the messages'
+        # The sub-directory is ignored by the collect of the attachments
+        return os.path.join(Transaction().cursor.dbname,
+            'account_payment_sepa')
+
+    def get_message(self, name):
+        if self.message_file_id:
+            try:
+                return filestore.get(self.message_file_id,
+                    prefix=self._get_filestore_prefix()).decode('utf-8')
+            except IOError:
+                pass
+
+    @classmethod
+    def set_message(cls, messages, name, value):
+        file_id = None
+        if value is not None:
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            file_id, _ = filestore.set(value,
+                prefix=cls._get_filestore_prefix())
+        cls.write(messages, {
+                'message_file_id': file_id,
+                })
+
+    @classmethod
+    def search_message(cls, name, clause):
+        # The content is in the filestore so only its presence is searchable
+        _, operator, value = clause[:3]
+        if value is not None or operator not in ('=', '!='):
+            cls.raise_user_error('search_function_missing', name)
+        return [('message_file_id', operator, None)]
+
     def get_filename(self, name):
         pool = Pool()
         Group = pool.get('account.payment.group')
@@ -111,6 +111,7 @@ def validate_file(flavor, kind, xsd=None):
     pool = Pool()
     Payment = pool.get('account.payment')
     PaymentGroup = pool.get('account.payment.group')
+    Message = pool.get('account.payment.sepa.message')
     Date = pool.get('ir.date')
     ProcessPayment = pool.get('account.payment.process', type='wizard')
 
@@ -145,6 +146,8 @@ def validate_file(flavor, kind, xsd=None):
     message, = group.sepa_messages
     assert message.type == 'out', message.type
     assert message.state == 'waiting', message.state
+    assert message.message_file_id, message.message_file_id
+    assert Message.search([('message', '!=', None)]) == [message]
     sepa_string = message.message.encode('utf-8')
     sepa_xml = etree.fromstring(sepa_string)
     schema_file = os.path.join(os.path.dirname(__file__),
@@ -339,6 +342,62 @@ class AccountPaymentSepaTestCase(ModuleTestCase):
             for payment in payments:
                 self.assertEqual(payment.sepa_mandate_sequence_type, 'RCUR')
 
+    def test_payment_sequence_type_group(self):
+        'Test payment sequence type of payments in the same group'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            pool = Pool()
+            Date = pool.get('ir.date')
+            Payment = pool.get('account.payment')
+            ProcessPayment = pool.get('account.payment.process', type='wizard')
+
+            environment = setup_environment()
+            company = environment['company']
+            bank = environment['bank']
+            customer = environment['customer']
+            company_account, customer_account = setup_accounts(
+                bank, company, customer)
+            mandate = setup_mandate(company, customer, customer_account)
+            journal = setup_journal('pain.008.001.02', 'receivable',
+                company, company_account)
+            self.assertEqual(mandate.sequence_type, 'FRST')
+
+            payments = Payment.create([{
+                        'company': company,
+                        'party': customer,
+                        'journal': journal,
+                        'kind': 'receivable',
+                        'amount': Decimal(amount),
+                        'state': 'approved',
+                        'description': 'PAYMENT',
+                        'date': Date.today(),
+                        } for amount in ['1000.0', '2000.0', '3000.0']])
+
+            session_id, _, _ = ProcessPayment.create()
+            process_payment = ProcessPayment(session_id)
+            payment_ids = [p.id for p in payments]
+            with Transaction().set_context(active_ids=payment_ids):
+                _, data = process_payment.do_process(None)
+
+            payments = Payment.browse(payment_ids)
+            self.assertEqual(
+                [p.sepa_mandate_sequence_type for p in payments],
+                ['FRST', 'RCUR', 'RCUR'])
+            self.assertTrue(all(p.sepa_mandate == mandate for p in payments))
+            self.assertEqual(mandate.sequence_type, 'RCUR')
+
+            Payment.write([payments[0]], {
+                    'state': 'failed',
+                    'sepa_return_reason_code': 'AC01',
+                    'sepa_return_reason_information': '/RTYP/RJCT',
+                    })
+            self.assertEqual(mandate.sequence_type, 'RCUR')
+            Payment.write(list(payments[1:]), {
+                    'state': 'failed',
+                    'sepa_return_reason_code': 'AC01',
+                    'sepa_return_reason_information': '/RTYP/RJCT',
+                    })
+            self.assertEqual(mandate.sequence_type, 'FRST')
+
     def handle_camt054(self, flavor):
         'Handle camt.054'
         with Transaction().start(DB_NAME, USER, context=CONTEXT):
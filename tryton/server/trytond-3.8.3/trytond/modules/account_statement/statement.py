@@ -245,16 +245,19 @@ class Statement(Workflow, ModelSQL, ModelView):
             for line in self.lines:
                 if getattr(line, 'invoice', None):
                     invoices.add(line.invoice)
+            invoices = list(invoices)
+            amounts_to_pay = Currency.compute_many(
+                [i.currency for i in invoices],
+                [i.amount_to_pay for i in invoices],
+                self.journal.currency,
+                dates=[i.currency_date for i in invoices])
             invoice_id2amount_to_pay = {}
-            for invoice in invoices:
-                with Transaction().set_context(date=invoice.currency_date):
-                    if invoice.type in ('out_invoice', 'in_credit_note'):
-                        sign = -1
-                    else:
-                        sign = 1
-                    invoice_id2amount_to_pay[invoice.id] = sign * (
-                        Currency.compute(invoice.currency,
-                            invoice.amount_to_pay, self.journal.currency))
+            for invoice, amount_to_pay in zip(invoices, amounts_to_pay):
+                if invoice.type in ('out_invoice', 'in_credit_note'):
+                    sign = -1
+                else:
+                    sign = 1
+                invoice_id2amount_to_pay[invoice.id] = sign * amount_to_pay
 
             lines = list(self.lines)
             line_offset = 0
@@ -17,6 +17,7 @@ def register():
         Category,
         Location,
         Event,
+        EventTombstone,
         EventCategory,
         EventAlarm,
         EventAttendee,
@@ -5,8 +5,9 @@ import urllib
 from string import atoi
 import xml.dom.minidom
 from pywebdav.lib import propfind
+from pywebdav.lib.report import REPORT
 from pywebdav.lib.errors import DAV_NotFound, DAV_Error, DAV_Forbidden
-from pywebdav.lib.utils import get_uriparentpath
+from pywebdav.lib.utils import get_uriparentpath, gen_estring
 from pywebdav.lib.constants import DAV_VERSION_1, DAV_VERSION_2
 from trytond.protocols.webdav import TrytonDAVInterface, CACHE, \
         WebDAVAuthRequestHandler
@@ -23,9 +24,13 @@ TrytonDAVInterface.PROPS['urn:ietf:params:xml:ns:caldav'] = (
     'schedule-inbox-URL',
     'schedule-outbox-URL',
     )
+TrytonDAVInterface.PROPS['http://calendarserver.org/ns/'] = (
+    'getctag',
+    )
 TrytonDAVInterface.PROPS['DAV:'] = tuple(list(TrytonDAVInterface.PROPS['DAV:'])
-    + ['principal-collection-set'])
+    + ['principal-collection-set', 'sync-token'])
 TrytonDAVInterface.M_NS['urn:ietf:params:xml:ns:caldav'] = '_get_caldav'
+TrytonDAVInterface.M_NS['http://calendarserver.org/ns/'] = '_get_cs'
 DAV_VERSION_1['version'] += ',calendar-access,calendar-schedule'
 DAV_VERSION_2['version'] += ',calendar-access,calendar-schedule'
 
@@ -229,6 +234,136 @@ def _get_caldav_schedule_outbox_URL(self, uri):
 TrytonDAVInterface._get_caldav_schedule_outbox_URL = \
     _get_caldav_schedule_outbox_URL
 
+def _get_cs_getctag(self, uri):
+    dbname, dburi = self._get_dburi(uri)
+    if not dbname:
+        raise DAV_NotFound
+    pool = Pool(Transaction().cursor.database_name)
+    try:
+        Collection = pool.get('webdav.collection')
+    except KeyError:
+        raise DAV_NotFound
+    if not getattr(Collection, 'get_ctag', None):
+        raise DAV_NotFound
+    try:
+        res = Collection.get_ctag(dburi, cache=CACHE)
+    except DAV_Error, exception:
+        self._log_exception(exception)
+        raise
+    except Exception, exception:
+        self._log_exception(exception)
+        raise DAV_Error(500)
+    return res
+
+TrytonDAVInterface._get_cs_getctag = _get_cs_getctag
+
+
+def _get_dav_sync_token(self, uri):
+    dbname, dburi = self._get_dburi(uri)
+    if not dbname:
+        raise DAV_NotFound
+    pool = Pool(Transaction().cursor.database_name)
+    try:
+        Collection = pool.get('webdav.collection')
+    except KeyError:
+        raise DAV_NotFound
+    if not getattr(Collection, 'get_sync_token', None):
+        raise DAV_NotFound
+    try:
+        res = Collection.get_sync_token(dburi, cache=CACHE)
+    except DAV_Error, exception:
+        self._log_exception(exception)
+        raise
+    except Exception, exception:
+        self._log_exception(exception)
+        raise DAV_Error(500)
+    return res
+
+TrytonDAVInterface._get_dav_sync_token = _get_dav_sync_token
+
+
+def sync_collection(self, uri, sync_token):
+    '''
+    Return the uris changed and deleted in the collection uri since
+    sync_token and the new sync token
+    '''
+    dbname, dburi = self._get_dburi(uri)
+    if not dbname:
+        raise DAV_Forbidden
+    pool = Pool(Transaction().cursor.database_name)
+    try:
+        Collection = pool.get('webdav.collection')
+    except KeyError:
+        raise DAV_Forbidden
+    if not getattr(Collection, 'get_sync_collection', None):
+        raise DAV_Forbidden
+    try:
+        changed, deleted, sync_token = Collection.get_sync_collection(dburi,
+            sync_token, cache=CACHE)
+    except DAV_Error, exception:
+        self._log_exception(exception)
+        raise
+    except Exception, exception:
+        self._log_exception(exception)
+        raise DAV_Error(500)
+    scheme, netloc, path, params, query, fragment = urlparse.urlparse(uri)
+    if path[-1:] != '/':
+        path += '/'
+
+    def child_uri(child):
+        return urlparse.urlunparse((scheme, netloc,
+                path + child.encode('utf-8'), params, query, fragment))
+    return ([child_uri(c) for c in changed], [child_uri(c) for c in deleted],
+        sync_token)
+
+TrytonDAVInterface.sync_collection = sync_collection
+
+
+class SYNC_COLLECTION(REPORT):
+    'The sync-collection report of RFC 6578'
+
+    def __init__(self, uri, dataclass, depth, body):
+        REPORT.__init__(self, uri, dataclass, depth, body)
+        self.sync_token = ''
+        for element in self.filter.getElementsByTagNameNS('DAV:',
+                'sync-token'):
+            if element.firstChild:
+                self.sync_token = element.firstChild.data.strip()
+
+    def createResponse(self):
+        if not self._dataclass.exists(self._uri):
+            raise DAV_NotFound
+        changed, deleted, sync_token = self._dataclass.sync_collection(
+            self._uri, self.sync_token)
+
+        doc = domimpl.createDocument(None, 'multistatus', None)
+        ms = doc.documentElement
+        ms.setAttribute('xmlns:D', 'DAV:')
+        ms.tagName = 'D:multistatus'
+        for uri in changed:
+            gp, bp = self.get_propvalues(uri)
+            ms.appendChild(self.mk_prop_response(uri, gp, bp, doc))
+        for uri in deleted:
+            re = doc.createElement('D:response')
+            re.appendChild(self.mk_href(uri, doc))
+            status = doc.createElement('D:status')
+            status.appendChild(doc.createTextNode(gen_estring(404)))
+            re.appendChild(status)
+            ms.appendChild(re)
+        token = doc.createElement('D:sync-token')
+        token.appendChild(doc.createTextNode(sync_token))
+        ms.appendChild(token)
+        return doc.toxml(encoding='utf-8')
+
+    def mk_href(self, uri, doc):
+        if self._dataclass.baseurl:
+            uri = self._dataclass.baseurl + '/' + '/'.join(uri.split('/')[3:])
+        uparts = urlparse.urlparse(uri)
+        href = doc.createElement('D:href')
+        href.appendChild(doc.createTextNode(uparts[0] + '://' + uparts[1]
+                + urllib.quote(uparts[2])))
+        return href
+
 _prev_get_dav_principal_collection_set = hasattr(TrytonDAVInterface,
         '_get_dav_principal_collection_set') and \
                 TrytonDAVInterface._get_dav_principal_collection_set or None
@@ -303,3 +438,44 @@ def do_POST(self):
     return _prev_do_POST(self)
 
 WebDAVAuthRequestHandler.do_POST = do_POST
+
+
+def do_REPORT(self):
+    dc = self.IFACE_CLASS
+
+    body = None
+    if 'Content-Length' in self.headers:
+        l = self.headers['Content-Length']
+        body = self.rfile.read(atoi(l))
+
+    uri = urlparse.urljoin(self.get_baseuri(dc), self.path)
+    uri = urllib.unquote(uri)
+
+    root = None
+    if body:
+        try:
+            root = xml.dom.minidom.parseString(body).documentElement
+        except Exception:
+            return self.send_status(400)
+    if (root is not None
+            and root.namespaceURI == 'DAV:'
+            and root.localName == 'sync-collection'):
+        rp = SYNC_COLLECTION(uri, dc, '1', body)
+    else:
+        rp = REPORT(uri, dc, self.headers.get('Depth', '0'), body)
+
+    try:
+        DATA = '%s\n' % rp.createResponse()
+    except DAV_Error, exception:
+        ec, _ = exception
+        if ec == 403 and isinstance(rp, SYNC_COLLECTION):
+            self.send_body('<?xml version="1.0" encoding="utf-8"?>\n'
+                '<D:error xmlns:D="DAV:"><D:valid-sync-token/></D:error>\n',
+                403, 'Forbidden', 'Forbidden',
+                ctype='text/xml; charset="utf-8"')
+            return
+        return self.send_status(ec)
+    self.send_body_chunks_if_http11(DATA, 207, 'Multi-Status',
+        'Multiple responses')
+
+WebDAVAuthRequestHandler.do_REPORT = do_REPORT
@@ -7,6 +7,7 @@ import pytz
 import datetime
 import xml.dom.minidom
 from sql import Table, Column, Null
+from sql.functions import CurrentTimestamp
 
 from trytond.model import Model, ModelSQL, ModelView, fields, Check, Unique
 from trytond.tools import reduce_ids, grouped_slice
@@ -17,15 +18,25 @@ from trytond.cache import Cache
 from trytond.pool import Pool
 
 __all__ = ['Calendar', 'ReadUser', 'WriteUser', 'Category', 'Location',
-    'Event', 'EventCategory', 'AlarmMixin', 'EventAlarm', 'AttendeeMixin',
-    'EventAttendee', 'DateMixin', 'EventRDate', 'EventExDate', 'RRuleMixin',
-    'EventRRule', 'EventExRule']
+    'Event', 'EventTombstone', 'EventCategory', 'AlarmMixin', 'EventAlarm',
+    'AttendeeMixin', 'EventAttendee', 'DateMixin', 'EventRDate',
+    'EventExDate', 'RRuleMixin', 'EventRRule', 'EventExRule']
 
 tzlocal = dateutil.tz.tzlocal()
 tzutc = dateutil.tz.tzutc()
 domimpl = xml.dom.minidom.getDOMImplementation()
 
 
+def _clear_cache(Model, ids):
+    "Clear the cache of the records updated by SQL queries"
+    transaction = Transaction()
+    transaction.counter += 1
+    for cache in transaction.cursor.cache.itervalues():
+        if Model.__name__ in cache:
+            for id_ in ids:
+                cache[Model.__name__].pop(id_, None)
+
+
 class Calendar(ModelSQL, ModelView):
     "Calendar"
     __name__ = 'calendar.calendar'
@@ -38,6 +49,8 @@ class Calendar(ModelSQL, ModelView):
             'calendar', 'user', 'Read Users')
     write_users = fields.Many2Many('calendar.calendar-write-res.user',
             'calendar', 'user', 'Write Users')
+    sync_token = fields.Integer('Sync Token', readonly=True,
+        help='Incremented on each change of the events of the calendar')
     _get_name_cache = Cache('calendar_calendar.get_name')
 
     @classmethod
@@ -55,6 +68,10 @@ class Calendar(ModelSQL, ModelView):
                 'invalid_name': 'Calendar name "%s" can not end with .ics',
                 })
 
+    @staticmethod
+    def default_sync_token():
+        return 0
+
     @classmethod
     def create(cls, vlist):
         calendars = super(Calendar, cls).create(vlist)
@@ -74,6 +91,38 @@ class Calendar(ModelSQL, ModelView):
         # Restart the cache for calendar
         cls._get_name_cache.clear()
 
+    @classmethod
+    def copy(cls, calendars, default=None):
+        if default is None:
+            default = {}
+        default = default.copy()
+        default.setdefault('sync_token', 0)
+        return super(Calendar, cls).copy(calendars, default=default)
+
+    @classmethod
+    def increment_sync_token(cls, ids):
+        '''
+        Increment the sync token of the calendars and return it by id
+        '''
+        cursor = Transaction().cursor
+        table = cls.__table__()
+
+        ids = list(set(ids))
+        for sub_ids in grouped_slice(ids):
+            red_sql = reduce_ids(table.id, sub_ids)
+            cursor.execute(*table.update(
+                    columns=[table.sync_token],
+                    values=[table.sync_token + 1],
+                    where=red_sql))
+        sync_tokens = {}
+        for sub_ids in grouped_slice(ids):
+            red_sql = reduce_ids(table.id, sub_ids)
+            cursor.execute(*table.select(table.id, table.sync_token,
+                    where=red_sql))
+            sync_tokens.update(cursor.fetchall())
+        _clear_cache(cls, ids)
+        return sync_tokens
+
     @classmethod
     def validate(cls, calendars):
         super(Calendar, cls).validate(calendars)
@@ -362,6 +411,19 @@ class Category(ModelSQL, ModelView):
             ]
         cls._order.insert(0, ('name', 'ASC'))
 
+    @classmethod
+    def write(cls, *args):
+        pool = Pool()
+        Event = pool.get('calendar.event')
+        super(Category, cls).write(*args)
+        categories = sum(args[::2], [])
+        with Transaction().set_user(0):
+            events = Event.search([
+                    ('categories', 'in', [c.id for c in categories]),
+                    ])
+        # The name of the categories is in the iCalendar of the events
+        Event.update_sync_token([e.id for e in events])
+
 
 class Location(ModelSQL, ModelView):
     "Location"
@@ -378,6 +440,19 @@ class Location(ModelSQL, ModelView):
             ]
         cls._order.insert(0, ('name', 'ASC'))
 
+    @classmethod
+    def write(cls, *args):
+        pool = Pool()
+        Event = pool.get('calendar.event')
+        super(Location, cls).write(*args)
+        locations = sum(args[::2], [])
+        with Transaction().set_user(0):
+            events = Event.search([
+                    ('location', 'in', [l.id for l in locations]),
+                    ])
+        # The name of the location is in the iCalendar of the events
+        Event.update_sync_token([e.id for e in events])
+
 
 class Event(ModelSQL, ModelView):
     "Event"
@@ -458,6 +533,9 @@ class Event(ModelSQL, ModelView):
             'required': Bool(Eval('_parent_parent')),
             }, depends=['parent'])
     vevent = fields.Binary('vevent')
+    sync_token = fields.Integer('Sync Token', readonly=True,
+        help='The sync token of the calendar at the last change')
+    ical_cache = fields.Text('iCalendar Cache', readonly=True)
 
     @classmethod
     def __setup__(cls):
@@ -495,6 +573,10 @@ class Event(ModelSQL, ModelView):
     def default_sequence():
         return 0
 
+    @staticmethod
+    def default_sync_token():
+        return 0
+
     @staticmethod
     def default_classification():
         return 'public'
@@ -602,6 +684,7 @@ class Event(ModelSQL, ModelView):
                                         'parent': parent.id,
                                         'uuid': event.uuid,
                                         })
+        cls.update_sync_token([e.id for e in events])
         # Restart the cache for event
         Collection._event_cache.clear()
         return events
@@ -639,13 +722,20 @@ class Event(ModelSQL, ModelView):
 
         actions = iter(args)
         args = []
+        all_events = []
         for events, values in zip(actions, actions):
             values = values.copy()
             if 'sequence' in values:
                 del values['sequence']
+            if values.get('calendar'):
+                cls.delete_sync_token([e for e in events
+                        if not e.parent
+                        and e.calendar.id != values['calendar']])
             args.extend((events, values))
+            all_events.extend(events)
 
         super(Event, cls).write(*args)
+        cls.update_sync_token([e.id for e in all_events])
 
         table = cls.__table__()
         for sub_ids in grouped_slice(events, cursor.IN_MAX):
@@ -784,10 +874,103 @@ class Event(ModelSQL, ModelView):
                                 Attendee.write([attendee], {
                                         'status': 'declined',
                                         })
+        event_ids = set(e.id for e in events)
+        cls.update_sync_token([e.parent.id for e in events
+                if e.parent and e.parent.id not in event_ids])
+        cls.delete_sync_token([e for e in events if not e.parent])
         super(Event, cls).delete(events)
         # Restart the cache for event
         Collection._event_cache.clear()
 
+    @classmethod
+    def update_sync_token(cls, ids):
+        '''
+        Increment the sync token of the calendars of the events and stamp
+        the events and their parents with it.
+        The iCalendar of the stamped events is stored for the CalDAV GET.
+        '''
+        pool = Pool()
+        Calendar = pool.get('calendar.calendar')
+        Tombstone = pool.get('calendar.event.tombstone')
+        transaction = Transaction()
+        cursor = transaction.cursor
+        table = cls.__table__()
+        calendar = Calendar.__table__()
+        tombstone = Tombstone.__table__()
+
+        event_ids = set()
+        calendar_ids = set()
+        for sub_ids in grouped_slice(ids):
+            red_sql = reduce_ids(table.id, sub_ids)
+            cursor.execute(*table.select(table.id, table.parent,
+                    table.calendar, where=red_sql))
+            for event_id, parent_id, calendar_id in cursor.fetchall():
+                event_ids.add(event_id)
+                if parent_id:
+                    event_ids.add(parent_id)
+                calendar_ids.add(calendar_id)
+        if not event_ids:
+            return
+        Calendar.increment_sync_token(calendar_ids)
+
+        uuids = {}
+        master_ids = []
+        for sub_ids in grouped_slice(event_ids):
+            red_sql = reduce_ids(table.id, sub_ids)
+            cursor.execute(*table.update(
+                    columns=[table.sync_token],
+                    values=[calendar.select(calendar.sync_token,
+                            where=calendar.id == table.calendar)],
+                    where=red_sql))
+            cursor.execute(*table.select(table.id, table.calendar, table.uuid,
+                    where=red_sql & (table.parent == Null)))
+            for event_id, calendar_id, uuid in cursor.fetchall():
+                master_ids.append(event_id)
+                uuids.setdefault(calendar_id, []).append(uuid)
+
+        # The iCalendar is the one seen by root, who sees all the events
+        with transaction.set_user(0), transaction.reset_context():
+            for event in cls.browse(master_ids):
+                cursor.execute(*table.update(
+                        columns=[table.ical_cache],
+                        values=[event.event2ical().serialize()
+                            .decode('utf-8')],
+                        where=table.id == event.id))
+        _clear_cache(cls, event_ids)
+
+        # The events exist again
+        for calendar_id, calendar_uuids in uuids.iteritems():
+            for sub_uuids in grouped_slice(calendar_uuids):
+                cursor.execute(*tombstone.delete(
+                        where=(tombstone.calendar == calendar_id)
+                        & tombstone.uuid.in_(list(sub_uuids))))
+
+    @classmethod
+    def delete_sync_token(cls, events):
+        '''
+        Increment the sync token of the calendars of the events and record
+        that the events are no longer in their calendar
+        '''
+        pool = Pool()
+        Calendar = pool.get('calendar.calendar')
+        Tombstone = pool.get('calendar.event.tombstone')
+        cursor = Transaction().cursor
+        tombstone = Tombstone.__table__()
+
+        if not events:
+            return
+        sync_tokens = Calendar.increment_sync_token(
+            [e.calendar.id for e in events])
+        for sub_events in grouped_slice(events):
+            cursor.execute(*tombstone.insert(
+                    columns=[tombstone.create_uid, tombstone.create_date,
+                        tombstone.calendar, tombstone.uuid,
+                        tombstone.sync_token],
+                    values=[[Transaction().user, CurrentTimestamp(),
+                            e.calendar.id, e.uuid,
+                            sync_tokens[e.calendar.id]]
+                        for e in sub_events]))
+
     @classmethod
     def ical2values(cls, event_id, ical, calendar_id, vevent=None):
         '''
@@ -1185,6 +1368,16 @@ class Event(ModelSQL, ModelView):
         return ical
 
 
+class EventTombstone(ModelSQL):
+    'Event Tombstone'
+    __name__ = 'calendar.event.tombstone'
+    _rec_name = 'uuid'
+    calendar = fields.Many2One('calendar.calendar', 'Calendar',
+        required=True, select=True, ondelete='CASCADE')
+    uuid = fields.Char('UUID', required=True)
+    sync_token = fields.Integer('Sync Token', required=True, select=True)
+
+
 class EventCategory(ModelSQL):
     'Event - Category'
     __name__ = 'calendar.event-calendar.category'
@@ -1,14 +1,116 @@
 # This file is part of Tryton.  The COPYRIGHT file at the top level of
 # this repository contains the full copyright notices and license terms.
+import datetime
 import unittest
+from pywebdav.lib.errors import DAV_Forbidden
 import trytond.tests.test_tryton
 from trytond.tests.test_tryton import ModuleTestCase
+from trytond.tests.test_tryton import POOL, DB_NAME, USER, CONTEXT
+from trytond.transaction import Transaction
+from trytond.modules.calendar.webdav import SYNC_TOKEN
 
 
 class CalendarTestCase(ModuleTestCase):
     'Test Calendar module'
     module = 'calendar'
 
+    def setUp(self):
+        super(CalendarTestCase, self).setUp()
+        self.user = POOL.get('res.user')
+        self.calendar = POOL.get('calendar.calendar')
+        self.event = POOL.get('calendar.event')
+        self.location = POOL.get('calendar.location')
+        self.collection = POOL.get('webdav.collection')
+
+    def create_calendar(self):
+        self.user.write([self.user(USER)], {
+                'email': 'admin@example.com',
+                })
+        calendar, = self.calendar.create([{
+                    'name': 'Test',
+                    'owner': USER,
+                    }])
+        return calendar
+
+    def test0010sync_collection(self):
+        'Test sync collection'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            calendar = self.create_calendar()
+            uri = 'Calendars/Test'
+            self.assertEqual(calendar.sync_token, 0)
+            self.assertEqual(self.collection.get_sync_collection(uri, ''),
+                ([], [], SYNC_TOKEN + '0'))
+
+            event1, event2 = self.event.create([{
+                        'calendar': calendar.id,
+                        'summary': 'Event 1',
+                        'dtstart': datetime.datetime(2015, 1, 1, 12, 0),
+                        }, {
+                        'calendar': calendar.id,
+                        'summary': 'Event 2',
+                        'dtstart': datetime.datetime(2015, 1, 2, 12, 0),
+                        }])
+            changed, deleted, sync_token = \
+                self.collection.get_sync_collection(uri, '')
+            self.assertEqual(sorted(changed),
+                sorted([event1.uuid + '.ics', event2.uuid + '.ics']))
+            self.assertEqual(deleted, [])
+            self.assertEqual(sync_token, SYNC_TOKEN + '1')
+            self.assertEqual(self.collection.get_ctag(uri), '1')
+            self.assertEqual(self.collection.get_sync_token(uri), sync_token)
+
+            event2_uuid = event2.uuid
+            self.event.write([event1], {
+                    'summary': 'Event 1 changed',
+                    })
+            self.event.delete([event2])
+            changed, deleted, new_sync_token = \
+                self.collection.get_sync_collection(uri, sync_token)
+            self.assertEqual(changed, [event1.uuid + '.ics'])
+            self.assertEqual(deleted, [event2_uuid + '.ics'])
+            self.assertEqual(
+                self.collection.get_sync_collection(uri, new_sync_token),
+                ([], [], new_sync_token))
+
+            for sync_token in ['foo', SYNC_TOKEN + 'foo', SYNC_TOKEN + '100']:
+                self.assertRaises(DAV_Forbidden,
+                    self.collection.get_sync_collection, uri, sync_token)
+
+    def test0020ical_cache(self):
+        'Test iCalendar cache'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            calendar = self.create_calendar()
+            location, = self.location.create([{
+                        'name': 'Room',
+                        }])
+            event, = self.event.create([{
+                        'calendar': calendar.id,
+                        'summary': 'Event',
+                        'location': location.id,
+                        'dtstart': datetime.datetime(2015, 1, 1, 12, 0),
+                        }])
+            uri = 'Calendars/Test/%s.ics' % event.uuid
+
+            ical_cache = self.event(event.id).ical_cache
+            self.assertIn('LOCATION:Room', ical_cache)
+            data = self.collection.get_data(uri)
+            self.assertEqual(data, ical_cache.encode('utf-8'))
+            etag = self.collection.get_etag(uri)
+
+            self.location.write([location], {
+                    'name': 'Hall',
+                    })
+            self.assertIn('LOCATION:Hall', self.event(event.id).ical_cache)
+            self.assertNotEqual(self.collection.get_etag(uri), etag)
+            self.assertIn('LOCATION:Hall', self.collection.get_data(uri))
+
+            self.event.write([event], {
+                    'summary': 'Event changed',
+                    })
+            self.assertIn('SUMMARY:Event changed',
+                self.collection.get_data(uri))
+            self.assertIn('SUMMARY:Event changed',
+                self.collection.get_data('Calendars/Test.ics'))
 
 def suite():
     suite = trytond.tests.test_tryton.suite()
@@ -16,6 +16,7 @@ __all__ = ['Collection']
 __metaclass__ = PoolMeta
 
 CALDAV_NS = 'urn:ietf:params:xml:ns:caldav'
+SYNC_TOKEN = 'http://www.tryton.org/ns/sync/'
 
 
 def _comp_filter_domain(dtstart, dtend):
@@ -100,6 +101,31 @@ class Collection:
         cls._event_cache.set(key, event_id)
         return event_id
 
+    @classmethod
+    def _cache_events(cls, uri, events, calendar_id, cache=None):
+        '''
+        Fill the caches with the events of the calendar uri
+        and return their names
+        '''
+        Event = Pool().get('calendar.event')
+
+        if cache is not None:
+            cache.setdefault('_calendar', {})
+            cache['_calendar'].setdefault(Event.__name__, {})
+        names = []
+        for event in events:
+            name = event.uuid + '.ics'
+            if not event.parent:
+                # Prevent a search by event for the properties of the
+                # children
+                event_uri = uri.rstrip('/') + '/' + name
+                cls._event_cache.set((event_uri, False), event.id)
+                cls._event_cache.set((event_uri, calendar_id), event.id)
+            if cache is not None:
+                cache['_calendar'][Event.__name__].setdefault(event.id, {})
+            names.append(name)
+        return names
+
     @staticmethod
     def _caldav_filter_domain_calendar(filter):
         '''
@@ -211,12 +237,8 @@ class Collection:
                         ('calendar', '=', calendar_id),
                         domain,
                         ])
-                if cache is not None:
-                    cache.setdefault('_calendar', {})
-                    cache['_calendar'].setdefault(Event.__name__, {})
-                    for event in events:
-                        cache['_calendar'][Event.__name__][event.id] = {}
-                return [x.uuid + '.ics' for x in events]
+                return cls._cache_events(uri, events, calendar_id,
+                    cache=cache)
             return []
         childs = super(Collection, cls).get_childs(uri, filter=filter,
             cache=cache)
@@ -447,11 +469,95 @@ class Collection:
                 return res
         return super(Collection, cls).get_lastmodified(uri, cache=cache)
 
+    @classmethod
+    def _get_sync_token(cls, model_name, record_id, cache=None):
+        '''
+        Return the sync token of the record of the model
+        '''
+        Model = Pool().get(model_name)
+        table = Model.__table__()
+
+        if cache is not None:
+            cache.setdefault('_calendar', {})
+            cache['_calendar'].setdefault(model_name, {})
+            ids = cache['_calendar'][model_name].keys()
+            if record_id not in ids:
+                ids.append(record_id)
+            elif 'sync_token' in cache['_calendar'][model_name][record_id]:
+                return cache['_calendar'][model_name][record_id][
+                    'sync_token']
+        else:
+            ids = [record_id]
+        res = None
+        cursor = Transaction().cursor
+        for sub_ids in grouped_slice(ids):
+            red_sql = reduce_ids(table.id, sub_ids)
+            cursor.execute(*table.select(table.id, table.sync_token,
+                    where=red_sql))
+            for record_id2, sync_token in cursor.fetchall():
+                if record_id2 == record_id:
+                    res = sync_token
+                if cache is not None:
+                    cache['_calendar'][model_name]\
+                        .setdefault(record_id2, {})
+                    cache['_calendar'][model_name][record_id2][
+                        'sync_token'] = sync_token
+        return res
+
+    @classmethod
+    def get_etag(cls, uri, cache=None):
+        calendar_id = cls.calendar(uri)
+        if calendar_id:
+            if not (uri[10:].split('/', 1) + [None])[1]:
+                return None
+            event_id = cls.event(uri, calendar_id=calendar_id)
+            if event_id:
+                sync_token = cls._get_sync_token('calendar.event', event_id,
+                    cache=cache)
+                if sync_token is not None:
+                    return '"%s"' % sync_token
+            return None
+        calendar_ics_id = cls.calendar(uri, ics=True)
+        if calendar_ics_id:
+            sync_token = cls._get_sync_token('calendar.calendar',
+                calendar_ics_id, cache=cache)
+            if sync_token is not None:
+                return '"%s"' % sync_token
+            return None
+        return super(Collection, cls).get_etag(uri, cache=cache)
+
+    @staticmethod
+    def _use_ical_cache(model_name, record_id):
+        '''
+        Return True if the stored iCalendar of the record is the one
+        computed for the current user
+        '''
+        return True
+
+    @classmethod
+    def _get_event_ical(cls, event_id):
+        '''
+        Return the serialized iCalendar of the event.
+        The one stored when the event was stamped is used when available.
+        '''
+        Event = Pool().get('calendar.event')
+        table = Event.__table__()
+        cursor = Transaction().cursor
+
+        if cls._use_ical_cache('calendar.event', event_id):
+            cursor.execute(*table.select(table.ical_cache,
+                    where=table.id == event_id))
+            row = cursor.fetchone()
+            if not row:
+                raise DAV_NotFound
+            data, = row
+            if data is not None:
+                return data.encode('utf-8')
+        return Event(event_id).event2ical().serialize()
+
     @classmethod
     def get_data(cls, uri, cache=None):
-        pool = Pool()
-        Event = pool.get('calendar.event')
-        Calendar = pool.get('calendar.calendar')
+        Calendar = Pool().get('calendar.calendar')
 
         calendar_id = cls.calendar(uri)
         if calendar_id:
@@ -460,8 +566,7 @@ class Collection:
             event_id = cls.event(uri, calendar_id=calendar_id)
             if not event_id:
                 raise DAV_NotFound
-            ical = Event(event_id).event2ical()
-            return ical.serialize()
+            return cls._get_event_ical(event_id)
         calendar_ics_id = cls.calendar(uri, ics=True)
         if calendar_ics_id:
             ical = Calendar(calendar_ics_id).calendar2ical()
@@ -503,6 +608,67 @@ class Collection:
                     return res
         raise DAV_NotFound
 
+    @classmethod
+    def get_ctag(cls, uri, cache=None):
+        calendar_id = cls.calendar(uri)
+        if calendar_id and not (uri[10:].split('/', 1) + [None])[1]:
+            sync_token = cls._get_sync_token('calendar.calendar',
+                calendar_id, cache=cache)
+            if sync_token is not None:
+                return str(sync_token)
+        raise DAV_NotFound
+
+    @classmethod
+    def get_sync_token(cls, uri, cache=None):
+        return SYNC_TOKEN + cls.get_ctag(uri, cache=cache)
+
+    @classmethod
+    def get_sync_collection(cls, uri, sync_token, cache=None):
+        '''
+        Return the names of the events of the calendar uri changed and
+        deleted since the sync token and the new sync token.
+        An empty sync token returns all the events.
+        '''
+        pool = Pool()
+        Calendar = pool.get('calendar.calendar')
+        Event = pool.get('calendar.event')
+        Tombstone = pool.get('calendar.event.tombstone')
+        tombstone = Tombstone.__table__()
+        cursor = Transaction().cursor
+
+        calendar_id = cls.calendar(uri)
+        if not calendar_id or (uri[10:].split('/', 1) + [None])[1]:
+            raise DAV_Forbidden
+        current = Calendar(calendar_id).sync_token
+        if sync_token:
+            if not sync_token.startswith(SYNC_TOKEN):
+                raise DAV_Forbidden
+            try:
+                sync_token = int(sync_token[len(SYNC_TOKEN):])
+            except ValueError:
+                raise DAV_Forbidden
+            if sync_token > current:
+                raise DAV_Forbidden
+        else:
+            sync_token = None
+
+        domain = [
+            ('calendar', '=', calendar_id),
+            ('parent', '=', None),
+            ]
+        if sync_token is not None:
+            domain.append(('sync_token', '>', sync_token))
+        events = Event.search(domain)
+        changed = cls._cache_events(uri, events, calendar_id, cache=cache)
+
+        deleted = []
+        if sync_token is not None:
+            cursor.execute(*tombstone.select(tombstone.uuid,
+                    where=(tombstone.calendar == calendar_id)
+                    & (tombstone.sync_token > sync_token)))
+            deleted = [uuid + '.ics' for uuid, in cursor.fetchall()]
+        return changed, deleted, SYNC_TOKEN + str(current)
+
     @classmethod
     def get_calendar_data(cls, uri, cache=None):
         return cls.get_data(uri, cache=cache).decode('utf-8')
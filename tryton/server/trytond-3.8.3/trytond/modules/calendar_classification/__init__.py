@@ -3,9 +3,11 @@
 
 from trytond.pool import Pool
 from .calendar_ import *
+from .webdav import *
 
 
 def register():
     Pool.register(
         Event,
+        Collection,
         module='calendar_classification', type_='model')
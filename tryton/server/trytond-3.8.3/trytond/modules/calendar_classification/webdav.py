@@ -0,0 +1,33 @@
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+from trytond.transaction import Transaction
+from trytond.pool import Pool, PoolMeta
+
+__all__ = ['Collection']
+__metaclass__ = PoolMeta
+
+
+class Collection:
+    __name__ = 'webdav.collection'
+
+    @classmethod
+    def _use_ical_cache(cls, model_name, record_id):
+        '''
+        The stored iCalendar is the one seen by the users who can write the
+        calendar because the others do not see the private events and get
+        the confidential events cleaned
+        '''
+        pool = Pool()
+        Rule = pool.get('ir.rule')
+        Model = pool.get(model_name)
+        table = Model.__table__()
+        cursor = Transaction().cursor
+
+        if not super(Collection, cls)._use_ical_cache(model_name, record_id):
+            return False
+        domain = Rule.query_get(model_name, mode='write')
+        if not domain:
+            return True
+        cursor.execute(*table.select(table.id,
+                where=(table.id == record_id) & table.id.in_(domain)))
+        return bool(cursor.fetchone())
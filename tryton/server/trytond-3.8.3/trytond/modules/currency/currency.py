@@ -2,10 +2,13 @@
 # this repository contains the full copyright notices and license terms.
 import datetime
 import json
+from bisect import bisect_right
+from itertools import izip, chain
 
 from decimal import Decimal, ROUND_HALF_EVEN
 from trytond.model import ModelView, ModelSQL, fields, Unique, Check
-from trytond.tools import datetime_strftime
+from trytond.cache import Cache
+from trytond.tools import datetime_strftime, grouped_slice, reduce_ids
 from trytond.transaction import Transaction
 from trytond.pool import Pool
 from trytond.rpc import RPC
@@ -23,6 +26,7 @@ class Currency(ModelSQL, ModelView):
     rate = fields.Function(fields.Numeric('Current rate', digits=(12, 6)),
         'get_rate')
     rates = fields.One2Many('currency.currency.rate', 'currency', 'Rates')
+    _rates_cache = Cache('currency_currency.rates', context=False)
     rounding = fields.Numeric('Rounding factor', digits=(12, 6), required=True)
     digits = fields.Integer('Display Digits', required=True)
     active = fields.Boolean('Active')
@@ -165,35 +169,64 @@ class Currency(ModelSQL, ModelView):
                 closer = date
         return res
 
-    @staticmethod
-    def get_rate(currencies, name):
+    @classmethod
+    def get_rate(cls, currencies, name):
         '''
         Return the rate at the date from the context or the current date
         '''
-        Rate = Pool().get('currency.currency.rate')
         Date = Pool().get('ir.date')
 
         res = {}
         date = Transaction().context.get('date', Date.today())
+        series = cls.get_rate_series([c.id for c in currencies])
         for currency in currencies:
-            rates = Rate.search([
-                    ('currency', '=', currency.id),
-                    ('date', '<=', date),
-                    ], limit=1, order=[('date', 'DESC')])
-            if rates:
-                res[currency.id] = rates[0].id
-            else:
-                res[currency.id] = 0
-        rate_ids = [x for x in res.values() if x]
-        rates = Rate.browse(rate_ids)
-        id2rate = {}
-        for rate in rates:
-            id2rate[rate.id] = rate
-        for currency_id in res.keys():
-            if res[currency_id]:
-                res[currency_id] = id2rate[res[currency_id]].rate
+            rate = cls._find_rate(series[currency.id], date)
+            res[currency.id] = rate if rate is not None else 0
         return res
 
+    @classmethod
+    def get_rate_series(cls, currency_ids):
+        '''
+        Return a dictionary with currency id as key and the tuple of the
+        sorted dates and their rates as value.
+        '''
+        pool = Pool()
+        Rate = pool.get('currency.currency.rate')
+        rate = Rate.__table__()
+        cursor = Transaction().cursor
+
+        series = {}
+        missing = []
+        for currency_id in set(currency_ids):
+            value = cls._rates_cache.get(currency_id)
+            if value is None:
+                missing.append(currency_id)
+            else:
+                series[currency_id] = value
+        for sub_ids in grouped_slice(missing):
+            sub_ids = list(sub_ids)
+            sub_series = dict((i, ([], [])) for i in sub_ids)
+            cursor.execute(*rate.select(rate.currency, rate.date, rate.rate,
+                    where=reduce_ids(rate.currency, sub_ids),
+                    order_by=[rate.currency.asc, rate.date.asc]))
+            for currency_id, date, value in cursor.fetchall():
+                dates, rates = sub_series[currency_id]
+                dates.append(date)
+                rates.append(value)
+            for currency_id, value in sub_series.iteritems():
+                series[currency_id] = cls._rates_cache.set(currency_id, value)
+        return series
+
+    @staticmethod
+    def _find_rate(series, date):
+        'Return the rate of the series at the date or None'
+        dates, rates = series
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+        index = bisect_right(dates, date)
+        if index:
+            return rates[index - 1]
+
     def round(self, amount, rounding=ROUND_HALF_EVEN):
         'Round the amount depending of the currency'
         return (amount / self.rounding).quantize(Decimal('1.'),
@@ -210,35 +243,58 @@ class Currency(ModelSQL, ModelView):
         Return the amount to the new currency
         Use the rate of the date of the context or the current date
         '''
+        return cls.compute_many(from_currency, [amount], to_currency,
+            round=round)[0]
+
+    @classmethod
+    def compute_many(cls, from_currencies, amounts, to_currencies,
+            dates=None, round=True):
+        '''
+        Take currencies and amounts
+        Return the list of amounts to the new currencies
+        from_currencies and to_currencies are a currency or a list of
+        currencies for each amount.
+        dates is the list of the dates of the rates for each amount, by default
+        the date of the context or the current date.
+        '''
         Date = Pool().get('ir.date')
-        Lang = Pool().get('ir.lang')
-        from_currency = cls(from_currency.id)
-        to_currency = cls(to_currency.id)
 
-        if to_currency == from_currency:
+        amounts = list(amounts)
+        if not isinstance(from_currencies, (list, tuple)):
+            from_currencies = [from_currencies] * len(amounts)
+        if not isinstance(to_currencies, (list, tuple)):
+            to_currencies = [to_currencies] * len(amounts)
+        if dates is None:
+            dates = [Transaction().context.get('date', Date.today())
+                ] * len(amounts)
+
+        series = cls.get_rate_series([c.id
+                for c in chain(from_currencies, to_currencies)])
+        result = []
+        for from_currency, amount, to_currency, date in izip(
+                from_currencies, amounts, to_currencies, dates):
+            if to_currency != from_currency:
+                from_rate = cls._find_rate(series[from_currency.id], date)
+                to_rate = cls._find_rate(series[to_currency.id], date)
+                if not from_rate or not to_rate:
+                    cls._raise_no_rate(
+                        from_currency if not from_rate else to_currency, date)
+                amount = amount * to_rate / from_rate
             if round:
-                return to_currency.round(amount)
-            else:
-                return amount
-        if (not from_currency.rate) or (not to_currency.rate):
-            date = Transaction().context.get('date', Date.today())
-            if not from_currency.rate:
-                name = from_currency.name
-            else:
-                name = to_currency.name
-
-            languages = Lang.search([
-                    ('code', '=', Transaction().language),
-                    ])
-            cls.raise_user_error('no_rate', {
-                    'currency': name,
-                    'date': datetime_strftime(date, str(languages[0].date))
-                    })
-        if round:
-            return to_currency.round(
-                amount * to_currency.rate / from_currency.rate)
-        else:
-            return amount * to_currency.rate / from_currency.rate
+                amount = to_currency.round(amount)
+            result.append(amount)
+        return result
+
+    @classmethod
+    def _raise_no_rate(cls, currency, date):
+        Lang = Pool().get('ir.lang')
+        languages = Lang.search([
+                ('code', '=', Transaction().language),
+                ])
+        cls.raise_user_error('no_rate', {
+                'currency': currency.name,
+                'date': datetime_strftime(date, str(languages[0].date))
+                })
 
 
 class Rate(ModelSQL, ModelView):
@@ -270,3 +326,22 @@ class Rate(ModelSQL, ModelView):
     @classmethod
     def check_xml_record(self, records, values):
         return True
+
+    @classmethod
+    def create(cls, vlist):
+        Currency = Pool().get('currency.currency')
+        rates = super(Rate, cls).create(vlist)
+        Currency._rates_cache.clear()
+        return rates
+
+    @classmethod
+    def write(cls, *args):
+        Currency = Pool().get('currency.currency')
+        super(Rate, cls).write(*args)
+        Currency._rates_cache.clear()
+
+    @classmethod
+    def delete(cls, rates):
+        Currency = Pool().get('currency.currency')
+        super(Rate, cls).delete(rates)
+        Currency._rates_cache.clear()
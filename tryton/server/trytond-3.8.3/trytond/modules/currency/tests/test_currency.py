@@ -1,6 +1,7 @@
 # This file is part of Tryton.  The COPYRIGHT file at the top level of
 # this repository contains the full copyright notices and license terms.
 import unittest
+import datetime
 from decimal import Decimal
 import trytond.tests.test_tryton
 from trytond.tests.test_tryton import ModuleTestCase
@@ -166,6 +167,41 @@ class CurrencyTestCase(ModuleTestCase):
                 cu1, Decimal("0"), cu2, True)
             self.assertEqual(converted_amount, expected)
 
+    def test0095compute_many(self):
+        'Conversion of many amounts'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            cu1 = self.get_currency('cu1')
+            cu2 = self.get_currency('cu2')
+            today = self.date.today()
+            yesterday = today - datetime.timedelta(days=1)
+
+            self.assertEqual(self.currency.compute_many(
+                    [cu2, cu1, cu1], [Decimal(10), Decimal(13), Decimal(1)],
+                    [cu1, cu2, cu1]),
+                [Decimal(13), Decimal(10), Decimal(1)])
+            self.assertEqual(self.currency.compute_many(
+                    (cu2, cu1), [Decimal(10), Decimal(13)], [cu1, cu2]),
+                [Decimal(13), Decimal(10)])
+            self.assertEqual(self.currency.compute_many(
+                    cu2, [Decimal(10), Decimal(20)], cu1,
+                    dates=[today, today + datetime.timedelta(days=10)]),
+                [Decimal(13), Decimal(26)])
+            self.assertRaises(Exception, self.currency.compute_many,
+                cu2, [Decimal(10), Decimal(20)], cu1,
+                dates=[today, yesterday])
+            with Transaction().set_context(date=yesterday):
+                self.assertEqual(self.currency.get_rate([cu1], 'rate'),
+                    {cu1.id: 0})
+
+            # Dates can be datetime
+            now = datetime.datetime.combine(today, datetime.time(12))
+            self.assertEqual(self.currency.compute_many(
+                    cu2, [Decimal(10)], cu1, dates=[now]), [Decimal(13)])
+            with Transaction().set_context(date=now):
+                self.assertEqual(
+                    self.currency.compute(cu2, Decimal(10), cu1),
+                    Decimal(13))
+
     def test0100compute_zerorate(self):
         'Conversion with zero rate'
         with Transaction().start(DB_NAME, USER,
@@ -2903,7 +2903,13 @@ class PatientData(ModelSQL, ModelView):
         return res
 
     def get_patient_photo(self, name):
-        return self.name.photo
+        photo = self.name.photo
+        format_ = Transaction().context.get('%s.%s' % (self.__name__, name))
+        if photo and format_ == 'size':
+            return len(photo)
+        elif photo and format_ == 'reference':
+            return fields.Binary.reference(photo)
+        return photo
 
     def get_patient_puid(self, name):
         return self.name.ref
@@ -26,10 +26,12 @@ from trytond.rpc import RPC
 from trytond.pool import Pool
 from trytond.wizard import Wizard, StateAction, StateView, Button
 from trytond.pyson import Eval, Not, Bool, PYSONEncoder, Equal, And, Or
+from trytond.tools import grouped_slice
 import hashlib
 import json
+from datetime import datetime
 
-__all__ = ['HealthCrypto','PatientPrescriptionOrder',
+__all__ = ['HealthCrypto', 'DigestMixin', 'PatientPrescriptionOrder',
     'BirthCertificate','DeathCertificate','PatientEvaluation']
 
 
@@ -47,7 +49,107 @@ class HealthCrypto:
         return hashlib.sha512(serialized_doc).hexdigest()
 
 
-class PatientPrescriptionOrder(ModelSQL, ModelView):
+class DigestMixin(object):
+    """ Lazy and batched verification of the document digest
+
+    The digest of the signed documents is not verified each time the
+    document is read. The verification is done on demand (button) or in
+    bulk by the background verifier (cron), and its result is stored.
+    """
+
+    digest_altered = fields.Boolean('Altered', readonly=True,
+        help="Result of the last verification of the document digest."
+        " It is set when the current document does not match"
+        " the original digest anymore")
+
+    digest_verified = fields.DateTime('Last Verification', readonly=True,
+        help="Date and time of the last verification of the digest")
+
+    @classmethod
+    def get_serials(cls, records):
+        """ Return a dictionary with the serialized document of each
+        record.
+        The documents are browsed together so the referenced records
+        (lines, patients, health professionals, ...) are read in
+        batches instead of one document at a time """
+        serials = {}
+        for sub_records in grouped_slice(records):
+            sub_records = cls.browse([r.id for r in sub_records])
+            for record in sub_records:
+                serials[record.id] = cls.get_serial(record)
+        return serials
+
+    @classmethod
+    def check_digest(cls, records, names):
+        """ The documents are serialized at most once, whatever the
+        number of requested fields.
+        The current string and hash are only computed for the documents
+        flagged as altered by the last verification """
+        result = {}
+        for name in names:
+            result[name] = dict((r.id, None) for r in records)
+
+        to_serialize = []
+        for record in records:
+            if ('digest_status' in names and record.document_digest
+                    or record.digest_altered and (
+                        'digest_current' in names
+                        or 'serializer_current' in names)):
+                to_serialize.append(record)
+
+        serials = cls.get_serials(to_serialize)
+        for record in to_serialize:
+            serial_doc = serials[record.id]
+            digest = HealthCrypto().gen_hash(serial_doc)
+            if 'digest_status' in names and record.document_digest:
+                ''' True if the document has been altered'''
+                result['digest_status'][record.id] = (
+                    digest != record.document_digest)
+            if record.digest_altered:
+                if 'digest_current' in names:
+                    result['digest_current'][record.id] = digest
+                if 'serializer_current' in names:
+                    result['serializer_current'][record.id] = serial_doc
+        return result
+
+    @classmethod
+    @ModelView.button
+    def verify_digest(cls, records):
+        """ Verify the digest of the documents and store the result """
+        records = [r for r in records if r.document_digest]
+        serials = cls.get_serials(records)
+
+        altered, intact = [], []
+        for record in records:
+            digest = HealthCrypto().gen_hash(serials[record.id])
+            if digest == record.document_digest:
+                intact.append(record)
+            else:
+                altered.append(record)
+
+        now = datetime.now()
+        to_write = []
+        for value, documents in ((True, altered), (False, intact)):
+            if documents:
+                to_write.extend((documents, {
+                    'digest_altered': value,
+                    'digest_verified': now,
+                    }))
+        if to_write:
+            cls.write(*to_write)
+
+    @classmethod
+    def verify_digests(cls):
+        """ Audit all the signed documents.
+        Called by the background verifier (cron) """
+        documents = cls.search([
+            ('document_digest', '!=', None),
+            ], order=[('id', 'ASC')])
+        for sub_documents in grouped_slice(documents):
+            cls.verify_digest(list(sub_documents))
+
+
+class PatientPrescriptionOrder(DigestMixin, ModelSQL, ModelView):
     """ Add the serialized and hash fields to the
     prescription order document"""
     
@@ -77,15 +179,15 @@ class PatientPrescriptionOrder(ModelSQL, ModelView):
 
     serializer_current = fields.Function(fields.Text('Current Doc',
             states={
-            'invisible': Not(Bool(Eval('digest_status'))),
-            }),
+            'invisible': Not(Bool(Eval('digest_altered'))),
+            }, depends=['digest_altered']),
         'check_digest')
 
         
     digest_current = fields.Function(fields.Char('Current Hash',
             states={
-            'invisible': Not(Bool(Eval('digest_status'))),
-            }),
+            'invisible': Not(Bool(Eval('digest_altered'))),
+            }, depends=['digest_altered']),
         'check_digest')
 
     digital_signature = fields.Text('Digital Signature', readonly=True)
@@ -98,6 +200,9 @@ class PatientPrescriptionOrder(ModelSQL, ModelView):
     @classmethod
     def __setup__(cls):
         cls._buttons.update({
+            'verify_digest': {
+                'invisible': Not(Bool(Eval('document_digest'))),
+                },
             'generate_prescription': {
                 'invisible': Equal(Eval('state'), 'validated'),
             },
@@ -126,6 +231,8 @@ class PatientPrescriptionOrder(ModelSQL, ModelView):
         cls.write(prescriptions, {
             'serializer': serial_doc,
             'document_digest': HealthCrypto().gen_hash(serial_doc),
+            'digest_altered': False,
+            'digest_verified': datetime.now(),
             'state': 'validated',})
 
 
@@ -173,22 +280,6 @@ class PatientPrescriptionOrder(ModelSQL, ModelView):
 
 
 
-    def check_digest (self,name):
-        result=''
-        serial_doc=self.get_serial(self)
-        if (name == 'digest_status' and self.document_digest):
-            if (HealthCrypto().gen_hash(serial_doc) == self.document_digest):
-                result = False
-            else:
-                ''' Return true if the document has been altered'''
-                result = True
-        if (name=='digest_current'):
-            result = HealthCrypto().gen_hash(serial_doc)
-
-        if (name=='serializer_current'):
-            result = serial_doc
-            
-        return result
  
     # Hide the group holding validation information when state is 
     # not validated
@@ -200,7 +291,7 @@ class PatientPrescriptionOrder(ModelSQL, ModelView):
                 })]
        
 
-class BirthCertificate(ModelSQL, ModelView):
+class BirthCertificate(DigestMixin, ModelSQL, ModelView):
     
     __name__ = 'gnuhealth.birth_certificate'
     
@@ -221,15 +312,15 @@ class BirthCertificate(ModelSQL, ModelView):
 
     serializer_current = fields.Function(fields.Text('Current Doc',
             states={
-            'invisible': Not(Bool(Eval('digest_status'))),
-            }),
+            'invisible': Not(Bool(Eval('digest_altered'))),
+            }, depends=['digest_altered']),
         'check_digest')
 
         
     digest_current = fields.Function(fields.Char('Current Hash',
             states={
-            'invisible': Not(Bool(Eval('digest_status'))),
-            }),
+            'invisible': Not(Bool(Eval('digest_altered'))),
+            }, depends=['digest_altered']),
         'check_digest')
 
     digital_signature = fields.Text('Digital Signature', readonly=True)
@@ -237,6 +328,9 @@ class BirthCertificate(ModelSQL, ModelView):
     @classmethod
     def __setup__(cls):
         cls._buttons.update({
+            'verify_digest': {
+                'invisible': Not(Bool(Eval('document_digest'))),
+                },
             'generate_birth_certificate': {
                 'invisible': Not(Equal(Eval('state'), 'signed'))},
             })
@@ -263,6 +357,8 @@ class BirthCertificate(ModelSQL, ModelView):
         cls.write(certificates, {
             'serializer': serial_doc,
             'document_digest': HealthCrypto().gen_hash(serial_doc),
+            'digest_altered': False,
+            'digest_verified': datetime.now(),
             'state': 'done',})
 
 
@@ -302,32 +398,16 @@ class BirthCertificate(ModelSQL, ModelView):
             'digital_signature': signature,
             })
 
-    def check_digest (self,name):
-        result=''
-        serial_doc=self.get_serial(self)
-        if (name == 'digest_status' and self.document_digest):
-            if (HealthCrypto().gen_hash(serial_doc) == self.document_digest):
-                result = False
-            else:
-                ''' Return true if the document has been altered'''
-                result = True
-        if (name=='digest_current'):
-            result = HealthCrypto().gen_hash(serial_doc)
-
-        if (name=='serializer_current'):
-            result = serial_doc
-            
-        return result
 
     # Hide the group holding all the digital signature until signed
         
     @classmethod
     def view_attributes(cls):
         return [('//group[@id="group_current_string"]', 'states', {
-                'invisible': ~Eval('digest_status'),
+                'invisible': ~Eval('digest_altered'),
                 })]
 
-class DeathCertificate(ModelSQL, ModelView):
+class DeathCertificate(DigestMixin, ModelSQL, ModelView):
     
     __name__ = 'gnuhealth.death_certificate'
     
@@ -348,15 +428,15 @@ class DeathCertificate(ModelSQL, ModelView):
 
     serializer_current = fields.Function(fields.Text('Current Doc',
             states={
-            'invisible': Not(Bool(Eval('digest_status'))),
-            }),
+            'invisible': Not(Bool(Eval('digest_altered'))),
+            }, depends=['digest_altered']),
         'check_digest')
 
         
     digest_current = fields.Function(fields.Char('Current Hash',
             states={
-            'invisible': Not(Bool(Eval('digest_status'))),
-            }),
+            'invisible': Not(Bool(Eval('digest_altered'))),
+            }, depends=['digest_altered']),
         'check_digest')
 
     digital_signature = fields.Text('Digital Signature', readonly=True)
@@ -364,6 +444,9 @@ class DeathCertificate(ModelSQL, ModelView):
     @classmethod
     def __setup__(cls):
         cls._buttons.update({
+            'verify_digest': {
+                'invisible': Not(Bool(Eval('document_digest'))),
+                },
             'generate_death_certificate': {
                 'invisible': Not(Equal(Eval('state'), 'signed')),
                 },
@@ -391,6 +474,8 @@ class DeathCertificate(ModelSQL, ModelView):
         cls.write(certificates, {
             'serializer': serial_doc,
             'document_digest': HealthCrypto().gen_hash(serial_doc),
+            'digest_altered': False,
+            'digest_verified': datetime.now(),
             'state': 'done',})
 
 
@@ -441,32 +526,16 @@ class DeathCertificate(ModelSQL, ModelView):
             'digital_signature': signature,
             })
 
-    def check_digest (self,name):
-        result=''
-        serial_doc=self.get_serial(self)
-        if (name == 'digest_status' and self.document_digest):
-            if (HealthCrypto().gen_hash(serial_doc) == self.document_digest):
-                result = False
-            else:
-                ''' Return true if the document has been altered'''
-                result = True
-        if (name=='digest_current'):
-            result = HealthCrypto().gen_hash(serial_doc)
-
-        if (name=='serializer_current'):
-            result = serial_doc
-            
-        return result
 
     # Hide the group holding all the digital signature until signed
         
     @classmethod
     def view_attributes(cls):
         return [('//group[@id="group_current_string"]', 'states', {
-                'invisible': ~Eval('digest_status'),
+                'invisible': ~Eval('digest_altered'),
                 })]
 
-class PatientEvaluation(ModelSQL, ModelView):
+class PatientEvaluation(DigestMixin, ModelSQL, ModelView):
     __name__ = 'gnuhealth.patient.evaluation'
     
     serializer = fields.Text('Doc String', readonly=True)
@@ -486,15 +555,15 @@ class PatientEvaluation(ModelSQL, ModelView):
 
     serializer_current = fields.Function(fields.Text('Current Doc',
             states={
-            'invisible': Not(Bool(Eval('digest_status'))),
-            }),
+            'invisible': Not(Bool(Eval('digest_altered'))),
+            }, depends=['digest_altered']),
         'check_digest')
 
         
     digest_current = fields.Function(fields.Char('Current Hash',
             states={
-            'invisible': Not(Bool(Eval('digest_status'))),
-            }),
+            'invisible': Not(Bool(Eval('digest_altered'))),
+            }, depends=['digest_altered']),
         'check_digest')
 
     digital_signature = fields.Text('Digital Signature', readonly=True)
@@ -502,6 +571,9 @@ class PatientEvaluation(ModelSQL, ModelView):
     @classmethod
     def __setup__(cls):
         cls._buttons.update({
+            'verify_digest': {
+                'invisible': Not(Bool(Eval('document_digest'))),
+                },
             'sign_evaluation': {
                 'invisible': Not(Equal(Eval('state'), 'done')),
                 },
@@ -535,6 +607,8 @@ class PatientEvaluation(ModelSQL, ModelView):
         cls.write(evaluations, {
             'serializer': serial_doc,
             'document_digest': HealthCrypto().gen_hash(serial_doc),
+            'digest_altered': False,
+            'digest_verified': datetime.now(),
             'state': 'signed',})
 
 
@@ -659,22 +733,6 @@ class PatientEvaluation(ModelSQL, ModelView):
             'digital_signature': signature,
             })
 
-    def check_digest (self,name):
-        result=''
-        serial_doc=self.get_serial(self)
-        if (name == 'digest_status' and self.document_digest):
-            if (HealthCrypto().gen_hash(serial_doc) == self.document_digest):
-                result = False
-            else:
-                ''' Return true if the document has been altered'''
-                result = True
-        if (name=='digest_current'):
-            result = HealthCrypto().gen_hash(serial_doc)
-
-        if (name=='serializer_current'):
-            result = serial_doc
-            
-        return result
     # Hide the group holding all the digital signature until signed
         
     @classmethod
@@ -682,5 +740,5 @@ class PatientEvaluation(ModelSQL, ModelView):
         return [('//group[@id="group_digital_signature"]', 'states', {
                 'invisible': ~Eval('digital_signature')}),
                 ('//group[@id="group_current_string"]', 'states', {
-                'invisible': ~Eval('digest_status'),
+                'invisible': ~Eval('digest_altered'),
                 })]
@@ -31,6 +31,7 @@ def register():
         InpatientSequences,
         DietTherapeutic,
         InpatientRegistration,
+        HospitalBed,
         BedTransfer,
         Appointment,
         PatientEvaluation,
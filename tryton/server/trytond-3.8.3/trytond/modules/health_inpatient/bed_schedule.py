@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    GNU Health: The Free Health and Hospital Information System
+#    Copyright (C) 2008-2016 Luis Falcon <lfalcon@gnusolidario.org>
+#    Copyright (C) 2011-2016 GNU Solidario <health@gnusolidario.org>
+#
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+from bisect import bisect_left, bisect_right
+
+__all__ = ['BedSchedule']
+
+
+class BedSchedule(object):
+    """ In-memory interval index of the bookings of the hospital beds
+
+    The periods are half-open [start, end), like the SQL OVERLAPS
+    operator and the PostgreSQL tsrange used by the exclusion constraint.
+
+    The bookings of each bed are kept sorted by start date together with
+    the running maximum of their end dates, so checking whether a period
+    overlaps a booking of the bed is a binary search.
+    """
+
+    def __init__(self, bookings=None):
+        self._starts = {}
+        self._max_ends = {}
+        for bed, start, end in bookings or []:
+            self.add(bed, start, end)
+
+    def add(self, bed, start, end):
+        "Add the booking of the bed from start to end"
+        starts = self._starts.setdefault(bed, [])
+        max_ends = self._max_ends.setdefault(bed, [])
+
+        index = bisect_right(starts, start)
+        starts.insert(index, start)
+        if index:
+            max_ends.insert(index, max(max_ends[index - 1], end))
+        else:
+            max_ends.insert(index, end)
+        # Propagate the new end date to the following bookings
+        for i in xrange(index + 1, len(max_ends)):
+            if max_ends[i] >= end:
+                break
+            max_ends[i] = end
+
+    def overlaps(self, bed, start, end):
+        "Test if the bed has a booking overlapping the period"
+        starts = self._starts.get(bed)
+        if not starts:
+            return False
+        # Only the bookings starting before the end of the period can overlap
+        index = bisect_left(starts, end)
+        return index > 0 and self._max_ends[bed][index - 1] > start
+
+    def is_free(self, bed, start, end):
+        "Test if the bed is free for the whole period"
+        return not self.overlaps(bed, start, end)
@@ -20,23 +20,50 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 ##############################################################################
+import logging
 from datetime import datetime
 from trytond.model import ModelView, ModelSingleton, ModelSQL, fields, Unique
 from trytond.transaction import Transaction
 from trytond.tools import grouped_slice, reduce_ids
 from sql import Literal, Table
+from sql.functions import Function
+from sql.operators import BinaryOperator
 from trytond.pool import Pool
 from trytond.pyson import Eval, Not, Bool, And, Equal, Or
+from trytond.rpc import RPC
 from trytond import backend
 
+from .bed_schedule import BedSchedule
+
 
 __all__ = ['InpatientSequences', 'DietTherapeutic','InpatientRegistration', 
-    'BedTransfer', 'Appointment', 'PatientEvaluation', 'PatientData',
-    'InpatientMedication', 'InpatientMedicationAdminTimes',
+    'HospitalBed', 'BedTransfer', 'Appointment', 'PatientEvaluation',
+    'PatientData', 'InpatientMedication', 'InpatientMedicationAdminTimes',
     'InpatientMedicationLog', 'InpatientDiet', 'InpatientMeal',
     'InpatientMealOrder','InpatientMealOrderItem', 'ECG']
 
 
+logger = logging.getLogger(__name__)
+
+# States of the registrations holding the bed
+BOOKING_STATES = ('confirmed', 'hospitalized', 'done')
+
+
+class TsRange(Function):
+    __slots__ = ()
+    _function = 'TSRANGE'
+
+
+class Int4Range(Function):
+    __slots__ = ()
+    _function = 'INT4RANGE'
+
+
+class Overlap(BinaryOperator):
+    __slots__ = ()
+    _operator = '&&'
+
+
 class InpatientSequences(ModelSingleton, ModelSQL, ModelView):
     "Inpatient Registration Sequences for GNU Health"
     __name__ = "gnuhealth.sequences"
@@ -108,7 +135,11 @@ class InpatientRegistration(ModelSQL, ModelView):
                             Bool(Eval('name')),
                         )
             },
-        depends=['name'])
+        context={
+            'availability_start': Eval('hospitalization_date'),
+            'availability_end': Eval('discharge_date'),
+            },
+        depends=['name', 'hospitalization_date', 'discharge_date'])
     nursing_plan = fields.Text('Nursing Plan', states = STATES)
     medications = fields.One2Many('gnuhealth.inpatient.medication', 'name',
         'Medications', states = STATES)
@@ -192,6 +223,50 @@ class InpatientRegistration(ModelSQL, ModelView):
         if table.column_exist('diet_belief'):
             table.drop_column('diet_belief')
 
+        if backend.name() == 'postgresql':
+            cls._register_booking_exclusion()
+
+    @classmethod
+    def _register_booking_exclusion(cls):
+        '''
+        Prevent overlapping bookings of the same bed at the database level.
+        The GiST index of the exclusion constraint also serves the bed
+        availability searches.
+        '''
+        cursor = Transaction().cursor
+        constraint = cls._table + '_bed_booking_exclude'
+        # information_schema.table_constraints does not list EXCLUDE
+        cursor.execute('SELECT 1 FROM pg_constraint '
+            'WHERE conname = %s AND conrelid = %s::regclass',
+            (constraint, cls._table))
+        if cursor.fetchone():
+            return
+
+        # Adding the constraint on overlapping bookings would fail
+        registration = cls.__table__()
+        other = cls.__table__()
+        cursor.execute(*registration.join(other,
+                condition=(registration.bed == other.bed)
+                & (registration.id < other.id)
+                ).select(registration.id,
+                where=registration.state.in_(BOOKING_STATES)
+                & other.state.in_(BOOKING_STATES)
+                & (registration.hospitalization_date < other.discharge_date)
+                & (registration.discharge_date > other.hospitalization_date),
+                limit=1))
+        if cursor.fetchone():
+            logger.warning('Unable to add the bed booking exclusion '
+                'constraint on table %s because of overlapping bookings!',
+                cls._table)
+            return
+
+        cursor.execute('ALTER TABLE "%s" ADD CONSTRAINT "%s" '
+            'EXCLUDE USING GIST ('
+                'TSRANGE("hospitalization_date", "discharge_date") WITH &&, '
+                'INT4RANGE("bed", "bed", \'[]\') WITH &&) '
+            'WHERE ("state" IN (%s))'
+            % (cls._table, constraint,
+                ', '.join("'%s'" % s for s in BOOKING_STATES)))
 
     @classmethod
     def __setup__(cls):
@@ -202,8 +277,16 @@ class InpatientRegistration(ModelSQL, ModelView):
                 'The Registration code already exists'),
             ]
 
+        cls._sql_error_messages.update({
+                'bed_booking_exclude': 'Bed is not available',
+                })
+
         cls._error_messages.update({
                 'bed_is_not_available': 'Bed is not available',
+                'bed_not_available_for': ('Bed "%(bed)s" is not available '
+                    'for registration "%(registration)s"'),
+                'discharge_before_admission': ('The Discharge date must '
+                    'be later than the Admission'),
                 'discharge_reason_needed': 'Admission and Discharge reasons \n'
                 'as well as Discharge Dx are needed',
                 'destination_bed_unavailable': 'Destination bed unavailable'})
@@ -232,34 +315,52 @@ class InpatientRegistration(ModelSQL, ModelView):
     @classmethod
     @ModelView.button
     def confirmed(cls, registrations):
-        registration_id = registrations[0]
         Bed = Pool().get('gnuhealth.hospital.bed')
-        cursor = Transaction().cursor
-        bed_id = registration_id.bed.id
-        cursor.execute("SELECT COUNT(*) \
-            FROM gnuhealth_inpatient_registration \
-            WHERE (hospitalization_date::timestamp,discharge_date::timestamp) \
-                OVERLAPS (timestamp %s, timestamp %s) \
-              AND (state = %s or state = %s or state = %s) \
-              AND bed = CAST(%s AS INTEGER) ",
-            (registration_id.hospitalization_date,
-            registration_id.discharge_date,
-            'confirmed', 'hospitalized', 'done', str(bed_id)))
-        res = cursor.fetchone()
-        if (registration_id.discharge_date.date() <
-            registration_id.hospitalization_date.date()):
-            cls.raise_user_error("The Discharge date must later than the \
-                Admission")
-        if res[0] > 0:
-            cls.raise_user_error('bed_is_not_available')
-        else:
-            cls.write(registrations, {'state': 'confirmed'})
-            Bed.write([registration_id.bed], {'state': 'reserved'})
+
+        for registration in registrations:
+            if (registration.discharge_date <
+                    registration.hospitalization_date):
+                cls.raise_user_error('discharge_before_admission')
+        cls.check_bed_availability(registrations)
+
+        cls.write(registrations, {'state': 'confirmed'})
+        Bed.write([r.bed for r in registrations], {'state': 'reserved'})
+
+    @classmethod
+    def check_bed_availability(cls, registrations):
+        '''
+        Check that the beds of the registrations are free for their period.
+        The registrations are checked against the existing bookings and
+        against each other with a single query.
+        '''
+        Bed = Pool().get('gnuhealth.hospital.bed')
+        if not registrations:
+            return
+        start = min(r.hospitalization_date for r in registrations)
+        end = max(r.discharge_date for r in registrations)
+        bookings = Bed.get_bookings(list(set(r.bed for r in registrations)),
+            start, end, exclude=[r.id for r in registrations])
+
+        schedule = BedSchedule((bed_id, b_start, b_end)
+            for bed_id, periods in bookings.iteritems()
+            for b_start, b_end, _ in periods)
+        for registration in sorted(registrations,
+                key=lambda r: r.hospitalization_date):
+            bed_id = registration.bed.id
+            if schedule.overlaps(bed_id, registration.hospitalization_date,
+                    registration.discharge_date):
+                if len(registrations) == 1:
+                    cls.raise_user_error('bed_is_not_available')
+                cls.raise_user_error('bed_not_available_for', {
+                        'bed': registration.bed.rec_name,
+                        'registration': registration.name,
+                        })
+            schedule.add(bed_id, registration.hospitalization_date,
+                registration.discharge_date)
 
     @classmethod
     @ModelView.button
     def discharge(cls, registrations):
-        registration_id = registrations[0]
         Bed = Pool().get('gnuhealth.hospital.bed')
 
         signing_hp = Pool().get('gnuhealth.healthprofessional').get_health_professional()
@@ -270,39 +371,37 @@ class InpatientRegistration(ModelSQL, ModelView):
         cls.write(registrations, {'state': 'done',
             'discharged_by': signing_hp})
 
-        Bed.write([registration_id.bed], {'state': 'to_clean'})
+        Bed.write([r.bed for r in registrations], {'state': 'to_clean'})
 
     @classmethod
     @ModelView.button
     def bedclean(cls, registrations):
-        registration_id = registrations[0]
         Bed = Pool().get('gnuhealth.hospital.bed')
 
         cls.write(registrations, {'state': 'finished'})
 
-        Bed.write([registration_id.bed], {'state': 'free'})
+        Bed.write([r.bed for r in registrations], {'state': 'free'})
 
     @classmethod
     @ModelView.button
     def cancel(cls, registrations):
-        registration_id = registrations[0]
         Bed = Pool().get('gnuhealth.hospital.bed')
 
         cls.write(registrations, {'state': 'cancelled'})
-        Bed.write([registration_id.bed], {'state': 'free'})
+        Bed.write([r.bed for r in registrations], {'state': 'free'})
 
     @classmethod
     @ModelView.button
     def admission(cls, registrations):
-        registration_id = registrations[0]
         Bed = Pool().get('gnuhealth.hospital.bed')
 
-        if (registration_id.hospitalization_date.date() !=
-            datetime.today().date()):
-            cls.raise_user_error("The Admission date must be today")
-        else:
-            cls.write(registrations, {'state': 'hospitalized'})
-            Bed.write([registration_id.bed], {'state': 'occupied'})
+        for registration in registrations:
+            if (registration.hospitalization_date.date() !=
+                datetime.today().date()):
+                cls.raise_user_error("The Admission date must be today")
+
+        cls.write(registrations, {'state': 'hospitalized'})
+        Bed.write([r.bed for r in registrations], {'state': 'occupied'})
 
     @classmethod
     def create(cls, vlist):
@@ -362,6 +461,100 @@ class InpatientRegistration(ModelSQL, ModelView):
 
 
         
+class HospitalBed(ModelSQL, ModelView):
+    __name__ = 'gnuhealth.hospital.bed'
+
+    available = fields.Function(fields.Boolean('Available',
+            help="Free for the period given by the \"availability_start\""
+            " and \"availability_end\" keys of the context"),
+        'get_available', searcher='search_available')
+
+    @classmethod
+    def __setup__(cls):
+        super(HospitalBed, cls).__setup__()
+        cls.__rpc__.update({
+                'search_free': RPC(result=lambda r: map(int, r)),
+                })
+
+    @classmethod
+    def get_bookings(cls, beds, start, end, exclude=None):
+        '''
+        Return for each bed the list of (start, end, registration id) of the
+        bookings overlapping the period from start to end.
+        The registrations in exclude are not taken into account.
+        '''
+        Registration = Pool().get('gnuhealth.inpatient.registration')
+        registration = Registration.__table__()
+        cursor = Transaction().cursor
+
+        bookings = dict((b.id, []) for b in beds)
+        if backend.name() == 'postgresql':
+            # Same expression as the exclusion constraint to use its index
+            overlap = Overlap(
+                TsRange(registration.hospitalization_date,
+                    registration.discharge_date),
+                TsRange(start, end))
+        else:
+            overlap = ((registration.hospitalization_date < end)
+                & (registration.discharge_date > start))
+        where = registration.state.in_(BOOKING_STATES) & overlap
+        if exclude:
+            where &= ~registration.id.in_(exclude)
+        for sub_ids in grouped_slice(bookings.keys()):
+            cursor.execute(*registration.select(registration.bed,
+                    registration.hospitalization_date,
+                    registration.discharge_date, registration.id,
+                    where=where & reduce_ids(registration.bed, sub_ids),
+                    order_by=registration.hospitalization_date.asc))
+            for bed_id, b_start, b_end, registration_id in cursor.fetchall():
+                bookings[bed_id].append((b_start, b_end, registration_id))
+        return bookings
+
+    @classmethod
+    def search_free(cls, start, end, domain=None):
+        '''
+        Return the beds matching the domain that are free for the whole
+        period from start to end.
+        The availability of all the beds is computed with one query per
+        slice of beds, for example: which electric beds of a ward are free
+        next week.
+        '''
+        beds = cls.search([
+                ('state', '!=', 'na'),
+                ] + (domain or []))
+        bookings = cls.get_bookings(beds, start, end)
+        return [b for b in beds if not bookings[b.id]]
+
+    @staticmethod
+    def _get_availability_period():
+        context = Transaction().context
+        return (context.get('availability_start'),
+            context.get('availability_end'))
+
+    @classmethod
+    def get_available(cls, beds, name):
+        start, end = cls._get_availability_period()
+        if not start or not end:
+            return dict((b.id, b.state == 'free') for b in beds)
+        free = set(cls.search_free(start, end, [
+                    ('id', 'in', [b.id for b in beds]),
+                    ]))
+        return dict((b.id, b in free) for b in beds)
+
+    @classmethod
+    def search_available(cls, name, clause):
+        start, end = cls._get_availability_period()
+        _, operator, value = clause
+        if start and end:
+            beds = cls.search_free(start, end)
+        else:
+            beds = cls.search([('state', '=', 'free')])
+        ids = [b.id for b in beds]
+        if (operator == '=') == bool(value):
+            return [('id', 'in', ids)]
+        return [('id', 'not in', ids)]
+
+
 class BedTransfer(ModelSQL, ModelView):
     'Bed transfers'
     __name__ = 'gnuhealth.bed.transfer'
@@ -1,6 +1,8 @@
 import unittest
+from datetime import datetime
 import trytond.tests.test_tryton
 from trytond.tests.test_tryton import ModuleTestCase
+from trytond.modules.health_inpatient.bed_schedule import BedSchedule
 
 
 class HealthInpatientTestCase(ModuleTestCase):
@@ -9,6 +11,33 @@ class HealthInpatientTestCase(ModuleTestCase):
     '''
     module = 'health_inpatient'
 
+    def test_bed_schedule(self):
+        'Test BedSchedule'
+        schedule = BedSchedule([
+                (1, datetime(2016, 1, 1), datetime(2016, 1, 10)),
+                (1, datetime(2016, 1, 20), datetime(2016, 1, 25)),
+                (2, datetime(2016, 1, 5), datetime(2016, 1, 6)),
+                ])
+        for bed, start, end, overlaps in [
+                (1, datetime(2015, 12, 1), datetime(2016, 1, 1), False),
+                (1, datetime(2015, 12, 1), datetime(2016, 1, 2), True),
+                (1, datetime(2016, 1, 10), datetime(2016, 1, 20), False),
+                (1, datetime(2016, 1, 9), datetime(2016, 1, 11), True),
+                (1, datetime(2016, 1, 21), datetime(2016, 1, 22), True),
+                (1, datetime(2016, 1, 25), datetime(2016, 2, 1), False),
+                (2, datetime(2016, 1, 1), datetime(2016, 1, 10), True),
+                (3, datetime(2016, 1, 1), datetime(2016, 1, 10), False),
+                ]:
+            self.assertEqual(schedule.overlaps(bed, start, end), overlaps,
+                (bed, start, end))
+
+        # A long booking starting early hides the following gaps
+        schedule.add(1, datetime(2015, 12, 31), datetime(2016, 1, 30))
+        self.assertTrue(schedule.overlaps(
+                1, datetime(2016, 1, 12), datetime(2016, 1, 15)))
+        self.assertTrue(schedule.is_free(
+                1, datetime(2016, 1, 30), datetime(2016, 2, 5)))
+
 
 def suite():
     suite = trytond.tests.test_tryton.suite()
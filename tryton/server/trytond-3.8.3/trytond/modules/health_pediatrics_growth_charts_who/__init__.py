@@ -28,6 +28,9 @@ from .report import *
 def register():
     Pool.register(
         PediatricsGrowthChartsWHO,
+        PatientEvaluation,
+        Party,
+        Patient,
         OpenPediatricsGrowthChartsWHOReportStart,
         module='health_pediatrics_growth_charts_who', type_='model')
     Pool.register(
@@ -19,9 +19,53 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 ##############################################################################
+from array import array
+from itertools import izip
+from math import erf, log, sqrt
+
+from trytond import backend
 from trytond.model import ModelView, ModelSQL, fields
+from trytond.pool import Pool, PoolMeta
+from trytond.cache import Cache
+from trytond.transaction import Transaction
+from trytond.tools import grouped_slice
+
+__all__ = ['PediatricsGrowthChartsWHO', 'PatientEvaluation', 'Party',
+    'Patient']
+
+# The WHO charts go from birth to 5 years
+MAX_MONTH = 60
+# Average length of a month in days (365.25 / 12) used by the WHO standards
+DAYS_PER_MONTH = 30.4375
+# Indicators derived from the weight use the restricted application of the
+# LMS method beyond 3 standard deviations
+RESTRICTED_INDICATORS = ('w-f-a', 'bmi-f-a')
+
+NAN = float('nan')
+
 
-__all__ = ['PediatricsGrowthChartsWHO']
+def lms_zscore(value, l, m, s, restricted=False):
+    """ Return the z-score of value for the L, M and S parameters """
+    def measure(z):
+        return m * (1 + l * s * z) ** (1 / l)
+
+    if l:
+        zscore = ((value / m) ** l - 1) / (s * l)
+    else:
+        zscore = log(value / m) / s
+    if restricted and l:
+        if zscore > 3:
+            sd3 = measure(3)
+            zscore = 3 + (value - sd3) / (sd3 - measure(2))
+        elif zscore < -3:
+            sd3 = measure(-3)
+            zscore = -3 + (value - sd3) / (measure(-2) - sd3)
+    return zscore
+
+
+def zscore_percentile(zscore):
+    """ Return the percentile of the z-score in the normal distribution """
+    return 50 * (1 + erf(zscore / sqrt(2)))
 
 
 class PediatricsGrowthChartsWHO(ModelSQL, ModelView):
@@ -36,6 +80,7 @@ class PediatricsGrowthChartsWHO(ModelSQL, ModelView):
     measure = fields.Selection([
         ('p', 'percentiles'),
         ('z', 'z-scores'),
+        ('lms', 'LMS parameters'),
         ], 'Measure')
     sex = fields.Selection([
         ('m', 'Male'),
@@ -44,3 +89,293 @@ class PediatricsGrowthChartsWHO(ModelSQL, ModelView):
     month = fields.Integer('Month')
     type = fields.Char('Type')
     value = fields.Float('Value')
+
+    _charts_cache = Cache('gnuhealth_pediatrics_growth_charts_who.charts',
+        context=False)
+
+    @classmethod
+    def create(cls, vlist):
+        cls._charts_cache.clear()
+        charts = super(PediatricsGrowthChartsWHO, cls).create(vlist)
+        cls._update_evaluations(cls._lms_keys(charts))
+        return charts
+
+    @classmethod
+    def write(cls, *args):
+        cls._charts_cache.clear()
+        all_charts = sum(args[::2], [])
+        keys = cls._lms_keys(all_charts)
+        super(PediatricsGrowthChartsWHO, cls).write(*args)
+        keys |= cls._lms_keys(cls.browse([c.id for c in all_charts]))
+        cls._update_evaluations(keys)
+
+    @classmethod
+    def delete(cls, charts):
+        cls._charts_cache.clear()
+        keys = cls._lms_keys(charts)
+        super(PediatricsGrowthChartsWHO, cls).delete(charts)
+        cls._update_evaluations(keys)
+
+    @staticmethod
+    def _lms_keys(charts):
+        "Return the set of (sex, indicator) of the LMS parameters"
+        return set((c.sex, c.indicator) for c in charts
+            if c.measure == 'lms')
+
+    @classmethod
+    def _update_evaluations(cls, keys):
+        """ Recompute the z-scores of the evaluations for the (sex, indicator)
+        keys of the modified LMS parameters """
+        pool = Pool()
+        Evaluation = pool.get('gnuhealth.patient.evaluation')
+        if not keys:
+            return
+        sexes = list(set(s for s, _ in keys))
+        indicators = set(i for _, i in keys)
+        domain = [('patient', '!=', None)]
+        if None not in sexes:
+            domain.append(['OR',
+                    ('patient.biological_sex', 'in', sexes),
+                    [
+                        ('patient.biological_sex', '=', None),
+                        ('patient.name.gender', 'in', sexes),
+                        ],
+                    ])
+        domain.append(['OR'] + [(f, '!=', None)
+                for _, i, f in Evaluation._growth_indicators()
+                if i in indicators])
+        Evaluation.update_growth_zscores(Evaluation.search(domain),
+            indicators=indicators)
+
+    @classmethod
+    def get_charts(cls):
+        """ Return the charts as a dictionary keyed by (indicator, measure,
+        sex) of dictionaries keyed by type of arrays of the values
+        indexed by month (NaN for missing months).
+        The charts are loaded once per process and kept until modified """
+        charts = cls._charts_cache.get(None)
+        if charts is not None:
+            return charts
+
+        chart = cls.__table__()
+        cursor = Transaction().cursor
+        cursor.execute(*chart.select(chart.indicator, chart.measure,
+                chart.sex, chart.type, chart.month, chart.value))
+        charts = {}
+        for indicator, measure, sex, type_, month, value in cursor.fetchall():
+            if month is None or not 0 <= month <= MAX_MONTH:
+                continue
+            types = charts.setdefault((indicator, measure, sex), {})
+            if type_ not in types:
+                types[type_] = array('d', [NAN] * (MAX_MONTH + 1))
+            types[type_][month] = value if value is not None else NAN
+        cls._charts_cache.set(None, charts)
+        return charts
+
+    @classmethod
+    def compute_zscores(cls, indicator, sexes, ages, values):
+        """ Return the list of z-scores of the values for the indicator.
+        sexes, ages (in months, can be fractional) and values are
+        sequences of the same length.
+        The LMS parameters are interpolated between the months of the
+        charts. The z-score is None when the value is missing or the age is
+        outside of the charts """
+        charts = cls.get_charts()
+        restricted = indicator in RESTRICTED_INDICATORS
+        zscores = []
+        for sex, age, value in izip(sexes, ages, values):
+            lms = charts.get((indicator, 'lms', sex))
+            if (not lms or age is None or not value or value < 0
+                    or not 0 <= age <= MAX_MONTH):
+                zscores.append(None)
+                continue
+            month = min(int(age), MAX_MONTH - 1)
+            fraction = age - month
+            params = []
+            for type_ in ('L', 'M', 'S'):
+                values_ = lms.get(type_)
+                if values_ is None:
+                    break
+                start, end = values_[month], values_[month + 1]
+                params.append(start + (end - start) * fraction)
+            l, m, s = params if len(params) == 3 else (NAN, NAN, NAN)
+            if m != m or l != l or s != s:
+                zscores.append(None)
+                continue
+            zscores.append(lms_zscore(value, l, m, s, restricted=restricted))
+        return zscores
+
+
+class PatientEvaluation:
+    __metaclass__ = PoolMeta
+    __name__ = 'gnuhealth.patient.evaluation'
+
+    wfa_zscore = fields.Float('Weight for age z-score', digits=(2, 2),
+        readonly=True, select=True,
+        help="WHO weight for age z-score (up to 5 years)")
+    wfa_percentile = fields.Float('Weight for age percentile', digits=(3, 1),
+        readonly=True)
+    lhfa_zscore = fields.Float('Length/height for age z-score',
+        digits=(2, 2), readonly=True, select=True,
+        help="WHO length/height for age z-score (up to 5 years)")
+    lhfa_percentile = fields.Float('Length/height for age percentile',
+        digits=(3, 1), readonly=True)
+    bmifa_zscore = fields.Float('BMI for age z-score', digits=(2, 2),
+        readonly=True, select=True,
+        help="WHO body mass index for age z-score (up to 5 years)")
+    bmifa_percentile = fields.Float('BMI for age percentile', digits=(3, 1),
+        readonly=True)
+
+    @classmethod
+    def __register__(cls, module_name):
+        TableHandler = backend.get('TableHandler')
+        cursor = Transaction().cursor
+        table = TableHandler(cursor, cls, module_name)
+        created = not table.column_exist('wfa_zscore')
+
+        super(PatientEvaluation, cls).__register__(module_name)
+
+        # Compute the z-scores of the existing evaluations
+        # (when the LMS parameters are already loaded)
+        if created:
+            cls.update_growth_zscores(cls.search([]))
+
+    @classmethod
+    def _growth_indicators(cls):
+        "Return the list of (field prefix, WHO indicator, measure field)"
+        return [
+            ('wfa', 'w-f-a', 'weight'),
+            ('lhfa', 'l/h-f-a', 'height'),
+            ('bmifa', 'bmi-f-a', 'bmi'),
+            ]
+
+    @classmethod
+    def create(cls, vlist):
+        evaluations = super(PatientEvaluation, cls).create(vlist)
+        cls.update_growth_zscores(evaluations)
+        return evaluations
+
+    @classmethod
+    def write(cls, *args):
+        super(PatientEvaluation, cls).write(*args)
+        depends = set(['patient', 'evaluation_start'])
+        depends.update(f for _, _, f in cls._growth_indicators())
+        to_update = []
+        actions = iter(args)
+        for evaluations, values in zip(actions, actions):
+            if depends & set(values):
+                to_update.extend(evaluations)
+        cls.update_growth_zscores(to_update)
+
+    @classmethod
+    def update_patients_growth_zscores(cls, patients):
+        "Recompute the z-scores of the evaluations of the patients"
+        evaluations = []
+        for sub_patients in grouped_slice(patients):
+            evaluations.extend(cls.search([
+                        ('patient', 'in', [p.id for p in sub_patients]),
+                        ]))
+        cls.update_growth_zscores(evaluations)
+
+    @staticmethod
+    def get_age_months(dob, date):
+        "Return the age in (fractional) months at date"
+        if not dob or not date:
+            return None
+        return (date - dob).days / DAYS_PER_MONTH
+
+    @staticmethod
+    def get_growth_sex(patient):
+        "Return the sex of the WHO charts for the patient"
+        if not patient:
+            return None
+        return patient.biological_sex or patient.name.gender
+
+    @classmethod
+    def update_growth_zscores(cls, evaluations, indicators=None):
+        """ Compute and store the WHO growth z-scores and percentiles of the
+        evaluations for the WHO indicators (all by default).
+        The z-scores of all the evaluations are computed at once and written
+        with one action per distinct result """
+        pool = Pool()
+        GrowthChartsWHO = pool.get('gnuhealth.pediatrics.growth.charts.who')
+        if not evaluations:
+            return
+        indicators = [i for i in cls._growth_indicators()
+            if indicators is None or i[1] in indicators]
+
+        names = []
+        for prefix, _, _ in indicators:
+            names.append(prefix + '_zscore')
+            names.append(prefix + '_percentile')
+
+        for sub_evaluations in grouped_slice(evaluations):
+            sub_evaluations = cls.browse([e.id for e in sub_evaluations])
+            sexes, ages = [], []
+            for evaluation in sub_evaluations:
+                patient = evaluation.patient
+                start = evaluation.evaluation_start
+                sexes.append(cls.get_growth_sex(patient))
+                ages.append(cls.get_age_months(
+                        patient.dob if patient else None,
+                        start.date() if start else None))
+
+            results = [[] for _ in sub_evaluations]
+            for _, indicator, field in indicators:
+                zscores = GrowthChartsWHO.compute_zscores(indicator, sexes,
+                    ages, [getattr(e, field) for e in sub_evaluations])
+                for result, zscore in izip(results, zscores):
+                    if zscore is None:
+                        result.extend([None, None])
+                    else:
+                        result.extend([round(zscore, 2),
+                                round(zscore_percentile(zscore), 1)])
+
+            to_write = {}
+            for evaluation, result in izip(sub_evaluations, results):
+                to_write.setdefault(tuple(result), []).append(evaluation)
+            args = []
+            for values, records in to_write.iteritems():
+                args.extend((records, dict(izip(names, values))))
+            cls.write(*args)
+
+
+class Party:
+    __metaclass__ = PoolMeta
+    __name__ = 'party.party'
+
+    @classmethod
+    def write(cls, *args):
+        pool = Pool()
+        Patient = pool.get('gnuhealth.patient')
+        Evaluation = pool.get('gnuhealth.patient.evaluation')
+        super(Party, cls).write(*args)
+        parties = []
+        actions = iter(args)
+        for records, values in zip(actions, actions):
+            if set(['dob', 'gender']) & set(values):
+                parties.extend(records)
+        if parties:
+            patients = []
+            for sub_parties in grouped_slice(parties):
+                patients.extend(Patient.search([
+                            ('name', 'in', [p.id for p in sub_parties]),
+                            ]))
+            Evaluation.update_patients_growth_zscores(patients)
+
+
+class Patient:
+    __metaclass__ = PoolMeta
+    __name__ = 'gnuhealth.patient'
+
+    @classmethod
+    def write(cls, *args):
+        pool = Pool()
+        Evaluation = pool.get('gnuhealth.patient.evaluation')
+        super(Patient, cls).write(*args)
+        patients = []
+        actions = iter(args)
+        for records, values in zip(actions, actions):
+            if set(['name', 'biological_sex']) & set(values):
+                patients.extend(records)
+        Evaluation.update_patients_growth_zscores(patients)
@@ -62,12 +62,8 @@ class PediatricsGrowthChartsWHOReport(Report):
 
         patient = Patient(data['patient'])
 
-        growthchartswho = GrowthChartsWHO.search([
-                ('indicator', '=', data['indicator']),
-                ('measure', '=', data['measure']),
-                ('sex', '=', patient.gender),
-                ], order=[('month', 'ASC')],
-                )
+        growthchartswho = GrowthChartsWHO.get_charts().get(
+            (data['indicator'], data['measure'], patient.gender), {})
 
         context['title'] = _INDICATORS[data['indicator']] + ' ' + \
             _GENDERS[patient.gender]
@@ -92,13 +88,14 @@ class PediatricsGrowthChartsWHOReport(Report):
             context['p85'] = '2'
             context['p97'] = '3'
 
-        for value in growthchartswho:
+        for type_, values in growthchartswho.iteritems():
             if data['measure'] == 'p':
-                context[value.type.lower() + '_' + str(value.month)] = \
-                    value.value
+                key = type_.lower()
             else:
-                context[_TYPES[value.type] + '_' + str(value.month)] = \
-                    value.value
+                key = _TYPES[type_]
+            for month, value in enumerate(values):
+                if value == value:
+                    context[key + '_' + str(month)] = value
 
         evaluations = Evaluation.search([
                 ('patient', '=', data['patient']),
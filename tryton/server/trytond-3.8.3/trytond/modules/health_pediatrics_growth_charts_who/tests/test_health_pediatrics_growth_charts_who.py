@@ -1,6 +1,12 @@
 import unittest
+import datetime
 import trytond.tests.test_tryton
-from trytond.tests.test_tryton import ModuleTestCase
+from trytond.tests.test_tryton import ModuleTestCase, POOL, DB_NAME, USER, \
+    CONTEXT
+from trytond.transaction import Transaction
+
+from trytond.modules.health_pediatrics_growth_charts_who.\
+    health_pediatrics_growth_charts_who import lms_zscore, zscore_percentile
 
 
 class HealthPediatricsGrowthChartsWHOTestCase(ModuleTestCase):
@@ -9,6 +15,121 @@ class HealthPediatricsGrowthChartsWHOTestCase(ModuleTestCase):
     '''
     module = 'health_pediatrics_growth_charts_who'
 
+    def test_lms_zscore(self):
+        'Test lms_zscore'
+        # Weight for age of boys at birth
+        l, m, s = 0.3487, 3.3464, 0.14602
+
+        def measure(z):
+            return m * (1 + l * s * z) ** (1 / l)
+
+        self.assertAlmostEqual(lms_zscore(m, l, m, s), 0)
+        for z in (-3, -2, -1, 1, 2, 3):
+            self.assertAlmostEqual(lms_zscore(measure(z), l, m, s), z)
+        self.assertAlmostEqual(lms_zscore(m, 0, m, s), 0)
+
+        # Restricted application beyond 3 standard deviations
+        sd3, sd23 = measure(3), measure(3) - measure(2)
+        self.assertAlmostEqual(
+            lms_zscore(sd3 + sd23, l, m, s, restricted=True), 4)
+        sd3, sd23 = measure(-3), measure(-2) - measure(-3)
+        self.assertAlmostEqual(
+            lms_zscore(sd3 - sd23, l, m, s, restricted=True), -4)
+
+    def test_zscore_percentile(self):
+        'Test zscore_percentile'
+        self.assertAlmostEqual(zscore_percentile(0), 50)
+        self.assertAlmostEqual(zscore_percentile(-2), 2.275, places=3)
+        self.assertAlmostEqual(zscore_percentile(2), 97.725, places=3)
+
+    def test_evaluation_zscores(self):
+        'Test z-scores of evaluation follow the patient'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            Party = POOL.get('party.party')
+            Patient = POOL.get('gnuhealth.patient')
+            Evaluation = POOL.get('gnuhealth.patient.evaluation')
+            HealthProfessional = POOL.get('gnuhealth.healthprofessional')
+            GrowthChartsWHO = POOL.get(
+                'gnuhealth.pediatrics.growth.charts.who')
+
+            physician, = Party.create([{
+                        'name': 'Physician',
+                        'is_person': True,
+                        'is_healthprof': True,
+                        'gender': 'f',
+                        }])
+            healthprof, = HealthProfessional.create([{
+                        'name': physician.id,
+                        'institution': None,
+                        }])
+            party, = Party.create([{
+                        'name': 'Child',
+                        'is_person': True,
+                        'is_patient': True,
+                        'gender': 'm',
+                        'dob': datetime.date(2016, 1, 1),
+                        }])
+            patient, = Patient.create([{
+                        'name': party.id,
+                        }])
+            # Median weight of boys at 1 month
+            evaluation, = Evaluation.create([{
+                        'code': 'EVAL1',
+                        'patient': patient.id,
+                        'institution': None,
+                        'healthprof': healthprof.id,
+                        'evaluation_start': datetime.datetime(
+                            2016, 1, 31, 10, 30),
+                        'weight': 4.47,
+                        }])
+            self.assertAlmostEqual(evaluation.wfa_zscore, 0, places=1)
+            self.assertAlmostEqual(evaluation.wfa_percentile, 50, delta=1)
+
+            # Born one month earlier
+            Party.write([party], {
+                    'dob': datetime.date(2015, 12, 1),
+                    })
+            evaluation = Evaluation(evaluation.id)
+            self.assertLess(evaluation.wfa_zscore, -1)
+
+            # Girls have a different chart
+            Party.write([party], {
+                    'dob': datetime.date(2016, 1, 1),
+                    'gender': 'f',
+                    })
+            evaluation = Evaluation(evaluation.id)
+            self.assertGreater(evaluation.wfa_zscore, 0)
+
+            # The biological sex takes precedence over the gender
+            Patient.write([patient], {
+                    'biological_sex': 'm',
+                    })
+            self.assertEqual(patient.gender, 'm-f')
+            evaluation = Evaluation(evaluation.id)
+            self.assertAlmostEqual(evaluation.wfa_zscore, 0, places=1)
+
+            # Only the evaluations of the modified charts are updated
+            # (the charts are XML records that only root can modify)
+            charts = GrowthChartsWHO.search([
+                    ('indicator', '=', 'w-f-a'),
+                    ('measure', '=', 'lms'),
+                    ('type', '=', 'M'),
+                    ('month', 'in', [0, 1, 2]),
+                    ])
+            write_date = evaluation.write_date
+            with Transaction().set_user(0):
+                GrowthChartsWHO.write([c for c in charts if c.sex == 'f'], {
+                        'value': 1,
+                        })
+            evaluation = Evaluation(evaluation.id)
+            self.assertEqual(evaluation.write_date, write_date)
+            with Transaction().set_user(0):
+                GrowthChartsWHO.write([c for c in charts if c.sex == 'm'], {
+                        'value': 1,
+                        })
+            evaluation = Evaluation(evaluation.id)
+            self.assertGreater(evaluation.wfa_zscore, 3)
+
 
 def suite():
     suite = trytond.tests.test_tryton.suite()
@@ -121,18 +121,20 @@ class CreateServiceInvoice(Wizard):
             #Invoice Lines
             seq = 0
             invoice_lines = []
-            for line in service.service_line:
+            if sale_price_list:
+                with Transaction().set_context(ctx):
+                    unit_prices = sale_price_list.compute_many(party,
+                        [(line.product, line.product.list_price, line.qty,
+                                line.product.default_uom)
+                            for line in service.service_line])
+            else:
+                unit_prices = [line.product.list_price
+                    for line in service.service_line]
+
+            for line, unit_price in zip(service.service_line, unit_prices):
                 seq = seq + 1
                 account = line.product.template.account_revenue_used.id
 
-                if sale_price_list:
-                    with Transaction().set_context(ctx):
-                        unit_price = sale_price_list.compute(party,
-                            line.product, line.product.list_price,
-                            line.qty, line.product.default_uom)
-                else:
-                    unit_price = line.product.list_price
-
                 if line.to_invoice:
                     invoice_lines.append(('create', [{
                             'origin': str(line),
@@ -2,10 +2,12 @@
 # this repository contains the full copyright notices and license terms.
 from trytond.pool import Pool
 from .price_list import *
+from .product import *
 
 
 def register():
     Pool.register(
         PriceList,
         PriceListLine,
+        Product,
         module='product_price_list', type_='model')
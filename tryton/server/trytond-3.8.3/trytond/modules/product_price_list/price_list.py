@@ -1,12 +1,14 @@
 # This file is part of Tryton.  The COPYRIGHT file at the top level of
 # this repository contains the full copyright notices and license terms.
+import ast
 from decimal import Decimal
 
 from sql import Null
 from sql.conditionals import Case
-from simpleeval import simple_eval
+from simpleeval import SimpleEval
 
 from trytond.model import ModelView, ModelSQL, MatchMixin, fields
+from trytond.cache import Cache
 from trytond.tools import decistmt
 from trytond.pyson import If, Eval
 from trytond.transaction import Transaction
@@ -33,6 +35,14 @@ class PriceList(ModelSQL, ModelView):
     def default_company():
         return Transaction().context.get('company')
 
+    @classmethod
+    def delete(cls, price_lists):
+        pool = Pool()
+        Line = pool.get('product.price_list.line')
+        super(PriceList, cls).delete(price_lists)
+        # The lines are deleted on cascade
+        Line.clear_match_index()
+
     @staticmethod
     def default_tax_included():
         return False
@@ -44,10 +54,8 @@ class PriceList(ModelSQL, ModelView):
                 },
             }
 
-    def compute(self, party, product, unit_price, quantity, uom,
-            pattern=None):
-        'Compute price based on price list of party'
-
+    def get_pattern(self, product, quantity, uom, pattern=None):
+        'Return the pattern to match the lines'
         Uom = Pool().get('product.uom')
 
         if pattern is None:
@@ -57,13 +65,36 @@ class PriceList(ModelSQL, ModelView):
         pattern['product'] = product and product.id or None
         pattern['quantity'] = Uom.compute_qty(uom, quantity,
             product.default_uom, round=False) if product else quantity
+        return pattern
 
-        context = self.get_context_formula(
-            party, product, unit_price, quantity, uom)
-        for line in self.lines:
-            if line.match(pattern):
-                return line.get_unit_price(**context)
-        return unit_price
+    def compute(self, party, product, unit_price, quantity, uom,
+            pattern=None):
+        'Compute price based on price list of party'
+        return self.compute_many(party,
+            [(product, unit_price, quantity, uom)], pattern=pattern)[0]
+
+    def compute_many(self, party, products, pattern=None):
+        """
+        Compute prices based on price list of party.
+        products is a list of (product, unit_price, quantity, uom).
+        Return the list of prices in the same order.
+        """
+        Line = Pool().get('product.price_list.line')
+
+        prices = []
+        for product, unit_price, quantity, uom in products:
+            line = Line.find_match([
+                    ('price_list', '=', self.id),
+                    ], self.get_pattern(product, quantity, uom,
+                    pattern=pattern), fields_names=['formula'])
+            if line is None:
+                prices.append(unit_price)
+                continue
+            context = self.get_context_formula(
+                party, product, unit_price, quantity, uom)
+            prices.append(Line(line['id'], formula=line['formula']
+                    ).get_unit_price(**context))
+        return prices
 
 
 class PriceListLine(ModelSQL, ModelView, MatchMixin):
@@ -81,6 +112,7 @@ class PriceListLine(ModelSQL, ModelView, MatchMixin):
     formula = fields.Char('Formula', required=True,
         help=('Python expression that will be evaluated with:\n'
             '- unit_price: the original unit_price'))
+    _formula_cache = Cache('product_price_list_line.formula', context=False)
 
     @classmethod
     def __setup__(cls):
@@ -148,7 +180,55 @@ class PriceListLine(ModelSQL, ModelView, MatchMixin):
                 return False
         return super(PriceListLine, self).match(pattern)
 
+    @classmethod
+    def match_values(cls, values, pattern):
+        if 'quantity' in pattern:
+            pattern = pattern.copy()
+            if values['quantity'] > pattern.pop('quantity'):
+                return False
+        return super(PriceListLine, cls).match_values(values, pattern)
+
+    @classmethod
+    def create(cls, vlist):
+        lines = super(PriceListLine, cls).create(vlist)
+        cls.clear_match_index()
+        return lines
+
+    @classmethod
+    def write(cls, *args):
+        super(PriceListLine, cls).write(*args)
+        cls.clear_match_index()
+
+    @classmethod
+    def delete(cls, lines):
+        super(PriceListLine, cls).delete(lines)
+        cls.clear_match_index()
+
+    @classmethod
+    def compile_formula(cls, formula):
+        'Return the parsed expression of the formula'
+        node = cls._formula_cache.get(formula)
+        if node is None:
+            node = cls._formula_cache.set(formula,
+                FormulaEval.parse(decistmt(formula)))
+        return node
+
     def get_unit_price(self, **context):
         'Return unit price (as Decimal)'
         context.setdefault('functions', {})['Decimal'] = Decimal
-        return simple_eval(decistmt(self.formula), **context)
+        return FormulaEval(**context).eval_node(
+            self.formula, self.compile_formula(self.formula))
+
+
+class FormulaEval(SimpleEval):
+    'SimpleEval of the expressions parsed once'
+
+    @staticmethod
+    def parse(expr):
+        'Return the node of the expression'
+        return ast.parse(expr.strip()).body[0].value
+
+    def eval_node(self, expr, node):
+        'Evaluate the node parsed from the expression'
+        self.expr = expr
+        return self._eval(node)
@@ -0,0 +1,18 @@
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+from trytond.pool import Pool, PoolMeta
+
+__all__ = ['Product']
+__metaclass__ = PoolMeta
+
+
+class Product:
+    __name__ = 'product.product'
+
+    @classmethod
+    def delete(cls, products):
+        pool = Pool()
+        PriceListLine = pool.get('product.price_list.line')
+        super(Product, cls).delete(products)
+        # The product of the lines is set to NULL
+        PriceListLine.clear_match_index()
@@ -1,17 +1,120 @@
 # This file is part of Tryton.  The COPYRIGHT file at the top level of
 # this repository contains the full copyright notices and license terms.
 import unittest
+import doctest
+from decimal import Decimal
+
 import trytond.tests.test_tryton
 from trytond.tests.test_tryton import ModuleTestCase
+from trytond.tests.test_tryton import POOL, DB_NAME, USER, CONTEXT
+from trytond.transaction import Transaction
 
 
 class ProductPriceListTestCase(ModuleTestCase):
     'Test ProductPriceList module'
     module = 'product_price_list'
 
+    def setUp(self):
+        super(ProductPriceListTestCase, self).setUp()
+        self.price_list = POOL.get('product.price_list')
+        self.price_list_line = POOL.get('product.price_list.line')
+        self.template = POOL.get('product.template')
+        self.product = POOL.get('product.product')
+        self.uom = POOL.get('product.uom')
+        self.company = POOL.get('company.company')
+        self.user = POOL.get('res.user')
+
+    def test_price_list(self):
+        'Test price list compute'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            company, = self.company.search([
+                    ('rec_name', '=', 'Dunder Mifflin'),
+                    ])
+            self.user.write([self.user(USER)], {
+                    'main_company': company.id,
+                    'company': company.id,
+                    })
+            unit, = self.uom.search([('name', '=', 'Unit')])
+            dozen, = self.uom.create([{
+                        'name': 'Dozen',
+                        'symbol': 'dz',
+                        'category': unit.category.id,
+                        'factor': 12,
+                        'rate': round(1. / 12, 12),
+                        }])
+            template, = self.template.create([{
+                        'name': 'Test price list',
+                        'type': 'goods',
+                        'list_price': Decimal(10),
+                        'cost_price': Decimal(5),
+                        'default_uom': unit.id,
+                        }])
+            product, other = self.product.create([{
+                        'template': template.id,
+                        }, {
+                        'template': template.id,
+                        }])
+
+            with transaction.set_context(company=company.id):
+                price_list, = self.price_list.create([{
+                            'name': 'Test',
+                            'lines': [('create', [{
+                                            'sequence': 1,
+                                            'product': product.id,
+                                            'quantity': 10,
+                                            'formula': 'unit_price * 0.8',
+                                            }, {
+                                            'sequence': 2,
+                                            'product': product.id,
+                                            'formula': 'unit_price * 0.9',
+                                            }, {
+                                            'sequence': 3,
+                                            'quantity': 5,
+                                            'formula': 'unit_price - 1',
+                                            }, {
+                                            'sequence': 4,
+                                            'formula': 'unit_price',
+                                            }])],
+                            }])
+
+                def compute(product, quantity, uom=unit):
+                    return price_list.compute(None, product, Decimal(10),
+                        quantity, uom)
+
+                self.assertEqual(compute(product, 1), Decimal(9))
+                self.assertEqual(compute(product, 10), Decimal(8))
+                self.assertEqual(compute(product, 1, dozen), Decimal(8))
+                self.assertEqual(compute(other, 1), Decimal(10))
+                self.assertEqual(compute(other, 5), Decimal(9))
+                self.assertEqual(compute(None, 5), Decimal(9))
+                self.assertEqual(price_list.compute_many(None, [
+                            (product, Decimal(10), 1, unit),
+                            (other, Decimal(10), 5, unit),
+                            (other, Decimal(20), 1, unit),
+                            ]), [Decimal(9), Decimal(9), Decimal(20)])
+
+                # The matcher follows the changes of the lines
+                line = price_list.lines[-1]
+                self.price_list_line.write([line], {
+                        'formula': 'unit_price * 2',
+                        })
+                self.assertEqual(compute(other, 1), Decimal(20))
+                self.price_list_line.delete([line])
+                self.assertEqual(compute(other, 1), Decimal(10))
+
+                # and of the products deleted
+                self.product.delete([product])
+                self.assertEqual(compute(other, 1), Decimal(9))
+                self.assertEqual(compute(other, 10), Decimal(8))
+
 
 def suite():
     suite = trytond.tests.test_tryton.suite()
+    from trytond.modules.company.tests import test_company
+    for test in test_company.suite():
+        if test not in suite and not isinstance(test, doctest.DocTestCase):
+            suite.addTest(test)
     suite.addTests(unittest.TestLoader().loadTestsFromTestCase(
         ProductPriceListTestCase))
     return suite
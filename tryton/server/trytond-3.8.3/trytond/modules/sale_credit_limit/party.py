@@ -29,15 +29,14 @@ class Party:
                 ('state', '=', 'processing'),
                 ])
         for sale in sales:
-            amount = 0
-            for line in sale.lines:
-                amount += Currency.compute(sale.currency, line.amount,
-                    currency, round=False)
-                for invoice_line in line.invoice_lines:
-                    invoice = invoice_line.invoice
-                    if invoice and invoice.move:
-                        amount -= Currency.compute(invoice.currency,
-                            invoice_line.amount, currency)
+            lines = sale.lines
+            amount = sum(Currency.compute_many(sale.currency,
+                    [l.amount for l in lines], currency, round=False), 0)
+            invoice_lines = [il for l in lines for il in l.invoice_lines
+                if il.invoice and il.invoice.move]
+            amount -= sum(Currency.compute_many(
+                    [il.invoice.currency for il in invoice_lines],
+                    [il.amount for il in invoice_lines], currency), 0)
             amounts[sale.party.id] += amount
         return amounts
 
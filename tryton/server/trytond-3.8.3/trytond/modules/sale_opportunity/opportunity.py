@@ -393,12 +393,9 @@ class SaleOpportunity(Workflow, ModelSQL, ModelView):
             return
 
         sale_lost_states = self._sale_lost_states()
-        amount = 0
-        for sale in self.sales:
-            if sale.state not in sale_lost_states:
-                amount += Currency.compute(sale.currency, sale.untaxed_amount,
-                    self.currency)
-        return amount
+        sales = [s for s in self.sales if s.state not in sale_lost_states]
+        return sum(Currency.compute_many([s.currency for s in sales],
+                [s.untaxed_amount for s in sales], self.currency), 0)
 
     @classmethod
     def process(cls, opportunities):
@@ -30,10 +30,11 @@ class Product:
             taxes = None
             if context.get('taxes'):
                 taxes = Tax.browse(context.get('taxes'))
-            for product in products:
-                uom = context_uom or product.default_uom
-                price = price_list.compute(
-                     customer, product, prices[product.id], quantity, uom)
+            list_prices = price_list.compute_many(customer,
+                [(product, prices[product.id], quantity,
+                        context_uom or product.default_uom)
+                    for product in products])
+            for product, price in zip(products, list_prices):
                 if price_list.tax_included and taxes:
                     price = Tax.reverse_compute(price, taxes)
                 prices[product.id] = price
@@ -9,6 +9,7 @@ from .move import *
 from .product import *
 from .inventory import *
 from .configuration import *
+from .ledger import *
 
 
 def register():
@@ -28,6 +29,7 @@ def register():
         AssignShipmentInReturnAssignFailed,
         Period,
         Cache,
+        QuantityLedger,
         Template,
         Product,
         ProductByLocationStart,
@@ -0,0 +1,296 @@
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+from collections import defaultdict
+
+from sql import Column, Literal, Null, Union
+from sql.aggregate import Sum
+from sql.conditionals import Case
+from sql.functions import CurrentTimestamp
+
+from trytond.model import ModelView, ModelSQL, fields
+from trytond.config import config
+from trytond.pool import Pool
+from trytond.rpc import RPC
+from trytond.tools import reduce_ids, grouped_slice
+from trytond.transaction import Transaction
+
+__all__ = ['QuantityLedgerMixin', 'QuantityLedger']
+
+# Quantities are float so they are compared with a tolerance
+_PRECISION = 1e-6
+
+
+class QuantityLedgerMixin(object):
+    '''
+    Perpetual ledger of the stock quantities per location and grouping.
+
+    The internal quantity is the sum of the done moves and the assigned
+    quantity is the sum of the assigned moves leaving the location, whatever
+    their dates. It is updated by the moves when they change.
+    '''
+    _grouping = ('product',)
+    location = fields.Many2One('stock.location', 'Location', required=True,
+        readonly=True, select=True, ondelete='CASCADE')
+    product = fields.Many2One('product.product', 'Product', required=True,
+        readonly=True, select=True, ondelete='CASCADE')
+    internal_quantity = fields.Float('Internal Quantity', readonly=True)
+    assigned_quantity = fields.Float('Assigned Quantity', readonly=True)
+
+    @classmethod
+    def __setup__(cls):
+        super(QuantityLedgerMixin, cls).__setup__()
+        cls.__rpc__.update({
+                'verify': RPC(),
+                'rebuild': RPC(readonly=False),
+                })
+
+    @staticmethod
+    def default_internal_quantity():
+        return 0.
+
+    @staticmethod
+    def default_assigned_quantity():
+        return 0.
+
+    @classmethod
+    def get_deltas(cls, moves):
+        '''
+        Return the quantity and assigned quantity per key (location and
+        grouping) for the moves values.
+        '''
+        deltas = defaultdict(lambda: [0., 0.])
+        for move in moves:
+            quantity = move['internal_quantity'] or 0.
+            keys = tuple(move[f] for f in cls._grouping)
+            if move['state'] == 'done':
+                deltas[(move['to_location'],) + keys][0] += quantity
+                deltas[(move['from_location'],) + keys][0] -= quantity
+            elif move['state'] == 'assigned':
+                deltas[(move['from_location'],) + keys][1] += quantity
+        return deltas
+
+    @classmethod
+    def _key_where(cls, table, keys):
+        "Return the SQL condition on table matching the keys"
+        location_ids = list(set(k[0] for k in keys))
+        where = reduce_ids(table.location, location_ids)
+        for i, fname in enumerate(cls._grouping, 1):
+            values = set(k[i] for k in keys)
+            column = Column(table, fname)
+            clause = reduce_ids(column, [v for v in values if v is not None])
+            if None in values:
+                clause |= column == Null
+            where &= clause
+        return where
+
+    @classmethod
+    def apply(cls, deltas):
+        'Add the deltas of quantity and assigned quantity to the ledger'
+        table = cls.__table__()
+        transaction = Transaction()
+        cursor = transaction.cursor
+
+        keys = [k for k, (q, a) in deltas.iteritems()
+            if abs(q) > _PRECISION or abs(a) > _PRECISION]
+        columns = [table.location] + [Column(table, f)
+            for f in cls._grouping]
+        for sub_keys in grouped_slice(sorted(keys)):
+            sub_keys = list(sub_keys)
+            cursor.execute(*table.select(table.id, *columns,
+                    where=cls._key_where(table, sub_keys),
+                    order_by=table.id.asc))
+            key2id = {}
+            for row in cursor.fetchall():
+                key2id.setdefault(tuple(row[1:]), row[0])
+
+            to_insert = []
+            for key in sub_keys:
+                quantity, assigned = deltas[key]
+                if key in key2id:
+                    cursor.execute(*table.update(
+                            [table.internal_quantity,
+                                table.assigned_quantity],
+                            [table.internal_quantity + quantity,
+                                table.assigned_quantity + assigned],
+                            where=table.id == key2id[key]))
+                else:
+                    to_insert.append(list(key) + [quantity, assigned,
+                            transaction.user, CurrentTimestamp()])
+            if to_insert:
+                cursor.execute(*table.insert(columns
+                        + [table.internal_quantity, table.assigned_quantity,
+                            table.create_uid, table.create_date],
+                        to_insert))
+
+    @classmethod
+    def get_quantities(cls, location_ids, grouping_filter=None):
+        '''
+        Return a dictionary with location id and grouping as key and
+        the tuple of quantity and assigned quantity as value.
+        grouping_filter is a tuple of values, for the field at the same
+        position in grouping, used to filter the keys.
+        '''
+        table = cls.__table__()
+        cursor = Transaction().cursor
+
+        columns = [table.location] + [Column(table, f)
+            for f in cls._grouping]
+        where = Literal(True)
+        for fname, values in zip(cls._grouping, grouping_filter or []):
+            if values:
+                where &= reduce_ids(Column(table, fname), values)
+        quantities = {}
+        for sub_ids in grouped_slice(location_ids):
+            cursor.execute(*table.select(*(columns + [
+                            Sum(table.internal_quantity),
+                            Sum(table.assigned_quantity)]),
+                    where=where & reduce_ids(table.location, sub_ids),
+                    group_by=columns))
+            for row in cursor.fetchall():
+                quantities[tuple(row[:-2])] = (row[-2], row[-1])
+        return quantities
+
+    @classmethod
+    def _moves_query(cls):
+        'Return the query of the quantities computed from the moves'
+        pool = Pool()
+        Move = pool.get('stock.move')
+        move = Move.__table__()
+
+        keys = [Column(move, f).as_(f) for f in cls._grouping]
+        incoming = move.select(move.to_location.as_('location'),
+            move.internal_quantity.as_('quantity'),
+            Literal(0.).as_('assigned'),
+            *keys,
+            where=move.state == 'done')
+        outgoing = move.select(move.from_location.as_('location'),
+            Case((move.state == 'done', -move.internal_quantity),
+                else_=0.).as_('quantity'),
+            Case((move.state == 'assigned', move.internal_quantity),
+                else_=0.).as_('assigned'),
+            *keys,
+            where=move.state.in_(['done', 'assigned']))
+        union = Union(incoming, outgoing, all_=True)
+        columns = [union.location] + [Column(union, f)
+            for f in cls._grouping]
+        return union.select(*(columns + [
+                    Sum(union.quantity).as_('quantity'),
+                    Sum(union.assigned).as_('assigned')]),
+            group_by=columns)
+
+    @classmethod
+    def verify(cls):
+        '''
+        Compare the ledger with the quantities computed from the moves.
+        Return the list of differences as tuple of key, ledger quantities and
+        computed quantities.
+        '''
+        pool = Pool()
+        ModelAccess = pool.get('ir.model.access')
+        table = cls.__table__()
+        cursor = Transaction().cursor
+
+        ModelAccess.check(cls.__name__, 'read')
+        cursor.execute(*cls._moves_query())
+        computed = dict((tuple(r[:-2]), (r[-2] or 0., r[-1] or 0.))
+            for r in cursor.fetchall())
+        columns = [table.location] + [Column(table, f)
+            for f in cls._grouping]
+        cursor.execute(*table.select(*(columns + [
+                        Sum(table.internal_quantity),
+                        Sum(table.assigned_quantity)]),
+                group_by=columns))
+        ledger = dict((tuple(r[:-2]), (r[-2] or 0., r[-1] or 0.))
+            for r in cursor.fetchall())
+
+        differences = []
+        for key in sorted(set(computed) | set(ledger)):
+            expected = computed.get(key, (0., 0.))
+            value = ledger.get(key, (0., 0.))
+            if any(abs(e - v) > _PRECISION for e, v in zip(expected, value)):
+                differences.append((key, value, expected))
+        return differences
+
+    @classmethod
+    def rebuild(cls):
+        'Rebuild the ledger from the moves'
+        pool = Pool()
+        ModelAccess = pool.get('ir.model.access')
+        table = cls.__table__()
+        transaction = Transaction()
+        cursor = transaction.cursor
+
+        ModelAccess.check(cls.__name__, 'delete')
+        ModelAccess.check(cls.__name__, 'create')
+        cursor.execute(*table.delete())
+        query = cls._moves_query()
+        keys = [Column(query, f) for f in cls._grouping]
+        cursor.execute(*table.insert([table.location]
+                + [Column(table, f) for f in cls._grouping]
+                + [table.internal_quantity, table.assigned_quantity,
+                    table.create_uid, table.create_date],
+                query.select(*([query.location] + keys + [
+                            query.quantity, query.assigned,
+                            Literal(transaction.user), CurrentTimestamp()]))))
+
+
+class QuantityLedger(QuantityLedgerMixin, ModelSQL, ModelView):
+    'Stock Quantity Ledger'
+    __name__ = 'stock.quantity.ledger'
+
+    @staticmethod
+    def enabled():
+        'Return True if the quantity ledgers are maintained'
+        return config.getboolean('stock', 'quantity_ledger', default=False)
+
+    @staticmethod
+    def groupings():
+        return [('product',)]
+
+    @staticmethod
+    def get_ledger(grouping):
+        pool = Pool()
+        if grouping == ('product',):
+            return pool.get('stock.quantity.ledger')
+
+    @classmethod
+    def move_fields(cls):
+        'Return the set of move fields used by the ledgers'
+        fields = set(['state', 'from_location', 'to_location',
+                'internal_quantity'])
+        for grouping in cls.groupings():
+            fields.update(grouping)
+        return fields
+
+    @classmethod
+    def read_moves(cls, move_ids):
+        'Return the list of values of the moves used by the ledgers'
+        pool = Pool()
+        Move = pool.get('stock.move')
+        move = Move.__table__()
+        cursor = Transaction().cursor
+
+        names = sorted(cls.move_fields())
+        values = []
+        for sub_ids in grouped_slice(move_ids):
+            cursor.execute(*move.select(
+                    *[Column(move, n) for n in names],
+                    where=reduce_ids(move.id, sub_ids)))
+            values.extend(dict(zip(names, r)) for r in cursor.fetchall())
+        return values
+
+    @classmethod
+    def update_moves(cls, before, after):
+        '''
+        Update the ledgers with the difference between the values of the
+        moves before and after a change.
+        '''
+        for grouping in cls.groupings():
+            Ledger = cls.get_ledger(grouping)
+            deltas = Ledger.get_deltas(after)
+            for key, (quantity, assigned) in Ledger.get_deltas(
+                    before).iteritems():
+                delta = deltas[key]
+                delta[0] -= quantity
+                delta[1] -= assigned
+            Ledger.apply(deltas)
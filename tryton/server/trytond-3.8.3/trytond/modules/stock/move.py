@@ -1,12 +1,11 @@
 # This file is part of Tryton.  The COPYRIGHT file at the top level of
 # this repository contains the full copyright notices and license terms.
 import datetime
-import operator
 from decimal import Decimal
 from functools import partial
 from collections import OrderedDict
 
-from sql import Literal, Union, Column, Null
+from sql import Literal, Union, Column, Null, Select
 from sql.aggregate import Sum
 from sql.conditionals import Coalesce
 from sql.operators import Concat
@@ -14,7 +13,7 @@ from sql.operators import Concat
 from trytond.model import Workflow, Model, ModelView, ModelSQL, fields, Check
 from trytond import backend
 from trytond.pyson import Eval, If, Bool
-from trytond.tools import reduce_ids
+from trytond.tools import reduce_ids, grouped_slice
 from trytond.transaction import Transaction
 from trytond.pool import Pool
 
@@ -668,6 +667,19 @@ class Move(Workflow, ModelSQL, ModelView):
 
     @classmethod
     def write(cls, *args):
+        pool = Pool()
+        Ledger = pool.get('stock.quantity.ledger')
+
+        ledger_ids = set()
+        if Ledger.enabled():
+            ledger_fields = Ledger.move_fields()
+            actions = iter(args)
+            for moves, values in zip(actions, actions):
+                if ledger_fields & set(values):
+                    ledger_ids.update(m.id for m in moves)
+            ledger_ids = list(ledger_ids)
+            ledger_before = Ledger.read_moves(ledger_ids)
+
         actions = iter(args)
         for moves, values in zip(actions, actions):
             vals_set = set(values)
@@ -683,6 +695,9 @@ class Move(Workflow, ModelSQL, ModelView):
 
         super(Move, cls).write(*args)
 
+        if ledger_ids:
+            Ledger.update_moves(ledger_before, Ledger.read_moves(ledger_ids))
+
         actions = iter(args)
         for moves, values in zip(actions, actions):
             if any(f not in cls._allow_modify_closed_period for f in values):
@@ -746,6 +761,44 @@ class Move(Workflow, ModelSQL, ModelView):
             return to_pick
         return to_pick
 
+    @classmethod
+    def _assign_lock(cls, moves):
+        '''
+        Lock the assignation of the moves.
+        If the database supports advisory locks, only the pairs of product
+        and root of the location tree of the moves are locked and in order
+        to prevent deadlocks. Otherwise the move table is locked.
+        Like the table lock, it does not wait: the transaction fails if the
+        moves are being assigned by another one and is retried with fresh
+        quantities.
+        '''
+        pool = Pool()
+        Location = pool.get('stock.location')
+        cursor = Transaction().cursor
+
+        if not cursor.has_advisory_lock():
+            cursor.lock(cls._table)
+            return
+
+        location = Location.__table__()
+        root = Location.__table__()
+        location2root = {}
+        from_ids = list(set(m.from_location.id for m in moves))
+        for sub_ids in grouped_slice(from_ids):
+            cursor.execute(*location.join(root,
+                    condition=(root.left <= location.left)
+                    & (root.right >= location.right)
+                    ).select(location.id, root.id,
+                    where=reduce_ids(location.id, sub_ids)
+                    & (root.parent == Null)))
+            location2root.update(cursor.fetchall())
+
+        keys = set((m.product.id,
+                location2root.get(m.from_location.id, m.from_location.id))
+            for m in moves)
+        for product_id, location_id in sorted(keys):
+            cursor.advisory_lock(product_id, location_id)
+
     @classmethod
     def assign_try(cls, moves, with_childs=True, grouping=('product',)):
         '''
@@ -758,8 +811,9 @@ class Move(Workflow, ModelSQL, ModelView):
         Uom = pool.get('product.uom')
         Date = pool.get('ir.date')
         Location = pool.get('stock.location')
+        Ledger = pool.get('stock.quantity.ledger')
 
-        Transaction().cursor.lock(cls._table)
+        cls._assign_lock(moves)
 
         if with_childs:
             locations = Location.search([
@@ -768,13 +822,24 @@ class Move(Workflow, ModelSQL, ModelView):
                     ])
         else:
             locations = list(set((m.from_location for m in moves)))
-        with Transaction().set_context(
-                stock_date_end=Date.today(),
-                stock_assign=True):
-            pbl = Product.products_by_location(
-                location_ids=[l.id for l in locations],
-                product_ids=[m.product.id for m in moves],
-                grouping=grouping)
+        if Ledger.enabled() and grouping in Ledger.groupings():
+            # The quantities available are the quantities less the
+            # assigned quantities
+            GroupingLedger = Ledger.get_ledger(grouping)
+            pbl = dict((key, quantity - assigned)
+                for key, (quantity, assigned)
+                in GroupingLedger.get_quantities(
+                    [l.id for l in locations],
+                    grouping_filter=([m.product.id for m in moves],)
+                    ).iteritems())
+        else:
+            with Transaction().set_context(
+                    stock_date_end=Date.today(),
+                    stock_assign=True):
+                pbl = Product.products_by_location(
+                    location_ids=[l.id for l in locations],
+                    product_ids=[m.product.id for m in moves],
+                    grouping=grouping)
 
         def get_key(move, location):
             key = (location.id,)
@@ -785,7 +850,20 @@ class Move(Workflow, ModelSQL, ModelView):
                 key += (value,)
             return key
 
+        # Compute the child locations once per source location
+        location2childs = {}
+        for from_location in set(m.from_location for m in moves):
+            if with_childs:
+                # Keep location order for pick_product
+                location2childs[from_location] = [l for l in locations
+                    if from_location.left <= l.left
+                    and l.right <= from_location.right]
+            else:
+                location2childs[from_location] = [from_location]
+
         success = True
+        to_write = []
+        to_assign = []
         for move in moves:
             if move.state != 'draft':
                 if move.state == 'staging':
@@ -794,13 +872,7 @@ class Move(Workflow, ModelSQL, ModelView):
             to_location = move.to_location
             # Keep location order for pick_product
             location_qties = OrderedDict()
-            if with_childs:
-                childs = Location.search([
-                        ('parent', 'child_of', [move.from_location.id]),
-                        ])
-            else:
-                childs = [move.from_location]
-            for location in childs:
+            for location in location2childs[move.from_location]:
                 key = get_key(move, location)
                 if key in pbl:
                     location_qties[location] = Uom.compute_qty(
@@ -816,10 +888,11 @@ class Move(Workflow, ModelSQL, ModelView):
             if move.quantity - picked_qties >= move.uom.rounding:
                 success = False
                 first = False
-                cls.write([move], {
-                    'quantity': Uom.round(
-                            move.quantity - picked_qties, move.uom.rounding),
-                    })
+                to_write.extend(([move], {
+                            'quantity': Uom.round(
+                                move.quantity - picked_qties,
+                                move.uom.rounding),
+                            }))
             else:
                 first = True
             for from_location, qty in to_pick:
@@ -828,11 +901,11 @@ class Move(Workflow, ModelSQL, ModelView):
                     'quantity': Uom.round(qty, move.uom.rounding),
                     }
                 if first:
-                    cls.write([move], values)
-                    cls.assign([move])
+                    to_write.extend(([move], values))
+                    to_assign.append(move)
                     first = False
                 else:
-                    cls.assign(cls.copy([move], default=values))
+                    to_assign.extend(cls.copy([move], default=values))
 
                 qty_default_uom = Uom.compute_qty(move.uom, qty,
                         move.product.default_uom, round=False)
@@ -841,6 +914,10 @@ class Move(Workflow, ModelSQL, ModelView):
                 to_key = get_key(move, to_location)
                 pbl[from_key] = pbl.get(from_key, 0.0) - qty_default_uom
                 pbl[to_key] = pbl.get(to_key, 0.0) + qty_default_uom
+        if to_write:
+            cls.write(*to_write)
+        if to_assign:
+            cls.assign(to_assign)
         return success
 
     @classmethod
@@ -1128,8 +1205,6 @@ class Move(Workflow, ModelSQL, ModelView):
             and quantity as value.
         """
         pool = Pool()
-        Location = pool.get('stock.location')
-        Product = pool.get('product.product')
         Uom = pool.get('product.uom')
 
         assert query is not None, (
@@ -1137,68 +1212,113 @@ class Move(Workflow, ModelSQL, ModelView):
         assert 'product' in grouping
 
         cursor = Transaction().cursor
+        # Propagate quantities from child locations to their parents
+        rollup_sql = with_childs and isinstance(query, Select)
+        if rollup_sql:
+            query = cls._rollup_quantities_query(query, location_ids,
+                grouping)
         cursor.execute(*query)
-        raw_lines = cursor.fetchall()
 
-        product_getter = operator.itemgetter(grouping.index('product') + 1)
-        res_product_ids = set()
         quantities = {}
-        keys = set()
-        for line in raw_lines:
-            location = line[0]
-            key = tuple(line[1:-1])
-            quantity = line[-1]
-            quantities[(location,) + key] = quantity
-            res_product_ids.add(product_getter(line))
-            keys.add(key)
-
-        # Propagate quantities on from child locations to their parents
-        if with_childs:
-            # Fetch all child locations
-            locations = Location.search([
-                    ('parent', 'child_of', location_ids),
-                    ])
-            # Generate a set of locations without childs and a dict
-            # giving the parent of each location.
-            leafs = set([l.id for l in locations])
-            parent = {}
-            for location in locations:
-                if not location.parent:
-                    continue
-                if location.parent.id in leafs:
-                    leafs.remove(location.parent.id)
-                parent[location.id] = location.parent.id
-            locations = set((l.id for l in locations))
-            while leafs:
-                for l in leafs:
-                    locations.remove(l)
-                    if l not in parent:
-                        continue
-                    for key in keys:
-                        parent_key = (parent[l],) + key
-                        quantities.setdefault(parent_key, 0)
-                        quantities[parent_key] += quantities.get((l,) + key, 0)
-                next_leafs = set(locations)
-                for l in locations:
-                    if l not in parent:
-                        continue
-                    if parent[l] in next_leafs and parent[l] in locations:
-                        next_leafs.remove(parent[l])
-                leafs = next_leafs
-
-            # clean result
-            for key in quantities.keys():
-                location = key[0]
-                if location not in location_ids:
-                    del quantities[key]
+        for line in cursor.fetchall():
+            quantities[tuple(line[:-1])] = line[-1]
+        if with_childs and not rollup_sql:
+            quantities = cls._rollup_quantities(quantities, location_ids)
 
         # Round quantities
-        default_uom = dict((p.id, p.default_uom) for p in
-            Product.browse(list(res_product_ids)))
+        product_index = grouping.index('product') + 1
+        roundings = cls._get_uom_roundings(
+            list(set(k[product_index] for k in quantities)))
         for key, quantity in quantities.iteritems():
-            location = key[0]
-            product = product_getter(key)
-            uom = default_uom[product]
-            quantities[key] = Uom.round(quantity, uom.rounding)
+            quantities[key] = Uom.round(quantity,
+                roundings[key[product_index]])
 
         return quantities
+
+    @classmethod
+    def _rollup_quantities_query(cls, query, location_ids, grouping):
+        """
+        Return a query summing the quantities of the query on the location_ids
+        from their child locations.
+
+        The locations are joined to their ancestors through the left and right
+        columns of the tree.
+        """
+        pool = Pool()
+        Location = pool.get('stock.location')
+        location = Location.__table__()
+        ancestor = Location.__table__()
+
+        keys = [Column(query, key) for key in grouping]
+        return query.join(location,
+            condition=query.location == location.id
+            ).join(ancestor,
+                condition=(ancestor.left <= location.left)
+                & (ancestor.right >= location.right)
+                ).select(*([ancestor.id.as_('location')]
+                    + [k.as_(n) for k, n in zip(keys, grouping)]
+                    + [Sum(query.quantity).as_('quantity')]),
+                where=reduce_ids(ancestor.id, location_ids),
+                group_by=[ancestor.id] + keys)
+
+    @classmethod
+    def _rollup_quantities(cls, quantities, location_ids):
+        """
+        Return the quantities summed on the location_ids from their child
+        locations.
+
+        quantities is a dictionary with location id and grouping as key.
+        """
+        pool = Pool()
+        Location = pool.get('stock.location')
+
+        location_ids = set(location_ids)
+        parents = {}
+        for location in Location.search_read([
+                    ('parent', 'child_of', list(location_ids)),
+                    ], fields_names=['parent']):
+            parents[location['id']] = location['parent']
+
+        # The requested ancestors of each location including itself
+        ancestors = {}
+
+        def get_ancestors(location):
+            if location not in ancestors:
+                result = []
+                if location in parents:
+                    if location in location_ids:
+                        result.append(location)
+                    parent = parents[location]
+                    if parent is not None:
+                        result.extend(get_ancestors(parent))
+                ancestors[location] = result
+            return ancestors[location]
+
+        result = {}
+        for key, quantity in quantities.iteritems():
+            for location in get_ancestors(key[0]):
+                location_key = (location,) + key[1:]
+                result[location_key] = result.get(location_key, 0) + quantity
+        return result
+
+    @classmethod
+    def _get_uom_roundings(cls, product_ids):
+        "Return a dictionary of the rounding of the default uom of products"
+        pool = Pool()
+        Product = pool.get('product.product')
+        Template = pool.get('product.template')
+        Uom = pool.get('product.uom')
+        product = Product.__table__()
+        template = Template.__table__()
+        uom = Uom.__table__()
+        cursor = Transaction().cursor
+
+        roundings = {}
+        for sub_ids in grouped_slice(product_ids):
+            cursor.execute(*product.join(template,
+                    condition=product.template == template.id
+                    ).join(uom, condition=template.default_uom == uom.id
+                    ).select(product.id, uom.rounding,
+                    where=reduce_ids(product.id, sub_ids)))
+            roundings.update(cursor.fetchall())
+        return roundings
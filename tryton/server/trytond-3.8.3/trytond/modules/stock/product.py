@@ -251,6 +251,16 @@ class Product(object, StockMixin):
                     ],
                 ], order=[('effective_date', 'ASC'), ('id', 'ASC')])
 
+        def in_cost(move):
+            return (move.from_location.type in ['supplier', 'production']
+                or move.to_location.type == 'supplier')
+        in_moves = [m for m in moves if in_cost(m)]
+        unit_prices = dict(zip(in_moves, Currency.compute_many(
+                    [m.currency for m in in_moves],
+                    [m.unit_price for m in in_moves],
+                    [m.company.currency for m in in_moves],
+                    dates=[m.effective_date for m in in_moves], round=False)))
+
         cost_price = Decimal(0)
         quantity = 0
         for move in moves:
@@ -258,13 +268,8 @@ class Product(object, StockMixin):
             qty = Decimal(str(qty))
             if move.from_location.type == 'storage':
                 qty *= -1
-            if (move.from_location.type in ['supplier', 'production']
-                    or move.to_location.type == 'supplier'):
-                with Transaction().set_context(date=move.effective_date):
-                    unit_price = Currency.compute(
-                        move.currency, move.unit_price,
-                        move.company.currency, round=False)
-                unit_price = Uom.compute_price(move.uom, unit_price,
+            if move in unit_prices:
+                unit_price = Uom.compute_price(move.uom, unit_prices[move],
                     self.default_uom)
                 if quantity + qty != 0:
                     cost_price = (
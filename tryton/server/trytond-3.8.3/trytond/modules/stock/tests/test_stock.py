@@ -13,8 +13,10 @@ from trytond.tests.test_tryton import ModuleTestCase
 from trytond.tests.test_tryton import POOL, DB_NAME, USER, CONTEXT
 from trytond.tests.test_tryton import doctest_setup, doctest_teardown
 from trytond.transaction import Transaction
+from trytond.config import config
 from trytond.exceptions import UserWarning
 from trytond.pool import Pool
+from trytond import backend
 
 
 class StockTestCase(ModuleTestCase):
@@ -445,6 +447,24 @@ class StockTestCase(ModuleTestCase):
             self.assertEqual(
                 products_by_location_all[(warehouse.id, product.id)], 2)
 
+            # The in-memory roll-up gives the same quantities than SQL
+            location_ids = [warehouse.id, storage.id, storage1.id]
+            products_by_location = self.product.products_by_location(
+                location_ids, [product.id], with_childs=True)
+            self.assertEqual(products_by_location, {
+                    (warehouse.id, product.id): 1,
+                    (storage.id, product.id): 2,
+                    })
+            query = self.move.compute_quantities_query(location_ids,
+                with_childs=True, grouping_filter=([product.id],))
+            cursor = transaction.cursor
+            cursor.execute(*query)
+            quantities = dict((tuple(r[:-1]), r[-1])
+                for r in cursor.fetchall())
+            self.assertEqual(
+                self.move._rollup_quantities(quantities, location_ids),
+                products_by_location)
+
     def test0030period(self):
         'Test period'
         with Transaction().start(DB_NAME, USER,
@@ -737,6 +757,159 @@ class StockTestCase(ModuleTestCase):
                 states[state].sort()
             self.assertEqual(states, result, msg=msg)
 
+    def test_assign_try_locked(self):
+        'Test Move assign_try with assignation locked'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            if not transaction.cursor.has_advisory_lock():
+                return
+            pool = Pool()
+            Template = pool.get('product.template')
+            Product = pool.get('product.product')
+            Uom = pool.get('product.uom')
+            Location = pool.get('stock.location')
+            Company = pool.get('company.company')
+            Move = pool.get('stock.move')
+            Database = backend.get('Database')
+            DatabaseOperationalError = backend.get('DatabaseOperationalError')
+
+            uom, = Uom.search([('name', '=', 'Unit')])
+            template, = Template.create([{
+                        'name': 'Test assign_try locked',
+                        'type': 'goods',
+                        'list_price': Decimal(1),
+                        'cost_price': Decimal(0),
+                        'cost_price_method': 'fixed',
+                        'default_uom': uom.id,
+                        }])
+            product, = Product.create([{
+                        'template': template.id,
+                        }])
+            storage, = Location.search([('code', '=', 'STO')])
+            customer, = Location.search([('code', '=', 'CUS')])
+            company, = Company.search([
+                    ('rec_name', '=', 'Dunder Mifflin'),
+                    ])
+            move, = Move.create([{
+                        'product': product.id,
+                        'uom': uom.id,
+                        'quantity': 1,
+                        'from_location': storage.id,
+                        'to_location': customer.id,
+                        'company': company.id,
+                        'unit_price': Decimal(1),
+                        'currency': company.currency.id,
+                        }])
+            warehouse = storage
+            while warehouse.parent:
+                warehouse = warehouse.parent
+
+            # Another transaction is assigning the product in the warehouse
+            cursor = Database(DB_NAME).cursor()
+            try:
+                cursor.advisory_lock(product.id, warehouse.id)
+                self.assertRaises(DatabaseOperationalError,
+                    Move.assign_try, [move])
+            finally:
+                cursor.close()
+            # Nothing to assign but not locked anymore
+            self.assertFalse(Move.assign_try([move]))
+
+    def test_quantity_ledger(self):
+        'Test quantity ledger'
+        if not config.has_section('stock'):
+            config.add_section('stock')
+        config.set('stock', 'quantity_ledger', 'True')
+        try:
+            self._test_quantity_ledger()
+        finally:
+            config.remove_option('stock', 'quantity_ledger')
+
+    def _test_quantity_ledger(self):
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            pool = Pool()
+            Template = pool.get('product.template')
+            Product = pool.get('product.product')
+            Uom = pool.get('product.uom')
+            Location = pool.get('stock.location')
+            Company = pool.get('company.company')
+            Move = pool.get('stock.move')
+            Ledger = pool.get('stock.quantity.ledger')
+
+            Ledger.rebuild()
+            self.assertEqual(Ledger.verify(), [])
+
+            uom, = Uom.search([('name', '=', 'Unit')])
+            template = Template(
+                name='Test quantity ledger',
+                type='goods',
+                list_price=Decimal(1),
+                cost_price=Decimal(0),
+                cost_price_method='fixed',
+                default_uom=uom,
+                )
+            template.save()
+            product = Product(template=template.id)
+            product.save()
+
+            supplier, = Location.search([('code', '=', 'SUP')])
+            storage, = Location.search([('code', '=', 'STO')])
+            customer, = Location.search([('code', '=', 'CUS')])
+            company, = Company.search([
+                    ('rec_name', '=', 'Dunder Mifflin'),
+                    ])
+
+            def create_move(quantity, from_location, to_location):
+                return Move.create([{
+                            'product': product.id,
+                            'uom': uom.id,
+                            'quantity': quantity,
+                            'from_location': from_location.id,
+                            'to_location': to_location.id,
+                            'company': company.id,
+                            'unit_price': Decimal(1),
+                            'currency': company.currency.id,
+                            }])[0]
+
+            def quantities():
+                return Ledger.get_quantities(
+                    [supplier.id, storage.id, customer.id],
+                    grouping_filter=([product.id],))
+
+            Move.do([create_move(10, supplier, storage)])
+            move1 = create_move(3, storage, customer)
+            move2 = create_move(4, storage, customer)
+            self.assertEqual(quantities(), {
+                    (supplier.id, product.id): (-10, 0),
+                    (storage.id, product.id): (10, 0),
+                    })
+
+            Move.assign([move1, move2])
+            self.assertEqual(quantities()[(storage.id, product.id)], (10, 7))
+            Move.draft([move2])
+            Move.do([move1])
+            self.assertEqual(quantities()[(storage.id, product.id)], (7, 0))
+            self.assertEqual(quantities()[(customer.id, product.id)], (3, 0))
+            Move.cancel([move2])
+            self.assertEqual(Ledger.verify(), [])
+
+            move3 = create_move(8, storage, customer)
+            self.assertFalse(Move.assign_try([move3]))
+            self.assertEqual(quantities()[(storage.id, product.id)], (7, 7))
+            self.assertEqual(Ledger.verify(), [])
+
+            ledger, = Ledger.search([
+                    ('location', '=', storage.id),
+                    ('product', '=', product.id),
+                    ])
+            Ledger.write([ledger], {'internal_quantity': 0})
+            self.assertEqual(Ledger.verify(), [
+                    ((storage.id, product.id), (0, 7), (7, 7)),
+                    ])
+            Ledger.rebuild()
+            self.assertEqual(Ledger.verify(), [])
+            self.assertEqual(quantities()[(storage.id, product.id)], (7, 7))
+
 
 def suite():
     suite = trytond.tests.test_tryton.suite()
@@ -16,6 +16,8 @@ def register():
         ShipmentOutReturn,
         Period,
         PeriodCacheLot,
+        QuantityLedger,
+        QuantityLedgerLot,
         Inventory,
         InventoryLine,
         Template,
@@ -4,11 +4,11 @@ from trytond.model import ModelView, ModelSQL, fields
 from trytond.pyson import Eval
 from trytond.pool import Pool, PoolMeta
 from trytond.transaction import Transaction
-from trytond.modules.stock import StockMixin
+from trytond.modules.stock import StockMixin, QuantityLedgerMixin
 
 __all__ = ['Lot', 'LotType', 'Move', 'ShipmentIn', 'ShipmentOut',
     'ShipmentOutReturn',
-    'Period', 'PeriodCacheLot',
+    'Period', 'PeriodCacheLot', 'QuantityLedger', 'QuantityLedgerLot',
     'Inventory', 'InventoryLine']
 __metaclass__ = PoolMeta
 
@@ -178,6 +178,30 @@ class PeriodCacheLot(ModelSQL, ModelView):
     internal_quantity = fields.Float('Internal Quantity', readonly=True)
 
 
+class QuantityLedger:
+    __name__ = 'stock.quantity.ledger'
+
+    @classmethod
+    def groupings(cls):
+        return super(QuantityLedger, cls).groupings() + [('product', 'lot')]
+
+    @classmethod
+    def get_ledger(cls, grouping):
+        pool = Pool()
+        Ledger = super(QuantityLedger, cls).get_ledger(grouping)
+        if grouping == ('product', 'lot'):
+            return pool.get('stock.quantity.ledger.lot')
+        return Ledger
+
+
+class QuantityLedgerLot(QuantityLedgerMixin, ModelSQL, ModelView):
+    'Stock Quantity Ledger per Lot'
+    __name__ = 'stock.quantity.ledger.lot'
+    _grouping = ('product', 'lot')
+    lot = fields.Many2One('stock.lot', 'Lot', readonly=True, select=True,
+        ondelete='CASCADE')
+
+
 class Inventory:
     __name__ = 'stock.inventory'
 
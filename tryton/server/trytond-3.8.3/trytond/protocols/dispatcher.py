@@ -2,6 +2,7 @@
 # This file is part of Tryton.  The COPYRIGHT file at the top level of
 # this repository contains the full copyright notices and license terms.
 import logging
+import sys
 import time
 import pydoc
 
@@ -14,6 +15,7 @@ from trytond.config import config
 from trytond import __version__
 from trytond.transaction import Transaction
 from trytond.cache import Cache
+from trytond.filestore import filestore
 from trytond.exceptions import UserError, UserWarning, NotLogged, \
     ConcurrencyException
 from trytond.tools import is_instance_method
@@ -121,28 +123,9 @@ def dispatch(host, port, protocol, database_name, user, session, object_type,
             obj = pool.get(object_name, type=object_type)
             return pydoc.getdoc(getattr(obj, method))
 
-    for count in range(config.getint('database', 'retry'), -1, -1):
-        try:
-            user = security.check(database_name, user, session)
-        except DatabaseOperationalError:
-            if count:
-                continue
-            raise
-        break
-
-    database_list = Pool.database_list()
-    pool = Pool(database_name)
-    if database_name not in database_list:
-        with Transaction().start(database_name, user,
-                readonly=True) as transaction:
-            pool.init()
-    obj = pool.get(object_name, type=object_type)
-
-    if method in obj.__rpc__:
-        rpc = obj.__rpc__[method]
-    else:
-        raise UserError('Calling method %s on %s %s is not allowed!'
-            % (method, object_type, object_name))
+    user = _check_session(database_name, user, session)
+    obj, rpc = _get_rpc(database_name, user, object_type, object_name,
+        method)
 
     log_message = '%s.%s.%s(*%s, **%s) from %s@%s:%d/%s'
     log_args = (object_type, object_name, method, args, kwargs,
@@ -154,20 +137,7 @@ def dispatch(host, port, protocol, database_name, user, session, object_type,
                 readonly=rpc.readonly) as transaction:
             Cache.clean(database_name)
             try:
-                c_args, c_kwargs, transaction.context, transaction.timestamp \
-                    = rpc.convert(obj, *args, **kwargs)
-                meth = getattr(obj, method)
-                if (rpc.instantiate is None
-                        or not is_instance_method(obj, method)):
-                    result = rpc.result(meth(*c_args, **c_kwargs))
-                else:
-                    assert rpc.instantiate == 0
-                    inst = c_args.pop(0)
-                    if hasattr(inst, method):
-                        result = rpc.result(meth(inst, *c_args, **c_kwargs))
-                    else:
-                        result = [rpc.result(meth(i, *c_args, **c_kwargs))
-                            for i in inst]
+                result = _call(obj, method, rpc, args, kwargs)
                 if not rpc.readonly:
                     transaction.cursor.commit()
             except DatabaseOperationalError:
@@ -184,19 +154,232 @@ def dispatch(host, port, protocol, database_name, user, session, object_type,
                 transaction.cursor.rollback()
                 raise
             Cache.resets(database_name)
-        with Transaction().start(database_name, 0) as transaction:
-            pool = Pool(database_name)
-            Session = pool.get('ir.session')
+        _reset_session(database_name, session)
+        logger.debug('Result: %s', result)
+        return result
+
+
+def _get_rpc(database_name, user, object_type, object_name, method):
+    "Return the object and the RPC of the method"
+    database_list = Pool.database_list()
+    pool = Pool(database_name)
+    if database_name not in database_list:
+        with Transaction().start(database_name, user,
+                readonly=True):
+            pool.init()
+    obj = pool.get(object_name, type=object_type)
+
+    if method in obj.__rpc__:
+        rpc = obj.__rpc__[method]
+    else:
+        raise UserError('Calling method %s on %s %s is not allowed!'
+            % (method, object_type, object_name))
+    return obj, rpc
+
+
+def _call(obj, method, rpc, args, kwargs):
+    "Call the method of obj in the current transaction"
+    transaction = Transaction()
+    c_args, c_kwargs, transaction.context, transaction.timestamp \
+        = rpc.convert(obj, *args, **kwargs)
+    meth = getattr(obj, method)
+    if (rpc.instantiate is None
+            or not is_instance_method(obj, method)):
+        return rpc.result(meth(*c_args, **c_kwargs))
+    else:
+        assert rpc.instantiate == 0
+        inst = c_args.pop(0)
+        if hasattr(inst, method):
+            return rpc.result(meth(inst, *c_args, **c_kwargs))
+        else:
+            return [rpc.result(meth(i, *c_args, **c_kwargs))
+                for i in inst]
+
+
+def _reset_session(database_name, session):
+    with Transaction().start(database_name, 0) as transaction:
+        pool = Pool(database_name)
+        Session = pool.get('ir.session')
+        try:
+            Session.reset(session)
+        except DatabaseOperationalError:
+            logger.debug('Reset session failed', exc_info=True)
+            # Silently fail when reseting session
+            transaction.cursor.rollback()
+        else:
+            transaction.cursor.commit()
+
+
+def dispatch_batch(host, port, protocol, database_name, requests):
+    '''
+    Dispatch a batch of requests.
+
+    requests is a list of tuples with user, session, object_type,
+    object_name, method and args like for dispatch.
+    The consecutive read-only calls of the same session are executed in a
+    single transaction after a single check of the session. The other
+    requests are dispatched one by one.
+    Return the list of tuples with the result and the exception information
+    (None if the call succeed) of each request.
+    '''
+    results = []
+    group = []
+    users = {}
+
+    def flush():
+        if group:
+            user = users[group[0][:2]]
+            results.extend(_dispatch_readonly(host, port, protocol,
+                    database_name, user, group))
+            del group[:]
+
+    for request in requests:
+        user, session, object_type, object_name, method, args = request
+        if group and group[0][:2] != (user, session):
+            flush()
+        try:
+            readonly = False
+            if object_type not in ('common', 'system'):
+                # Check the session before loading the pool
+                if (user, session) not in users:
+                    users[(user, session)] = _check_session(database_name,
+                        user, session)
+                _, rpc = _get_rpc(database_name, users[(user, session)],
+                    object_type, object_name, method)
+                readonly = rpc.readonly
+        except Exception:
+            flush()
+            results.append((None, sys.exc_info()))
+            continue
+        if readonly:
+            group.append(request)
+            continue
+        flush()
+        try:
+            results.append((dispatch(host, port, protocol, database_name,
+                        user, session, object_type, object_name, method,
+                        *args), None))
+        except Exception:
+            results.append((None, sys.exc_info()))
+    flush()
+    return results
+
+
+def _check_session(database_name, user, session):
+    DatabaseOperationalError = backend.get('DatabaseOperationalError')
+    for count in range(config.getint('database', 'retry'), -1, -1):
+        try:
+            return security.check(database_name, user, session)
+        except DatabaseOperationalError:
+            if count:
+                continue
+            raise
+
+
+def _dispatch_readonly(host, port, protocol, database_name, user,
+        requests):
+    """
+    Execute the read-only requests of a session in a single transaction.
+    user is the id of the checked session.
+    """
+    DatabaseOperationalError = backend.get('DatabaseOperationalError')
+    session = requests[0][1]
+    for count in range(config.getint('database', 'retry'), -1, -1):
+        results = []
+        with Transaction().start(database_name, user,
+                readonly=True) as transaction:
+            Cache.clean(database_name)
             try:
-                Session.reset(session)
+                for request in requests:
+                    results.append(_call_readonly(host, port, database_name,
+                            user, request))
             except DatabaseOperationalError:
-                logger.debug('Reset session failed', exc_info=True)
-                # Silently fail when reseting session
                 transaction.cursor.rollback()
-            else:
-                transaction.cursor.commit()
-        logger.debug('Result: %s', result)
-        return result
+                if count:
+                    continue
+                results.extend([(None, sys.exc_info())]
+                    * (len(requests) - len(results)))
+            Cache.resets(database_name)
+        break
+    _reset_session(database_name, session)
+    return results
+
+
+def _call_readonly(host, port, database_name, user, request):
+    """
+    Call a read-only request in the current transaction.
+    Return the result and the exception information.
+    DatabaseOperationalError is raised to retry the transaction.
+    """
+    DatabaseOperationalError = backend.get('DatabaseOperationalError')
+    transaction = Transaction()
+    _, _, object_type, object_name, method, args = request
+    log_message = '%s.%s.%s(*%s) from %s@%s:%d/%s'
+    log_args = (object_type, object_name, method, args,
+        user, host, port, database_name)
+    logger.info(log_message, *log_args)
+    try:
+        obj, rpc = _get_rpc(database_name, user, object_type,
+            object_name, method)
+        result = _call(obj, method, rpc, args, {})
+    except DatabaseOperationalError:
+        raise
+    except (NotLogged, ConcurrencyException, UserError, UserWarning):
+        logger.debug(log_message, *log_args, exc_info=True)
+        transaction.cursor.rollback()
+        return None, sys.exc_info()
+    except Exception:
+        logger.error(log_message, *log_args, exc_info=True)
+        transaction.cursor.rollback()
+        return None, sys.exc_info()
+    logger.debug('Result: %s', result)
+    return result, None
+
+
+def dispatch_binary(host, port, protocol, database_name, user, session,
+        model_name, field_name, record_id):
+    '''
+    Return the reference of the binary field of the record and a function
+    which yields its content by chunks from an offset for a length.
+    The access is checked like for a read call. The content of the fields
+    with a file_id is streamed from the filestore.
+    Return None instead of the reference if the field is empty.
+    '''
+    user = _check_session(database_name, user, session)
+    Model, _ = _get_rpc(database_name, user, 'model', model_name, 'read')
+
+    logger.info('%s.%s.%s binary from %s@%s:%d/%s', model_name, record_id,
+        field_name, user, host, port, database_name)
+    field = Model._fields.get(field_name)
+    if field is None or field._type != 'binary':
+        raise UserError('Field %s of %s is not a binary!'
+            % (field_name, model_name))
+    file_id = getattr(field, 'file_id', None)
+    with Transaction().start(database_name, user, readonly=True, context={
+                '_check_access': True,
+                }):
+        Cache.clean(database_name)
+        if file_id:
+            with Transaction().set_context({
+                        '%s.%s' % (model_name, field_name): 'reference',
+                        }):
+                values, = Model.read([record_id], [field_name, file_id])
+            reference = values[field_name]
+            id_ = values[file_id]
+
+            def stream(offset, length):
+                return filestore.stream(id_, prefix=database_name,
+                    offset=offset, length=length)
+        else:
+            values, = Model.read([record_id], [field_name])
+            data = values[field_name]
+            reference = field.reference(data) if data else None
+
+            def stream(offset, length):
+                yield bytes(data[offset:offset + length])
+        Cache.resets(database_name)
+    _reset_session(database_name, session)
+    return reference, stream
 
 
 def create(database_name, password, lang, admin_password):
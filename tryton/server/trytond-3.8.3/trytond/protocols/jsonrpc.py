@@ -1,7 +1,8 @@
 # This file is part of Tryton.  The COPYRIGHT file at the top level of
 # this repository contains the full copyright notices and license terms.
 from trytond.protocols.sslsocket import SSLSocket
-from trytond.protocols.dispatcher import dispatch
+from trytond.protocols.dispatcher import dispatch, dispatch_batch, \
+    dispatch_binary
 from trytond.config import config
 from trytond.protocols.common import daemon, RegisterHandlerMixin
 from trytond.exceptions import UserError, UserWarning, NotLogged, \
@@ -27,10 +28,17 @@ except ImportError:
     import json
 import base64
 import encodings
+import xmlrpclib
 try:
     from cStringIO import StringIO
 except ImportError:
     from StringIO import StringIO
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from trytond.protocols import msgpackrpc
 
 
 class JSONDecoder(object):
@@ -129,6 +137,14 @@ JSONEncoder.register(Decimal,
         })
 
 
+def json_loads(data):
+    return json.loads(data, object_hook=JSONDecoder())
+
+
+def json_dumps(obj):
+    return json.dumps(obj, cls=JSONEncoder)
+
+
 class SimpleJSONRPCDispatcher(SimpleXMLRPCServer.SimpleXMLRPCDispatcher):
     """Mix-in class that dispatches JSON-RPC requests.
 
@@ -137,7 +153,8 @@ class SimpleJSONRPCDispatcher(SimpleXMLRPCServer.SimpleXMLRPCDispatcher):
     reason to instantiate this class directly.
     """
 
-    def _marshaled_dispatch(self, data, dispatch_method=None, path=None):
+    def _marshaled_dispatch(self, data, dispatch_method=None, path=None,
+            loads=None, dumps=None):
         """Dispatches an JSON-RPC method from marshalled (JSON) data.
 
         JSON-RPC methods are dispatched from the marshalled (JSON) data
@@ -147,41 +164,72 @@ class SimpleJSONRPCDispatcher(SimpleXMLRPCServer.SimpleXMLRPCDispatcher):
         SimpleJSONRPCRequestHandler.do_POST) but overriding the
         existing method through subclassing is the prefered means
         of changing method dispatch behavior.
+        The loads and dumps functions replace JSON to unmarshal the request
+        and marshal the response.
         """
-        rawreq = json.loads(data, object_hook=JSONDecoder())
+        loads = loads or json_loads
+        dumps = dumps or json_dumps
+        rawreq = loads(data)
+
+        if isinstance(rawreq, list):
+            # Batch of requests
+            batch_method = getattr(getattr(dispatch_method, 'im_self', None),
+                '_dispatch_batch', None)
+            responses = []
+            if batch_method is not None:
+                results = batch_method(
+                    [(r['method'], r.get('params', [])) for r in rawreq])
+            else:
+                results = []
+                for request in rawreq:
+                    results.append(self._call(dispatch_method,
+                            request['method'], request.get('params', [])))
+            for request, (result, exc_info) in zip(rawreq, results):
+                responses.append(
+                    self._response(request.get('id', 0), result, exc_info))
+            return dumps(responses)
 
         req_id = rawreq.get('id', 0)
         method = rawreq['method']
         params = rawreq.get('params', [])
+        result, exc_info = self._call(dispatch_method, method, params)
+        return dumps(self._response(req_id, result, exc_info))
 
-        response = {'id': req_id}
-
+    def _call(self, dispatch_method, method, params):
+        "Return the result and the exception information of the call"
         try:
             # generate response
             if dispatch_method is not None:
-                response['result'] = dispatch_method(method, params)
+                return dispatch_method(method, params), None
             else:
-                response['result'] = self._dispatch(method, params)
-        except (UserError, UserWarning, NotLogged,
-                ConcurrencyException), exception:
-            response['error'] = exception.args
+                return self._dispatch(method, params), None
         except Exception:
-            tb_s = ''.join(traceback.format_exception(*sys.exc_info()))
+            return None, sys.exc_info()
+
+    @staticmethod
+    def _response(req_id, result, exc_info):
+        response = {'id': req_id}
+        if exc_info is None:
+            response['result'] = result
+            return response
+        exception = exc_info[1]
+        if isinstance(exception, (UserError, UserWarning, NotLogged,
+                    ConcurrencyException)):
+            response['error'] = exception.args
+        else:
+            tb_s = ''.join(traceback.format_exception(*exc_info))
             for path in sys.path:
                 tb_s = tb_s.replace(path, '')
             # report exception back to server
-            response['error'] = (str(sys.exc_value), tb_s)
-
-        return json.dumps(response, cls=JSONEncoder)
+            response['error'] = (str(exception), tb_s)
+        return response
 
 
 class GenericJSONRPCRequestHandler:
 
     def _dispatch(self, method, params):
         host, port = self.client_address[:2]
-        database_name = self.path[1:]
-        if database_name.startswith('sao/'):
-            database_name = database_name[4:]
+        database_name = self._database_name()
         method_list = method.split('.')
         object_type = method_list[0]
         object_name = '.'.join(method_list[1:-1])
@@ -191,6 +239,52 @@ class GenericJSONRPCRequestHandler:
         res = dispatch(*args)
         return res
 
+    def _dispatch_batch(self, requests):
+        host, port = self.client_address[:2]
+        database_name = self._database_name()
+        calls = []
+        for method, params in requests:
+            method_list = method.split('.')
+            calls.append((params[0], params[1], method_list[0],
+                    '.'.join(method_list[1:-1]), method_list[-1],
+                    tuple(params[2:])))
+        return dispatch_batch(host, port, 'JSON-RPC', database_name, calls)
+
+    def _database_name(self):
+        database_name = self.path[1:]
+        if database_name.startswith('sao/'):
+            database_name = database_name[4:]
+        return database_name
+
+
+def parse_range(value, size):
+    """Return the first and last positions of the Range header value for
+    the size, None if it must be ignored or False if it is not satisfiable.
+    Only a single range of bytes is supported."""
+    unit, _, ranges = value.partition('=')
+    if unit.strip() != 'bytes' or ',' in ranges:
+        return None
+    start, sep, end = ranges.strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if not start:
+            suffix = int(end)
+            if not suffix:
+                return False
+            return max(size - suffix, 0), size - 1
+        start = int(start)
+        end = int(end) if end else None
+    except ValueError:
+        return None
+    if end is not None and end < start:
+        return None
+    if start >= size:
+        return False
+    if end is None:
+        end = size - 1
+    return start, min(end, size - 1)
+
 
 class SimpleJSONRPCRequestHandler(RegisterHandlerMixin,
         GenericJSONRPCRequestHandler,
@@ -211,13 +305,99 @@ class SimpleJSONRPCRequestHandler(RegisterHandlerMixin,
         SimpleXMLRPCServer.SimpleXMLRPCRequestHandler.send_header(self,
             keyword, value)
 
+    def do_POST(self):
+        """Handles the HTTP POST request.
+
+        The request is unmarshalled with msgpack if it is its content type
+        and the response is marshalled with msgpack if the client accepts
+        it. The response is compressed with zstd or gzip if the client
+        accepts it.
+        """
+        if not self.is_rpc_path_valid():
+            self.report_404()
+            return
+
+        request_type = self.headers.get('Content-Type', '').split(';')[0]
+        if (request_type == msgpackrpc.CONTENT_TYPE
+                and msgpackrpc.msgpack is None):
+            self.send_response(415, 'Content type %r not supported'
+                % request_type)
+            self.send_header('Content-length', '0')
+            self.end_headers()
+            return
+        accept = [t.split(';')[0].strip()
+            for t in self.headers.get('Accept', '').split(',')]
+        loads, dumps = json_loads, json_dumps
+        content_type = 'application/json-rpc'
+        if request_type == msgpackrpc.CONTENT_TYPE:
+            loads = msgpackrpc.loads
+        if (msgpackrpc.CONTENT_TYPE in accept
+                and msgpackrpc.msgpack is not None):
+            dumps = msgpackrpc.dumps
+            content_type = msgpackrpc.CONTENT_TYPE
+
+        try:
+            size_remaining = int(self.headers['content-length'])
+            chunks = []
+            while size_remaining:
+                chunk = self.rfile.read(min(size_remaining, 10 * 1024 * 1024))
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                size_remaining -= len(chunk)
+            data = self.decode_request_content(''.join(chunks))
+            if data is None:
+                return  # response has been sent
+            response = self.server._marshaled_dispatch(data,
+                getattr(self, '_dispatch', None), self.path,
+                loads=loads, dumps=dumps)
+        except Exception:
+            self.send_response(500)
+            self.send_header('Content-length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        if (self.encode_threshold is not None
+                and len(response) > self.encode_threshold):
+            accepted = self.accept_encodings()
+            if zstandard is not None and accepted.get('zstd', 0):
+                response = zstandard.ZstdCompressor().compress(response)
+                self.send_header('Content-Encoding', 'zstd')
+            elif accepted.get('gzip', 0):
+                response = xmlrpclib.gzip_encode(response)
+                self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def decode_request_content(self, data):
+        encoding = self.headers.get('content-encoding', 'identity').lower()
+        if encoding == 'zstd' and zstandard is not None:
+            try:
+                return zstandard.ZstdDecompressor().decompress(data)
+            except zstandard.ZstdError:
+                self.send_response(400, 'error decoding zstd content')
+                self.send_header('Content-length', '0')
+                self.end_headers()
+                return
+        return SimpleXMLRPCServer.SimpleXMLRPCRequestHandler\
+            .decode_request_content(self, data)
+
     def do_GET(self):
+        if self.is_binary_url(self.path):
+            self.send_binary(self.path)
+            return
         if self.is_tryton_url(self.path):
             self.send_tryton_url(self.path)
             return
         SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self)
 
     def do_HEAD(self):
+        if self.is_binary_url(self.path):
+            self.send_binary(self.path, with_body=False)
+            return
         if self.is_tryton_url(self.path):
             self.send_tryton_url(self.path)
             return
@@ -253,6 +433,114 @@ class SimpleJSONRPCRequestHandler(RegisterHandlerMixin,
         except IndexError:
             return False
 
+    def is_binary_url(self, path):
+        words = path.split('?', 1)[0].split('/')
+        try:
+            return words[2] == 'binary'
+        except IndexError:
+            return False
+
+    def send_empty(self, code, headers=None):
+        self.send_response(code)
+        for keyword, value in (headers or {}).iteritems():
+            self.send_header(keyword, value)
+        self.send_header('Content-length', '0')
+        self.end_headers()
+
+    def session_credentials(self):
+        "Return the user id and session of the Authorization header"
+        authorization = self.headers.get('Authorization', '')
+        try:
+            scheme, credentials = authorization.split(None, 1)
+            if scheme.lower() != 'session':
+                return None, None
+            user, session = base64.b64decode(credentials).split(':', 1)
+            return int(user), session
+        except (ValueError, TypeError):
+            return None, None
+
+    def send_binary(self, path, with_body=True):
+        """Send the content of a binary field.
+
+        The path is /<database>/binary/<model>/<field>/<id>[/<digest>] and
+        the user is authenticated by an Authorization header with the Session
+        scheme and the base64 encoded "<user id>:<session>" as credentials.
+        The digest of the content is sent as ETag which is used to answer Not
+        Modified to a If-None-Match request. A single Range of bytes is
+        supported. If the digest is in the path, the content is cacheable as
+        it can not change.
+        """
+        words = [urllib.unquote(w)
+            for w in path.split('?', 1)[0].split('#', 1)[0].split('/')]
+        try:
+            database_name = words[1]
+            model_name, field_name = words[3], words[4]
+            record_id = int(words[5])
+            digest = words[6] if len(words) > 6 else None
+        except (IndexError, ValueError):
+            self.send_empty(404)
+            return
+        user, session = self.session_credentials()
+        if not user:
+            self.send_empty(401, {'WWW-Authenticate': 'Session'})
+            return
+        host, port = self.client_address[:2]
+        try:
+            reference, stream = dispatch_binary(host, port, 'JSON-RPC',
+                database_name, user, session, model_name, field_name,
+                record_id)
+        except NotLogged:
+            self.send_empty(401, {'WWW-Authenticate': 'Session'})
+            return
+        except UserError:
+            self.send_empty(403)
+            return
+        except Exception:
+            self.send_empty(500)
+            return
+        if reference is None or (digest and digest != reference['digest']):
+            self.send_empty(404)
+            return
+
+        size = reference['size']
+        etag = '"%s"' % reference['digest']
+        headers = {
+            'ETag': etag,
+            'Accept-Ranges': 'bytes',
+            'Cache-Control': ('private, max-age=31536000' if digest
+                else 'private, no-cache'),
+            }
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*'
+                or etag in [e.strip() for e in if_none_match.split(',')]):
+            self.send_empty(304, headers)
+            return
+
+        code, offset, length = 200, 0, size
+        range_ = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_ and (not if_range or if_range.strip() == etag):
+            byte_range = parse_range(range_, size)
+            if byte_range is False:
+                headers['Content-Range'] = 'bytes */%s' % size
+                self.send_empty(416, headers)
+                return
+            elif byte_range is not None:
+                start, end = byte_range
+                code, offset, length = 206, start, end - start + 1
+                headers['Content-Range'] = 'bytes %s-%s/%s' % (
+                    start, end, size)
+
+        self.send_response(code)
+        for keyword, value in headers.iteritems():
+            self.send_header(keyword, value)
+        self.send_header('Content-type', 'application/octet-stream')
+        self.send_header('Content-length', str(length))
+        self.end_headers()
+        if with_body and length:
+            for chunk in stream(offset, length):
+                self.wfile.write(chunk)
+
     def send_tryton_url(self, path):
         self.send_response(300)
         hostname = (config.get('jsonrpc', 'hostname')
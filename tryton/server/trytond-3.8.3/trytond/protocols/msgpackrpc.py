@@ -0,0 +1,132 @@
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+import datetime
+import struct
+from decimal import Decimal
+try:
+    import msgpack
+    from msgpack import ExtType
+except ImportError:
+    msgpack = ExtType = None
+
+__all__ = ['CONTENT_TYPE', 'MsgPackEncoder', 'MsgPackDecoder', 'dumps',
+    'loads']
+
+CONTENT_TYPE = 'application/x-msgpack'
+
+# Extension type codes
+DATETIME, DATE, TIME, TIMEDELTA, DECIMAL, BYTES = range(1, 7)
+
+_datetime = struct.Struct('>HBBBBBI')
+_date = struct.Struct('>HBB')
+_time = struct.Struct('>BBBI')
+_timedelta = struct.Struct('>d')
+
+
+def _ext_type(code, data):
+    'Return the ExtType without the costly checks of its constructor'
+    return tuple.__new__(ExtType, (code, data))
+
+
+class MsgPackEncoder(object):
+    'Convert the Tryton types into msgpack extension types'
+
+    serializers = {}
+
+    @classmethod
+    def register(cls, klass, code, encoder):
+        assert klass not in cls.serializers
+        cls.serializers[klass] = (code, encoder)
+
+    def __call__(self, obj):
+        try:
+            code, encoder = self.serializers[type(obj)]
+        except KeyError:
+            raise TypeError('%r is not msgpack serializable' % obj)
+        return _ext_type(code, encoder(obj))
+
+MsgPackEncoder.register(datetime.datetime, DATETIME,
+    lambda o: _datetime.pack(o.year, o.month, o.day,
+        o.hour, o.minute, o.second, o.microsecond))
+MsgPackEncoder.register(datetime.date, DATE,
+    lambda o: _date.pack(o.year, o.month, o.day))
+MsgPackEncoder.register(datetime.time, TIME,
+    lambda o: _time.pack(o.hour, o.minute, o.second, o.microsecond))
+MsgPackEncoder.register(datetime.timedelta, TIMEDELTA,
+    lambda o: _timedelta.pack(o.total_seconds()))
+MsgPackEncoder.register(Decimal, DECIMAL, str)
+
+
+class MsgPackDecoder(object):
+    'Convert the msgpack extension types into the Tryton types'
+
+    decoders = {}
+
+    @classmethod
+    def register(cls, code, decoder):
+        assert code not in cls.decoders
+        cls.decoders[code] = decoder
+
+    def __call__(self, code, data):
+        if code in self.decoders:
+            return self.decoders[code](data)
+        return ExtType(code, data)
+
+MsgPackDecoder.register(DATETIME,
+    lambda d: datetime.datetime(*_datetime.unpack(d)))
+MsgPackDecoder.register(DATE, lambda d: datetime.date(*_date.unpack(d)))
+MsgPackDecoder.register(TIME, lambda d: datetime.time(*_time.unpack(d)))
+MsgPackDecoder.register(TIMEDELTA,
+    lambda d: datetime.timedelta(seconds=_timedelta.unpack(d)[0]))
+MsgPackDecoder.register(DECIMAL, Decimal)
+MsgPackDecoder.register(BYTES, bytearray if bytes == str else bytes)
+
+_BINARY_TYPES = (bytearray, buffer) if bytes == str else (bytes, bytearray)
+# The types which can not contain binaries
+_ATOMIC_TYPES = frozenset([type(None), bool, int, long, float, str, unicode,
+        Decimal, datetime.datetime, datetime.date, datetime.time,
+        datetime.timedelta])
+
+
+def _encode_binary(value):
+    '''
+    Return the value with the binaries replaced by extension types.
+    The strings are packed as text like with JSON so the binaries must be
+    converted before packing. msgpack packs bytearray natively so the default
+    hook never receives them. The containers are copied only if they contain
+    binaries.
+    '''
+    if isinstance(value, _BINARY_TYPES):
+        return _ext_type(BYTES, bytes(value))
+    elif isinstance(value, dict):
+        new = None
+        for key, item in value.iteritems():
+            if type(item) in _ATOMIC_TYPES:
+                continue
+            converted = _encode_binary(item)
+            if converted is not item:
+                if new is None:
+                    new = value.copy()
+                new[key] = converted
+        return value if new is None else new
+    elif isinstance(value, (list, tuple)):
+        new = None
+        for i, item in enumerate(value):
+            if type(item) in _ATOMIC_TYPES:
+                continue
+            converted = _encode_binary(item)
+            if converted is not item:
+                if new is None:
+                    new = list(value)
+                new[i] = converted
+        return value if new is None else new
+    return value
+
+
+def dumps(obj):
+    return msgpack.packb(_encode_binary(obj), use_bin_type=False,
+        default=MsgPackEncoder())
+
+
+def loads(data):
+    return msgpack.unpackb(data, raw=False, ext_hook=MsgPackDecoder())
@@ -359,6 +359,21 @@ class TrytonDAVInterface(iface.dav_interface):
         return res
 
     def _get_dav_getetag(self, uri):
+        dbname, dburi = self._get_dburi(uri)
+        if dbname and dburi:
+            pool = Pool(Transaction().cursor.database_name)
+            Collection = pool.get('webdav.collection')
+            try:
+                res = Collection.get_etag(dburi, cache=CACHE)
+            except (DAV_Error, DAV_NotFound, DAV_Secret,
+                    DAV_Forbidden), exception:
+                self._log_exception(exception)
+                raise
+            except Exception, exception:
+                self._log_exception(exception)
+                raise DAV_Error(500)
+            if res:
+                return res
         return '"' + str(self.get_lastmodified(uri)) + '"'
 
     def get_creationdate(self, uri):
@@ -529,6 +544,32 @@ class WebDAVAuthRequestHandler(WebDAVServer.DAVRequestHandler):
             with Transaction().start(dbname, 0):
                 Cache.resets(dbname)
 
+    def _HEAD_GET(self, with_body=False):
+        if self._not_modified():
+            return 304
+        return WebDAVServer.DAVRequestHandler._HEAD_GET(self,
+            with_body=with_body)
+
+    def _not_modified(self):
+        "Send Not Modified if the If-None-Match header matches the ETag"
+        if_none_match = self.headers.get('If-None-Match')
+        if not if_none_match:
+            return False
+        dc = self.IFACE_CLASS
+        uri = urllib.unquote(urlparse.urljoin(self.get_baseuri(dc),
+                self.path))
+        try:
+            etag = dc.get_prop(uri, 'DAV:', 'getetag')
+        except DAV_Error:
+            return False
+        if (if_none_match.strip() != '*'
+                and etag not in [e.strip()
+                    for e in if_none_match.split(',')]):
+            return False
+        self.send_body(None, 304, 'Not Modified', 'Not Modified',
+            headers={'ETag': etag})
+        return True
+
     def parse_request(self):
         if not BaseHTTPServer.BaseHTTPRequestHandler.parse_request(self):
             return False
@@ -75,7 +75,8 @@ class TrytonServer(object):
             with open(self.options.pidfile, 'w') as fd_pid:
                 fd_pid.write("%d" % (os.getpid()))
 
-        if not self.options.update:
+        gc_filestore = getattr(self.options, 'gc_filestore', False)
+        if not self.options.update and not gc_filestore:
             self.start_servers()
 
         for db_name in self.options.database_names:
@@ -147,8 +148,17 @@ class TrytonServer(object):
                             })
                     transaction.cursor.commit()
 
-        if self.options.update:
-            self.logger.info('Update/Init succeed!')
+        if gc_filestore:
+            for db_name in self.options.database_names:
+                with Transaction().start(db_name, 0):
+                    Attachment = Pool().get('ir.attachment')
+                    removed = Attachment.collect_files()
+                self.logger.info('%s files removed from the filestore of %s',
+                    removed, db_name)
+
+        if self.options.update or gc_filestore:
+            if self.options.update:
+                self.logger.info('Update/Init succeed!')
             logging.shutdown()
             sys.exit(0)
 
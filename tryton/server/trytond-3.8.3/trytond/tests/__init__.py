@@ -144,6 +144,7 @@ def register():
         Triggered,
         TriggerAction,
         TestAccess,
+        TestAccessTableQuery,
         TestWizardStart,
         WorkflowedModel,
         CopyOne2Many,
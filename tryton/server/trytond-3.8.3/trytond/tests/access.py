@@ -1,9 +1,11 @@
 # This file is part of Tryton.  The COPYRIGHT file at the top level of
 # this repository contains the full copyright notices and license terms.
 from trytond.model import ModelSQL, fields
+from trytond.pool import Pool
+from trytond.transaction import Transaction
 
 __all__ = [
-    'TestAccess',
+    'TestAccess', 'TestAccessTableQuery',
     ]
 
 
@@ -12,3 +14,19 @@ class TestAccess(ModelSQL):
     __name__ = 'test.access'
     field1 = fields.Char('Field 1')
     field2 = fields.Char('Field 2')
+
+
+class TestAccessTableQuery(ModelSQL):
+    'Test Access Table Query'
+    __name__ = 'test.access.table_query'
+    field1 = fields.Char('Field 1')
+
+    @staticmethod
+    def table_query():
+        pool = Pool()
+        TestAccess = pool.get('test.access')
+        access = TestAccess.__table__()
+        return access.select(access.id, access.create_uid,
+            access.create_date, access.write_uid, access.write_date,
+            access.field1,
+            where=access.field1 == Transaction().context.get('field1'))
@@ -6,6 +6,9 @@ from trytond.tests.test_tryton import POOL, DB_NAME, USER, CONTEXT, \
         install_module
 from trytond.transaction import Transaction
 from trytond.exceptions import UserError
+from trytond.pyson import PYSONEncoder, Eval
+from trytond.ir.model import ACCESS_READ, ACCESS_WRITE, ACCESS_CREATE, \
+    ACCESS_DELETE
 
 CONTEXT = CONTEXT.copy()
 CONTEXT['_check_access'] = True
@@ -345,6 +348,63 @@ class ModelAccessTestCase(unittest.TestCase):
             transaction.cursor.rollback()
             self.model_access._get_access_cache.clear()
 
+    def test0050access_masks(self):
+        'Test Access Masks'
+        User = POOL.get('res.user')
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            model, = self.model.search([('model', '=', 'test.access')])
+            group, = self.group.create([{'name': 'Test'}])
+            user1, user2 = User.create([{
+                        'name': 'User 1',
+                        'login': 'user1',
+                        'groups': [('add', [group.id])],
+                        }, {
+                        'name': 'User 2',
+                        'login': 'user2',
+                        'groups': [('add', [group.id])],
+                        }])
+            self.model_access.create([{
+                        'model': model.id,
+                        'group': group.id,
+                        'perm_read': True,
+                        'perm_write': True,
+                        }])
+
+            with transaction.set_user(user1.id):
+                masks1 = self.model_access.get_access_masks()
+                self.assertEqual(masks1['test.access'],
+                    ACCESS_READ | ACCESS_WRITE)
+                self.assertTrue(self.model_access.check('test.access',
+                        'write', raise_exception=False))
+                self.assertFalse(self.model_access.check('test.access',
+                        'delete', raise_exception=False))
+                self.assertEqual(
+                    self.model_access.get_access(['test.access']),
+                    {'test.access': {
+                            'read': True,
+                            'write': True,
+                            'create': False,
+                            'delete': False,
+                            }})
+            with transaction.set_user(user2.id):
+                masks2 = self.model_access.get_access_masks()
+            # Users with the same groups share the masks
+            self.assertIs(masks1, masks2)
+
+            # Changing the groups of a user changes its masks
+            User.write([user2], {
+                    'groups': [('remove', [group.id])],
+                    })
+            with transaction.set_user(user2.id):
+                self.assertNotIn('test.access',
+                    self.model_access.get_access_masks())
+                self.assertTrue(self.model_access.check('test.access',
+                        'delete', raise_exception=False))
+
+            transaction.cursor.rollback()
+            self.model_access._get_access_cache.clear()
+
 
 class ModelFieldAccessTestCase(unittest.TestCase):
     'Test Model Field Access'
@@ -772,6 +832,241 @@ class ModelFieldAccessTestCase(unittest.TestCase):
             transaction.cursor.rollback()
             self.field_access._get_access_cache.clear()
 
+    def test0020access_masks(self):
+        'Test Access Masks'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            field1, = self.field.search([
+                    ('model.model', '=', 'test.access'),
+                    ('name', '=', 'field1'),
+                    ])
+
+            self.assertEqual(
+                self.field_access.get_access_masks('test.access'), {})
+
+            self.field_access.create([{
+                        'field': field1.id,
+                        'group': None,
+                        'perm_read': True,
+                        'perm_write': False,
+                        }])
+            self.assertEqual(
+                self.field_access.get_access_masks('test.access'),
+                {'field1': ACCESS_READ | ACCESS_CREATE | ACCESS_DELETE})
+            self.assertEqual(
+                self.field_access.get_access(['test.access']),
+                {'test.access': {'field1': {
+                            'read': True,
+                            'write': False,
+                            'create': True,
+                            'delete': True,
+                            }}})
+            self.assertEqual(self.field_access.check('test.access',
+                    ['field1', 'field2'], 'write', access=True),
+                {'field1': False})
+            self.assertFalse(self.field_access.check('test.access',
+                    ['field1', 'field2'], 'write', raise_exception=False))
+            self.assertTrue(self.field_access.check('test.access',
+                    ['field2'], 'write', raise_exception=False))
+
+            transaction.cursor.rollback()
+            self.field_access._get_access_cache.clear()
+
+
+class ModelRuleTestCase(unittest.TestCase):
+    'Test Model Rule'
+
+    def setUp(self):
+        install_module('tests')
+        self.rule_group = POOL.get('ir.rule.group')
+        self.rule = POOL.get('ir.rule')
+        self.test_access = POOL.get('test.access')
+        self.model = POOL.get('ir.model')
+        self.user = POOL.get('res.user')
+
+    def test0010global(self):
+        'Test global rule'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            model, = self.model.search([('model', '=', 'test.access')])
+            foo, bar = self.test_access.create([{
+                        'field1': 'foo',
+                        }, {
+                        'field1': 'bar',
+                        }])
+
+            rule_group, = self.rule_group.create([{
+                        'name': 'Field1 Foo',
+                        'model': model.id,
+                        'global_p': True,
+                        'perm_read': True,
+                        'perm_write': True,
+                        'perm_create': False,
+                        'perm_delete': True,
+                        'rules': [('create', [{
+                                        'domain': PYSONEncoder().encode(
+                                            [('field1', '=', 'foo')]),
+                                        }])],
+                        }])
+
+            self.test_access.read([foo.id], ['field1'])
+            self.assertRaises(UserError, self.test_access.read, [bar.id],
+                ['field1'])
+            self.assertEqual(self.test_access.search([]), [foo])
+            self.test_access.write([foo], {'field2': 'spam'})
+            self.assertRaises(UserError, self.test_access.write, [bar],
+                {'field2': 'spam'})
+            self.assertRaises(UserError, self.test_access.delete, [bar])
+            self.test_access.create([{'field1': 'bar'}])
+
+            self.rule_group.write([rule_group], {
+                    'perm_read': False,
+                    })
+            self.test_access.read([bar.id], ['field1'])
+
+            transaction.cursor.rollback()
+            self.rule._domain_get_cache.clear()
+
+    def test0020shared(self):
+        'Test rule domain shared between users'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            model, = self.model.search([('model', '=', 'test.access')])
+            user1, user2 = self.user.create([{
+                        'name': 'User 1',
+                        'login': 'user1',
+                        }, {
+                        'name': 'User 2',
+                        'login': 'user2',
+                        }])
+            self.rule_group.create([{
+                        'name': 'Field1 Foo',
+                        'model': model.id,
+                        'global_p': True,
+                        'rules': [('create', [{
+                                        'domain': PYSONEncoder().encode(
+                                            [('field1', '=', 'foo')]),
+                                        }])],
+                        }])
+
+            with transaction.set_user(user1.id):
+                domain1 = self.rule.domain_get('test.access')
+            with transaction.set_user(user2.id):
+                domain2 = self.rule.domain_get('test.access')
+            self.assertEqual(domain1, ['AND', ['OR',
+                            [['field1', '=', 'foo']]]])
+            self.assertIs(domain1, domain2)
+
+            transaction.cursor.rollback()
+            self.rule._domain_get_cache.clear()
+
+    def test0030user(self):
+        'Test rule domain with user'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            model, = self.model.search([('model', '=', 'test.access')])
+            user1, user2 = self.user.create([{
+                        'name': 'User 1',
+                        'login': 'user1',
+                        }, {
+                        'name': 'User 2',
+                        'login': 'user2',
+                        }])
+            self.rule_group.create([{
+                        'name': 'Field1 Login',
+                        'model': model.id,
+                        'global_p': True,
+                        'rules': [('create', [{
+                                        'domain': PYSONEncoder().encode(
+                                            [('field1', '=',
+                                                    Eval('user', {}).get(
+                                                        'login'))]),
+                                        }])],
+                        }])
+
+            with transaction.set_user(user1.id):
+                domain1 = self.rule.domain_get('test.access')
+            with transaction.set_user(user2.id):
+                domain2 = self.rule.domain_get('test.access')
+            self.assertEqual(domain1, ['AND', ['OR',
+                        [['field1', '=', 'user1']]]])
+            self.assertEqual(domain2, ['AND', ['OR',
+                        [['field1', '=', 'user2']]]])
+
+            transaction.cursor.rollback()
+            self.rule._domain_get_cache.clear()
+
+    def test0040rule_query(self):
+        'Test rule query memoization'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            model, = self.model.search([('model', '=', 'test.access')])
+            self.assertIsNone(self.test_access._get_rule_query('read'))
+
+            rule_group, = self.rule_group.create([{
+                        'name': 'Field1 Foo',
+                        'model': model.id,
+                        'global_p': True,
+                        'rules': [('create', [{
+                                        'domain': PYSONEncoder().encode(
+                                            [('field1', '=', 'foo')]),
+                                        }])],
+                        }])
+
+            rule_query = self.test_access._get_rule_query('read')
+            self.assertIsNotNone(rule_query)
+            self.assertIs(self.test_access._get_rule_query('read'),
+                rule_query)
+
+            # A modification of record renews the query
+            foo, = self.test_access.create([{'field1': 'foo'}])
+            self.assertIsNot(self.test_access._get_rule_query('read'),
+                rule_query)
+
+            # A modification of rule renews the domain
+            rule_query = self.test_access._get_rule_query('read')
+            self.rule.write(list(rule_group.rules), {
+                    'domain': PYSONEncoder().encode(
+                        [('field1', '=', 'bar')]),
+                    })
+            self.assertEqual(self.test_access.search([]), [])
+
+            transaction.cursor.rollback()
+            self.rule._domain_get_cache.clear()
+
+    def test0050rule_query_context(self):
+        'Test rule query of table query depending on context'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            TableQuery = POOL.get('test.access.table_query')
+            model, = self.model.search([
+                    ('model', '=', 'test.access.table_query'),
+                    ])
+            foo, bar = self.test_access.create([{
+                        'field1': 'foo',
+                        }, {
+                        'field1': 'bar',
+                        }])
+            self.rule_group.create([{
+                        'name': 'Field1 Set',
+                        'model': model.id,
+                        'global_p': True,
+                        'rules': [('create', [{
+                                        'domain': PYSONEncoder().encode(
+                                            [('field1', '!=', None)]),
+                                        }])],
+                        }])
+
+            with transaction.set_context(field1='foo'):
+                self.assertEqual(TableQuery.read([foo.id], ['field1']),
+                    [{'id': foo.id, 'field1': 'foo'}])
+            with transaction.set_context(field1='bar'):
+                self.assertEqual(TableQuery.read([bar.id], ['field1']),
+                    [{'id': bar.id, 'field1': 'bar'}])
+
+            transaction.cursor.rollback()
+            self.rule._domain_get_cache.clear()
+
 
 def suite():
     suite_ = unittest.TestSuite()
@@ -779,4 +1074,6 @@ def suite():
         ).loadTestsFromTestCase(ModelAccessTestCase))
     suite_.addTests(unittest.TestLoader(
         ).loadTestsFromTestCase(ModelFieldAccessTestCase))
+    suite_.addTests(unittest.TestLoader(
+        ).loadTestsFromTestCase(ModelRuleTestCase))
     return suite_
@@ -11,6 +11,7 @@ except ImportError:
     sys.modules['cdecimal'] = decimal
 import unittest
 import datetime
+import hashlib
 from decimal import Decimal
 from trytond.tests.test_tryton import POOL, DB_NAME, USER, CONTEXT, \
         install_module
@@ -3204,6 +3205,13 @@ class FieldsTestCase(unittest.TestCase):
                 self.assert_(bin1_size.binary == len(b'bar'))
                 self.assert_(bin1_size.binary != fields.Binary.cast(b'bar'))
 
+            with transaction.set_context({'test.binary.binary': 'reference'}):
+                bin1_reference = self.binary(bin1.id)
+                self.assertEqual(bin1_reference.binary, {
+                        'size': len(b'bar'),
+                        'digest': hashlib.sha256(b'bar').hexdigest(),
+                        })
+
             bin2, = self.binary.create([{}])
             self.assert_(bin2.binary is None)
 
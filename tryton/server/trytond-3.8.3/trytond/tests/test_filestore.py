@@ -0,0 +1,203 @@
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import unittest
+from io import BytesIO
+
+from trytond.tests.test_tryton import POOL, DB_NAME, USER, CONTEXT, \
+    install_module
+from trytond.transaction import Transaction
+from trytond.exceptions import UserError
+from trytond.model import fields
+from trytond.config import config
+from trytond.filestore import FileStore
+from trytond.protocols.dispatcher import dispatch_binary
+
+
+class FileStoreTestCase(unittest.TestCase):
+    'Test FileStore'
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filestore = FileStore(path=self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test0010set_get(self):
+        'Test set and get'
+        data = 'foo' * 100000
+        id, size = self.filestore.set(data, prefix='test')
+        self.assertEqual(id, hashlib.sha256(data).hexdigest())
+        self.assertEqual(size, len(data))
+        self.assertEqual(self.filestore.get(id, prefix='test'), data)
+        self.assertEqual(self.filestore.size(id, prefix='test'), len(data))
+        self.assertEqual(list(self.filestore.ids(prefix='test')), [id])
+        self.assertEqual(os.listdir(os.path.join(self.path, 'test')),
+            [id[0:2]])
+
+    def test0020set_same(self):
+        'Test set same content'
+        id1, _ = self.filestore.set('foo', prefix='test')
+        id2, _ = self.filestore.set(BytesIO('foo'), prefix='test')
+        self.assertEqual(id1, id2)
+        self.assertEqual(list(self.filestore.ids(prefix='test')), [id1])
+
+    def test0030set_file(self):
+        'Test set file object'
+        data = os.urandom(200000)
+        id, size = self.filestore.set(BytesIO(data), prefix='test')
+        self.assertEqual(id, hashlib.sha256(data).hexdigest())
+        self.assertEqual(size, len(data))
+        self.assertEqual(self.filestore.get(id, prefix='test'), data)
+
+    def test0035set_iterable(self):
+        'Test set iterable of strings'
+        strings = [os.urandom(1000) for _ in xrange(100)]
+        data = ''.join(strings)
+        id, size = self.filestore.set(iter(strings), prefix='test')
+        self.assertEqual(id, hashlib.sha256(data).hexdigest())
+        self.assertEqual(size, len(data))
+        self.assertEqual(self.filestore.get(id, prefix='test'), data)
+
+    def test0040stream(self):
+        'Test stream'
+        data = os.urandom(200000)
+        id, _ = self.filestore.set(data, prefix='test')
+        chunks = list(self.filestore.stream(id, prefix='test',
+                chunk_size=1024))
+        self.assertEqual(''.join(chunks), data)
+        self.assertEqual(max(len(c) for c in chunks), 1024)
+        self.assertEqual(''.join(self.filestore.stream(id, prefix='test',
+                    offset=10, length=5000)), data[10:5010])
+
+    def test0050collect(self):
+        'Test collect'
+        used, _ = self.filestore.set('used', prefix='test')
+        unused, _ = self.filestore.set('unused', prefix='test')
+        self.assertEqual(self.filestore.collect(set([used]), prefix='test'),
+            0)
+        self.assertEqual(self.filestore.collect(set([used]), prefix='test',
+                grace=0), 1)
+        self.assertEqual(list(self.filestore.ids(prefix='test')), [used])
+        self.assertFalse(self.filestore.exists(unused, prefix='test'))
+
+    def test0060collect_temporary(self):
+        'Test collect temporary files'
+        fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=self.path)
+        os.close(fd)
+        past = time.time() - 7200
+        os.utime(tmp, (past, past))
+        self.assertEqual(self.filestore.collect(set()), 1)
+        self.assertFalse(os.path.exists(tmp))
+
+
+class AttachmentFileStoreTestCase(unittest.TestCase):
+    'Test Attachment FileStore'
+
+    def setUp(self):
+        install_module('ir')
+        self.path = tempfile.mkdtemp()
+        self.previous_path = config.get('database', 'path')
+        config.set('database', 'path', self.path)
+
+    def tearDown(self):
+        config.set('database', 'path', self.previous_path)
+        shutil.rmtree(self.path)
+
+    def test0010data(self):
+        'Test attachment data'
+        Attachment = POOL.get('ir.attachment')
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            data = 'foo' * 1000
+            attachment, = Attachment.create([{
+                        'name': 'test',
+                        'resource': 'res.user,%s' % USER,
+                        'data': data,
+                        }])
+            self.assertEqual(attachment.file_id,
+                hashlib.sha256(data).hexdigest())
+            self.assertEqual(attachment.data_size, len(data))
+            self.assertEqual(bytes(attachment.data), data)
+            with Transaction().set_context({'ir.attachment.data': 'size'}):
+                self.assertEqual(Attachment(attachment.id).data, len(data))
+
+            unused, = Attachment.create([{
+                        'name': 'unused',
+                        'resource': 'res.user,%s' % USER,
+                        'data': 'bar',
+                        }])
+            Attachment.delete([unused])
+            file_id = attachment.file_id
+            past = time.time() - 7200
+            for root, _, files in os.walk(os.path.join(self.path, DB_NAME)):
+                for filename in files:
+                    os.utime(os.path.join(root, filename), (past, past))
+            self.assertEqual(Attachment.collect_files(), 1)
+            self.assertEqual(bytes(Attachment(attachment.id).data), data)
+            self.assertEqual(
+                list(os.listdir(os.path.join(self.path, DB_NAME,
+                            file_id[0:2], file_id[2:4]))), [file_id])
+
+    def test0020dispatch_binary(self):
+        'Test dispatch binary'
+        Attachment = POOL.get('ir.attachment')
+        Report = POOL.get('ir.action.report')
+        Session = POOL.get('ir.session')
+        data = os.urandom(100000)
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            attachment, = Attachment.create([{
+                        'name': 'test',
+                        'resource': 'res.user,%s' % USER,
+                        'data': data,
+                        }])
+            report, = Report.create([{
+                        'name': 'Test',
+                        'report_name': 'test.report',
+                        'report_content': fields.Binary.cast(b'foo'),
+                        }])
+            session, = Session.create([{}])
+            key = session.key
+            transaction.cursor.commit()
+        try:
+            reference, stream = dispatch_binary('localhost', 0, 'test',
+                DB_NAME, USER, key, 'ir.attachment', 'data',
+                attachment.id)
+            self.assertEqual(reference, {
+                    'size': len(data),
+                    'digest': hashlib.sha256(data).hexdigest(),
+                    })
+            self.assertEqual(''.join(stream(0, len(data))), data)
+            self.assertEqual(''.join(stream(10, 100)), data[10:110])
+
+            reference, stream = dispatch_binary('localhost', 0, 'test',
+                DB_NAME, USER, key, 'ir.action.report', 'report_content',
+                report.id)
+            self.assertEqual(reference, {
+                    'size': 3,
+                    'digest': hashlib.sha256(b'foo').hexdigest(),
+                    })
+            self.assertEqual(''.join(stream(1, 2)), b'oo')
+
+            self.assertRaises(UserError, dispatch_binary, 'localhost', 0,
+                'test', DB_NAME, USER, key, 'ir.attachment', 'name',
+                attachment.id)
+        finally:
+            with Transaction().start(DB_NAME, USER,
+                    context=CONTEXT) as transaction:
+                Attachment.delete([Attachment(attachment.id)])
+                Report.delete([Report(report.id)])
+                Session.delete([Session(session.id)])
+                transaction.cursor.commit()
+
+def suite():
+    func = unittest.TestLoader().loadTestsFromTestCase
+    suite = unittest.TestSuite()
+    for testcase in (FileStoreTestCase, AttachmentFileStoreTestCase):
+        suite.addTests(func(testcase))
+    return suite
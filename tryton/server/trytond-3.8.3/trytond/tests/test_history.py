@@ -76,6 +76,44 @@ class HistoryTestCase(unittest.TestCase):
             with Transaction().set_context(_datetime=datetime.datetime.min):
                 self.assertRaises(UserError, History.read, [history_id])
 
+    def test0015read_many(self):
+        'Test read history of many records'
+        History = POOL.get('test.history')
+
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            histories = History.create([{'value': i} for i in range(5)])
+            ids = [h.id for h in histories]
+            first = max(h.create_date for h in histories)
+
+            transaction.cursor.commit()
+
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            History.write(History.browse(ids[:3]), {'value': 10})
+            second = max(h.write_date for h in History.browse(ids[:3]))
+
+            transaction.cursor.commit()
+
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            History.write(History.browse(ids[:1]), {'value': 20})
+
+            transaction.cursor.commit()
+
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            for timestamp, values in [
+                    (first, [0, 1, 2, 3, 4]),
+                    (second, [10, 10, 10, 3, 4]),
+                    (datetime.datetime.max, [20, 10, 10, 3, 4]),
+                    ]:
+                with Transaction().set_context(_datetime=timestamp):
+                    rows = History.read(ids, ['value'])
+                    self.assertEqual(
+                        [r['value'] for r in sorted(rows,
+                                key=lambda r: r['id'])],
+                        values)
+
     @unittest.skipUnless(backend.name() == 'postgresql',
         'CURRENT_TIMESTAMP as transaction_timestamp is specific to postgresql')
     def test0020read_same_timestamp(self):
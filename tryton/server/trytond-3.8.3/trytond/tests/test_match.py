@@ -0,0 +1,84 @@
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+import unittest
+import random
+
+from trytond.model.match import MatchMixin, MatchIndex
+
+
+def match_values(values, pattern):
+    return MatchMixin.match_values.__func__(MatchMixin, values, pattern)
+
+
+class MatchIndexTestCase(unittest.TestCase):
+    'Test MatchIndex'
+
+    def linear(self, rows, pattern):
+        for row in rows:
+            if match_values(row, pattern):
+                return row
+
+    def test_find(self):
+        'Test find'
+        rows = [
+            {'id': 1, 'a': 1, 'b': None},
+            {'id': 2, 'a': None, 'b': 2},
+            {'id': 3, 'a': 1, 'b': 2},
+            {'id': 4, 'a': None, 'b': None},
+            ]
+        index = MatchIndex(rows, ['a', 'b'])
+        for pattern, result in [
+                ({'a': 1, 'b': 1}, 1),
+                ({'a': 2, 'b': 2}, 2),
+                ({'a': 1, 'b': 2}, 1),
+                ({'a': 2, 'b': 1}, 4),
+                ({'a': None, 'b': None}, 4),
+                ]:
+            self.assertEqual(index.find(pattern, match_values)['id'], result)
+
+    def test_find_not_indexed(self):
+        'Test find on names not indexed'
+        rows = [
+            {'id': 1, 'a': 1, 'b': 1},
+            {'id': 2, 'a': 1, 'b': None},
+            ]
+        index = MatchIndex(rows, ['a'])
+        self.assertEqual(
+            index.find({'a': 1, 'b': 2}, match_values)['id'], 2)
+        self.assertEqual(index.find({'a': 2, 'b': 1}, match_values), None)
+        index = MatchIndex(rows, [])
+        self.assertEqual(
+            index.find({'a': 1, 'b': 1}, match_values)['id'], 1)
+
+    def test_find_unhashable(self):
+        'Test find with unhashable pattern value'
+        rows = [
+            {'id': 1, 'a': 1},
+            {'id': 2, 'a': None},
+            ]
+        index = MatchIndex(rows, ['a'])
+        self.assertEqual(index.find({'a': [1]}, match_values)['id'], 2)
+
+    def test_find_random(self):
+        'Test find gives the same row than the linear scan'
+        generator = random.Random(42)
+        names = ['a', 'b', 'c']
+
+        def value():
+            return generator.choice([None, None, 1, 2, 3, 4])
+        rows = [dict([('id', i)] + [(n, value()) for n in names])
+            for i in xrange(500)]
+        index = MatchIndex(rows, names)
+        for _ in xrange(500):
+            pattern = dict((n, generator.choice([None, 1, 2, 3, 4, 5]))
+                for n in names)
+            self.assertEqual(index.find(pattern, match_values),
+                self.linear(rows, pattern))
+
+
+def suite():
+    func = unittest.TestLoader().loadTestsFromTestCase
+    suite = unittest.TestSuite()
+    for testcase in (MatchIndexTestCase,):
+        suite.addTests(func(testcase))
+    return suite
@@ -34,6 +34,69 @@ class ModelStorageTestCase(unittest.TestCase):
             self.assertTrue(
                 all(x['name'] >= y['name'] for x, y in zip(rows, rows[1:])))
 
+    def test_search_page(self):
+        'Test search_page'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            pool = Pool()
+            ModelSQL = pool.get('test.modelsql')
+            ModelStorage = pool.get('test.modelstorage')
+
+            ModelSQL.create([{'integer': i % 4, 'desc': str(i)}
+                    for i in range(10)])
+            ModelStorage.create([{'name': str(i % 3) if i % 4 else None}
+                    for i in range(10)])
+            for Model, order in [
+                    (ModelSQL, [('integer', 'DESC'), ('desc', 'ASC')]),
+                    (ModelSQL, [('integer', 'ASC')]),
+                    (ModelStorage, [('name', 'ASC')]),
+                    (ModelStorage, [('name', 'DESC')]),
+                    (ModelStorage, [('create_uid', 'ASC')]),
+                    ]:
+                expected = map(int, Model.search([],
+                        order=order + [('id', 'ASC')]))
+
+                ids, token, count = [], None, None
+                while True:
+                    page = Model.search_page([], limit=3, order=order,
+                        token=token, count=token is None)
+                    if token is None:
+                        count = page['count']
+                    else:
+                        self.assertEqual(page['count'], None)
+                    self.assertTrue(len(page['ids']) <= 3)
+                    ids.extend(page['ids'])
+                    token = page['next']
+                    if not token:
+                        break
+                self.assertEqual(ids, expected)
+                self.assertEqual(count, len(expected))
+
+                # Go back from the last page
+                ids = page['ids']
+                token = page['previous']
+                while token:
+                    page = Model.search_page([], limit=3, order=order,
+                        token=token)
+                    ids = page['ids'] + ids
+                    token = page['previous']
+                self.assertEqual(ids, expected)
+
+            page = ModelSQL.search_page([], limit=3,
+                order=[('integer', 'ASC')], fields_names=['desc'])
+            self.assertEqual([r['id'] for r in page['records']], page['ids'])
+            self.assertEqual(page['previous'], None)
+            self.assertEqual(page['next']['direction'], 'next')
+
+            page = ModelStorage.search_page([], limit=3,
+                order=[('create_uid', 'ASC')])
+            self.assertEqual(page['next'], {'offset': 3})
+
+            # The count of the last page or beyond
+            for offset, limit in [(0, None), (0, 20), (8, 3), (20, 3)]:
+                page = ModelSQL.search_page([], offset=offset, limit=limit,
+                    count=True)
+                self.assertEqual(page['count'], 10)
+
 
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(ModelStorageTestCase)
@@ -6,7 +6,8 @@ import json
 import datetime
 from decimal import Decimal
 
-from trytond.protocols.jsonrpc import JSONEncoder, JSONDecoder
+from trytond.protocols.jsonrpc import JSONEncoder, JSONDecoder, parse_range
+from trytond.protocols import msgpackrpc
 from trytond.protocols.xmlrpc import xmlrpclib
 
 
@@ -40,6 +41,65 @@ class JSONTestCase(unittest.TestCase):
         self.dumps_loads(Decimal('3.141592653589793'))
 
 
+@unittest.skipIf(msgpackrpc.msgpack is None, 'requires msgpack')
+class MsgPackTestCase(unittest.TestCase):
+    'Test MsgPack'
+
+    def dumps_loads(self, value):
+        self.assertEqual(msgpackrpc.loads(msgpackrpc.dumps(value)), value)
+
+    def test_datetime(self):
+        'Test datetime'
+        self.dumps_loads(datetime.datetime.now())
+
+    def test_date(self):
+        'Test date'
+        self.dumps_loads(datetime.date.today())
+
+    def test_time(self):
+        'Test time'
+        self.dumps_loads(datetime.datetime.now().time())
+
+    def test_timedelta(self):
+        'Test timedelta'
+        self.dumps_loads(datetime.timedelta(days=1, seconds=2))
+
+    def test_bytes(self):
+        'Test bytes'
+        value = bytearray(b'\x00\xff')
+        result = msgpackrpc.loads(msgpackrpc.dumps(value))
+        self.assertEqual(result, value)
+        self.assertIsInstance(result, bytearray)
+
+    def test_decimal(self):
+        'Test Decimal'
+        self.dumps_loads(Decimal('3.141592653589793'))
+
+    def test_string(self):
+        'Test strings are loaded as unicode like with JSON'
+        self.assertEqual(msgpackrpc.loads(msgpackrpc.dumps('foo')), u'foo')
+        self.dumps_loads(u'\xe9')
+
+    def test_response(self):
+        'Test response'
+        binary = bytearray(b'\x89PNG')
+        rows = [{
+                'id': 1,
+                'name': u'Foo',
+                'date': datetime.date(2016, 1, 1),
+                'amount': Decimal('1.50'),
+                'photo': binary,
+                'lines': [1, 2],
+                }, {
+                'id': 2,
+                'name': None,
+                'photo': None,
+                }]
+        self.dumps_loads({'id': 1, 'result': rows})
+        # The binary is not replaced in the original value
+        self.assertIs(rows[0]['photo'], binary)
+
+
 class XMLTestCase(unittest.TestCase):
     'Test XML'
 
@@ -71,8 +131,35 @@ class XMLTestCase(unittest.TestCase):
         self.dumps_loads(None)
 
 
+class RangeTestCase(unittest.TestCase):
+    'Test HTTP Range'
+
+    def test_range(self):
+        'Test range'
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=500-', 1000), (500, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=900-2000', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-2000', 1000), (0, 999))
+
+    def test_unsatisfiable(self):
+        'Test unsatisfiable range'
+        self.assertEqual(parse_range('bytes=1000-', 1000), False)
+        self.assertEqual(parse_range('bytes=-0', 1000), False)
+
+    def test_ignored(self):
+        'Test ignored range'
+        for value in ['items=0-1', 'bytes=0-1,5-6', 'bytes=5-1', 'bytes=a-',
+                'bytes=1']:
+            self.assertEqual(parse_range(value, 1000), None)
+
+
 def suite():
     suite_ = unittest.TestSuite()
     suite_.addTests(unittest.TestLoader().loadTestsFromTestCase(JSONTestCase))
+    suite_.addTests(unittest.TestLoader().loadTestsFromTestCase(
+            MsgPackTestCase))
     suite_.addTests(unittest.TestLoader().loadTestsFromTestCase(XMLTestCase))
+    suite_.addTests(unittest.TestLoader().loadTestsFromTestCase(
+            RangeTestCase))
     return suite_
@@ -598,6 +598,43 @@ class PYSONTestCase(unittest.TestCase):
             self.assertEqual(decoder.decode(encoder.encode(instance)).pyson(),
                 instance.pyson())
 
+    def test_compile(self):
+        'Test compile_pyson'
+        encoder = pyson.PYSONEncoder()
+        expr = encoder.encode([
+                ('id', pyson.If(pyson.Not(pyson.In('company',
+                                pyson.Eval('context', {}))), '=', '!='),
+                    pyson.Get(pyson.Eval('context', {}), 'company', -1)),
+                ('state', 'in', ['draft', pyson.Eval('state')]),
+                ('name', '=', pyson.Bool(pyson.Eval('name'))
+                    & pyson.Or(pyson.Equal(pyson.Eval('name'), 'foo'),
+                        pyson.Greater(pyson.Len(pyson.Eval('name', '')), 2),
+                        pyson.Less(pyson.Eval('number', 0), 2, True))),
+                {'foo': {'bar': pyson.Eval('name')}},
+                ])
+        for context in [
+                None,
+                {},
+                {'context': {'company': 1}, 'state': 'done', 'name': 'foo'},
+                {'context': {}, 'name': 'bar', 'number': 2},
+                {'name': 'ba', 'number': 3},
+                ]:
+            self.assertEqual(pyson.compile_pyson(expr)(context),
+                pyson.PYSONDecoder(context).decode(expr))
+
+        self.assertIs(pyson.compile_pyson(expr), pyson.compile_pyson(expr))
+
+        # The result must not be shared between evaluations
+        result = pyson.compile_pyson(expr)({})
+        result[1][2].append('done')
+        result[3]['foo']['bar'] = 'test'
+        self.assertEqual(pyson.compile_pyson(expr)({}),
+            pyson.PYSONDecoder().decode(expr))
+
+        expr = encoder.encode(pyson.Date(delta_days=1))
+        self.assertEqual(pyson.compile_pyson(expr)(),
+            datetime.date.today() + datetime.timedelta(days=1))
+
 
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(PYSONTestCase)
@@ -110,6 +110,53 @@ class SequenceTestCase(unittest.TestCase):
                 self.assertEqual(self.sequence.get_id(sequence),
                     '2010-08-15/2/15.08.2010')
 
+    def test0050get_ids(self):
+        'Test get_ids'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            sequence, = self.sequence.create([{
+                        'name': 'Test incremental',
+                        'code': 'test',
+                        'prefix': 'P',
+                        'suffix': '',
+                        'type': 'incremental',
+                        'padding': 2,
+                        }])
+            self.assertEqual(self.sequence.get_ids(sequence, 3),
+                ['P01', 'P02', 'P03'])
+            self.assertEqual(self.sequence.get_ids(sequence, 0), [])
+            self.assertEqual(self.sequence.get_id(sequence), 'P04')
+
+            sequence, = self.sequence.create([{
+                        'name': 'Test decimal timestamp',
+                        'code': 'test',
+                        'prefix': '',
+                        'suffix': '',
+                        'type': 'decimal timestamp',
+                        }])
+            timestamps = self.sequence.get_ids(sequence, 3)
+            self.assertEqual(len(set(timestamps)), 3)
+
+            transaction.cursor.rollback()
+
+    def test0060strict_get_ids(self):
+        'Test get_ids on strict sequence'
+        SequenceStrict = POOL.get('ir.sequence.strict')
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            sequence, = SequenceStrict.create([{
+                        'name': 'Test strict',
+                        'code': 'test',
+                        'prefix': '',
+                        'suffix': '',
+                        'type': 'incremental',
+                        'number_increment': 2,
+                        }])
+            self.assertEqual(SequenceStrict.get_ids(sequence, 2), ['1', '3'])
+            self.assertEqual(SequenceStrict.get_id(sequence), '5')
+
+            transaction.cursor.rollback()
+
 
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(SequenceTestCase)
@@ -441,6 +441,136 @@ class TriggerTestCase(unittest.TestCase):
             self.trigger._get_triggers_cache.clear()
             transaction.cursor.rollback()
 
+    def test0060domain(self):
+        'Test domain'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            model, = self.model.search([
+                    ('model', '=', 'test.triggered'),
+                    ])
+            action_model, = self.model.search([
+                    ('model', '=', 'test.trigger_action'),
+                    ])
+        values = {
+            'name': 'Test',
+            'model': model.id,
+            'on_create': True,
+            'condition': 'true',
+            'domain': PYSONEncoder().encode([('name', '=', 'Bar')]),
+            'action_model': action_model.id,
+            'action_function': 'trigger',
+            }
+
+        # check_domain
+        for domain in ['=', PYSONEncoder().encode(True)]:
+            with Transaction().start(DB_NAME, USER, context=CONTEXT):
+                self.assertRaises(UserError, self.trigger.create, [
+                        dict(values, domain=domain)])
+
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            trigger, = self.trigger.create([values])
+            triggered, = self.triggered.create([{
+                        'name': 'Foo',
+                        }])
+            self.assertEqual(TRIGGER_LOGS, [])
+            triggered, _ = self.triggered.create([{
+                        'name': 'Bar',
+                        }, {
+                        'name': 'Foo',
+                        }])
+            self.assertEqual(TRIGGER_LOGS, [([triggered], trigger)])
+            TRIGGER_LOGS.pop()
+
+            # With condition
+            self.trigger.write([trigger], {
+                    'condition': PYSONEncoder().encode(
+                        Eval('self', {}).get('id', 0) < 0),
+                    })
+            self.triggered.create([{
+                        'name': 'Bar',
+                        }])
+            self.assertEqual(TRIGGER_LOGS, [])
+
+            self.trigger.write([trigger], {
+                    'on_create': False,
+                    'on_write': True,
+                    'condition': 'true',
+                    })
+            triggered, = self.triggered.create([{
+                        'name': 'Foo',
+                        }])
+            self.triggered.write([triggered], {
+                    'name': 'Bar',
+                    })
+            self.assertEqual(TRIGGER_LOGS, [([triggered], trigger)])
+            TRIGGER_LOGS.pop()
+            self.triggered.write([triggered], {
+                    'name': 'Bar',
+                    })
+            self.assertEqual(TRIGGER_LOGS, [])
+
+            self.trigger.write([trigger], {
+                    'on_write': False,
+                    'on_time': True,
+                    })
+            bars = self.triggered.search([
+                    ('name', '=', 'Bar'),
+                    ])
+            self.trigger.trigger_time()
+            self.assertEqual(TRIGGER_LOGS, [(bars, trigger)])
+            TRIGGER_LOGS.pop()
+
+            # Restart the cache on the get_triggers method of ir.trigger
+            self.trigger._get_triggers_cache.clear()
+            transaction.cursor.rollback()
+
+    def test0070domain_rule(self):
+        'Test domain with record rule'
+        RuleGroup = POOL.get('ir.rule.group')
+        Rule = POOL.get('ir.rule')
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            model, = self.model.search([
+                    ('model', '=', 'test.triggered'),
+                    ])
+            action_model, = self.model.search([
+                    ('model', '=', 'test.trigger_action'),
+                    ])
+            trigger, = self.trigger.create([{
+                        'name': 'Test',
+                        'model': model.id,
+                        'on_create': True,
+                        'condition': 'true',
+                        'domain': PYSONEncoder().encode(
+                            [('name', '=', 'Bar')]),
+                        'action_model': action_model.id,
+                        'action_function': 'trigger',
+                        }])
+            RuleGroup.create([{
+                        'name': 'Not Bar',
+                        'model': model.id,
+                        'global_p': True,
+                        'perm_read': True,
+                        'perm_write': False,
+                        'perm_create': False,
+                        'perm_delete': False,
+                        'rules': [('create', [{
+                                        'domain': PYSONEncoder().encode(
+                                            [('name', '!=', 'Bar')]),
+                                        }])],
+                        }])
+
+            # The records not readable by the user are triggered
+            triggered, = self.triggered.create([{
+                        'name': 'Bar',
+                        }])
+            self.assertEqual(TRIGGER_LOGS, [([triggered], trigger)])
+            TRIGGER_LOGS.pop()
+
+            self.trigger._get_triggers_cache.clear()
+            Rule._domain_get_cache.clear()
+            transaction.cursor.rollback()
+
 
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(TriggerTestCase)
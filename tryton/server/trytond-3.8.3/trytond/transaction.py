@@ -66,6 +66,7 @@ class Transaction(local):
     delete_records = None
     delete = None  # TODO check to merge with delete_records
     timestamp = None
+    rule_queries = None
 
     def start(self, database_name, user, readonly=False, context=None,
             close=False, autocommit=False):
@@ -94,6 +95,7 @@ class Transaction(local):
         self.delete_records = {}
         self.delete = {}
         self.timestamp = {}
+        self.rule_queries = {}
         self.counter = 0
         return _TransactionManager()
 
@@ -113,6 +115,7 @@ class Transaction(local):
             self.delete_records = None
             self.delete = None
             self.timestamp = None
+            self.rule_queries = None
 
     def set_context(self, context=None, **kwargs):
         if context is None:
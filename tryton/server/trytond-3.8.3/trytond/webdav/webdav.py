@@ -406,6 +406,39 @@ class Collection(ModelSQL, ModelView):
             return res
         return '0'
 
+    @classmethod
+    def get_etag(cls, uri, cache=None):
+        pool = Pool()
+        Attachment = pool.get('ir.attachment')
+
+        object_name, object_id = cls._uri2object(uri, cache=cache)
+        if object_name == 'ir.attachment' and object_id:
+
+            if cache is not None:
+                cache.setdefault('ir.attachment', {})
+                ids = cache['ir.attachment'].keys()
+                if object_id not in ids:
+                    ids.append(object_id)
+                elif 'etag' in cache['ir.attachment'][object_id]:
+                    return cache['ir.attachment'][object_id]['etag']
+            else:
+                ids = [object_id]
+
+            attachments = Attachment.browse(ids)
+
+            res = None
+            for attachment in attachments:
+                etag = None
+                if attachment.file_id:
+                    etag = '"%s"' % attachment.file_id
+                if attachment.id == object_id:
+                    res = etag
+                if cache is not None:
+                    cache['ir.attachment'].setdefault(attachment.id, {})
+                    cache['ir.attachment'][attachment.id]['etag'] = etag
+            return res
+        return None
+
     @classmethod
     def get_contenttype(cls, uri, cache=None):
         object_name, object_id = cls._uri2object(uri, cache=cache)
@@ -500,33 +533,25 @@ class Collection(ModelSQL, ModelView):
             object_name, object_id = cls._uri2object(uri, cache=cache)
 
             if object_name == 'ir.attachment' and object_id:
+                # The data is not prefetched for the other attachments as a
+                # request returns the data of only one
                 if cache is not None:
                     cache.setdefault('ir.attachment', {})
-                    ids = cache['ir.attachment'].keys()
-                    if object_id not in ids:
-                        ids.append(object_id)
-                    elif 'data' in cache['ir.attachment'][object_id]:
+                    if 'data' in cache['ir.attachment'].get(object_id, {}):
                         res = cache['ir.attachment'][object_id]['data']
                         if res == DAV_NotFound:
                             raise DAV_NotFound
                         return res
-                else:
-                    ids = [object_id]
-                attachments = Attachment.browse(ids)
-
+                attachment = Attachment(object_id)
                 res = DAV_NotFound
-                for attachment in attachments:
-                    data = DAV_NotFound
-                    try:
-                        if attachment.data is not None:
-                            data = str(attachment.data)
-                    except Exception:
-                        pass
-                    if attachment.id == object_id:
-                        res = data
-                    if cache is not None:
-                        cache['ir.attachment'].setdefault(attachment.id, {})
-                        cache['ir.attachment'][attachment.id]['data'] = data
+                try:
+                    if attachment.data is not None:
+                        res = str(attachment.data)
+                except Exception:
+                    pass
+                if cache is not None:
+                    cache['ir.attachment'].setdefault(attachment.id, {})
+                    cache['ir.attachment'][attachment.id]['data'] = res
                 if res == DAV_NotFound:
                     raise DAV_NotFound
                 return res